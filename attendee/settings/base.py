@@ -218,3 +218,44 @@ CHARGE_CREDITS_FOR_BOTS = os.getenv("CHARGE_CREDITS_FOR_BOTS", "false") == "true
 ASR_PROVIDER = os.getenv("ASR_PROVIDER", "deepgram").lower()
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY", "")
 ASSEMBLYAI_REALTIME_URL = os.getenv("ASSEMBLYAI_REALTIME_URL", "wss://api.assemblyai.com/v2/realtime/ws?sample_rate=16000")
+
+# Where the raw audio of utterances waiting to be transcribed is kept. Options: database | filesystem | s3
+UTTERANCE_AUDIO_STORAGE_BACKEND = os.getenv("UTTERANCE_AUDIO_STORAGE_BACKEND", "database").lower()
+UTTERANCE_AUDIO_SPOOL_DIR = os.getenv("UTTERANCE_AUDIO_SPOOL_DIR", "/tmp/utterance_audio")
+AWS_UTTERANCE_AUDIO_STORAGE_BUCKET_NAME = os.getenv("AWS_UTTERANCE_AUDIO_STORAGE_BUCKET_NAME")
+# Format utterance audio is encoded in before it is uploaded to the transcription provider, if the provider accepts it. Options: flac | ogg_opus
+# FLAC is much cheaper to encode, Ogg Opus is much smaller
+UTTERANCE_AUDIO_UPLOAD_FORMAT = os.getenv("UTTERANCE_AUDIO_UPLOAD_FORMAT", "flac").lower()
+# Transcribe utterances in the run_transcription_worker process, instead of in a Celery task each
+UTTERANCE_TRANSCRIPTION_WORKER_ENABLED = os.getenv("UTTERANCE_TRANSCRIPTION_WORKER_ENABLED", "false") == "true"
+
+# Decoded PCM of the MediaBlobs bots play, so the same clip isn't decoded again every time it is played
+MEDIA_BLOB_PCM_CACHE_DIR = os.getenv("MEDIA_BLOB_PCM_CACHE_DIR", "/tmp/media_blob_pcm_cache")
+MEDIA_BLOB_PCM_CACHE_MAX_SIZE_MB = int(os.getenv("MEDIA_BLOB_PCM_CACHE_MAX_SIZE_MB", "1024"))
+# Optional bucket that shares decoded PCM between bots
+AWS_MEDIA_BLOB_PCM_CACHE_BUCKET_NAME = os.getenv("AWS_MEDIA_BLOB_PCM_CACHE_BUCKET_NAME")
+# Text-to-speech provider for speech media requests. Options: google | fake (for tests)
+TEXT_TO_SPEECH_PROVIDER = os.getenv("TEXT_TO_SPEECH_PROVIDER", "google").lower()
+# Number of synthesized speech MediaBlobs each bot keeps in memory
+TEXT_TO_SPEECH_CACHE_MAX_SIZE = int(os.getenv("TEXT_TO_SPEECH_CACHE_MAX_SIZE", "100"))
+
+# API key authentication cache. Set the TTL to 0 to look up the key on every request.
+API_KEY_CACHE_TTL_SECONDS = int(os.getenv("API_KEY_CACHE_TTL_SECONDS", "30"))
+API_KEY_CACHE_MAX_SIZE = int(os.getenv("API_KEY_CACHE_MAX_SIZE", "1000"))
+# Also share cached keys between processes through the Django cache
+API_KEY_DJANGO_CACHE_ENABLED = os.getenv("API_KEY_DJANGO_CACHE_ENABLED", "false") == "true"
+
+# Keep a Redis queue of scheduled bots for the event driven scheduler (run_scheduler --event-driven)
+SCHEDULED_BOT_QUEUE_ENABLED = os.getenv("SCHEDULED_BOT_QUEUE_ENABLED", "false") == "true"
+
+# Write bot heartbeats after the first one to Redis, they're flushed to the database by the scheduler
+REDIS_BOT_HEARTBEATS_ENABLED = os.getenv("REDIS_BOT_HEARTBEATS_ENABLED", "false") == "true"
+
+# Maximum number of calendar syncs the scheduler runs at once, per calendar platform and per organization
+CALENDAR_SYNC_MAX_CONCURRENCY_PER_PLATFORM = int(os.getenv("CALENDAR_SYNC_MAX_CONCURRENCY_PER_PLATFORM", "50"))
+CALENDAR_SYNC_MAX_CONCURRENCY_PER_ORGANIZATION = int(os.getenv("CALENDAR_SYNC_MAX_CONCURRENCY_PER_ORGANIZATION", "10"))
+
+# Webhook delivery
+WEBHOOK_SECRET_CACHE_TTL_SECONDS = int(os.getenv("WEBHOOK_SECRET_CACHE_TTL_SECONDS", "60"))
+# Maximum number of events sent in one request to a subscription with batch_deliveries enabled
+WEBHOOK_MAX_BATCH_SIZE = int(os.getenv("WEBHOOK_MAX_BATCH_SIZE", "50"))
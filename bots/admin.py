@@ -8,6 +8,8 @@ from django.db.models.functions import Extract
 from django.utils import timezone
 from django.utils.html import format_html
 
+from .bot_pod_creator.warm_bot_pod_pool import bot_pod_name, warm_bot_pod_pool_size
+from .bots_api_utils import get_redis_client
 from .models import Bot, BotEvent, Calendar, CalendarEvent, Utterance, WebhookDeliveryAttempt, WebhookSubscription
 
 
@@ -93,11 +95,11 @@ class BotAdmin(admin.ModelAdmin):
         return True
 
     def view_logs_link(self, obj):
-        pod_name = obj.k8s_pod_name()
         link_formatting_str = os.getenv("CLOUD_LOGS_LINK_FORMATTING_STR")
         if not link_formatting_str:
             return None
         try:
+            pod_name = bot_pod_name(get_redis_client(), obj) if warm_bot_pod_pool_size() else obj.k8s_pod_name()
             url = link_formatting_str.format(pod_name=pod_name)
             return format_html('<a href="{}" target="_blank">View Logs</a>', url)
         except Exception:
@@ -215,7 +217,7 @@ class UtteranceAdmin(admin.ModelAdmin):
     list_display = ("recording", "participant", "timestamp_ms", "duration_ms", "source", "created_at", "updated_at")
     list_filter = ("source", "audio_format")
     search_fields = ("participant__full_name", "recording__bot__object_id")
-    readonly_fields = ("recording", "participant", "audio_blob", "audio_format", "timestamp_ms", "duration_ms", "source_uuid", "sample_rate", "source")
+    readonly_fields = ("recording", "participant", "audio_blob", "audio_blob_key", "audio_blob_size", "audio_format", "timestamp_ms", "duration_ms", "source_uuid", "sample_rate", "source")
 
     def has_add_permission(self, request):
         return False
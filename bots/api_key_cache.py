@@ -0,0 +1,71 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+# key hash -> (pickled ApiKey with its project, monotonic time it expires at), least recently used first
+_api_key_cache = OrderedDict()
+_api_key_cache_lock = threading.Lock()
+
+
+def _django_cache_key(key_hash):
+    return f"api_key_auth:{key_hash}"
+
+
+def get_cached_api_key(key_hash):
+    """
+    Returns the ApiKey cached for the key hash, or None if there isn't one. Looks in the in-process cache first and then
+    in the Django cache if API_KEY_DJANGO_CACHE_ENABLED is set.
+    Every call returns a new instance, so the cached ApiKey can't be changed by the request that uses it.
+    """
+    if settings.API_KEY_CACHE_TTL_SECONDS <= 0:
+        return None
+
+    with _api_key_cache_lock:
+        cached_api_key = _api_key_cache.get(key_hash)
+        if cached_api_key:
+            if cached_api_key[1] > time.monotonic():
+                _api_key_cache.move_to_end(key_hash)
+                return pickle.loads(cached_api_key[0])
+            del _api_key_cache[key_hash]
+
+    if settings.API_KEY_DJANGO_CACHE_ENABLED:
+        pickled_api_key = cache.get(_django_cache_key(key_hash))
+        if pickled_api_key is not None:
+            _cache_in_process(key_hash, pickled_api_key)
+            return pickle.loads(pickled_api_key)
+
+    return None
+
+
+def cache_api_key(api_key):
+    if settings.API_KEY_CACHE_TTL_SECONDS <= 0:
+        return
+
+    pickled_api_key = pickle.dumps(api_key)
+    _cache_in_process(api_key.key_hash, pickled_api_key)
+    if settings.API_KEY_DJANGO_CACHE_ENABLED:
+        cache.set(_django_cache_key(api_key.key_hash), pickled_api_key, timeout=settings.API_KEY_CACHE_TTL_SECONDS)
+
+
+def _cache_in_process(key_hash, pickled_api_key):
+    with _api_key_cache_lock:
+        _api_key_cache[key_hash] = (pickled_api_key, time.monotonic() + settings.API_KEY_CACHE_TTL_SECONDS)
+        _api_key_cache.move_to_end(key_hash)
+        while len(_api_key_cache) > settings.API_KEY_CACHE_MAX_SIZE:
+            _api_key_cache.popitem(last=False)
+
+
+def invalidate_cached_api_key(key_hash):
+    """
+    Removes the key hash from the in-process cache and the Django cache. Other processes only see this through the
+    Django cache, so their in-process cache can serve the key for up to API_KEY_CACHE_TTL_SECONDS longer.
+    """
+    with _api_key_cache_lock:
+        _api_key_cache.pop(key_hash, None)
+
+    if settings.API_KEY_DJANGO_CACHE_ENABLED:
+        cache.delete(_django_cache_key(key_hash))
@@ -2,6 +2,7 @@ import hashlib
 
 from rest_framework import authentication, exceptions
 
+from .api_key_cache import cache_api_key, get_cached_api_key
 from .models import ApiKey
 
 
@@ -20,11 +21,16 @@ class ApiKeyAuthentication(authentication.BaseAuthentication):
 
         api_key = auth_header[1]
 
-        try:
-            key_hash = hashlib.sha256(api_key.encode()).hexdigest()
-            api_key_obj = ApiKey.objects.select_related("project").get(key_hash=key_hash, disabled_at__isnull=True)
-        except ApiKey.DoesNotExist:
-            raise exceptions.AuthenticationFailed({"detail": "Invalid or disabled API key"})
+        key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+
+        # Keys are cached for a short time, because this runs on every request. Keys that are disabled or deleted are removed from the cache.
+        api_key_obj = get_cached_api_key(key_hash)
+        if api_key_obj is None:
+            try:
+                api_key_obj = ApiKey.objects.select_related("project").get(key_hash=key_hash, disabled_at__isnull=True)
+            except ApiKey.DoesNotExist:
+                raise exceptions.AuthenticationFailed({"detail": "Invalid or disabled API key"})
+            cache_api_key(api_key_obj)
 
         # Return (None, api_key_obj) instead of (user, auth)
         return (None, api_key_obj)
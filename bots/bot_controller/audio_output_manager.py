@@ -1,9 +1,9 @@
 import threading
 import time
 
-from bots.utils import mp3_to_pcm
+from bots.media_blob_pcm_cache import MediaBlobPCMCache, read_pcm_file_in_chunks
 
-from .text_to_speech import generate_audio_from_text
+from .text_to_speech import get_text_to_speech_media_blob
 
 
 class AudioOutputManager:
@@ -20,16 +20,15 @@ class AudioOutputManager:
         self.currently_playing_audio_media_request_duration_ms = None
         self.currently_playing_audio_media_request_finished_callback = currently_playing_audio_media_request_finished_callback
         self.play_raw_audio_callback = play_raw_audio_callback
-        self.currently_playing_audio_media_request_raw_audio_pcm_bytes = None
         self.audio_thread = None
         self.stop_audio_thread = False
         self.sleep_time_between_chunks_seconds = sleep_time_between_chunks_seconds
+        self.media_blob_pcm_cache = MediaBlobPCMCache()
 
-    def _play_audio_chunks(self, audio_data, chunk_size):
-        for i in range(0, len(audio_data), chunk_size):
+    def _play_audio_chunks(self, chunks):
+        for chunk in chunks:
             if self.stop_audio_thread:
                 break
-            chunk = audio_data[i : i + chunk_size]
             self.play_raw_audio_callback(bytes=chunk, sample_rate=self.SAMPLE_RATE)
             time.sleep(self.sleep_time_between_chunks_seconds)
 
@@ -44,33 +43,31 @@ class AudioOutputManager:
         # Stop any existing audio playback
         self._stop_audio_thread()
 
+        bytes_per_sample = 2
+        chunk_size = self.SAMPLE_RATE * bytes_per_sample
+
         if audio_media_request.media_blob:
             # Handle raw audio blob case
-            self.currently_playing_audio_media_request_raw_audio_pcm_bytes = mp3_to_pcm(audio_media_request.media_blob.blob, sample_rate=self.SAMPLE_RATE)
-            self.currently_playing_audio_media_request_duration_ms = audio_media_request.media_blob.duration_ms
+            media_blob = audio_media_request.media_blob
         else:
-            # Handle text-to-speech case
-            audio_blob, duration_ms = generate_audio_from_text(
+            # Handle text-to-speech case. The speech is stored as a MediaBlob, so the same speech isn't synthesized again
+            media_blob = get_text_to_speech_media_blob(
                 text=audio_media_request.text_to_speak,
                 settings=audio_media_request.text_to_speech_settings,
                 sample_rate=self.SAMPLE_RATE,
                 bot=audio_media_request.bot,
             )
-            self.currently_playing_audio_media_request_raw_audio_pcm_bytes = audio_blob
-            self.currently_playing_audio_media_request_duration_ms = duration_ms
+
+        # The decoded audio is cached, and read from the cache a chunk at a time as it plays
+        pcm_path = self.media_blob_pcm_cache.get_pcm_path(media_blob, sample_rate=self.SAMPLE_RATE)
+        chunks = read_pcm_file_in_chunks(pcm_path, chunk_size)
+        self.currently_playing_audio_media_request_duration_ms = media_blob.duration_ms
 
         self.currently_playing_audio_media_request = audio_media_request
         self.currently_playing_audio_media_request_started_at = time.time()
 
-        bytes_per_sample = 2
         # Start audio playback in a new thread
-        self.audio_thread = threading.Thread(
-            target=self._play_audio_chunks,
-            args=(
-                self.currently_playing_audio_media_request_raw_audio_pcm_bytes,
-                self.SAMPLE_RATE * bytes_per_sample,
-            ),
-        )
+        self.audio_thread = threading.Thread(target=self._play_audio_chunks, args=(chunks,))
         self.audio_thread.start()
 
     def currently_playing_audio_media_request_is_finished(self):
@@ -10,12 +10,14 @@ from datetime import timedelta
 
 import gi
 import redis
+from django.conf import settings
 from django.core.files.base import ContentFile
 from django.utils import timezone
 
 from bots.automatic_leave_configuration import AutomaticLeaveConfiguration
 from bots.bot_adapter import BotAdapter
 from bots.bot_controller.bot_websocket_client import BotWebsocketClient
+from bots.bot_heartbeats import record_bot_heartbeat
 from bots.bots_api_utils import BotCreationSource
 from bots.external_callback_utils import get_zoom_tokens
 from bots.models import (
@@ -45,10 +47,11 @@ from bots.models import (
     Utterance,
     WebhookTriggerTypes,
 )
+from bots.pending_utterances import UTTERANCES_TERMINATED_COMMAND, add_pending_utterance
 from bots.utils import meeting_type_from_url
 from bots.webhook_payloads import chat_message_webhook_payload, participant_event_webhook_payload, utterance_webhook_payload
-from bots.webhook_utils import trigger_webhook
-from bots.websocket_payloads import mixed_audio_websocket_payload
+from bots.webhook_utils import trigger_webhook, trigger_webhooks
+from bots.websocket_payloads import WebsocketAudioMessageFormats, mixed_audio_websocket_binary_payload, mixed_audio_websocket_payload, parse_bot_output_audio_binary_message
 
 from .audio_output_manager import AudioOutputManager
 from .bot_resource_snapshot_taker import BotResourceSnapshotTaker
@@ -62,6 +65,8 @@ from .pipeline_configuration import PipelineConfiguration
 from .realtime_audio_output_manager import RealtimeAudioOutputManager
 from .rtmp_client import RTMPClient
 from .screen_and_audio_recorder import ScreenAndAudioRecorder
+from .streaming_transcription_sink import StreamingTranscriptionSink
+from .streaming_uploader import StreamingUploader
 from .video_output_manager import VideoOutputManager
 
 gi.require_version("GLib", "2.0")
@@ -73,6 +78,7 @@ logger = logging.getLogger(__name__)
 class BotController:
     # Default wait time for utterance termination (5 minutes)
     UTTERANCE_TERMINATION_WAIT_TIME_SECONDS = 300
+    UTTERANCE_TERMINATION_CHECK_INTERVAL_SECONDS = 30
 
     def per_participant_audio_input_manager(self):
         if self.bot_in_db.deepgram_use_streaming():
@@ -223,12 +229,20 @@ class BotController:
             logger.info("Starting websocket audio client...")
             self.websocket_audio_client.start()
 
-        payload = mixed_audio_websocket_payload(
-            chunk=chunk,
-            input_sample_rate=self.mixed_audio_sample_rate(),
-            output_sample_rate=self.bot_in_db.websocket_audio_sample_rate(),
-            bot_object_id=self.bot_in_db.object_id,
-        )
+        if self.websocket_audio_message_format == WebsocketAudioMessageFormats.BINARY:
+            payload = mixed_audio_websocket_binary_payload(
+                chunk=chunk,
+                input_sample_rate=self.mixed_audio_sample_rate(),
+                output_sample_rate=self.bot_in_db.websocket_audio_sample_rate(),
+                bot_object_id=self.bot_in_db.object_id,
+            )
+        else:
+            payload = mixed_audio_websocket_payload(
+                chunk=chunk,
+                input_sample_rate=self.mixed_audio_sample_rate(),
+                output_sample_rate=self.bot_in_db.websocket_audio_sample_rate(),
+                bot_object_id=self.bot_in_db.object_id,
+            )
 
         self.websocket_audio_client.send_async(payload)
 
@@ -337,8 +351,10 @@ class BotController:
             write_succeeded = self.rtmp_client.write_data(data)
             if not write_succeeded:
                 GLib.idle_add(lambda: self.on_rtmp_connection_failed())
+        elif self.recording_streaming_uploader:
+            self.recording_streaming_uploader.upload_part(data)
         else:
-            raise Exception("No rtmp client found")
+            raise Exception("No rtmp client or streaming uploader found")
 
     def upload_recording_to_external_media_storage_if_enabled(self):
         if not self.bot_in_db.external_media_storage_bucket_name():
@@ -392,6 +408,9 @@ class BotController:
         termination_thread = threading.Thread(target=terminate_worker, daemon=True)
         termination_thread.start()
 
+        # Before the meeting is left, so results for audio that was already sent still make it into the recording
+        self.flush_streaming_transcriptions()
+
         if self.gstreamer_pipeline:
             logger.info("Telling gstreamer pipeline to cleanup...")
             self.gstreamer_pipeline.cleanup()
@@ -421,7 +440,16 @@ class BotController:
             logger.info("Telling websocket audio client to cleanup...")
             self.websocket_audio_client.cleanup()
 
-        if self.get_recording_file_location():
+        if self.recording_streaming_uploader:
+            # The pipeline has been flushed, so everything it produced has been handed to the uploader
+            logger.info("Telling streaming uploader to finish uploading recording...")
+            try:
+                self.recording_streaming_uploader.complete_upload()
+                logger.info("Streaming uploader finished uploading recording")
+                self.recording_file_saved(self.recording_streaming_uploader.key)
+            except Exception as e:
+                logger.exception(f"Error completing streaming upload of recording: {e}")
+        elif self.get_recording_file_location():
             self.upload_recording_to_external_media_storage_if_enabled()
 
             logger.info("Telling file uploader to upload recording file...")
@@ -448,23 +476,59 @@ class BotController:
 
     # We're going to wait until all utterances are transcribed or have failed. If there are still
     # in progress utterances, after 5 minutes, then we'll consider them failed and mark them as timed out.
+    # The database is checked again when the utterance processing says the recording's last pending utterance terminated,
+    # and every UTTERANCE_TERMINATION_CHECK_INTERVAL_SECONDS in case that notification is missed.
     def wait_until_all_utterances_are_terminated(self):
         default_recording = self.bot_in_db.recordings.get(is_default_recording=True)
 
-        start_time = time.time()
-        wait_time_seconds = self.UTTERANCE_TERMINATION_WAIT_TIME_SECONDS
-        while time.time() - start_time < wait_time_seconds:
-            in_progress_utterances = default_recording.utterances.filter(transcription__isnull=True, failure_data__isnull=True)
-            # If no more in progress utterances, then we're done
-            if not in_progress_utterances.exists():
-                logger.info(f"All utterances are terminated for bot {self.bot_in_db.id}")
-                return
-
-            logger.info(f"Waiting for {len(in_progress_utterances)} utterances to terminate. It has been {time.time() - start_time} seconds. We will wait {wait_time_seconds} seconds.")
-            time.sleep(5)
+        # Subscribe before checking, so a notification sent in between isn't missed
+        utterances_terminated_pubsub = self.subscribe_to_utterances_terminated_notifications()
+        try:
+            start_time = time.time()
+            wait_time_seconds = self.UTTERANCE_TERMINATION_WAIT_TIME_SECONDS
+            while True:
+                in_progress_utterances = default_recording.utterances.filter(transcription__isnull=True, failure_data__isnull=True)
+                # If no more in progress utterances, then we're done
+                if not in_progress_utterances.exists():
+                    logger.info(f"All utterances are terminated for bot {self.bot_in_db.id}")
+                    return
+
+                remaining_seconds = wait_time_seconds - (time.time() - start_time)
+                if remaining_seconds <= 0:
+                    break
+                logger.info(f"Waiting for {in_progress_utterances.count()} utterances to terminate. It has been {time.time() - start_time} seconds. We will wait {wait_time_seconds} seconds.")
+                self.wait_for_utterances_terminated_notification(utterances_terminated_pubsub, min(remaining_seconds, self.UTTERANCE_TERMINATION_CHECK_INTERVAL_SECONDS))
+        finally:
+            if utterances_terminated_pubsub:
+                utterances_terminated_pubsub.close()
 
         logger.info(f"Timed out in post-processing waiting for utterances to terminate for bot {self.bot_in_db.id}. Transcription will be marked as failed because recording terminated.")
 
+    def subscribe_to_utterances_terminated_notifications(self):
+        # The redis listener thread reads the bot's main subscription, and it hands messages to the main loop, which is busy running this cleanup
+        try:
+            pubsub = self.redis_client.pubsub()
+            pubsub.subscribe(self.pubsub_channel)
+            return pubsub
+        except Exception as e:
+            logger.info(f"Failed to subscribe to utterances terminated notifications for bot {self.bot_in_db.id}, falling back to polling: {e}")
+            return None
+
+    def wait_for_utterances_terminated_notification(self, pubsub, timeout_seconds):
+        if pubsub is None:
+            time.sleep(timeout_seconds)
+            return
+        deadline = time.time() + timeout_seconds
+        while (remaining_seconds := deadline - time.time()) > 0:
+            try:
+                message = pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining_seconds)
+            except Exception as e:
+                logger.info(f"Error waiting for utterances terminated notification for bot {self.bot_in_db.id}: {e}")
+                time.sleep(max(0, deadline - time.time()))
+                return
+            if message and json.loads(message["data"].decode("utf-8")).get("command") == UTTERANCES_TERMINATED_COMMAND:
+                return
+
     def __init__(self, bot_id):
         self.bot_in_db = Bot.objects.get(id=bot_id)
         self.cleanup_called = False
@@ -472,6 +536,7 @@ class BotController:
 
         self.redis_client = None
         self.pubsub = None
+        self.last_redis_heartbeat_timestamp = None
         self.pubsub_channel = f"bot_{self.bot_in_db.id}"
 
         self.automatic_leave_configuration = AutomaticLeaveConfiguration(**self.bot_in_db.automatic_leave_settings())
@@ -501,9 +566,29 @@ class BotController:
 
         return PipelineConfiguration.recorder_bot()
 
+    def should_stream_recording_upload(self):
+        # If enabled, the recording is uploaded to S3 in parts while the meeting is in progress, instead of after it ends
+        if os.getenv("STREAM_RECORDING_UPLOADS", "false").lower() != "true":
+            return False
+
+        # Only the gstreamer pipeline can hand us the recording as it is produced
+        if not self.should_create_gstreamer_pipeline():
+            return False
+
+        if not self.get_recording_file_location():
+            return False
+
+        # Uploading to external media storage is done from the local file
+        if self.bot_in_db.external_media_storage_bucket_name():
+            return False
+
+        return True
+
     def get_gstreamer_sink_type(self):
         if self.pipeline_configuration.rtmp_stream_audio or self.pipeline_configuration.rtmp_stream_video:
             return GstreamerPipeline.SINK_TYPE_APPSINK
+        elif self.should_stream_recording_upload():
+            return GstreamerPipeline.SINK_TYPE_APPSINK
         else:
             return GstreamerPipeline.SINK_TYPE_FILE
 
@@ -599,8 +684,13 @@ class BotController:
             silence_duration_limit=self.non_streaming_audio_silence_duration_limit(),
         )
 
+        # Final results from the streaming transcribers are buffered here and written in batches from the main loop
+        self.streaming_transcription_sink = StreamingTranscriptionSink(
+            save_utterances_callback=self.save_streaming_transcription_utterances,
+        )
+
         self.per_participant_streaming_audio_input_manager = PerParticipantStreamingAudioInputManager(
-            save_utterance_callback=self.save_individual_audio_utterance,
+            save_utterance_callback=self.streaming_transcription_sink.add_transcription,
             get_participant_callback=self.get_participant,
             sample_rate=self.get_per_participant_audio_sample_rate(),
             transcription_provider=self.get_recording_transcription_provider(),
@@ -624,6 +714,15 @@ class BotController:
             self.rtmp_client = RTMPClient(rtmp_url=self.bot_in_db.rtmp_destination_url())
             self.rtmp_client.start()
 
+        self.recording_streaming_uploader = None
+        if self.should_stream_recording_upload():
+            self.recording_streaming_uploader = StreamingUploader(
+                bucket=os.environ.get("AWS_RECORDING_STORAGE_BUCKET_NAME"),
+                key=self.get_recording_filename(),
+                spool_path=self.get_recording_file_location(),
+            )
+            self.recording_streaming_uploader.start_upload()
+
         self.gstreamer_pipeline = None
         if self.should_create_gstreamer_pipeline():
             self.gstreamer_pipeline = GstreamerPipeline(
@@ -645,6 +744,7 @@ class BotController:
             )
 
         self.websocket_audio_client = None
+        self.websocket_audio_message_format = self.bot_in_db.websocket_audio_message_format()
         if self.should_create_websocket_client():
             self.websocket_audio_client = BotWebsocketClient(
                 url=self.bot_in_db.websocket_audio_url(),
@@ -843,6 +943,12 @@ class BotController:
     def handle_glib_shutdown(self):
         logger.info("handle_glib_shutdown called")
 
+        # The FATAL_ERROR event ends the recording, so the streaming transcriptions are saved before it
+        try:
+            self.flush_streaming_transcriptions()
+        except Exception as e:
+            logger.info(f"Error flushing streaming transcriptions: {e}")
+
         try:
             BotEventManager.create_event(
                 bot=self.bot_in_db,
@@ -880,6 +986,9 @@ class BotController:
                 logger.info(f"Resuming recording for bot {self.bot_in_db.object_id}")
                 self.bot_in_db.refresh_from_db()
                 self.resume_recording()
+            elif command == UTTERANCES_TERMINATED_COMMAND:
+                # Only used to wake up wait_until_all_utterances_are_terminated
+                pass
             elif command == "admit_from_waiting_room":
                 logger.info(f"Admitting from waiting room for bot {self.bot_in_db.object_id}")
                 self.bot_in_db.refresh_from_db()
@@ -922,9 +1031,26 @@ class BotController:
         )
 
     def set_bot_heartbeat(self):
+        # The first heartbeat always goes to the database, since it marks the bot as launched
+        if settings.REDIS_BOT_HEARTBEATS_ENABLED and self.bot_in_db.first_heartbeat_timestamp is not None:
+            self.set_bot_heartbeat_in_redis()
+            return
+
         if self.bot_in_db.last_heartbeat_timestamp is None or self.bot_in_db.last_heartbeat_timestamp <= int(timezone.now().timestamp()) - 60:
             self.bot_in_db.set_heartbeat()
 
+    def set_bot_heartbeat_in_redis(self):
+        current_timestamp = int(timezone.now().timestamp())
+        if self.last_redis_heartbeat_timestamp is not None and self.last_redis_heartbeat_timestamp > current_timestamp - 60:
+            return
+
+        try:
+            record_bot_heartbeat(self.redis_client, self.bot_in_db.id, current_timestamp)
+        except Exception as e:
+            logger.warning(f"Failed to set heartbeat in Redis for bot {self.bot_in_db.object_id}, setting it in the database instead: {e}")
+            self.bot_in_db.set_heartbeat()
+        self.last_redis_heartbeat_timestamp = current_timestamp
+
     def on_main_loop_timeout(self):
         try:
             if self.first_timeout_call:
@@ -942,6 +1068,9 @@ class BotController:
             # Monitor transcription
             self.per_participant_streaming_audio_input_manager.monitor_transcription()
 
+            # Save final results from the streaming transcribers
+            self.streaming_transcription_sink.flush()
+
             # Process captions
             self.closed_caption_manager.process_captions()
 
@@ -1026,7 +1155,7 @@ class BotController:
         RecordingManager.set_recording_transcription_in_progress(recording_in_progress)
 
     def save_individual_audio_utterance(self, message):
-        from bots.tasks.process_utterance_task import process_utterance
+        from bots.tasks.process_utterance_task import enqueue_utterance_transcription
 
         logger.info("Received message that new utterance was detected")
 
@@ -1047,24 +1176,80 @@ class BotController:
             logger.warning("Warning: No recording in progress found so cannot save individual audio utterance.")
             return
 
-        utterance = Utterance.objects.create(
+        utterance = Utterance(
             source=Utterance.Sources.PER_PARTICIPANT_AUDIO,
             recording=recording_in_progress,
             participant=participant,
-            audio_blob=message["audio_data"],
             audio_format=Utterance.AudioFormat.PCM,
             timestamp_ms=message["timestamp_ms"] - self.get_per_participant_audio_utterance_delay_ms(),
             duration_ms=len(message["audio_data"]) / ((message["sample_rate"] / 1000) * 2),
             sample_rate=message["sample_rate"],
         )
+        # Depending on UTTERANCE_AUDIO_STORAGE_BACKEND, the audio goes to the database or to the utterance audio storage
+        utterance.set_audio_blob(message["audio_data"])
+        utterance.save()
+
+        # Counted before it is queued, so it can't be counted out before it's counted in
+        try:
+            add_pending_utterance(self.redis_client, recording_in_progress.id)
+        except Exception as e:
+            logger.warning(f"Failed to count pending utterance {utterance.id}: {e}")
 
         # Set the recording transcription in progress
         RecordingManager.set_recording_transcription_in_progress(recording_in_progress)
 
         # Process the utterance immediately
-        process_utterance.delay(utterance.id)
+        enqueue_utterance_transcription(utterance)
         return
 
+    def save_streaming_transcription_utterances(self, messages):
+        recording_in_progress = self.get_recording_in_progress()
+        if recording_in_progress is None:
+            logger.warning(f"Warning: No recording in progress found so cannot save {len(messages)} streaming transcription utterances.")
+            return
+
+        participants = {}
+        utterances = []
+        for message in messages:
+            participant = participants.get(message["participant_uuid"])
+            if participant is None:
+                participant, _ = Participant.objects.get_or_create(
+                    bot=self.bot_in_db,
+                    uuid=message["participant_uuid"],
+                    defaults={
+                        "user_uuid": message["participant_user_uuid"],
+                        "full_name": message["participant_full_name"],
+                        "is_the_bot": message["participant_is_the_bot"],
+                    },
+                )
+                participants[message["participant_uuid"]] = participant
+
+            # The transcription is already done, so there is no audio to store and nothing for process_utterance to do
+            utterances.append(
+                Utterance(
+                    source=Utterance.Sources.PER_PARTICIPANT_AUDIO,
+                    recording=recording_in_progress,
+                    participant=participant,
+                    audio_blob=b"",
+                    audio_format=None,
+                    timestamp_ms=message["timestamp_ms"] - self.get_per_participant_audio_utterance_delay_ms(),
+                    duration_ms=message["duration_ms"],
+                    sample_rate=message["sample_rate"],
+                    transcription=message["transcription"],
+                )
+            )
+
+        Utterance.objects.bulk_create(utterances)
+
+        RecordingManager.set_recording_transcription_in_progress(recording_in_progress)
+
+        # Triggered together so the deliveries can share requests
+        trigger_webhooks(
+            webhook_trigger_type=WebhookTriggerTypes.TRANSCRIPT_UPDATE,
+            bot=self.bot_in_db,
+            payloads=[utterance_webhook_payload(utterance) for utterance in utterances],
+        )
+
     def on_new_chat_message(self, chat_message):
         GLib.idle_add(lambda: self.upsert_chat_message(chat_message))
 
@@ -1155,10 +1340,19 @@ class BotController:
     def on_message_from_adapter(self, message):
         GLib.idle_add(lambda: self.take_action_based_on_message_from_adapter(message))
 
+    def flush_streaming_transcriptions(self):
+        # Finishing the transcribers makes them deliver their last final results, which are then saved from the sink
+        if self.per_participant_streaming_audio_input_manager:
+            logger.info("Flushing streaming transcriptions...")
+            self.per_participant_streaming_audio_input_manager.flush_utterances()
+        if self.streaming_transcription_sink:
+            self.streaming_transcription_sink.flush()
+
     def flush_utterances(self):
         if self.per_participant_non_streaming_audio_input_manager:
             logger.info("Flushing utterances...")
             self.per_participant_non_streaming_audio_input_manager.flush_utterances()
+        self.flush_streaming_transcriptions()
         if self.closed_caption_manager:
             logger.info("Flushing captions...")
             self.closed_caption_manager.flush_captions()
@@ -1179,8 +1373,14 @@ class BotController:
                 debug_screenshot.file.save(f"debug_screen_recording_{debug_screenshot.object_id}.mp4", f, save=True)
             logger.info(f"Saved debug recording with ID {debug_screenshot.object_id}")
 
-    def on_message_from_websocket_audio(self, message_json: str):
+    def on_message_from_websocket_audio(self, message_json: str | bytes):
         try:
+            # Binary frames carry raw PCM audio after a fixed size header, so there is no JSON or base64 to decode
+            if isinstance(message_json, bytes):
+                chunk, sample_rate = parse_bot_output_audio_binary_message(message_json)
+                self.realtime_audio_output_manager.add_chunk(chunk, sample_rate)
+                return
+
             message = json.loads(message_json)
             if message["trigger"] == RealtimeTriggerTypes.type_to_api_code(RealtimeTriggerTypes.BOT_OUTPUT_AUDIO_CHUNK):
                 chunk = b64decode(message["data"]["chunk"])
@@ -25,7 +25,7 @@ class BotWebsocketClient:
     FAILED = "FAILED"
     STOPPED = "STOPPED"
 
-    def __init__(self, url: str, on_message_callback: Callable[[dict], None]):
+    def __init__(self, url: str, on_message_callback: Callable[[str | bytes], None]):
         self.on_message_callback = on_message_callback
         self.websocket_url = url
         self.websocket = None
@@ -62,7 +62,7 @@ class BotWebsocketClient:
         finally:
             self.connection_state = self.STOPPED
 
-    def send_async(self, message: dict):
+    def send_async(self, message: dict | bytes):
         if self.connection_state == self.CONNECTED:
             self.send_queue.put(message)
         else:
@@ -146,7 +146,8 @@ class BotWebsocketClient:
                 continue  # nothing queued yet
 
             try:
-                self.websocket.send(json.dumps(message))
+                # Bytes are sent as a binary frame, everything else as JSON in a text frame
+                self.websocket.send(message if isinstance(message, bytes) else json.dumps(message))
             except Exception as e:
                 logger.info("BotWebsocketClient send failed (%s). Leaving loop.", e)
                 break
@@ -57,8 +57,16 @@ class GstreamerPipeline:
         sample = sink.emit("pull-sample")
         if sample:
             buffer = sample.get_buffer()
-            data = buffer.extract_dup(0, buffer.get_size())
-            self.on_new_sample_callback(data)
+            # Map the buffer instead of using extract_dup, which copies the sample once in C and then again into a Python bytes object.
+            # The callback gets a memoryview that is only valid until it returns, every consumer writes from that same view.
+            success, map_info = buffer.map(Gst.MapFlags.READ)
+            if not success:
+                return Gst.FlowReturn.ERROR
+            try:
+                with memoryview(map_info.data) as data:
+                    self.on_new_sample_callback(data)
+            finally:
+                buffer.unmap(map_info)
             return Gst.FlowReturn.OK
         return Gst.FlowReturn.ERROR
 
@@ -67,12 +75,20 @@ class GstreamerPipeline:
         self.start_time_ns = None
 
         # Setup muxer based on output format
+        # An appsink can't seek back to rewrite headers, so when writing to one the container must be streamable.
+        # For MP4 that means fragmented MP4, where each fragment carries its own index.
         if self.output_format == self.OUTPUT_FORMAT_MP4:
-            muxer_string = "mp4mux name=muxer"
+            if self.sink_type == self.SINK_TYPE_APPSINK:
+                muxer_string = "mp4mux name=muxer fragment-duration=1000 streamable=true"
+            else:
+                muxer_string = "mp4mux name=muxer"
         elif self.output_format == self.OUTPUT_FORMAT_FLV:
             muxer_string = "h264parse ! flvmux name=muxer streamable=true"
         elif self.output_format == self.OUTPUT_FORMAT_WEBM:
-            muxer_string = "h264parse ! matroskamux name=muxer"
+            if self.sink_type == self.SINK_TYPE_APPSINK:
+                muxer_string = "h264parse ! matroskamux name=muxer streamable=true"
+            else:
+                muxer_string = "h264parse ! matroskamux name=muxer"
         elif self.output_format == self.OUTPUT_FORMAT_MP3:
             muxer_string = ""
         else:
@@ -9,12 +9,23 @@ logger = logging.getLogger(__name__)
 
 
 def calculate_normalized_rms(audio_bytes):
-    samples = np.frombuffer(audio_bytes, dtype=np.int16)
+    # Square as floats, squaring int16 samples overflows
+    samples = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float64)
     rms = np.sqrt(np.mean(np.square(samples)))
     # Normalize by max possible value for 16-bit audio (32768)
     return rms / 32768
 
 
+def calculate_normalized_rms_per_chunk(chunks):
+    # Computes the RMS of every chunk with a single numpy operation over the concatenated samples, instead of one per chunk
+    samples = np.frombuffer(b"".join(chunks), dtype=np.int16).astype(np.float64)
+    sample_counts = np.array([len(chunk_bytes) // 2 for chunk_bytes in chunks])
+    chunk_offsets = np.concatenate(([0], np.cumsum(sample_counts[:-1])))
+    rms = np.sqrt(np.add.reduceat(np.square(samples), chunk_offsets) / sample_counts)
+    # Normalize by max possible value for 16-bit audio (32768)
+    return rms / 32768
+
+
 class PerParticipantNonStreamingAudioInputManager:
     def __init__(self, *, save_utterance_callback, get_participant_callback, sample_rate, utterance_size_limit, silence_duration_limit):
         self.queue = queue.Queue()
@@ -36,9 +47,14 @@ class PerParticipantNonStreamingAudioInputManager:
         self.queue.put((speaker_id, chunk_time, chunk_bytes))
 
     def process_chunks(self):
+        chunks = []
         while not self.queue.empty():
-            speaker_id, chunk_time, chunk_bytes = self.queue.get()
-            self.process_chunk(speaker_id, chunk_time, chunk_bytes)
+            chunks.append(self.queue.get())
+
+        # Silence detection is done for all the chunks of this tick at once, before they go through the per speaker state
+        chunks_are_silent = self.silence_detected_in_chunks([chunk_bytes for _, _, chunk_bytes in chunks])
+        for (speaker_id, chunk_time, chunk_bytes), audio_is_silent in zip(chunks, chunks_are_silent):
+            self.process_chunk(speaker_id, chunk_time, chunk_bytes, audio_is_silent=audio_is_silent)
 
         for speaker_id in list(self.first_nonsilent_audio_time.keys()):
             self.process_chunk(speaker_id, datetime.utcnow(), None)
@@ -57,8 +73,23 @@ class PerParticipantNonStreamingAudioInputManager:
             return True
         return not self.vad.is_speech(chunk_bytes, self.sample_rate)
 
-    def process_chunk(self, speaker_id, chunk_time, chunk_bytes):
-        audio_is_silent = self.silence_detected(chunk_bytes) if chunk_bytes else True
+    def silence_detected_in_chunks(self, chunks):
+        # Same as calling silence_detected on every chunk, but the energy gate is computed for all the chunks together
+        # and VAD only runs on the chunks that pass it. Empty chunks are silent.
+        chunks_are_silent = [True] * len(chunks)
+        nonempty_chunk_indices = [i for i, chunk_bytes in enumerate(chunks) if chunk_bytes]
+        if not nonempty_chunk_indices:
+            return chunks_are_silent
+
+        rms_per_chunk = calculate_normalized_rms_per_chunk([chunks[i] for i in nonempty_chunk_indices])
+        for i, rms in zip(nonempty_chunk_indices, rms_per_chunk):
+            if rms >= 0.01:
+                chunks_are_silent[i] = not self.vad.is_speech(chunks[i], self.sample_rate)
+        return chunks_are_silent
+
+    def process_chunk(self, speaker_id, chunk_time, chunk_bytes, audio_is_silent=None):
+        if audio_is_silent is None:
+            audio_is_silent = self.silence_detected(chunk_bytes) if chunk_bytes else True
 
         # Initialize buffer and timing for new speaker
         if speaker_id not in self.utterances or len(self.utterances[speaker_id]) == 0:
@@ -70,7 +70,7 @@ class PerParticipantStreamingAudioInputManager:
         from django.conf import settings
         return getattr(settings, "ASSEMBLYAI_API_KEY", None)
 
-    def create_streaming_transcriber(self, speaker_id, metadata):
+    def create_streaming_transcriber(self, speaker_id, metadata, on_final_transcript_callback=None):
         logger.info(f"Creating streaming transcriber for speaker {speaker_id}")
         
         metadata_list = [f"{key}:{value}" for key, value in metadata.items()] if metadata else None
@@ -86,6 +86,7 @@ class PerParticipantStreamingAudioInputManager:
                     sample_rate=self.sample_rate,
                     metadata=metadata_list,
                     redaction_settings=self.bot.deepgram_redaction_settings(),
+                    on_final_transcript_callback=on_final_transcript_callback,
                 )
             else:
                 logger.warning("Deepgram not available, falling back to factory")
@@ -98,6 +99,7 @@ class PerParticipantStreamingAudioInputManager:
                     sample_rate=self.sample_rate,
                     metadata=metadata_list,
                     redaction_settings=self.bot.deepgram_redaction_settings(),
+                    on_final_transcript_callback=on_final_transcript_callback,
                 )
         
         elif self.transcription_provider == TranscriptionProviders.ASSEMBLY_AI:
@@ -110,6 +112,7 @@ class PerParticipantStreamingAudioInputManager:
                 sample_rate=self.sample_rate,
                 metadata=metadata_list,
                 redaction_settings=self.bot.deepgram_redaction_settings(),
+                on_final_transcript_callback=on_final_transcript_callback,
             )
         
         else:
@@ -126,14 +129,41 @@ class PerParticipantStreamingAudioInputManager:
                 sample_rate=self.sample_rate,
                 metadata=metadata_list,
                 redaction_settings=self.bot.deepgram_redaction_settings(),
+                on_final_transcript_callback=on_final_transcript_callback,
             )
 
-    def find_or_create_streaming_transcriber_for_speaker(self, speaker_id):
+    def find_or_create_streaming_transcriber_for_speaker(self, speaker_id, chunk_time):
         if speaker_id not in self.streaming_transcribers:
             metadata = {"bot_id": self.bot.object_id, **(self.bot.metadata or {}), **self.get_participant_callback(speaker_id)}
-            self.streaming_transcribers[speaker_id] = self.create_streaming_transcriber(speaker_id, metadata)
+            # The offsets in the transcriber's results are relative to the first chunk we send it
+            stream_start_time_ms = int(chunk_time.timestamp() * 1000)
+            self.streaming_transcribers[speaker_id] = self.create_streaming_transcriber(
+                speaker_id,
+                metadata,
+                on_final_transcript_callback=lambda result: self.on_final_transcript(speaker_id, stream_start_time_ms, result),
+            )
         return self.streaming_transcribers[speaker_id]
 
+    # Called from the transcriber's thread whenever it produces a final result
+    def on_final_transcript(self, speaker_id, stream_start_time_ms, result):
+        if not result.get("transcript"):
+            return
+
+        participant = self.get_participant_callback(speaker_id)
+        if not participant:
+            logger.warning(f"Participant {speaker_id} not found")
+            return
+
+        self.save_utterance_callback(
+            {
+                **participant,
+                "transcription": {"transcript": result["transcript"], "words": result.get("words", [])},
+                "timestamp_ms": stream_start_time_ms + result["start_ms"],
+                "duration_ms": result["duration_ms"],
+                "sample_rate": self.sample_rate,
+            }
+        )
+
     def add_chunk(self, speaker_id, chunk_time, chunk_bytes):
         # Check if we have necessary API keys based on provider
         if self.transcription_provider == TranscriptionProviders.DEEPGRAM and not self.deepgram_api_key:
@@ -149,7 +179,7 @@ class PerParticipantStreamingAudioInputManager:
         if audio_is_silent and speaker_id not in self.streaming_transcribers:
             return
 
-        streaming_transcriber = self.find_or_create_streaming_transcriber_for_speaker(speaker_id)
+        streaming_transcriber = self.find_or_create_streaming_transcriber_for_speaker(speaker_id, chunk_time)
         streaming_transcriber.send(chunk_bytes)
 
     def monitor_transcription(self):
@@ -165,7 +195,14 @@ class PerParticipantStreamingAudioInputManager:
 
         # If Number of streaming transcibers is greater than 4, then stop the oldest one
         if len(self.streaming_transcribers) > 4:
-            oldest_transcriber = min(self.streaming_transcribers.values(), key=lambda x: x.last_send_time)
-            oldest_transcriber.finish()
-            del self.streaming_transcribers[oldest_transcriber.speaker_id]
-            logger.info(f"Stopped oldest streaming transcriber for speaker {oldest_transcriber.speaker_id}")
+            oldest_speaker_id = min(self.streaming_transcribers, key=lambda speaker_id: self.streaming_transcribers[speaker_id].last_send_time)
+            self.streaming_transcribers[oldest_speaker_id].finish()
+            del self.streaming_transcribers[oldest_speaker_id]
+            logger.info(f"Stopped oldest streaming transcriber for speaker {oldest_speaker_id}")
+
+    # When the meeting ends, finish every transcriber so that they emit their last final results
+    def flush_utterances(self):
+        for speaker_id, streaming_transcriber in self.streaming_transcribers.items():
+            logger.info(f"Finishing streaming transcriber for speaker {speaker_id}")
+            streaming_transcriber.finish()
+        self.streaming_transcribers = {}
@@ -57,7 +57,7 @@ class RTMPClient:
         Write FLV data to the RTMP stream.
 
         Args:
-            flv_data (bytes): FLV formatted data containing audio and video
+            flv_data (bytes-like): FLV formatted data containing audio and video. It's written before this returns, so it can be a view that is released afterwards
 
         Returns:
             bool: True if data was written, False if failed
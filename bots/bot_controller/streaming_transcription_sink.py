@@ -0,0 +1,28 @@
+import logging
+import queue
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingTranscriptionSink:
+    """Buffers final results from the streaming transcribers so they can be written to the database in batches.
+
+    The transcribers deliver results on their own threads, so add_transcription only enqueues. flush is called from the
+    GLib main loop and hands everything that has accumulated to save_utterances_callback in a single call.
+    """
+
+    def __init__(self, *, save_utterances_callback, max_batch_size=100):
+        self.queue = queue.Queue()
+        self.save_utterances_callback = save_utterances_callback
+        self.max_batch_size = max_batch_size
+
+    def add_transcription(self, message):
+        self.queue.put(message)
+
+    def flush(self):
+        while not self.queue.empty():
+            batch = []
+            while not self.queue.empty() and len(batch) < self.max_batch_size:
+                batch.append(self.queue.get())
+            logger.info(f"Saving batch of {len(batch)} streaming transcription utterances")
+            self.save_utterances_callback(batch)
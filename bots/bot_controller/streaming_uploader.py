@@ -1,7 +1,7 @@
 import logging
 import os
 import threading
-from io import BytesIO
+import time
 from queue import Queue
 
 import boto3
@@ -10,21 +10,46 @@ logger = logging.getLogger(__name__)
 
 
 class StreamingUploader:
-    def __init__(self, bucket, key, chunk_size=5242880):  # 5MB chunks
+    MAX_PART_UPLOAD_ATTEMPTS = 3
+
+    def __init__(self, bucket, key, chunk_size=5242880, spool_path=None):  # 5MB chunks, the minimum part size for S3
         self.s3_client = boto3.client("s3", endpoint_url=os.getenv("AWS_ENDPOINT_URL"))
         self.bucket = bucket
         self.key = key
         self.chunk_size = chunk_size
-        self.buffer = BytesIO()
+        self.buffer = bytearray()
         self.upload_id = None
         self.parts = []
         self.part_number = 1
+        self.failed_part_numbers = []
+        self.bytes_received = 0
+
+        # Everything received is also written to a local file, so parts that failed can be read back and the
+        # recording can still be uploaded as a whole file if a part can't be uploaded at all
+        self.spool_path = spool_path
+        self.spool_file = open(spool_path, "wb") if spool_path else None
 
         # Add upload queue and worker thread
         self.upload_queue = Queue()
         self.upload_thread = threading.Thread(target=self._upload_worker, daemon=True)
         self.upload_thread.start()
 
+    def _upload_chunk(self, chunk, part_num):
+        for attempt in range(1, self.MAX_PART_UPLOAD_ATTEMPTS + 1):
+            try:
+                return self.s3_client.upload_part(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    PartNumber=part_num,
+                    UploadId=self.upload_id,
+                    Body=chunk,
+                )
+            except Exception as e:
+                if attempt == self.MAX_PART_UPLOAD_ATTEMPTS:
+                    raise
+                logger.warning(f"Error uploading part {part_num} of {self.key} (attempt {attempt}/{self.MAX_PART_UPLOAD_ATTEMPTS}): {e}")
+                time.sleep(2**attempt)
+
     def _upload_worker(self):
         """Background thread to handle uploads"""
         while True:
@@ -33,56 +58,95 @@ class StreamingUploader:
                 if chunk is None:  # Sentinel value to stop the thread
                     break
 
-                response = self.s3_client.upload_part(
-                    Bucket=self.bucket,
-                    Key=self.key,
-                    PartNumber=part_num,
-                    UploadId=self.upload_id,
-                    Body=chunk,
-                )
+                response = self._upload_chunk(chunk, part_num)
 
                 self.parts.append({"PartNumber": part_num, "ETag": response["ETag"]})
             except Exception as e:
-                logging.error(f"Upload error: {e}")
+                logger.error(f"Upload error for part {part_num} of {self.key}: {e}")
+                self.failed_part_numbers.append(part_num)
             finally:
                 self.upload_queue.task_done()
 
     def upload_part(self, data):
-        self.buffer.write(data)
+        # data can be a view of a buffer that is only valid during this call (see GstreamerPipeline), so it's copied into our buffer right away
+        self.buffer += data
+        self.bytes_received += len(data)
+        if self.spool_file:
+            self.spool_file.write(data)
 
         # Upload complete chunks
-        while self.buffer.tell() >= self.chunk_size:
-            self.buffer.seek(0)
-            chunk = self.buffer.read(self.chunk_size)
+        while len(self.buffer) >= self.chunk_size:
+            chunk = bytes(self.buffer[: self.chunk_size])
+            # Deleting from the front of a bytearray doesn't copy the remaining data
+            del self.buffer[: self.chunk_size]
 
             # Queue the chunk for upload instead of uploading directly
             self.upload_queue.put((chunk, self.part_number))
             self.part_number += 1
 
-            # Keep remaining data
-            remaining = self.buffer.read()
-            self.buffer = BytesIO()
-            self.buffer.write(remaining)
+    def _stop_upload_worker(self):
+        self.upload_queue.join()
+        self.upload_queue.put((None, None))  # Stop the worker thread
+        self.upload_thread.join()
+
+    def _retry_failed_parts_from_spool_file(self):
+        # Parts are cut at fixed offsets, so each failed part can be read back from the spool file
+        with open(self.spool_path, "rb") as spool_file:
+            for part_num in sorted(self.failed_part_numbers):
+                spool_file.seek((part_num - 1) * self.chunk_size)
+                chunk = spool_file.read(self.chunk_size)
+                try:
+                    response = self._upload_chunk(chunk, part_num)
+                except Exception as e:
+                    logger.error(f"Upload error for part {part_num} of {self.key} on its last retry: {e}")
+                    continue
+                self.parts.append({"PartNumber": part_num, "ETag": response["ETag"]})
+                self.failed_part_numbers.remove(part_num)
+
+    def _delete_spool_file(self):
+        if self.spool_path and os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
 
     def complete_upload(self):
-        # If we never started a multipart upload (len(self.parts) == 0), do a regular upload
-        if len(self.parts) == 0:
-            self.buffer.seek(0)
-            data = self.buffer.getvalue()
+        if self.spool_file:
+            self.spool_file.close()
+
+        # If we never queued a part, the data is smaller than a single part, so do a regular upload
+        if self.part_number == 1:
+            self._stop_upload_worker()
+            data = bytes(self.buffer)
             self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=data)
-            logger.info("len(self.parts) == 0, so did a regular upload")
+            if self.upload_id:
+                self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            logger.info("No parts were uploaded, so did a regular upload")
+            self._delete_spool_file()
             return
 
         # Upload final part if any data remains
-        if self.buffer.tell() > 0:
-            self.buffer.seek(0)
-            final_chunk = self.buffer.getvalue()
+        if self.buffer:
+            final_chunk = bytes(self.buffer)
             self.upload_queue.put((final_chunk, self.part_number))
+            self.buffer = bytearray()
 
         # Wait for all uploads to complete
-        self.upload_queue.join()
-        self.upload_queue.put((None, None))  # Stop the worker thread
-        self.upload_thread.join()
+        self._stop_upload_worker()
+
+        if self.failed_part_numbers and self.spool_path:
+            self._retry_failed_parts_from_spool_file()
+
+        # Completing with parts missing would silently produce a corrupt file
+        if self.failed_part_numbers:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            if not self.spool_path:
+                raise Exception(f"Failed to upload parts {sorted(self.failed_part_numbers)} of {self.key}, aborted the multipart upload")
+
+            # Upload the whole recording from the spool file instead, the way it's done when it isn't streamed.
+            # If this fails too, the spool file is left behind.
+            logger.warning(f"Failed to upload parts {sorted(self.failed_part_numbers)} of {self.key}, aborted the multipart upload and uploading {self.spool_path} instead")
+            self.s3_client.upload_file(self.spool_path, self.bucket, self.key)
+            logger.info(f"Uploaded {self.key} from {self.spool_path} ({self.bytes_received} bytes)")
+            self._delete_spool_file()
+            return
 
         # Complete multipart upload
         self.s3_client.complete_multipart_upload(
@@ -91,6 +155,8 @@ class StreamingUploader:
             UploadId=self.upload_id,
             MultipartUpload={"Parts": sorted(self.parts, key=lambda x: x["PartNumber"])},
         )
+        logger.info(f"Completed multipart upload of {self.key} with {len(self.parts)} parts ({self.bytes_received} bytes)")
+        self._delete_spool_file()
 
     def start_upload(self):
         """Initialize the multipart upload and get the upload ID"""
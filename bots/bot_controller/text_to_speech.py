@@ -1,8 +1,112 @@
+import hashlib
 import json
+import logging
+import threading
+from collections import OrderedDict
 
+from django.conf import settings as django_settings
+from django.db import IntegrityError, transaction
 from google.cloud import texttospeech
 
-from bots.models import Credentials
+from bots.models import Credentials, MediaBlob
+
+logger = logging.getLogger(__name__)
+
+# Content type of the MediaBlobs that cache synthesized speech: raw 16-bit mono PCM, at the sample rate it was synthesized at
+TEXT_TO_SPEECH_CONTENT_TYPE = "audio/L16;rate={sample_rate}"
+
+
+class GoogleTextToSpeechProvider:
+    """Synthesizes speech with Google Cloud Text-to-Speech. A client is created once per set of credentials and reused for the life of the process."""
+
+    def __init__(self):
+        # (credentials id, credentials updated_at) -> TextToSpeechClient
+        self.clients = {}
+        self.clients_lock = threading.Lock()
+
+    def get_client(self, google_tts_credentials):
+        client_key = (google_tts_credentials.id, google_tts_credentials.updated_at)
+        with self.clients_lock:
+            client = self.clients.get(client_key)
+            if client:
+                return client
+
+            try:
+                # Create client with credentials
+                client = texttospeech.TextToSpeechClient.from_service_account_info(json.loads(google_tts_credentials.get_credentials().get("service_account_json", {})))
+            except (ValueError, json.JSONDecodeError) as e:
+                raise ValueError("Invalid Google Text-to-Speech credentials format: " + str(e)) from e
+            except Exception as e:
+                raise ValueError("Failed to initialize Google Text-to-Speech client: " + str(e)) from e
+
+            # Clients for outdated versions of the credentials aren't used anymore
+            self.clients = {key: value for key, value in self.clients.items() if key[0] != google_tts_credentials.id}
+            self.clients[client_key] = client
+            return client
+
+    def synthesize(self, bot, text, settings, sample_rate):
+        google_tts_credentials = bot.project.credentials.filter(credential_type=Credentials.CredentialTypes.GOOGLE_TTS).first()
+
+        if not google_tts_credentials:
+            raise ValueError("Could not find Google Text-to-Speech credentials.")
+
+        client = self.get_client(google_tts_credentials)
+
+        # Set up text input
+        synthesis_input = texttospeech.SynthesisInput(text=text)
+
+        # Get Google settings
+        google_settings = settings.get("google", {})
+        language_code = google_settings.get("voice_language_code")
+        voice_name = google_settings.get("voice_name")
+
+        # Build voice parameters
+        voice = texttospeech.VoiceSelectionParams(language_code=language_code, name=voice_name)
+
+        # Configure audio output as PCM (LINEAR16)
+        audio_config = texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding.LINEAR16,
+            sample_rate_hertz=sample_rate,
+        )
+
+        # Perform the text-to-speech request
+        response = client.synthesize_speech(input=synthesis_input, voice=voice, audio_config=audio_config)
+
+        # Skip the WAV header (first 44 bytes) to get raw PCM data
+        return response.audio_content[44:]
+
+
+class FakeTextToSpeechProvider:
+    """Offline stand-in for a text-to-speech provider. Produces 50ms of silence per character of text, and records every request it gets."""
+
+    def __init__(self):
+        self.requests = []
+
+    def synthesize(self, bot, text, settings, sample_rate):
+        self.requests.append({"text": text, "settings": settings, "sample_rate": sample_rate})
+        return b"\x00\x00" * (sample_rate * len(text) // 20)
+
+
+TEXT_TO_SPEECH_PROVIDER_CLASSES = {
+    "google": GoogleTextToSpeechProvider,
+    "fake": FakeTextToSpeechProvider,
+}
+
+# Provider name -> provider instance, so provider state like clients lives as long as the process
+_text_to_speech_providers = {}
+_text_to_speech_providers_lock = threading.Lock()
+
+
+def get_text_to_speech_provider():
+    """Returns the process-wide instance of the provider configured with TEXT_TO_SPEECH_PROVIDER."""
+    provider_name = django_settings.TEXT_TO_SPEECH_PROVIDER
+    with _text_to_speech_providers_lock:
+        provider = _text_to_speech_providers.get(provider_name)
+        if provider is None:
+            if provider_name not in TEXT_TO_SPEECH_PROVIDER_CLASSES:
+                raise ValueError(f"Unknown text-to-speech provider: {provider_name}")
+            provider = _text_to_speech_providers[provider_name] = TEXT_TO_SPEECH_PROVIDER_CLASSES[provider_name]()
+        return provider
 
 
 def generate_audio_from_text(bot, text, settings, sample_rate):
@@ -22,43 +126,7 @@ def generate_audio_from_text(bot, text, settings, sample_rate):
             - Audio data in LINEAR16 format
             - Duration in milliseconds
     """
-
-    # Additional providers will be added, for now we only support Google TTS
-    google_tts_credentials = bot.project.credentials.filter(credential_type=Credentials.CredentialTypes.GOOGLE_TTS).first()
-
-    if not google_tts_credentials:
-        raise ValueError("Could not find Google Text-to-Speech credentials.")
-
-    try:
-        # Create client with credentials
-        client = texttospeech.TextToSpeechClient.from_service_account_info(json.loads(google_tts_credentials.get_credentials().get("service_account_json", {})))
-    except (ValueError, json.JSONDecodeError) as e:
-        raise ValueError("Invalid Google Text-to-Speech credentials format: " + str(e)) from e
-    except Exception as e:
-        raise ValueError("Failed to initialize Google Text-to-Speech client: " + str(e)) from e
-
-    # Set up text input
-    synthesis_input = texttospeech.SynthesisInput(text=text)
-
-    # Get Google settings
-    google_settings = settings.get("google", {})
-    language_code = google_settings.get("voice_language_code")
-    voice_name = google_settings.get("voice_name")
-
-    # Build voice parameters
-    voice = texttospeech.VoiceSelectionParams(language_code=language_code, name=voice_name)
-
-    # Configure audio output as PCM (LINEAR16)
-    audio_config = texttospeech.AudioConfig(
-        audio_encoding=texttospeech.AudioEncoding.LINEAR16,
-        sample_rate_hertz=sample_rate,  # Using 8kHz sample rate
-    )
-
-    # Perform the text-to-speech request
-    response = client.synthesize_speech(input=synthesis_input, voice=voice, audio_config=audio_config)
-
-    # Skip the WAV header (first 44 bytes) to get raw PCM data
-    audio_content = response.audio_content[44:]
+    audio_content = get_text_to_speech_provider().synthesize(bot, text, settings, sample_rate)
 
     # Calculate duration in milliseconds
     # For LINEAR16: 2 bytes per sample, sample_rate samples per second
@@ -67,3 +135,52 @@ def generate_audio_from_text(bot, text, settings, sample_rate):
 
     # Return both audio content and duration
     return audio_content, duration_ms
+
+
+# (project id, text-to-speech checksum) -> MediaBlob with the synthesized speech, least recently used first
+_text_to_speech_media_blobs = OrderedDict()
+_text_to_speech_media_blobs_lock = threading.Lock()
+
+
+def text_to_speech_checksum(text, settings, sample_rate):
+    """The checksum the MediaBlob with the speech for these inputs is stored under. It addresses the speech by what it was synthesized from, not by its bytes."""
+    synthesis_inputs = {"provider": django_settings.TEXT_TO_SPEECH_PROVIDER, "text": text, "settings": settings, "sample_rate": sample_rate}
+    return hashlib.sha256(json.dumps(synthesis_inputs, sort_keys=True).encode()).hexdigest()
+
+
+def get_text_to_speech_media_blob(bot, text, settings, sample_rate):
+    """
+    Returns a MediaBlob with the speech for the text, settings and sample rate, only synthesizing it if no bot in the
+    project has before. Recently used MediaBlobs are kept in memory, the rest are looked up in the database.
+    """
+    checksum = text_to_speech_checksum(text, settings, sample_rate)
+    cache_key = (bot.project_id, checksum)
+
+    with _text_to_speech_media_blobs_lock:
+        media_blob = _text_to_speech_media_blobs.get(cache_key)
+        if media_blob:
+            _text_to_speech_media_blobs.move_to_end(cache_key)
+            return media_blob
+
+    # The audio is only needed if it isn't in the decoded PCM cache yet, so it's loaded lazily
+    media_blob = MediaBlob.objects.filter(project_id=bot.project_id, checksum=checksum).defer("blob").first()
+    if media_blob is None:
+        audio_content, duration_ms = generate_audio_from_text(bot=bot, text=text, settings=settings, sample_rate=sample_rate)
+        media_blob = MediaBlob(project_id=bot.project_id, blob=audio_content, content_type=TEXT_TO_SPEECH_CONTENT_TYPE.format(sample_rate=sample_rate), checksum=checksum, duration_ms=duration_ms)
+        try:
+            with transaction.atomic():
+                media_blob.save()
+        except IntegrityError:
+            # Another bot synthesized the same speech at the same time
+            media_blob = MediaBlob.objects.filter(project_id=bot.project_id, checksum=checksum).defer("blob").first()
+        except ValueError as e:
+            # Too large to store, play it without caching it
+            logger.warning(f"Not caching synthesized speech for bot {bot.object_id}: {e}")
+            return media_blob
+
+    with _text_to_speech_media_blobs_lock:
+        _text_to_speech_media_blobs[cache_key] = media_blob
+        _text_to_speech_media_blobs.move_to_end(cache_key)
+        while len(_text_to_speech_media_blobs) > django_settings.TEXT_TO_SPEECH_CACHE_MAX_SIZE:
+            _text_to_speech_media_blobs.popitem(last=False)
+    return media_blob
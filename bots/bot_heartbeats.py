@@ -0,0 +1,65 @@
+import logging
+
+from .bots_api_utils import get_redis_client
+from .models import Bot, BotEventManager
+
+logger = logging.getLogger(__name__)
+
+# Redis hash of bot id to the timestamp of the bot's last heartbeat. Flushed to Bot.last_heartbeat_timestamp periodically.
+BOT_HEARTBEATS_KEY = "bot_heartbeats"
+
+
+def record_bot_heartbeat(redis_client, bot_id, timestamp):
+    redis_client.hset(BOT_HEARTBEATS_KEY, bot_id, timestamp)
+
+
+def clear_bot_heartbeat(redis_client, bot_id):
+    redis_client.hdel(BOT_HEARTBEATS_KEY, bot_id)
+
+
+def get_bot_heartbeats(redis_client, bot_ids):
+    """Returns a dict of bot id to the bot's last heartbeat in Redis, for the bots that have one."""
+    bot_ids = list(bot_ids)
+    if not bot_ids:
+        return {}
+    timestamps = redis_client.hmget(BOT_HEARTBEATS_KEY, bot_ids)
+    return {bot_id: int(timestamp) for bot_id, timestamp in zip(bot_ids, timestamps) if timestamp is not None}
+
+
+def apply_unflushed_bot_heartbeat(bot):
+    """Sets the bot's last heartbeat to the one in Redis, if that is newer. Does not save the bot."""
+    try:
+        redis_timestamp = get_bot_heartbeats(get_redis_client(), [bot.id]).get(bot.id)
+    except Exception as e:
+        logger.warning(f"Failed to get heartbeat from Redis for bot {bot.object_id}: {e}")
+        return
+
+    if redis_timestamp is not None and (bot.last_heartbeat_timestamp is None or redis_timestamp > bot.last_heartbeat_timestamp):
+        bot.last_heartbeat_timestamp = redis_timestamp
+
+
+def flush_bot_heartbeats(redis_client):
+    """Writes the heartbeats in Redis to the database. Returns the number of bots that were updated."""
+    heartbeats = {int(bot_id): int(timestamp) for bot_id, timestamp in redis_client.hgetall(BOT_HEARTBEATS_KEY).items()}
+    if not heartbeats:
+        return 0
+
+    bots_to_update = []
+    finished_bot_ids = set(heartbeats.keys())
+    for bot in Bot.objects.filter(id__in=heartbeats.keys()).only("id", "state", "last_heartbeat_timestamp"):
+        # The last heartbeat of a bot that has left the meeting was applied when it left, since it's used to charge credits
+        if BotEventManager.is_post_meeting_state(bot.state):
+            continue
+        finished_bot_ids.discard(bot.id)
+        if bot.last_heartbeat_timestamp is None or heartbeats[bot.id] > bot.last_heartbeat_timestamp:
+            bot.last_heartbeat_timestamp = heartbeats[bot.id]
+            bots_to_update.append(bot)
+
+    # bulk_update doesn't bump the version field, so flushing doesn't make the bot's own saves fail with RecordModifiedError
+    Bot.objects.bulk_update(bots_to_update, ["last_heartbeat_timestamp"], batch_size=1000)
+
+    # Running bots stay in the hash, so a save from a stale copy of the bot that overwrote the flushed heartbeat gets fixed by the next flush
+    if finished_bot_ids:
+        redis_client.hdel(BOT_HEARTBEATS_KEY, *finished_bot_ids)
+
+    return len(bots_to_update)
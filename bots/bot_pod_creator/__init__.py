@@ -1,3 +1,4 @@
 from .bot_pod_creator import BotPodCreator
+from .warm_bot_pod_pool import bot_pod_name, claim_warm_bot_pod, warm_bot_pod_cpu_request, warm_bot_pod_pool_size
 
-__all__ = ["BotPodCreator"]
+__all__ = ["BotPodCreator", "bot_pod_name", "claim_warm_bot_pod", "warm_bot_pod_cpu_request", "warm_bot_pod_pool_size"]
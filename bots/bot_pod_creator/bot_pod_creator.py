@@ -2,18 +2,16 @@ import os
 import uuid
 from typing import Dict, Optional
 
-from kubernetes import client, config
+from kubernetes import client
+
+from .kubernetes_client import get_core_v1_api
+from .warm_bot_pod_pool import warm_bot_pod_cpu_request
 
 # fmt: off
 
 class BotPodCreator:
     def __init__(self, namespace: str = "attendee"):
-        try:
-            config.load_incluster_config()
-        except config.ConfigException:
-            config.load_kube_config()
-        
-        self.v1 = client.CoreV1Api()
+        self.v1 = get_core_v1_api()
         self.namespace = namespace
         
         # Get configuration from environment variables
@@ -48,8 +46,33 @@ class BotPodCreator:
             bot_cpu_request = os.getenv("BOT_CPU_REQUEST", "4")
 
         # Set the command based on bot_id
-        # Run entrypoint script first, then the bot command
         bot_cmd = f"python manage.py run_bot --botid {bot_id}"
+        return self._create_pod(pod_name=bot_name, bot_cmd=bot_cmd, bot_cpu_request=bot_cpu_request)
+
+    def create_warm_bot_pod(self, pod_name: str) -> Dict:
+        """
+        Create a bot pod that starts up and then waits in the warm bot pod pool
+        until a bot is assigned to it.
+
+        Args:
+            pod_name: Name for the pod, the pod registers itself in the pool under this name
+        """
+        bot_cmd = f"python manage.py run_bot --warm-pod-name {pod_name} --warm-pool-version {self.app_version}"
+        return self._create_pod(
+            pod_name=pod_name,
+            bot_cmd=bot_cmd,
+            bot_cpu_request=warm_bot_pod_cpu_request(),
+            extra_labels={"attendee-warm-bot-pod": "true"}
+        )
+
+    def _create_pod(
+        self,
+        pod_name: str,
+        bot_cmd: str,
+        bot_cpu_request,
+        extra_labels: Optional[Dict] = None,
+    ) -> Dict:
+        # Run entrypoint script first, then the bot command
         command = ["/bin/bash", "-c", f"/opt/bin/entrypoint.sh && {bot_cmd}"]
 
         # Metadata labels matching the deployment
@@ -58,7 +81,8 @@ class BotPodCreator:
             "app.kubernetes.io/instance": self.app_instance,
             "app.kubernetes.io/version": self.app_version,
             "app.kubernetes.io/managed-by": "cuber",
-            "app": "bot-proc"
+            "app": "bot-proc",
+            **(extra_labels or {})
         }
 
         annotations = {}
@@ -68,7 +92,7 @@ class BotPodCreator:
 
         pod = client.V1Pod(
             metadata=client.V1ObjectMeta(
-                name=bot_name,
+                name=pod_name,
                 namespace=self.namespace,
                 labels=labels,
                 annotations=annotations
@@ -151,7 +175,7 @@ class BotPodCreator:
             
         except client.ApiException as e:
             return {
-                "name": bot_name,
+                "name": pod_name,
                 "status": "Error",
                 "created": False,
                 "error": str(e)
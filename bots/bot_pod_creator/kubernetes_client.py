@@ -0,0 +1,84 @@
+import logging
+import os
+import threading
+
+from kubernetes import client, config, watch
+
+logger = logging.getLogger(__name__)
+
+BOT_POD_NAMESPACE = "attendee"
+BOT_POD_LABEL_SELECTOR = "app=bot-proc"
+
+_core_v1_api = None
+_core_v1_api_pid = None
+_core_v1_api_lock = threading.Lock()
+
+
+def get_core_v1_api():
+    """Returns a Kubernetes client shared by the whole process, so the config is loaded and the connection pool is created once."""
+    global _core_v1_api, _core_v1_api_pid
+
+    with _core_v1_api_lock:
+        # Connections can't be shared with the parent process after a fork (celery prefork workers)
+        if _core_v1_api is None or _core_v1_api_pid != os.getpid():
+            _core_v1_api = create_core_v1_api()
+            _core_v1_api_pid = os.getpid()
+        return _core_v1_api
+
+
+def create_core_v1_api():
+    try:
+        config.load_incluster_config()
+    except config.ConfigException:
+        config.load_kube_config()
+    return client.CoreV1Api()
+
+
+def is_completed_bot_pod(pod):
+    return pod.metadata.name.startswith("bot-pod-") and pod.status is not None and pod.status.phase == "Succeeded"
+
+
+def delete_pod_and_wait(v1, pod_name, namespace=BOT_POD_NAMESPACE, grace_period_seconds=60, timeout_seconds=100):
+    """
+    Deletes the pod and watches it until it is gone. Returns False if the pod still exists after the timeout. A pod that
+    doesn't exist counts as deleted.
+    """
+    try:
+        pod = v1.read_namespaced_pod(name=pod_name, namespace=namespace)
+    except client.ApiException as e:
+        if e.status == 404:
+            logger.info(f"Pod {pod_name} not found, no need to delete")
+            return True
+        raise
+
+    logger.info(f"Found existing pod {pod_name}, deleting it")
+    v1.delete_namespaced_pod(name=pod_name, namespace=namespace, grace_period_seconds=grace_period_seconds)
+
+    # Watching from the version we read means the DELETED event can't be missed, even if it happened before the watch started
+    pod_watch = watch.Watch()
+    try:
+        for event in pod_watch.stream(
+            v1.list_namespaced_pod,
+            namespace=namespace,
+            field_selector=f"metadata.name={pod_name}",
+            resource_version=pod.metadata.resource_version,
+            timeout_seconds=timeout_seconds,
+        ):
+            if event["type"] == "DELETED":
+                logger.info(f"Pod {pod_name} deleted successfully")
+                return True
+    except client.ApiException as e:
+        # The version we read is too old to watch from, so check directly whether the pod is gone
+        if e.status != 410:
+            raise
+        try:
+            v1.read_namespaced_pod(name=pod_name, namespace=namespace)
+        except client.ApiException as read_error:
+            if read_error.status == 404:
+                return True
+            raise
+    finally:
+        pod_watch.stop()
+
+    logger.error(f"Pod {pod_name} was not deleted after {timeout_seconds} seconds")
+    return False
@@ -0,0 +1,162 @@
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Sorted set of warm pods waiting for a bot, scored by the last time the pod said it was still waiting
+IDLE_WARM_BOT_PODS_KEY = "warm_bot_pods:{app_version}:idle"
+# Sorted set of warm pods that were created but haven't started waiting yet, scored by when they were created
+STARTING_WARM_BOT_PODS_KEY = "warm_bot_pods:{app_version}:starting"
+# List a warm pod blocks on, the id of the bot it should run is pushed onto it when the pod is claimed
+WARM_BOT_POD_BOT_ID_KEY = "warm_bot_pod:{pod_name}:bot_id"
+# List the warm pod pushes the bot id back onto once it has taken the bot, so the launcher knows the pod is still alive
+WARM_BOT_POD_CLAIMED_KEY = "warm_bot_pod:{pod_name}:claimed"
+# Name of the warm pod a bot was launched in, since it isn't Bot.k8s_pod_name()
+BOT_POD_NAME_KEY = "bot_pod_name:{bot_id}"
+
+IDLE_HEARTBEAT_SECONDS = 30
+# Pods that haven't started waiting after this long probably failed to start, so they no longer count towards the pool
+STARTING_TIMEOUT_SECONDS = 600
+BOT_POD_NAME_TTL_SECONDS = 2 * 24 * 60 * 60
+# A live warm pod is blocked waiting for a bot, so it takes the bot right away
+CLAIM_ACK_TIMEOUT_SECONDS = 5
+
+
+def warm_bot_pod_pool_size():
+    return int(os.getenv("WARM_BOT_POD_POOL_SIZE", "0") or "0")
+
+
+def warm_bot_pod_max_idle_seconds():
+    return int(os.getenv("WARM_BOT_POD_MAX_IDLE_SECONDS", "3600") or "3600")
+
+
+def warm_bot_pod_cpu_request():
+    # Warm pods are created before we know which bot they'll run, so they use the default CPU request
+    return os.getenv("BOT_CPU_REQUEST", "4") or "4"
+
+
+def claim_warm_bot_pod(redis_client, app_version, bot_id):
+    """
+    Assigns the bot to the most recently active idle warm pod and returns the pod's name once the pod has taken the bot.
+    Returns None if there is no idle warm pod, or if the claimed pod didn't take the bot, so the caller can create a new pod for it.
+    """
+    idle_key = IDLE_WARM_BOT_PODS_KEY.format(app_version=app_version)
+    while True:
+        popped = redis_client.zpopmax(idle_key)
+        if not popped:
+            return None
+
+        pod_name, last_heartbeat = popped[0]
+        pod_name = pod_name.decode()
+        if last_heartbeat < time.time() - 2 * IDLE_HEARTBEAT_SECONDS:
+            logger.info(f"Skipping warm bot pod {pod_name} because its last heartbeat was at {last_heartbeat}")
+            continue
+
+        bot_id_key = WARM_BOT_POD_BOT_ID_KEY.format(pod_name=pod_name)
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.rpush(bot_id_key, bot_id)
+        # If the pod died after its last heartbeat, don't leave the bot id behind
+        pipeline.expire(bot_id_key, 2 * IDLE_HEARTBEAT_SECONDS)
+        pipeline.set(BOT_POD_NAME_KEY.format(bot_id=bot_id), pod_name, ex=BOT_POD_NAME_TTL_SECONDS)
+        pipeline.execute()
+
+        if wait_for_claim_ack(redis_client, pod_name, bot_id):
+            return pod_name
+
+        # The pod died or was evicted after its last heartbeat
+        logger.warning(f"Warm bot pod {pod_name} didn't take bot {bot_id} within {CLAIM_ACK_TIMEOUT_SECONDS} seconds")
+        redis_client.delete(BOT_POD_NAME_KEY.format(bot_id=bot_id))
+        return None
+
+
+def wait_for_claim_ack(redis_client, pod_name, bot_id):
+    """Waits for the claimed warm pod to take the bot. Returns False if it didn't, in which case the bot id has been taken back from the pod."""
+    claimed_key = WARM_BOT_POD_CLAIMED_KEY.format(pod_name=pod_name)
+    if redis_client.blpop(claimed_key, timeout=CLAIM_ACK_TIMEOUT_SECONDS):
+        return True
+
+    # Take the bot id back, so the pod can't start the bot later on if it was only slow
+    if redis_client.lrem(WARM_BOT_POD_BOT_ID_KEY.format(pod_name=pod_name), 1, bot_id):
+        return False
+
+    # The pod took the bot just after the timeout
+    redis_client.delete(claimed_key)
+    return True
+
+
+def take_bot_id(redis_client, pod_name, popped):
+    """Called from the warm pod once it popped a bot id, tells the launcher that the pod is going to run the bot."""
+    bot_id = int(popped[1])
+    claimed_key = WARM_BOT_POD_CLAIMED_KEY.format(pod_name=pod_name)
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.rpush(claimed_key, bot_id)
+    # If the launcher stopped waiting, don't leave the ack behind
+    pipeline.expire(claimed_key, 2 * IDLE_HEARTBEAT_SECONDS)
+    pipeline.execute()
+    return bot_id
+
+
+def wait_for_bot_id(redis_client, app_version, pod_name):
+    """
+    Called from the warm pod. Adds the pod to the idle warm pods and blocks until a bot is assigned to it. Returns the
+    bot id, or None if no bot was assigned within the maximum idle time.
+    """
+    idle_key = IDLE_WARM_BOT_PODS_KEY.format(app_version=app_version)
+    bot_id_key = WARM_BOT_POD_BOT_ID_KEY.format(pod_name=pod_name)
+
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.zrem(STARTING_WARM_BOT_PODS_KEY.format(app_version=app_version), pod_name)
+    pipeline.zadd(idle_key, {pod_name: time.time()})
+    pipeline.execute()
+
+    idle_deadline = time.monotonic() + warm_bot_pod_max_idle_seconds()
+    while time.monotonic() < idle_deadline:
+        popped = redis_client.blpop(bot_id_key, timeout=IDLE_HEARTBEAT_SECONDS)
+        if popped:
+            return take_bot_id(redis_client, pod_name, popped)
+        # Only refresh the heartbeat if the pod is still idle, a launcher may have claimed it since the blpop timed out
+        redis_client.zadd(idle_key, {pod_name: time.time()}, xx=True)
+
+    if redis_client.zrem(idle_key, pod_name):
+        return None
+
+    # A launcher claimed the pod while it was leaving, so it has to run the bot
+    popped = redis_client.blpop(bot_id_key, timeout=CLAIM_ACK_TIMEOUT_SECONDS)
+    return take_bot_id(redis_client, pod_name, popped) if popped else None
+
+
+def add_starting_warm_bot_pod(redis_client, app_version, pod_name):
+    redis_client.zadd(STARTING_WARM_BOT_PODS_KEY.format(app_version=app_version), {pod_name: time.time()})
+
+
+def remove_starting_warm_bot_pod(redis_client, app_version, pod_name):
+    redis_client.zrem(STARTING_WARM_BOT_PODS_KEY.format(app_version=app_version), pod_name)
+
+
+def warm_bot_pods_to_create(redis_client, app_version, pool_size):
+    """Returns how many warm pods need to be created to bring the idle and starting pods up to the pool size."""
+    now = time.time()
+    idle_key = IDLE_WARM_BOT_PODS_KEY.format(app_version=app_version)
+    starting_key = STARTING_WARM_BOT_PODS_KEY.format(app_version=app_version)
+
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.zremrangebyscore(idle_key, "-inf", now - 2 * IDLE_HEARTBEAT_SECONDS)
+    pipeline.zremrangebyscore(starting_key, "-inf", now - STARTING_TIMEOUT_SECONDS)
+    pipeline.zcard(idle_key)
+    pipeline.zcard(starting_key)
+    _, _, idle_count, starting_count = pipeline.execute()
+
+    return max(0, pool_size - idle_count - starting_count)
+
+
+def bot_pod_name(redis_client, bot):
+    """Returns the name of the pod the bot runs in, which is a warm pod if one was claimed for the bot."""
+    warm_pod_name = redis_client.get(BOT_POD_NAME_KEY.format(bot_id=bot.id))
+    if warm_pod_name:
+        return warm_pod_name.decode()
+    return bot.k8s_pod_name()
+
+
+def forget_bot_pod_name(redis_client, bot_id):
+    redis_client.delete(BOT_POD_NAME_KEY.format(bot_id=bot_id))
@@ -1,10 +1,12 @@
 import json
 import logging
 import os
+import threading
 import uuid
 from enum import Enum
 
 import redis
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError, transaction
 from django.urls import reverse
@@ -28,6 +30,7 @@ from .models import (
     WebhookSubscription,
     WebhookTriggerTypes,
 )
+from .scheduled_bot_queue import add_scheduled_bots
 from .serializers import (
     CreateBotSerializer,
     PatchBotSerializer,
@@ -37,12 +40,54 @@ from .utils import meeting_type_from_url, transcription_provider_from_bot_creati
 logger = logging.getLogger(__name__)
 
 
+# One connection pool per process, so that sync commands reuse connections instead of opening a new one every time
+_redis_client = None
+_redis_client_pid = None
+_redis_client_lock = threading.Lock()
+
+
+def get_redis_client():
+    global _redis_client, _redis_client_pid
+
+    with _redis_client_lock:
+        # Connections can't be shared with the parent process after a fork (celery prefork and gunicorn workers)
+        if _redis_client is None or _redis_client_pid != os.getpid():
+            redis_url = os.getenv("REDIS_URL") + ("?ssl_cert_reqs=none" if os.getenv("DISABLE_REDIS_SSL") else "")
+            _redis_client = redis.Redis(connection_pool=redis.ConnectionPool.from_url(redis_url))
+            _redis_client_pid = os.getpid()
+        return _redis_client
+
+
 def send_sync_command(bot, command="sync"):
-    redis_url = os.getenv("REDIS_URL") + ("?ssl_cert_reqs=none" if os.getenv("DISABLE_REDIS_SSL") else "")
-    redis_client = redis.from_url(redis_url)
     channel = f"bot_{bot.id}"
     message = {"command": command}
-    redis_client.publish(channel, json.dumps(message))
+    get_redis_client().publish(channel, json.dumps(message))
+
+
+def send_sync_commands(bots, command="sync"):
+    """
+    Sends the same command to many bots at once, for example when all the bots in a project need to be told something.
+    The publishes are pipelined, so this takes a single round trip to Redis.
+    """
+    message = json.dumps({"command": command})
+    pipeline = get_redis_client().pipeline(transaction=False)
+    for bot in bots:
+        pipeline.publish(f"bot_{bot.id}", message)
+    pipeline.execute()
+
+
+def add_bot_to_scheduled_bot_queue(bot):
+    """
+    Adds a scheduled bot to the queue the event driven scheduler (run_scheduler --event-driven) sleeps on.
+    The scheduler also adds upcoming bots from the database periodically, so a failure here only delays the launch.
+    """
+    if not settings.SCHEDULED_BOT_QUEUE_ENABLED:
+        return
+
+    try:
+        add_scheduled_bots(get_redis_client(), [bot])
+    except Exception as e:
+        logger.warning(f"Failed to add bot {bot.object_id} to the scheduled bot queue: {e}")
 
 
 def create_bot_chat_message_request(bot, chat_message_data):
@@ -255,6 +300,9 @@ def create_bot(data: dict, source: BotCreationSource, project: Project) -> tuple
                 # Try to transition the state from READY to JOINING
                 BotEventManager.create_event(bot=bot, event_type=BotEventTypes.JOIN_REQUESTED, event_metadata={"source": source})
 
+            if bot.state == BotStates.SCHEDULED:
+                transaction.on_commit(lambda: add_bot_to_scheduled_bot_queue(bot))
+
             return bot, None
 
     except ValidationError as e:
@@ -298,6 +346,9 @@ def patch_bot(bot: Bot, data: dict) -> tuple[Bot | None, dict | None]:
         bot.meeting_url = validated_data.get("meeting_url", bot.meeting_url)
         bot.save()
 
+        if "join_at" in validated_data:
+            add_bot_to_scheduled_bot_queue(bot)
+
         return bot, None
 
     except ValidationError as e:
@@ -388,7 +439,7 @@ def validate_webhook_data(url, triggers, project, bot=None):
     return None
 
 
-def create_webhook_subscription(url, triggers, project, bot=None):
+def create_webhook_subscription(url, triggers, project, bot=None, batch_deliveries=False):
     """
     Creates a single webhook subscription for a project or bot.
 
@@ -397,6 +448,7 @@ def create_webhook_subscription(url, triggers, project, bot=None):
         triggers: List of trigger types (api codes as strings)
         project: The Project instance
         bot: Optional Bot instance for bot-level webhooks
+        batch_deliveries: Whether high volume triggers are delivered as arrays of events
 
     Returns:
         None
@@ -421,6 +473,7 @@ def create_webhook_subscription(url, triggers, project, bot=None):
         bot=bot,
         url=url,
         triggers=triggers_mapped_to_integers,
+        batch_deliveries=batch_deliveries,
     )
 
 
@@ -447,5 +500,6 @@ def create_webhook_subscriptions(webhook_data_list, project, bot=None):
     for webhook_data in webhook_data_list:
         url = webhook_data.get("url", "")
         triggers = webhook_data.get("triggers", [])
+        batch_deliveries = webhook_data.get("batch_deliveries", False)
 
-        create_webhook_subscription(url, triggers, project, bot)
+        create_webhook_subscription(url, triggers, project, bot, batch_deliveries=batch_deliveries)
@@ -1,8 +1,11 @@
+import json
 import logging
 import os
 import time
 
 from django.core.exceptions import ValidationError
+from django.db.models import F, Max, Q
+from django.http import HttpResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.utils.dateparse import parse_datetime
 from drf_spectacular.utils import (
@@ -13,6 +16,7 @@ from drf_spectacular.utils import (
 )
 from rest_framework import status
 from rest_framework.generics import GenericAPIView
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -210,7 +214,7 @@ class BotListCreateView(GenericAPIView):
                 bots_query = bots_query.filter(state__in=state_values)
 
         # Apply ordering for cursor pagination
-        bots = bots_query.order_by("created_at")
+        bots = BotSerializer.prefetch_related_for_serialization(bots_query.order_by("created_at"))
 
         # Let the pagination class handle the rest
         page = self.paginate_queryset(bots)
@@ -698,8 +702,66 @@ class RecordingView(APIView):
             return Response({"error": "Bot not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+class TranscriptContentNegotiation(DefaultContentNegotiation):
+    # The transcript's format query parameter chooses between its JSON and plain text shapes, which are both JSON.
+    # DRF would otherwise treat it as a renderer override and respond with a 404 for format=plain.
+    def filter_renderers(self, renderers, format):
+        return renderers
+
+
 class TranscriptView(APIView):
     authentication_classes = [ApiKeyAuthentication]
+    content_negotiation_class = TranscriptContentNegotiation
+
+    # Number of utterances fetched from the database and written to the response at a time
+    STREAMING_CHUNK_SIZE = 500
+
+    def utterance_chunks(self, utterances, first_chunk):
+        # Each chunk is fetched with its own query, continuing after the last (timestamp_ms, id) of the previous one.
+        # No cursor is held open between chunks, which also works behind a transaction-pooling proxy like PgBouncer.
+        chunk = first_chunk
+        while chunk:
+            yield chunk
+            if len(chunk) < self.STREAMING_CHUNK_SIZE:
+                return
+            last_timestamp_ms, last_id = chunk[-1][0], chunk[-1][-1]
+            chunk = list(utterances.filter(Q(timestamp_ms__gt=last_timestamp_ms) | Q(timestamp_ms=last_timestamp_ms, id__gt=last_id))[: self.STREAMING_CHUNK_SIZE])
+
+    def transcript_response_chunks(self, utterance_chunks, output_format):
+        # Builds the same JSON document the endpoint has always returned, but a chunk of segments at a time.
+        # last_timestamp_ms comes last in the document, so it can be computed while streaming.
+        last_timestamp_ms = 0
+        if output_format == "plain":
+            yield '{"text":"'
+            separator = ""
+            for chunk in utterance_chunks:
+                parts = []
+                for start_ms, end_ms, text, speaker_name, speaker_uuid, utterance_id in chunk:
+                    # Strip the quotes so the text can be joined inside a single JSON string
+                    parts.append(separator + json.dumps(text)[1:-1])
+                    separator = " "
+                    last_timestamp_ms = max(last_timestamp_ms, end_ms)
+                yield "".join(parts)
+            yield f'","last_timestamp_ms":{last_timestamp_ms}}}'
+        else:
+            yield '{"segments":['
+            separator = ""
+            for chunk in utterance_chunks:
+                parts = []
+                for start_ms, end_ms, text, speaker_name, speaker_uuid, utterance_id in chunk:
+                    segment = {
+                        "start_ms": start_ms,
+                        "end_ms": end_ms,
+                        "text": text,
+                        "is_final": True,
+                        "speaker_name": speaker_name,
+                        "speaker_uuid": speaker_uuid,
+                    }
+                    parts.append(separator + json.dumps(segment, separators=(",", ":")))
+                    separator = ","
+                    last_timestamp_ms = max(last_timestamp_ms, end_ms)
+                yield "".join(parts)
+            yield f'],"last_timestamp_ms":{last_timestamp_ms}}}'
 
     @extend_schema(
         operation_id="Get Bot Transcript",
@@ -768,8 +830,8 @@ class TranscriptView(APIView):
                     status=status.HTTP_404_NOT_FOUND,
                 )
 
-            # Get all utterances with transcriptions, sorted by timeline
-            utterances_query = Utterance.objects.select_related("participant").filter(recording=recording, transcription__isnull=False)
+            # Get the utterances with non-empty transcriptions. The end time is computed in the database so that it can be filtered on.
+            utterances_query = Utterance.objects.filter(recording=recording, transcription__isnull=False, transcription__has_key="transcript").exclude(transcription__transcript=None).exclude(transcription__transcript="").annotate(end_ms=F("timestamp_ms") + F("duration_ms"))
 
             # Apply updated_after filter if provided
             updated_after = request.query_params.get("updated_after")
@@ -786,95 +848,53 @@ class TranscriptView(APIView):
                     )
                 utterances_query = utterances_query.filter(updated_at__gt=updated_after_datetime)
 
-            # Apply ordering
-            utterances = utterances_query.order_by("timestamp_ms")
-
-            # Format the response, skipping empty transcriptions
-            transcript_data = [
-                {
-                    "speaker_name": utterance.participant.full_name,
-                    "speaker_uuid": utterance.participant.uuid,
-                    "speaker_user_uuid": utterance.participant.user_uuid,
-                    "timestamp_ms": utterance.timestamp_ms,
-                    "duration_ms": utterance.duration_ms,
-                    "transcription": utterance.transcription,
-                    "end_ms": utterance.timestamp_ms + utterance.duration_ms,  # Calculate end time
-                }
-                for utterance in utterances
-                if utterance.transcription.get("transcript", "")
-            ]
-            
             # Apply since_ms filter
             since_ms = request.query_params.get("since_ms")
             if since_ms:
                 try:
                     since_ms = int(since_ms)
-                    transcript_data = [
-                        item for item in transcript_data
-                        if item["end_ms"] > since_ms
-                    ]
                 except (ValueError, TypeError):
                     return Response(
                         {"error": "Invalid since_ms format. Must be an integer."},
                         status=status.HTTP_400_BAD_REQUEST,
                     )
-            
-            # Apply window_s filter
+                utterances_query = utterances_query.filter(end_ms__gt=since_ms)
+
+            # Apply window_s filter, relative to the latest end time of the segments that are left
             window_s = request.query_params.get("window_s")
             if window_s:
                 try:
                     window_s = int(window_s)
-                    if transcript_data:
-                        # Get the latest timestamp
-                        latest_ms = max(item["end_ms"] for item in transcript_data)
-                        cutoff_ms = latest_ms - (window_s * 1000)
-                        transcript_data = [
-                            item for item in transcript_data
-                            if item["end_ms"] > cutoff_ms
-                        ]
                 except (ValueError, TypeError):
                     return Response(
                         {"error": "Invalid window_s format. Must be an integer."},
                         status=status.HTTP_400_BAD_REQUEST,
                     )
-            
-            # Calculate last_timestamp_ms
-            last_timestamp_ms = max(item["end_ms"] for item in transcript_data) if transcript_data else 0
-            
+                latest_ms = utterances_query.aggregate(latest_ms=Max("end_ms"))["latest_ms"]
+                if latest_ms is not None:
+                    utterances_query = utterances_query.filter(end_ms__gt=latest_ms - (window_s * 1000))
+
+            # Apply ordering and only fetch the columns needed for the response. The id breaks ties between utterances that start at the same time.
+            utterances = utterances_query.order_by("timestamp_ms", "id").values_list(
+                "timestamp_ms",
+                "end_ms",
+                "transcription__transcript",
+                "participant__full_name",
+                "participant__uuid",
+                "id",
+            )
+
             # Check output format
             output_format = request.query_params.get("format", "json").lower()
-            
-            if output_format == "plain":
-                # Join all transcriptions into plain text
-                text_parts = []
-                for item in transcript_data:
-                    transcript_text = item["transcription"].get("transcript", "")
-                    if transcript_text:
-                        text_parts.append(transcript_text)
-                
-                return Response({
-                    "text": " ".join(text_parts),
-                    "last_timestamp_ms": last_timestamp_ms
-                })
-            else:
-                # Default JSON format with segments
-                # Convert to segments format
-                segments = [
-                    {
-                        "start_ms": item["timestamp_ms"],
-                        "end_ms": item["end_ms"],
-                        "text": item["transcription"].get("transcript", ""),
-                        "is_final": True,
-                        "speaker_name": item["speaker_name"],
-                        "speaker_uuid": item["speaker_uuid"],
-                    }
-                    for item in transcript_data
-                ]
-                
-                return Response({
-                    "segments": segments,
-                    "last_timestamp_ms": last_timestamp_ms
-                })
+
+            # The first chunk is fetched before responding, so a database error still gets an error response
+            first_chunk = list(utterances[: self.STREAMING_CHUNK_SIZE])
+            response_chunks = self.transcript_response_chunks(self.utterance_chunks(utterances, first_chunk), output_format)
+            if len(first_chunk) < self.STREAMING_CHUNK_SIZE:
+                return HttpResponse("".join(response_chunks), content_type="application/json")
+
+            # Stream the response so that long transcripts are never held in memory all at once
+            return StreamingHttpResponse(response_chunks, content_type="application/json")
 
         except Bot.DoesNotExist:
             return Response({"error": "Bot not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,93 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+
+# How often each calendar is synced
+CALENDAR_SYNC_INTERVAL = timedelta(minutes=30)
+# Calendars with scheduled bots joining within this long are synced before the others
+UPCOMING_BOTS_WINDOW = timedelta(hours=2)
+# A sync stops counting against the concurrency caps after this long, in case the worker running it died
+CALENDAR_SYNC_SLOT_LEASE = timedelta(minutes=15)
+
+# Redis sorted sets of the ids of the calendars being synced, scored by the unix time their slot expires at
+PLATFORM_CALENDAR_SYNC_SLOTS_KEY = "calendar_sync_slots:platform:{platform}"
+ORGANIZATION_CALENDAR_SYNC_SLOTS_KEY = "calendar_sync_slots:organization:{organization_id}"
+
+
+def calendar_sync_offset_seconds(calendar_id):
+    """Where in the sync interval the calendar is synced. Derived from a hash of the id, so it doesn't change when the scheduler restarts."""
+    digest = hashlib.sha256(str(calendar_id).encode()).digest()
+    return int.from_bytes(digest[:8], "big") % int(CALENDAR_SYNC_INTERVAL.total_seconds())
+
+
+def last_calendar_sync_slot(calendar_id, now):
+    """Returns the latest time, at or before now, that the calendar was due to be synced."""
+    seconds_since_slot = (now.timestamp() - calendar_sync_offset_seconds(calendar_id)) % CALENDAR_SYNC_INTERVAL.total_seconds()
+    return now - timedelta(seconds=seconds_since_slot)
+
+
+def is_calendar_sync_due(calendar_id, sync_task_enqueued_at, sync_task_requested_at, now):
+    if sync_task_requested_at is not None or sync_task_enqueued_at is None:
+        return True
+    return sync_task_enqueued_at < last_calendar_sync_slot(calendar_id, now)
+
+
+def prioritize_calendar_syncs(calendars, calendar_ids_with_upcoming_bots):
+    """Orders the calendars to sync: calendars with bots joining soon first, then calendars with a requested sync, then the longest waiting."""
+
+    def priority(calendar):
+        return (
+            calendar.id not in calendar_ids_with_upcoming_bots,
+            calendar.sync_task_requested_at is None,
+            calendar.sync_task_enqueued_at is not None,
+            calendar.sync_task_enqueued_at.timestamp() if calendar.sync_task_enqueued_at else 0,
+        )
+
+    return sorted(calendars, key=priority)
+
+
+def _calendar_sync_slot_keys_and_limits(platform, organization_id):
+    return [
+        (PLATFORM_CALENDAR_SYNC_SLOTS_KEY.format(platform=platform), settings.CALENDAR_SYNC_MAX_CONCURRENCY_PER_PLATFORM),
+        (ORGANIZATION_CALENDAR_SYNC_SLOTS_KEY.format(organization_id=organization_id), settings.CALENDAR_SYNC_MAX_CONCURRENCY_PER_ORGANIZATION),
+    ]
+
+
+def acquire_calendar_sync_slot(redis_client, calendar_id, platform, organization_id, now_timestamp):
+    """
+    Takes a slot in the platform's and the organization's semaphores for syncing the calendar. Returns False, without
+    taking either slot, if either of them is full.
+    """
+    keys_and_limits = _calendar_sync_slot_keys_and_limits(platform, organization_id)
+    expires_at = now_timestamp + CALENDAR_SYNC_SLOT_LEASE.total_seconds()
+
+    def acquire(pipe):
+        # Expired slots are still in the sets, so only count the ones that expire later
+        for key, limit in keys_and_limits:
+            if pipe.zcount(key, now_timestamp, "+inf") >= limit:
+                return False
+        pipe.multi()
+        for key, _ in keys_and_limits:
+            pipe.zremrangebyscore(key, "-inf", now_timestamp)
+            pipe.zadd(key, {str(calendar_id): expires_at})
+        return True
+
+    # Watching the sets means two schedulers can't both take the last slot
+    return redis_client.transaction(acquire, *[key for key, _ in keys_and_limits], value_from_callable=True)
+
+
+def extend_calendar_sync_slot(redis_client, calendar_id, platform, organization_id, now_timestamp):
+    """Renews the lease on the calendar's slots for a retry of the sync. Does nothing for slots that were already released or expired."""
+    expires_at = now_timestamp + CALENDAR_SYNC_SLOT_LEASE.total_seconds()
+    pipeline = redis_client.pipeline(transaction=False)
+    for key, _ in _calendar_sync_slot_keys_and_limits(platform, organization_id):
+        pipeline.zadd(key, {str(calendar_id): expires_at}, xx=True)
+    pipeline.execute()
+
+
+def release_calendar_sync_slot(redis_client, calendar_id, platform, organization_id):
+    pipeline = redis_client.pipeline(transaction=False)
+    for key, _ in _calendar_sync_slot_keys_and_limits(platform, organization_id):
+        pipeline.zrem(key, str(calendar_id))
+    pipeline.execute()
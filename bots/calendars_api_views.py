@@ -226,6 +226,11 @@ class CalendarDetailPatchDeleteView(APIView):
             if refresh_token is not None:
                 existing_credentials["refresh_token"] = refresh_token
 
+            # The cached access token and sync cursor may belong to the old credentials
+            existing_credentials.pop("access_token", None)
+            existing_credentials.pop("access_token_expires_at", None)
+            calendar.sync_cursor = None
+
             # Save updated credentials
             calendar.set_credentials(existing_credentials)
 
@@ -7,12 +7,41 @@ from bots.models import BotEventManager, BotEventSubTypes, BotEventTypes
 logger = logging.getLogger(__name__)
 
 
+def launch_bot_in_warm_pod(bot):
+    """Hands the bot to an idle pod from the warm bot pod pool. Returns False if the pool is disabled, doesn't fit the bot or has no idle pod."""
+    from .bot_pod_creator import claim_warm_bot_pod, warm_bot_pod_cpu_request, warm_bot_pod_pool_size
+    from .bots_api_utils import get_redis_client
+    from .tasks.replenish_warm_bot_pod_pool_task import replenish_warm_bot_pod_pool
+
+    if not warm_bot_pod_pool_size() or bot.cpu_request() != warm_bot_pod_cpu_request():
+        return False
+
+    try:
+        pod_name = claim_warm_bot_pod(get_redis_client(), os.getenv("CUBER_RELEASE_VERSION"), bot.id)
+    except Exception as e:
+        logger.warning(f"Failed to claim warm bot pod for bot {bot.object_id} ({bot.id}): {str(e)}")
+        return False
+
+    # Replace the claimed pod, or fill the pool if it was empty
+    replenish_warm_bot_pod_pool.delay()
+
+    if pod_name is None:
+        logger.info(f"No idle warm bot pod for bot {bot.object_id} ({bot.id}), creating a new pod")
+        return False
+
+    logger.info(f"Bot {bot.object_id} ({bot.id}) launched in warm bot pod {pod_name}")
+    return True
+
+
 def launch_bot(bot):
     # If this instance is running in Kubernetes, use the Kubernetes pod creator
-    # which spins up a new pod for the bot
+    # which spins up a new pod for the bot, unless there is an idle warm pod to run it
     if os.getenv("LAUNCH_BOT_METHOD") == "kubernetes":
         from .bot_pod_creator import BotPodCreator
 
+        if launch_bot_in_warm_pod(bot):
+            return
+
         bot_pod_creator = BotPodCreator()
         create_pod_result = bot_pod_creator.create_bot_pod(bot_id=bot.id, bot_name=bot.k8s_pod_name(), bot_cpu_request=bot.cpu_request())
         logger.info(f"Bot {bot.object_id} ({bot.id}) launched via Kubernetes: {create_pod_result}")
@@ -0,0 +1,85 @@
+import io
+import time
+
+import gi
+
+gi.require_version("Gst", "1.0")
+from django.core.management.base import BaseCommand
+from gi.repository import Gst
+
+from bots.bot_controller.gstreamer_pipeline import GstreamerPipeline
+
+
+class Command(BaseCommand):
+    help = "Measures how long GstreamerPipeline's appsink handler takes to hand the samples of a videotestsrc pipeline to its consumers, compared to copying them with extract_dup"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--width", type=int, default=1920, help="Width of the test video")
+        parser.add_argument("--height", type=int, default=1080, help="Height of the test video")
+        parser.add_argument("--frames", type=int, default=300, help="Number of frames to run through the pipeline")
+        parser.add_argument("--consumers", type=int, default=2, help="Number of consumers each sample is written to, like the RTMP client and the streaming uploader")
+        parser.add_argument("--raw", action="store_true", help="Send the raw I420 frames to the appsink instead of encoding them, which makes each sample much larger")
+
+    def pipeline_string(self, options):
+        source = f"videotestsrc num-buffers={options['frames']} pattern=ball ! video/x-raw,format=I420,width={options['width']},height={options['height']},framerate=30/1 ! "
+        if options["raw"]:
+            return f"{source}appsink name=sink emit-signals=true sync=false drop=false"
+        return f"{source}x264enc tune=zerolatency speed-preset=ultrafast ! h264parse ! flvmux streamable=true ! appsink name=sink emit-signals=true sync=false drop=false"
+
+    def run_pipeline(self, options, on_new_sample):
+        pipeline = Gst.parse_launch(self.pipeline_string(options))
+        pipeline.get_by_name("sink").connect("new-sample", on_new_sample)
+        pipeline.set_state(Gst.State.PLAYING)
+        message = pipeline.get_bus().timed_pop_filtered(Gst.CLOCK_TIME_NONE, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        pipeline.set_state(Gst.State.NULL)
+        if message.type == Gst.MessageType.ERROR:
+            err, debug = message.parse_error()
+            raise Exception(f"Benchmark pipeline failed: {err} {debug}")
+
+    def handle(self, *args, **options):
+        consumers = [io.BytesIO() for _ in range(options["consumers"])]
+        bytes_received = 0
+
+        def write_to_consumers(data):
+            nonlocal bytes_received
+            bytes_received += len(data)
+            for consumer in consumers:
+                consumer.write(data)
+                # Keep the consumers from growing for the whole run, only the cost of writing to them is being measured
+                consumer.seek(0)
+
+        def extract_dup_handler(sink):
+            sample = sink.emit("pull-sample")
+            buffer = sample.get_buffer()
+            write_to_consumers(buffer.extract_dup(0, buffer.get_size()))
+            return Gst.FlowReturn.OK
+
+        # Constructing the pipeline initializes GStreamer, setup() is never called since only its appsink handler is used
+        gstreamer_pipeline = GstreamerPipeline(
+            on_new_sample_callback=write_to_consumers,
+            video_frame_size=(options["width"], options["height"]),
+            audio_format=GstreamerPipeline.AUDIO_FORMAT_PCM,
+            output_format=GstreamerPipeline.OUTPUT_FORMAT_FLV,
+            sink_type=GstreamerPipeline.SINK_TYPE_APPSINK,
+        )
+        handlers = {
+            "extract_dup": extract_dup_handler,
+            "map (GstreamerPipeline)": gstreamer_pipeline.on_new_sample_from_appsink,
+        }
+
+        self.stdout.write(f"{'handler':<26}{'samples':>10}{'MB':>10}{'handler ms':>12}{'us/sample':>12}")
+        for name, handler in handlers.items():
+            samples = 0
+            handler_seconds = 0.0
+            bytes_received = 0
+
+            def timed_handler(sink, handler=handler):
+                nonlocal samples, handler_seconds
+                began = time.perf_counter()
+                flow_return = handler(sink)
+                handler_seconds += time.perf_counter() - began
+                samples += 1
+                return flow_return
+
+            self.run_pipeline(options, timed_handler)
+            self.stdout.write(f"{name:<26}{samples:>10}{bytes_received / 1024 / 1024:>10.1f}{handler_seconds * 1000:>12.1f}{handler_seconds / max(samples, 1) * 1_000_000:>12.1f}")
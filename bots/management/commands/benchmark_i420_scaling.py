@@ -0,0 +1,46 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from bots.utils import I420Scaler, half_ceil, scale_i420
+
+
+class Command(BaseCommand):
+    help = "Measures how long it takes to scale one incoming I420 video frame to the 720p and 1080p recording sizes, with and without a reused I420Scaler"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--input-sizes", type=str, default="640x360,640x480,1280x720,1920x1080", help="Comma separated sizes of the incoming frames")
+        parser.add_argument("--output-sizes", type=str, default="1280x720,1920x1080", help="Comma separated sizes to scale the frames to")
+        parser.add_argument("--iterations", type=int, default=200, help="Number of frames to scale for each pair of sizes")
+
+    def parse_sizes(self, sizes):
+        return [tuple(int(dimension) for dimension in size.split("x")) for size in sizes.split(",")]
+
+    def measure(self, scale, frame, iterations):
+        # Warm up, so one time setup like OpenCV's thread pool isn't counted
+        scale(frame)
+        latencies_ms = []
+        for _ in range(iterations):
+            began = time.perf_counter()
+            scale(frame)
+            latencies_ms.append((time.perf_counter() - began) * 1000)
+        p95_ms = statistics.quantiles(latencies_ms, n=20)[-1] if len(latencies_ms) > 1 else latencies_ms[0]
+        return statistics.mean(latencies_ms), p95_ms
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        self.stdout.write(f"{'input':>10}{'output':>11}  {'scaler':<22}{'mean ms':>10}{'p95 ms':>10}")
+        for input_size in self.parse_sizes(options["input_sizes"]):
+            width, height = input_size
+            frame = rng.integers(0, 256, width * height + 2 * half_ceil(width) * half_ceil(height), dtype=np.uint8).tobytes()
+            for output_size in self.parse_sizes(options["output_sizes"]):
+                scaler = I420Scaler(input_size, output_size)
+                scalers = {
+                    "new for each frame": lambda frame: scale_i420(frame, input_size, output_size),
+                    "reused (I420Scaler)": scaler.scale,
+                }
+                for name, scale in scalers.items():
+                    mean_ms, p95_ms = self.measure(scale, frame, options["iterations"])
+                    self.stdout.write(f"{width:>5}x{height:<4}{output_size[0]:>6}x{output_size[1]:<4}  {name:<22}{mean_ms:>10.2f}{p95_ms:>10.2f}")
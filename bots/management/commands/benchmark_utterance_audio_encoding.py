@@ -0,0 +1,45 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from bots.utils import pcm_to_flac, pcm_to_mp3, pcm_to_ogg_opus
+
+
+class Command(BaseCommand):
+    help = "Measures how long it takes to encode one utterance's audio in each of the formats it can be uploaded in"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--durations", type=str, default="1,5,15,30", help="Comma separated utterance durations in seconds")
+        parser.add_argument("--sample-rate", type=int, default=32000, help="Sample rate of the utterance audio")
+        parser.add_argument("--iterations", type=int, default=20, help="Number of times to encode each utterance")
+
+    def generate_pcm(self, duration_seconds, sample_rate):
+        # Noise shaped by a slow envelope is closer to speech than a pure tone, which encoders compress unrealistically well
+        rng = np.random.default_rng(0)
+        num_samples = int(duration_seconds * sample_rate)
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * np.arange(num_samples) / sample_rate)
+        return (rng.normal(0, 3000, num_samples) * envelope).clip(-32768, 32767).astype(np.int16).tobytes()
+
+    def handle(self, *args, **options):
+        sample_rate = options["sample_rate"]
+        encoders = {
+            "mp3 (pydub + ffmpeg)": lambda pcm: pcm_to_mp3(pcm, sample_rate=sample_rate),
+            "flac (libsndfile)": lambda pcm: pcm_to_flac(pcm, sample_rate=sample_rate),
+            "ogg opus (libsndfile)": lambda pcm: pcm_to_ogg_opus(pcm, sample_rate=sample_rate),
+        }
+
+        self.stdout.write(f"{'format':<24}{'duration':>10}{'mean ms':>10}{'p95 ms':>10}{'size KB':>10}")
+        for duration_seconds in [float(duration) for duration in options["durations"].split(",")]:
+            pcm = self.generate_pcm(duration_seconds, sample_rate)
+            for name, encode in encoders.items():
+                # Warm up, so one time setup like loading libraries isn't counted
+                encoded = encode(pcm)
+                latencies_ms = []
+                for _ in range(options["iterations"]):
+                    began = time.perf_counter()
+                    encode(pcm)
+                    latencies_ms.append((time.perf_counter() - began) * 1000)
+                p95_ms = statistics.quantiles(latencies_ms, n=20)[-1] if len(latencies_ms) > 1 else latencies_ms[0]
+                self.stdout.write(f"{name:<24}{duration_seconds:>9g}s{statistics.mean(latencies_ms):>10.1f}{p95_ms:>10.1f}{len(encoded) / 1024:>10.1f}")
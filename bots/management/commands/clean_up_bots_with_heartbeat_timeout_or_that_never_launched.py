@@ -1,11 +1,16 @@
 import logging
 import os
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db import models
 from django.utils import timezone
-from kubernetes import client, config
+from kubernetes import client
 
+from bots.bot_heartbeats import get_bot_heartbeats
+from bots.bot_pod_creator import bot_pod_name
+from bots.bot_pod_creator.kubernetes_client import create_core_v1_api
+from bots.bots_api_utils import get_redis_client
 from bots.models import Bot, BotEventManager, BotEventSubTypes, BotEventTypes
 
 logger = logging.getLogger(__name__)
@@ -17,6 +22,7 @@ class Command(BaseCommand):
     def __init__(self):
         super().__init__()
         self.namespace = "attendee"
+        self.v1 = None
 
     def terminate_bot(self, bot, event_sub_type):
         try:
@@ -32,18 +38,15 @@ class Command(BaseCommand):
         if not os.getenv("LAUNCH_BOT_METHOD") == "kubernetes":
             return
 
-        # Initialize kubernetes client
-        try:
-            config.load_incluster_config()
-        except config.ConfigException:
-            config.load_kube_config()
-        v1 = client.CoreV1Api()
-        logger.info("initialized kubernetes client")
+        # Initialize kubernetes client once for all the bots
+        if self.v1 is None:
+            self.v1 = create_core_v1_api()
+            logger.info("initialized kubernetes client")
 
         # Try to delete the pod if it exists
         try:
-            pod_name = bot.k8s_pod_name()
-            v1.delete_namespaced_pod(
+            pod_name = bot_pod_name(get_redis_client(), bot)
+            self.v1.delete_namespaced_pod(
                 name=pod_name,
                 namespace=self.namespace,
                 grace_period_seconds=0,
@@ -66,9 +69,14 @@ class Command(BaseCommand):
 
             # Find non post-meeting bots where the last heartbeat is over 10 minutes ago
             heartbeat_timeout_q_filter = models.Q(last_heartbeat_timestamp__isnull=False) & models.Q(last_heartbeat_timestamp__lt=ten_minutes_ago_timestamp)
-            problem_bots = Bot.objects.filter(~BotEventManager.get_post_meeting_states_q_filter() & heartbeat_timeout_q_filter)
+            problem_bots = list(Bot.objects.filter(~BotEventManager.get_post_meeting_states_q_filter() & heartbeat_timeout_q_filter))
+
+            # The database only has the heartbeats that were flushed from Redis, so check Redis for a more recent one
+            if settings.REDIS_BOT_HEARTBEATS_ENABLED:
+                redis_heartbeats = get_bot_heartbeats(get_redis_client(), [bot.id for bot in problem_bots])
+                problem_bots = [bot for bot in problem_bots if redis_heartbeats.get(bot.id, 0) < ten_minutes_ago_timestamp]
 
-            logger.info(f"Found {problem_bots.count()} bots with heartbeat timeout")
+            logger.info(f"Found {len(problem_bots)} bots with heartbeat timeout")
 
             # Create fatal error events for each bot
             for bot in problem_bots:
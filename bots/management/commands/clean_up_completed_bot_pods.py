@@ -2,34 +2,31 @@ import logging
 from typing import List
 
 from django.core.management.base import BaseCommand
-from kubernetes import client, config
+from kubernetes import client
+
+from bots.bot_pod_creator.kubernetes_client import BOT_POD_LABEL_SELECTOR, BOT_POD_NAMESPACE, get_core_v1_api, is_completed_bot_pod
 
 logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
-    help = "Cleans up completed bot pods"
+    help = "Cleans up completed bot pods. The watch_bot_pods command does this continuously."
 
     def __init__(self):
         super().__init__()
-        # Initialize kubernetes client
-        try:
-            config.load_incluster_config()
-        except config.ConfigException:
-            config.load_kube_config()
-        self.v1 = client.CoreV1Api()
-        self.namespace = "attendee"
+        self.v1 = get_core_v1_api()
+        self.namespace = BOT_POD_NAMESPACE
         logger.info("initialized kubernetes client")
 
     def handle(self, *args, **options):
         logger.info("Cleaning up completed bot pods...")
 
         try:
-            # Get all pods in the namespace
-            pods = self.v1.list_namespaced_pod(namespace=self.namespace)
+            # Only list the completed bot pods, instead of every pod in the namespace
+            pods = self.v1.list_namespaced_pod(namespace=self.namespace, label_selector=BOT_POD_LABEL_SELECTOR, field_selector="status.phase=Succeeded")
 
             # Filter for completed bot pods
-            completed_pods: List[str] = [pod.metadata.name for pod in pods.items if (pod.metadata.name.startswith("bot-pod-") and pod.status.phase == "Succeeded")]
+            completed_pods: List[str] = [pod.metadata.name for pod in pods.items if is_completed_bot_pod(pod)]
 
             # Delete each completed pod
             for pod_name in completed_pods:
@@ -0,0 +1,64 @@
+import logging
+import os
+from datetime import timedelta
+
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bots.models import Utterance
+from bots.utterance_audio_storage import get_utterance_audio_storage
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Deletes utterance audio from the utterance audio storage once it is no longer needed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-hours", type=int, default=int(os.getenv("UTTERANCE_AUDIO_RETENTION_HOURS", "72")), help="How long to keep audio for utterances whose transcription failed")
+
+    def delete_audio(self, utterances):
+        num_deleted = 0
+        for utterance in utterances.iterator():
+            utterance.delete_audio_blob()
+            utterance.save(update_fields=["audio_blob", "audio_blob_key", "audio_blob_size", "updated_at"])
+            num_deleted += 1
+        return num_deleted
+
+    def delete_orphaned_spool_files(self, storage, cutoff):
+        # Files can be left behind if the bot crashed between writing the file and saving the utterance,
+        # or if a delete failed. Only done for the filesystem backend, use a bucket lifecycle rule for S3.
+        num_deleted = 0
+        directories, _ = storage.listdir("")
+        for directory in directories:
+            _, file_names = storage.listdir(directory)
+            keys = [f"{directory}/{file_name}" for file_name in file_names]
+            referenced_keys = set(Utterance.objects.filter(audio_blob_key__in=keys).values_list("audio_blob_key", flat=True))
+            for key in keys:
+                if key in referenced_keys or storage.get_modified_time(key) > cutoff:
+                    continue
+                storage.delete(key)
+                num_deleted += 1
+        return num_deleted
+
+    def handle(self, *args, **options):
+        storage = get_utterance_audio_storage()
+        if storage is None:
+            logger.info("UTTERANCE_AUDIO_STORAGE_BACKEND is database, nothing to clean up")
+            return
+
+        logger.info("Cleaning up utterance audio...")
+        cutoff = timezone.now() - timedelta(hours=options["retention_hours"])
+
+        # Audio for transcribed utterances should already be gone, but the delete in process_utterance is best effort
+        num_transcribed_deleted = self.delete_audio(Utterance.objects.filter(audio_blob_key__isnull=False, transcription__isnull=False))
+
+        # Audio for failed utterances is kept around for debugging for a while
+        num_failed_deleted = self.delete_audio(Utterance.objects.filter(audio_blob_key__isnull=False, failure_data__isnull=False, updated_at__lt=cutoff))
+
+        num_orphans_deleted = 0
+        if isinstance(storage, FileSystemStorage):
+            num_orphans_deleted = self.delete_orphaned_spool_files(storage, cutoff)
+
+        logger.info(f"Utterance audio cleanup completed. Deleted audio for {num_transcribed_deleted} transcribed utterances, {num_failed_deleted} failed utterances and {num_orphans_deleted} orphaned files")
@@ -0,0 +1,45 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from bots.models import Utterance
+from bots.utterance_audio_storage import get_utterance_audio_storage
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Moves utterance audio that is still stored in the database into the configured utterance audio storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Number of utterances to move per batch")
+
+    def handle(self, *args, **options):
+        if get_utterance_audio_storage() is None:
+            logger.info("UTTERANCE_AUDIO_STORAGE_BACKEND is database, nothing to migrate")
+            return
+
+        batch_size = options["batch_size"]
+        utterances_to_migrate = Utterance.objects.filter(audio_blob_key__isnull=True).exclude(audio_blob=b"").order_by("id")
+
+        num_migrated = 0
+        last_id = 0
+        while True:
+            # Only pull the ids up front, so we never hold more than one audio blob in memory at a time
+            utterance_ids = list(utterances_to_migrate.filter(id__gt=last_id).values_list("id", flat=True)[:batch_size])
+            if not utterance_ids:
+                break
+            last_id = utterance_ids[-1]
+
+            for utterance_id in utterance_ids:
+                utterance = Utterance.objects.select_related("recording").get(id=utterance_id)
+                try:
+                    utterance.set_audio_blob(bytes(utterance.audio_blob))
+                    utterance.save(update_fields=["audio_blob", "audio_blob_key", "audio_blob_size", "updated_at"])
+                    num_migrated += 1
+                except Exception as e:
+                    logger.error(f"Failed to move audio for utterance {utterance_id} into storage: {e}")
+
+            logger.info(f"Moved audio for {num_migrated} utterances into storage so far")
+
+        logger.info(f"Finished moving utterance audio into storage. Moved audio for {num_migrated} utterances")
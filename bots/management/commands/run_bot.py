@@ -2,6 +2,7 @@ import logging
 
 from django.core.management.base import BaseCommand
 
+from bots.bots_api_utils import get_redis_client
 from bots.tasks import run_bot  # Import your task
 
 logger = logging.getLogger(__name__)
@@ -13,11 +14,23 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         # Add any arguments you need
         parser.add_argument("--botid", type=int, help="Bot ID")
+        parser.add_argument("--warm-pod-name", type=str, help="Wait in the warm bot pod pool under this pod name for a bot to run, instead of running --botid")
+        parser.add_argument("--warm-pool-version", type=str, help="Release version of the warm bot pod pool to wait in")
 
     def handle(self, *args, **options):
+        bot_id = options["botid"]
+        if options["warm_pod_name"]:
+            from bots.bot_pod_creator.warm_bot_pod_pool import wait_for_bot_id
+
+            logger.info(f"Waiting in warm bot pod pool as {options['warm_pod_name']}...")
+            bot_id = wait_for_bot_id(get_redis_client(), options["warm_pool_version"], options["warm_pod_name"])
+            if bot_id is None:
+                logger.info("No bot was assigned to this warm pod, exiting")
+                return
+
         logger.info("Running run bot task...")
 
         # Call your task directly
-        result = run_bot.run(options["botid"])
+        result = run_bot.run(bot_id)
 
         logger.info(f"Run bot task completed with result: {result}")
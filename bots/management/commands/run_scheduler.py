@@ -2,14 +2,20 @@ import logging
 import signal
 import time
 
+from celery import group
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db import connection, models, transaction
-from django.db.models import Q
+from django.db.models import F, Q
 from django.utils import timezone
 
 from accounts.models import Organization
+from bots.bots_api_utils import get_redis_client
+from bots.calendar_sync_planner import UPCOMING_BOTS_WINDOW, acquire_calendar_sync_slot, is_calendar_sync_due, prioritize_calendar_syncs
 from bots.models import Bot, BotStates, Calendar, CalendarStates
+from bots.scheduled_bot_queue import LAUNCH_LEAD_TIME, SCHEDULED_BOTS_UPDATED_CHANNEL, add_scheduled_bots, next_launch_time, pop_due_bot_ids
 from bots.tasks.autopay_charge_task import enqueue_autopay_charge_task
+from bots.tasks.flush_bot_heartbeats_task import flush_bot_heartbeats_to_db
 from bots.tasks.launch_scheduled_bot_task import launch_scheduled_bot
 from bots.tasks.sync_calendar_task import enqueue_sync_calendar_task
 
@@ -26,6 +32,11 @@ class Command(BaseCommand):
             default=60,
             help="Polling interval in seconds (default: 60)",
         )
+        parser.add_argument(
+            "--event-driven",
+            action="store_true",
+            help="Launch scheduled bots from the Redis scheduled bot queue as soon as they are due, instead of once per interval. The other periodic work still runs once per interval.",
+        )
 
     # Graceful shutdown flags
     _keep_running = True
@@ -40,6 +51,11 @@ class Command(BaseCommand):
         signal.signal(signal.SIGTERM, self._graceful_exit)
 
         interval = opts["interval"]
+        if opts["event_driven"]:
+            log.info("Scheduler daemon started in event driven mode, running periodic work every %s seconds", interval)
+            self._run_event_driven(interval)
+            return
+
         log.info("Scheduler daemon started, polling every %s seconds", interval)
 
         while self._keep_running:
@@ -48,6 +64,8 @@ class Command(BaseCommand):
                 self._run_scheduled_bots()
                 self._run_periodic_calendar_syncs()
                 self._run_autopay_tasks()
+                self._run_warm_bot_pod_pool_replenishment()
+                self._run_bot_heartbeat_flush()
             except Exception:
                 log.exception("Scheduler cycle failed")
             finally:
@@ -71,25 +89,110 @@ class Command(BaseCommand):
 
         log.info("Scheduler daemon exited")
 
+    def _run_event_driven(self, interval):
+        """
+        Sleeps until the next bot in the scheduled bot queue is due, or until a bot is added to the queue, and launches the
+        due bots in a batch. The database stays the source of truth: every interval, upcoming scheduled bots are added to
+        the queue again, in case they were scheduled while Redis was unavailable.
+        """
+        redis_client = get_redis_client()
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(SCHEDULED_BOTS_UPDATED_CHANNEL)
+
+        next_periodic_run = 0
+        while self._keep_running:
+            next_launch = None
+            try:
+                if time.monotonic() >= next_periodic_run:
+                    next_periodic_run = time.monotonic() + interval
+                    self._enqueue_upcoming_scheduled_bots(redis_client, interval)
+                    self._run_periodic_calendar_syncs()
+                    self._run_autopay_tasks()
+                    self._run_warm_bot_pod_pool_replenishment()
+                    self._run_bot_heartbeat_flush()
+
+                self._launch_due_scheduled_bots(redis_client)
+                next_launch = next_launch_time(redis_client)
+            except Exception:
+                log.exception("Scheduler cycle failed")
+            finally:
+                # Close stale connections so the loop never inherits a dead socket
+                connection.close()
+
+            sleep_seconds = next_periodic_run - time.monotonic()
+            if next_launch is not None:
+                sleep_seconds = min(sleep_seconds, next_launch - timezone.now().timestamp())
+            self._wait_for_scheduled_bots_update(pubsub, sleep_seconds)
+
+        pubsub.close()
+        log.info("Scheduler daemon exited")
+
+    def _wait_for_scheduled_bots_update(self, pubsub, timeout_seconds):
+        # Wait in small chunks to allow for responsive shutdown
+        deadline = time.monotonic() + timeout_seconds
+        while self._keep_running and (remaining_seconds := deadline - time.monotonic()) > 0:
+            try:
+                if pubsub.get_message(timeout=min(1, remaining_seconds)):
+                    return
+            except Exception as e:
+                log.warning(f"Error waiting for scheduled bot queue updates: {e}")
+                time.sleep(min(1, remaining_seconds))
+
+    def _enqueue_upcoming_scheduled_bots(self, redis_client, interval):
+        # Only bots that become due before the next periodic run are needed, later ones are added by a later run
+        join_at_upper_threshold = timezone.now() + LAUNCH_LEAD_TIME + timezone.timedelta(seconds=2 * interval)
+        join_at_lower_threshold = timezone.now() - timezone.timedelta(minutes=5)
+        upcoming_bots = Bot.objects.filter(state=BotStates.SCHEDULED, join_at__lte=join_at_upper_threshold, join_at__gte=join_at_lower_threshold).only("id", "join_at")
+        add_scheduled_bots(redis_client, upcoming_bots)
+
+    def _launch_due_scheduled_bots(self, redis_client):
+        bot_ids = pop_due_bot_ids(redis_client, timezone.now().timestamp())
+        if not bot_ids:
+            return
+
+        # Same thresholds as _run_scheduled_bots. The bot may have been patched or launched since it was added to the queue.
+        join_at_upper_threshold = timezone.now() + LAUNCH_LEAD_TIME
+        join_at_lower_threshold = timezone.now() - timezone.timedelta(minutes=5)
+
+        with transaction.atomic():
+            bots_to_launch = list(Bot.objects.filter(id__in=bot_ids, state=BotStates.SCHEDULED, join_at__lte=join_at_upper_threshold, join_at__gte=join_at_lower_threshold).select_for_update(skip_locked=True))
+            for bot in bots_to_launch:
+                log.info(f"Launching scheduled bot {bot.id} ({bot.object_id}) with join_at {bot.join_at.isoformat()}")
+            if bots_to_launch:
+                group(launch_scheduled_bot.s(bot.id, bot.join_at.isoformat()) for bot in bots_to_launch).apply_async()
+
+        log.info("Launched %s of %s due bots", len(bots_to_launch), len(bot_ids))
+
     def _run_periodic_calendar_syncs(self):
         """
         Run periodic calendar syncs.
-        Launch sync tasks for calendars that haven't had a sync task enqueued in the last 30 minutes.
+        Each calendar is synced every 30 minutes, at an offset into the interval derived from its id, so that the calendars
+        aren't all synced at once. Syncs are capped per platform and per organization, calendars that don't get a slot are
+        synced in a later cycle. Calendars with bots joining soon are synced first.
         """
         now = timezone.now()
-        cutoff_time = now - timezone.timedelta(minutes=30)
 
-        # Find connected calendars that haven't had a sync task enqueued in the last 30 minutes
-        calendars = Calendar.objects.filter(
-            state=CalendarStates.CONNECTED,
-        ).filter(Q(sync_task_enqueued_at__isnull=True) | Q(sync_task_enqueued_at__lte=cutoff_time) | Q(sync_task_requested_at__isnull=False))
+        due_calendar_ids = [calendar_id for calendar_id, sync_task_enqueued_at, sync_task_requested_at in Calendar.objects.filter(state=CalendarStates.CONNECTED).values_list("id", "sync_task_enqueued_at", "sync_task_requested_at") if is_calendar_sync_due(calendar_id, sync_task_enqueued_at, sync_task_requested_at, now)]
+        if not due_calendar_ids:
+            log.info("Launched 0 calendar sync tasks")
+            return
+
+        calendars = Calendar.objects.filter(id__in=due_calendar_ids).annotate(organization_id=F("project__organization_id"))
+        calendar_ids_with_upcoming_bots = set(Bot.objects.filter(state=BotStates.SCHEDULED, join_at__gte=now, join_at__lte=now + UPCOMING_BOTS_WINDOW, calendar_event__calendar_id__in=due_calendar_ids).values_list("calendar_event__calendar_id", flat=True))
+
+        redis_client = get_redis_client()
+        launched_count = 0
+        for calendar in prioritize_calendar_syncs(calendars, calendar_ids_with_upcoming_bots):
+            if not acquire_calendar_sync_slot(redis_client, calendar.id, calendar.platform, calendar.organization_id, now.timestamp()):
+                log.info("Deferring calendar sync for calendar %s, too many syncs are running for its platform or organization", calendar.object_id)
+                continue
 
-        for calendar in calendars:
             last_enqueued = calendar.sync_task_enqueued_at.isoformat() if calendar.sync_task_enqueued_at else "never"
             log.info("Launching calendar sync for calendar %s (last enqueued: %s)", calendar.object_id, last_enqueued)
             enqueue_sync_calendar_task(calendar)
+            launched_count += 1
 
-        log.info("Launched %d calendar sync tasks", len(calendars))
+        log.info("Launched %d calendar sync tasks, deferred %d", launched_count, len(due_calendar_ids) - launched_count)
 
     # -----------------------------------------------------------
     def _run_scheduled_bots(self):
@@ -156,3 +259,22 @@ class Command(BaseCommand):
             enqueue_autopay_charge_task(organization)
 
         log.info("Enqueued %d autopay tasks", len(organizations))
+
+    def _run_warm_bot_pod_pool_replenishment(self):
+        """
+        Top up the warm bot pod pool. Launching a bot also does this, but the pool needs to be filled when no bots are launching too, e.g. after a release.
+        """
+        from bots.bot_pod_creator.warm_bot_pod_pool import warm_bot_pod_pool_size
+
+        if not warm_bot_pod_pool_size():
+            return
+
+        from bots.tasks.replenish_warm_bot_pod_pool_task import replenish_warm_bot_pod_pool
+
+        replenish_warm_bot_pod_pool.delay()
+
+    def _run_bot_heartbeat_flush(self):
+        if not settings.REDIS_BOT_HEARTBEATS_ENABLED:
+            return
+
+        flush_bot_heartbeats_to_db.delay()
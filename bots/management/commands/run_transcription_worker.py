@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bots.bots_api_utils import get_redis_client
+from bots.transcription_worker import TranscriptionClientPool, TranscriptionWorker
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Transcribes the utterances in the utterance transcription queue. Used when UTTERANCE_TRANSCRIPTION_WORKER_ENABLED is set."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50, help="Maximum number of utterances to pull from the queue at once (default: 50)")
+        parser.add_argument("--max-in-flight", type=int, default=500, help="Maximum number of utterances to transcribe at once (default: 500)")
+        parser.add_argument("--max-connections-per-credential", type=int, default=100, help="Maximum number of connections to a provider for each set of credentials (default: 100)")
+
+    # Graceful shutdown flags
+    _keep_running = True
+
+    def _graceful_exit(self, signum, frame):
+        log.info("Received %s, shutting down after the utterances being transcribed are done", signum)
+        self._keep_running = False
+
+    def handle(self, *args, **opts):
+        # Trap SIGINT / SIGTERM so Kubernetes or Heroku can stop the container cleanly
+        signal.signal(signal.SIGINT, self._graceful_exit)
+        signal.signal(signal.SIGTERM, self._graceful_exit)
+
+        if not settings.UTTERANCE_TRANSCRIPTION_WORKER_ENABLED:
+            # Utterances are transcribed by process_utterance tasks, the worker would only duplicate their work.
+            # Process managers restart processes that exit, so idle until stopped instead.
+            log.info("UTTERANCE_TRANSCRIPTION_WORKER_ENABLED is not set, the transcription worker is not needed. Idling until stopped")
+            while self._keep_running:
+                time.sleep(1)
+            return
+
+        worker = TranscriptionWorker(
+            redis_client=get_redis_client(),
+            client_pool=TranscriptionClientPool(max_connections_per_client=opts["max_connections_per_credential"]),
+            batch_size=opts["batch_size"],
+            max_in_flight=opts["max_in_flight"],
+        )
+        log.info("Transcription worker started")
+        asyncio.run(worker.run(keep_running=lambda: self._keep_running))
+        log.info("Transcription worker exited")
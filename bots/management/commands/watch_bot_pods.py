@@ -0,0 +1,96 @@
+import logging
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from kubernetes import client, watch
+
+from bots.bot_pod_creator.kubernetes_client import BOT_POD_LABEL_SELECTOR, BOT_POD_NAMESPACE, get_core_v1_api, is_completed_bot_pod
+
+log = logging.getLogger(__name__)
+
+# The API server ends each watch after this long, so shutdown is never delayed by more than this
+WATCH_TIMEOUT_SECONDS = 60
+
+
+class Command(BaseCommand):
+    help = "Watches bot pods and deletes them as soon as they complete."
+
+    # Graceful shutdown flags
+    _keep_running = True
+
+    def _graceful_exit(self, signum, frame):
+        log.info("Received %s, shutting down after current watch", signum)
+        self._keep_running = False
+
+    def handle(self, *args, **opts):
+        # Trap SIGINT / SIGTERM so Kubernetes can stop the container cleanly
+        signal.signal(signal.SIGINT, self._graceful_exit)
+        signal.signal(signal.SIGTERM, self._graceful_exit)
+
+        # Bots only run in pods when they are launched in Kubernetes. Process managers restart processes that exit, so idle until stopped instead.
+        if os.getenv("LAUNCH_BOT_METHOD") != "kubernetes":
+            log.info("LAUNCH_BOT_METHOD is not kubernetes, there are no bot pods to watch. Idling until stopped")
+            while self._keep_running:
+                time.sleep(1)
+            return
+
+        v1 = get_core_v1_api()
+        log.info("Bot pod watcher started")
+
+        resource_version = None
+        while self._keep_running:
+            try:
+                if resource_version is None:
+                    resource_version = self._delete_completed_pods(v1)
+                resource_version = self._watch_pods(v1, resource_version)
+            except client.ApiException as e:
+                if e.status == 410:
+                    # The version we were watching from is too old, start over from a fresh list
+                    log.info("Bot pod watch expired, listing pods again")
+                    resource_version = None
+                else:
+                    log.exception("Bot pod watch failed")
+                    time.sleep(5)
+            except Exception:
+                log.exception("Bot pod watch failed")
+                time.sleep(5)
+
+        log.info("Bot pod watcher exited")
+
+    def _delete_completed_pods(self, v1):
+        """Deletes the pods that completed while nothing was watching, and returns the version to start watching from."""
+        pods = v1.list_namespaced_pod(namespace=BOT_POD_NAMESPACE, label_selector=BOT_POD_LABEL_SELECTOR)
+        for pod in pods.items:
+            if is_completed_bot_pod(pod):
+                self._delete_pod(v1, pod.metadata.name)
+        return pods.metadata.resource_version
+
+    def _watch_pods(self, v1, resource_version):
+        pod_watch = watch.Watch()
+        for event in pod_watch.stream(
+            v1.list_namespaced_pod,
+            namespace=BOT_POD_NAMESPACE,
+            label_selector=BOT_POD_LABEL_SELECTOR,
+            resource_version=resource_version,
+            allow_watch_bookmarks=True,
+            timeout_seconds=WATCH_TIMEOUT_SECONDS,
+        ):
+            # Bookmarks only move the version forward, so the next watch doesn't replay events we've already handled
+            resource_version = event["raw_object"]["metadata"]["resourceVersion"]
+            # Deleting a pod modifies it too, only delete it once
+            if event["type"] in ("ADDED", "MODIFIED") and is_completed_bot_pod(event["object"]) and event["object"].metadata.deletion_timestamp is None:
+                self._delete_pod(v1, event["object"].metadata.name)
+            if not self._keep_running:
+                pod_watch.stop()
+        return resource_version
+
+    def _delete_pod(self, v1, pod_name):
+        try:
+            v1.delete_namespaced_pod(name=pod_name, namespace=BOT_POD_NAMESPACE, grace_period_seconds=60)
+            log.info(f"Deleted pod: {pod_name}")
+        except client.ApiException as e:
+            # 404 means the pod was already deleted, e.g. by the periodic cleanup
+            if e.status != 404:
+                log.warning(f"Error deleting pod {pod_name}: {str(e)}")
@@ -0,0 +1,136 @@
+import logging
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from pydub import AudioSegment
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .utils import mp3_to_pcm
+
+logger = logging.getLogger(__name__)
+
+
+class MediaBlobPCMCacheS3Storage(S3Boto3Storage):
+    bucket_name = settings.AWS_MEDIA_BLOB_PCM_CACHE_BUCKET_NAME
+
+
+def media_blob_pcm_cache_key(media_blob, sample_rate):
+    # MediaBlobs can't be updated, so their checksum and the sample rate fully determine the decoded audio. For uploaded MP3s the
+    # checksum is of the file's bytes, for synthesized speech it is of the inputs it was synthesized from.
+    return f"{media_blob.checksum}_{sample_rate}.pcm"
+
+
+def decode_media_blob_to_pcm(media_blob, sample_rate):
+    """Decodes the MediaBlob's audio to 16-bit mono PCM at sample_rate. Besides MP3, handles the raw PCM (audio/L16) that synthesized speech is stored as."""
+    l16_match = re.fullmatch(r"audio/L16;rate=(\d+)", media_blob.content_type)
+    if l16_match:
+        pcm = bytes(media_blob.blob)
+        blob_sample_rate = int(l16_match.group(1))
+        if blob_sample_rate == sample_rate:
+            return pcm
+        return AudioSegment(data=pcm, sample_width=2, frame_rate=blob_sample_rate, channels=1).set_frame_rate(sample_rate).raw_data
+    return mp3_to_pcm(bytes(media_blob.blob), sample_rate=sample_rate)
+
+
+class MediaBlobPCMCache:
+    """
+    Decoded PCM audio of MediaBlobs, so playing the same clip again doesn't decode the MP3 again.
+
+    The PCM is kept in a local directory, and optionally in an S3 bucket that is shared by all bots,
+    so a clip decoded by one bot doesn't need to be decoded by the next one.
+    """
+
+    def __init__(self, directory=None, max_size_bytes=None, s3_storage=None):
+        self.directory = directory or settings.MEDIA_BLOB_PCM_CACHE_DIR
+        self.max_size_bytes = max_size_bytes if max_size_bytes is not None else settings.MEDIA_BLOB_PCM_CACHE_MAX_SIZE_MB * 1024 * 1024
+        if s3_storage is None and settings.AWS_MEDIA_BLOB_PCM_CACHE_BUCKET_NAME:
+            s3_storage = MediaBlobPCMCacheS3Storage()
+        self.s3_storage = s3_storage
+
+    def get_pcm_path(self, media_blob, sample_rate):
+        """Returns the path of a local file with the MediaBlob's audio decoded to 16-bit mono PCM at sample_rate, decoding it if it isn't cached yet."""
+        key = media_blob_pcm_cache_key(media_blob, sample_rate)
+        path = os.path.join(self.directory, key)
+        if os.path.exists(path):
+            # Keep the modification time up to date, it decides which files are evicted first
+            os.utime(path)
+            return path
+
+        os.makedirs(self.directory, exist_ok=True)
+        if not self._download_from_s3(key, path):
+            pcm = decode_media_blob_to_pcm(media_blob, sample_rate)
+            self._write_atomically(path, lambda f: f.write(pcm))
+            self._upload_to_s3(key, path)
+        self._evict_if_needed(keep_path=path)
+        return path
+
+    def _write_atomically(self, path, write):
+        # Write to a temporary file and rename it, so other processes sharing the directory never see a partial file
+        temp_fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(temp_fd, "wb") as f:
+                write(f)
+            os.replace(temp_path, path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+
+    def _download_from_s3(self, key, path):
+        if not self.s3_storage:
+            return False
+        try:
+            if not self.s3_storage.exists(key):
+                return False
+            with self.s3_storage.open(key, "rb") as s3_file:
+                self._write_atomically(path, lambda f: _copy_in_chunks(s3_file, f))
+            return True
+        except Exception as e:
+            logger.warning(f"Error downloading decoded PCM {key} from S3, decoding it instead: {e}")
+            return False
+
+    def _upload_to_s3(self, key, path):
+        if not self.s3_storage:
+            return
+        try:
+            with open(path, "rb") as f:
+                self.s3_storage.save(key, f)
+        except Exception as e:
+            logger.warning(f"Error uploading decoded PCM {key} to S3: {e}")
+
+    def _evict_if_needed(self, keep_path):
+        """Deletes the least recently used files until the directory is under max_size_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".pcm"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            if path == keep_path:
+                continue
+            try:
+                os.unlink(path)
+                total_size -= size
+            except FileNotFoundError:
+                pass
+
+
+def _copy_in_chunks(source, destination, chunk_size=1024 * 1024):
+    while chunk := source.read(chunk_size):
+        destination.write(chunk)
+
+
+def read_pcm_file_in_chunks(path, chunk_size):
+    """Opens the file right away, so it can't be evicted before playback starts, and returns a generator of its chunks that closes it when done."""
+    pcm_file = open(path, "rb")
+
+    def chunks():
+        with pcm_file:
+            while chunk := pcm_file.read(chunk_size):
+                yield chunk
+
+    return chunks()
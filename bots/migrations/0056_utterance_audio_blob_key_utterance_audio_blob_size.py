@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-16 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bots', '0055_alter_botchatmessagerequest_to'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='utterance',
+            name='audio_blob_key',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='utterance',
+            name='audio_blob_size',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
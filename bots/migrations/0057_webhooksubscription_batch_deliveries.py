@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-16 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bots', '0056_utterance_audio_blob_key_utterance_audio_blob_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhooksubscription',
+            name='batch_deliveries',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-16 21:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bots', '0057_webhooksubscription_batch_deliveries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='utterance',
+            index=models.Index(condition=models.Q(('transcription__isnull', False)), fields=['recording', 'timestamp_ms'], name='utterance_transcribed_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-16 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bots', '0058_utterance_utterance_transcribed_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendar',
+            name='sync_cursor',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='calendar',
+            name='sync_cursor_created_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bots', '0059_calendar_sync_cursor'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mediablob',
+            name='content_type',
+            field=models.CharField(choices=[('audio/mp3', 'MP3 Audio'), ('image/png', 'PNG Image'), ('audio/L16;rate=44100', '16-bit PCM Audio (44.1 kHz)')], max_length=255),
+        ),
+    ]
@@ -1,25 +1,34 @@
 import hashlib
 import json
+import logging
 import math
 import os
 import random
 import secrets
 import string
+import uuid
 
 from concurrency.exceptions import RecordModifiedError
 from concurrency.fields import IntegerVersionField
 from cryptography.fernet import Fernet, InvalidToken
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
 from django.db import models, transaction
 from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
 from django.db.utils import IntegrityError
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.crypto import get_random_string
 
 from accounts.models import Organization, User, UserRole
+from bots.api_key_cache import invalidate_cached_api_key
+from bots.utterance_audio_storage import get_utterance_audio_storage, utterance_audio_key
 from bots.webhook_utils import trigger_webhook
 
+logger = logging.getLogger(__name__)
+
 # Create your models here.
 
 
@@ -94,6 +103,9 @@ class Calendar(models.Model):
     last_successful_sync_started_at = models.DateTimeField(null=True, blank=True)
     sync_task_enqueued_at = models.DateTimeField(null=True, blank=True)
     sync_task_requested_at = models.DateTimeField(null=True, blank=True)
+    # Google nextSyncToken or Microsoft Graph deltaLink from the last sync, used to fetch only the events that changed since then
+    sync_cursor = models.TextField(null=True, blank=True)
+    sync_cursor_created_at = models.DateTimeField(null=True, blank=True)
 
     _encrypted_data = models.BinaryField(
         null=True,
@@ -152,11 +164,15 @@ class CalendarEvent(models.Model):
 
     raw = models.JSONField()
 
+    @classmethod
+    def generate_object_id(cls):
+        # Used by save and for events created in bulk, which skips save
+        random_string = "".join(random.choices(string.ascii_letters + string.digits, k=16))
+        return f"{cls.OBJECT_ID_PREFIX}{random_string}"
+
     def save(self, *args, **kwargs):
         if not self.object_id:
-            # Generate a random 16-character string
-            random_string = "".join(random.choices(string.ascii_letters + string.digits, k=16))
-            self.object_id = f"{self.OBJECT_ID_PREFIX}{random_string}"
+            self.object_id = self.generate_object_id()
         super().save(*args, **kwargs)
 
     class Meta:
@@ -207,6 +223,13 @@ class ApiKey(models.Model):
         return f"{self.name} ({self.project.name})"
 
 
+@receiver(post_save, sender=ApiKey)
+@receiver(post_delete, sender=ApiKey)
+def invalidate_api_key_authentication_cache(sender, instance, **kwargs):
+    # The key may have been disabled, so it shouldn't be authenticated from the cache anymore
+    invalidate_cached_api_key(instance.key_hash)
+
+
 class MeetingTypes(models.TextChoices):
     ZOOM = "zoom"
     GOOGLE_MEET = "google_meet"
@@ -322,7 +345,9 @@ class Bot(models.Model):
 
             # Delete all utterances and recording files for each recording
             for recording in self.recordings.all():
-                # Delete all utterances first
+                # Delete any utterance audio that lives outside the database, then the utterances
+                for utterance in recording.utterances.filter(audio_blob_key__isnull=False):
+                    utterance.delete_audio_blob()
                 recording.utterances.all().delete()
 
                 # Delete the actual recording file if it exists
@@ -536,6 +561,11 @@ class Bot(models.Model):
         websocket_audio_settings = websocket_settings.get("audio") or {}
         return websocket_audio_settings.get("sample_rate", 16000)
 
+    def websocket_audio_message_format(self):
+        websocket_settings = self.settings.get("websocket_settings") or {}
+        websocket_audio_settings = websocket_settings.get("audio") or {}
+        return websocket_audio_settings.get("message_format", "json")
+
     def zoom_tokens_callback_url(self):
         callback_settings = self.settings.get("callback_settings", {})
         if callback_settings is None:
@@ -1235,6 +1265,12 @@ class BotEventManager:
                         new_state = transition["to"]
                     bot.state = new_state
 
+                    # Credits are charged based on the last heartbeat, which may not have been flushed from Redis yet
+                    if settings.REDIS_BOT_HEARTBEATS_ENABLED and cls.is_post_meeting_state(new_state) and not cls.is_post_meeting_state(old_state):
+                        from bots.bot_heartbeats import apply_unflushed_bot_heartbeat
+
+                        apply_unflushed_bot_heartbeat(bot)
+
                     bot.save()  # This will raise RecordModifiedError if version mismatch
 
                     # There's a chance that some other thread in the same process will modify the bot state to be something other than new_state. This should never happen, but we
@@ -1664,6 +1700,9 @@ class Utterance(models.Model):
     recording = models.ForeignKey(Recording, on_delete=models.CASCADE, related_name="utterances")
     participant = models.ForeignKey(Participant, on_delete=models.PROTECT, related_name="utterances")
     audio_blob = models.BinaryField()
+    # If the audio is kept in the utterance audio storage instead of audio_blob, this is its key in the storage
+    audio_blob_key = models.CharField(max_length=255, null=True, blank=True)
+    audio_blob_size = models.IntegerField(null=True, blank=True)
     audio_format = models.IntegerField(choices=AudioFormat.choices, default=AudioFormat.PCM, null=True)
     timestamp_ms = models.BigIntegerField()
     duration_ms = models.IntegerField()
@@ -1679,9 +1718,55 @@ class Utterance(models.Model):
 
     source = models.IntegerField(choices=Sources.choices, default=Sources.PER_PARTICIPANT_AUDIO, null=False)
 
+    class Meta:
+        # The transcript endpoint is polled during the meeting for the transcribed utterances of a recording in timeline order.
+        # The partial index leaves out utterances that are still being transcribed or that failed.
+        indexes = [
+            models.Index(fields=["recording", "timestamp_ms"], name="utterance_transcribed_idx", condition=models.Q(transcription__isnull=False)),
+        ]
+
     def __str__(self):
         return f"Utterance at {self.timestamp_ms}ms ({self.duration_ms}ms long)"
 
+    def set_audio_blob(self, data):
+        # Does not save the utterance, the caller is responsible for that
+        storage = get_utterance_audio_storage()
+        self.audio_blob_size = len(data)
+        if storage is None:
+            self.audio_blob = data
+            self.audio_blob_key = None
+            return
+
+        if not self.recording_id:
+            raise ValueError("Utterance must have a recording before its audio can be stored")
+        self.audio_blob_key = storage.save(utterance_audio_key(self.recording, uuid.uuid4().hex), ContentFile(data))
+        self.audio_blob = b""
+
+    def get_audio_blob(self):
+        if not self.audio_blob_key:
+            return bytes(self.audio_blob)
+
+        storage = get_utterance_audio_storage()
+        if storage is None:
+            raise ValueError(f"Utterance {self.id} has audio in storage ({self.audio_blob_key}) but no utterance audio storage is configured")
+        with storage.open(self.audio_blob_key, "rb") as f:
+            return f.read()
+
+    def delete_audio_blob(self):
+        # Does not save the utterance, the caller is responsible for that
+        if self.audio_blob_key:
+            storage = get_utterance_audio_storage()
+            try:
+                if storage is None:
+                    raise ValueError("No utterance audio storage is configured")
+                storage.delete(self.audio_blob_key)
+            except Exception as e:
+                # The clean_up_utterance_audio command removes anything that is left behind
+                logger.warning(f"Failed to delete audio {self.audio_blob_key} for utterance {self.id}: {e}")
+            self.audio_blob_key = None
+        self.audio_blob = b""
+        self.audio_blob_size = None
+
 
 class Credentials(models.Model):
     class CredentialTypes(models.IntegerChoices):
@@ -1737,6 +1822,10 @@ class MediaBlob(models.Model):
     VALID_IMAGE_CONTENT_TYPES = [
         ("image/png", "PNG Image"),
     ]
+    # Synthesized speech is cached as raw 16-bit mono PCM at the sample rate bots play audio at (AudioOutputManager.SAMPLE_RATE). It can't be uploaded through the API.
+    VALID_SYNTHESIZED_SPEECH_CONTENT_TYPES = [
+        ("audio/L16;rate=44100", "16-bit PCM Audio (44.1 kHz)"),
+    ]
 
     OBJECT_ID_PREFIX = "blob_"
     object_id = models.CharField(max_length=32, unique=True, editable=False)
@@ -1746,7 +1835,7 @@ class MediaBlob(models.Model):
     blob = models.BinaryField()
     content_type = models.CharField(
         max_length=255,
-        choices=VALID_AUDIO_CONTENT_TYPES + VALID_VIDEO_CONTENT_TYPES + VALID_IMAGE_CONTENT_TYPES,
+        choices=VALID_AUDIO_CONTENT_TYPES + VALID_VIDEO_CONTENT_TYPES + VALID_IMAGE_CONTENT_TYPES + VALID_SYNTHESIZED_SPEECH_CONTENT_TYPES,
     )
     checksum = models.CharField(max_length=64, editable=False)  # SHA-256 hash is 64 chars
     created_at = models.DateTimeField(auto_now_add=True)
@@ -2042,6 +2131,11 @@ class WebhookTriggerTypes(models.IntegerChoices):
     CALENDAR_STATE_CHANGE = 6, "Calendar State Change"
     # add other event types here
 
+    @classmethod
+    def batchable_trigger_types(cls):
+        """Triggers that can fire many times per second, so subscriptions can opt into receiving them in batches"""
+        return [cls.TRANSCRIPT_UPDATE, cls.CHAT_MESSAGES_UPDATE, cls.PARTICIPANT_EVENTS_JOIN_LEAVE]
+
     @classmethod
     def _get_mapping(cls):
         """Get the trigger type to API code mapping"""
@@ -2086,6 +2180,8 @@ class WebhookSubscription(models.Model):
     url = models.URLField()
     triggers = models.JSONField(default=default_triggers)
     is_active = models.BooleanField(default=True)
+    # If true, deliveries for the high volume triggers are sent as a JSON array of webhook events instead of one request per event
+    batch_deliveries = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
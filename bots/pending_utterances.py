@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+# Redis counter of a recording's utterances that haven't been transcribed and haven't failed yet
+PENDING_UTTERANCES_KEY = "recording_pending_utterances:{recording_id}"
+# Refreshed with each new utterance, so the counters of finished recordings go away on their own
+PENDING_UTTERANCES_TTL = timedelta(days=1)
+# Sent on the bot's channel when the last pending utterance of one of its recordings is transcribed or fails
+UTTERANCES_TERMINATED_COMMAND = "utterances_terminated"
+
+
+def add_pending_utterance(redis_client, recording_id):
+    key = PENDING_UTTERANCES_KEY.format(recording_id=recording_id)
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.incr(key)
+    pipeline.expire(key, PENDING_UTTERANCES_TTL)
+    pipeline.execute()
+
+
+def remove_pending_utterance(redis_client, recording_id):
+    """Returns the number of pending utterances left. It can go below zero for utterances that weren't counted, for example if Redis was flushed."""
+    return redis_client.decr(PENDING_UTTERANCES_KEY.format(recording_id=recording_id))
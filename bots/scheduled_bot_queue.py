@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+# Redis sorted set of scheduled bot ids, scored by the unix time the bot should be launched at
+SCHEDULED_BOTS_KEY = "scheduled_bots"
+# Published to whenever bots are added, so that a sleeping scheduler can pick up a bot that is due sooner
+SCHEDULED_BOTS_UPDATED_CHANNEL = "scheduled_bots_updated"
+# Give the bots 5 minutes to spin up, before they join the meeting
+LAUNCH_LEAD_TIME = timedelta(minutes=5)
+
+
+def add_scheduled_bots(redis_client, bots):
+    """Adds the bots to the queue, or moves them if they are already in it. The bots must have a join_at."""
+    launch_times = {str(bot.id): (bot.join_at - LAUNCH_LEAD_TIME).timestamp() for bot in bots}
+    if not launch_times:
+        return
+
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.zadd(SCHEDULED_BOTS_KEY, launch_times)
+    pipeline.publish(SCHEDULED_BOTS_UPDATED_CHANNEL, "updated")
+    pipeline.execute()
+
+
+def next_launch_time(redis_client):
+    """Returns the unix time the next bot in the queue should be launched at, or None if the queue is empty."""
+    next_entries = redis_client.zrange(SCHEDULED_BOTS_KEY, 0, 0, withscores=True)
+    if not next_entries:
+        return None
+    return next_entries[0][1]
+
+
+def pop_due_bot_ids(redis_client, now_timestamp):
+    """Removes the bots that are due to be launched from the queue and returns their ids."""
+    due_members = redis_client.zrangebyscore(SCHEDULED_BOTS_KEY, "-inf", now_timestamp)
+    if not due_members:
+        return []
+
+    pipeline = redis_client.pipeline(transaction=False)
+    for member in due_members:
+        pipeline.zrem(SCHEDULED_BOTS_KEY, member)
+    removed = pipeline.execute()
+
+    # Another scheduler may have popped some of the bots in the meantime, only the ones removed here are ours to launch
+    return [int(member) for member, was_removed in zip(due_members, removed) if was_removed]
@@ -5,6 +5,7 @@ from dataclasses import asdict
 
 import jsonschema
 from dateutil.relativedelta import relativedelta
+from django.db.models import Prefetch
 from django.utils import timezone
 from drf_spectacular.utils import (
     OpenApiExample,
@@ -17,6 +18,7 @@ from .automatic_leave_configuration import AutomaticLeaveConfiguration
 from .models import (
     Bot,
     BotChatMessageToOptions,
+    BotEvent,
     BotEventSubTypes,
     BotEventTypes,
     BotStates,
@@ -457,6 +459,10 @@ def get_webhook_trigger_enum():
                     "description": "List of webhook trigger types",
                     "uniqueItems": True,
                 },
+                "batch_deliveries": {
+                    "type": "boolean",
+                    "description": "If true, transcript.update, chat_messages.update and participant_events.join_leave events are delivered as a JSON array of webhook events, so that a single request can carry several of them. Defaults to false.",
+                },
             },
             "required": ["url", "triggers"],
             "additionalProperties": False,
@@ -539,6 +545,12 @@ class BotChatMessageRequestSerializer(serializers.Serializer):
                         "default": 16000,
                         "description": "The sample rate of the audio to send. Can be 8000, 16000, or 24000. Defaults to 16000.",
                     },
+                    "message_format": {
+                        "type": "string",
+                        "enum": ["json", "binary"],
+                        "default": "json",
+                        "description": "The format of the audio messages. 'json' sends base64 encoded audio in JSON text frames. 'binary' sends raw PCM audio after a small fixed size header in binary frames, which avoids the base64 overhead. Defaults to 'json'.",
+                    },
                 },
                 "required": ["url"],
                 "additionalProperties": False,
@@ -647,6 +659,9 @@ class CreateBotSerializer(BotValidationMixin, serializers.Serializer):
                     "minItems": 1,
                     "uniqueItems": True,
                 },
+                "batch_deliveries": {
+                    "type": "boolean",
+                },
             },
             "required": ["url", "triggers"],
             "additionalProperties": False,
@@ -1057,6 +1072,10 @@ class CreateBotSerializer(BotValidationMixin, serializers.Serializer):
                         "type": "integer",
                         "enum": [8000, 16000, 24000],
                     },
+                    "message_format": {
+                        "type": "string",
+                        "enum": ["json", "binary"],
+                    },
                 },
                 "required": ["url"],
                 "additionalProperties": False,
@@ -1362,6 +1381,20 @@ class BotSerializer(serializers.ModelSerializer):
     join_at = serializers.DateTimeField()
     deduplication_key = serializers.CharField()
 
+    @staticmethod
+    def prefetch_related_for_serialization(queryset):
+        # Loads the events and the default recording of all the bots in the queryset up front,
+        # so that serializing a list of bots takes the same number of queries no matter how many bots there are.
+        return queryset.prefetch_related(
+            Prefetch("bot_events", queryset=BotEvent.objects.order_by("created_at")),
+            Prefetch("recordings", queryset=Recording.objects.filter(is_default_recording=True).order_by("id"), to_attr="prefetched_default_recordings"),
+        )
+
+    def default_recording_for_bot(self, obj):
+        if hasattr(obj, "prefetched_default_recordings"):
+            return obj.prefetched_default_recordings[0] if obj.prefetched_default_recordings else None
+        return Recording.objects.filter(bot=obj, is_default_recording=True).first()
+
     @extend_schema_field(
         {
             "type": "string",
@@ -1407,7 +1440,7 @@ class BotSerializer(serializers.ModelSerializer):
         }
     )
     def get_transcription_state(self, obj):
-        default_recording = Recording.objects.filter(bot=obj, is_default_recording=True).first()
+        default_recording = self.default_recording_for_bot(obj)
         if not default_recording:
             return None
 
@@ -1420,7 +1453,7 @@ class BotSerializer(serializers.ModelSerializer):
         }
     )
     def get_recording_state(self, obj):
-        default_recording = Recording.objects.filter(bot=obj, is_default_recording=True).first()
+        default_recording = self.default_recording_for_bot(obj)
         if not default_recording:
             return None
 
@@ -1,7 +1,9 @@
 from .autopay_charge_task import autopay_charge
-from .deliver_webhook_task import deliver_webhook
+from .deliver_webhook_task import deliver_webhook, deliver_webhooks
+from .flush_bot_heartbeats_task import flush_bot_heartbeats_to_db
 from .launch_scheduled_bot_task import launch_scheduled_bot
 from .process_utterance_task import process_utterance
+from .replenish_warm_bot_pod_pool_task import replenish_warm_bot_pod_pool
 from .restart_bot_pod_task import restart_bot_pod
 from .run_bot_task import run_bot
 from .sync_calendar_task import sync_calendar
@@ -11,8 +13,11 @@ __all__ = [
     "process_utterance",
     "run_bot",
     "deliver_webhook",
+    "deliver_webhooks",
     "restart_bot_pod",
     "launch_scheduled_bot",
     "sync_calendar",
     "autopay_charge",
+    "replenish_warm_bot_pod_pool",
+    "flush_bot_heartbeats_to_db",
 ]
@@ -1,46 +1,64 @@
 import logging
+import os
+import threading
+import time
 
 import requests
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
 
-from bots.models import WebhookDeliveryAttempt, WebhookDeliveryAttemptStatus, WebhookTriggerTypes
+from bots.models import WebhookDeliveryAttempt, WebhookDeliveryAttemptStatus, WebhookSecret, WebhookTriggerTypes
 from bots.webhook_utils import sign_payload
 
 logger = logging.getLogger(__name__)
 
+# One session per worker process, so that deliveries to the same host reuse keep-alive connections
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
 
-@shared_task(
-    bind=True,
-    retry_backoff=True,  # Enable exponential backoff
-    max_retries=3,
-    autoretry_for=(Exception,),
-)
-def deliver_webhook(self, delivery_id):
+# project id -> (decrypted secret, monotonic time it expires at)
+_webhook_secret_cache = {}
+
+
+def get_webhook_session():
+    global _session, _session_pid
+
+    with _session_lock:
+        # Connections can't be shared with the parent process after a fork
+        if _session is None or _session_pid != os.getpid():
+            _session = requests.Session()
+            _session_pid = os.getpid()
+        return _session
+
+
+def get_webhook_secret(project_id):
     """
-    Deliver a webhook to its destination.
+    Returns the decrypted active webhook secret for the project. Cached for WEBHOOK_SECRET_CACHE_TTL_SECONDS so that
+    we don't query and decrypt it for every delivery.
     """
-    try:
-        delivery = WebhookDeliveryAttempt.objects.get(id=delivery_id)
-    except WebhookDeliveryAttempt.DoesNotExist:
-        logger.error(f"Webhook delivery attempt {delivery_id} not found")
-        raise  # Re-raises the original exception with preserved traceback
+    cached_secret = _webhook_secret_cache.get(project_id)
+    if cached_secret and cached_secret[1] > time.monotonic():
+        return cached_secret[0]
 
-    subscription = delivery.webhook_subscription
+    active_secret = WebhookSecret.objects.filter(project_id=project_id).order_by("-created_at").first()
+    if active_secret is None:
+        raise ValueError(f"No webhook secret found for project {project_id}")
+
+    secret = active_secret.get_secret()
+    if secret is None:
+        raise ValueError(f"Webhook secret for project {project_id} could not be decrypted")
+
+    _webhook_secret_cache[project_id] = (secret, time.monotonic() + settings.WEBHOOK_SECRET_CACHE_TTL_SECONDS)
+    return secret
+
+
+def delivery_is_batched(delivery):
+    return delivery.webhook_subscription.batch_deliveries and delivery.webhook_trigger_type in WebhookTriggerTypes.batchable_trigger_types()
 
-    # If the subscription is no longer active, mark as failed and return
-    if not subscription.is_active:
-        delivery.status = WebhookDeliveryAttemptStatus.FAILURE
-        error_response = {
-            "status_code": None,  # No HTTP status since request failed
-            "error_type": "InactiveSubscription",
-            "error_message": "Webhook subscription is no longer active",
-            "request_url": subscription.url,
-        }
-        delivery.add_to_response_body_list(error_response)
-        delivery.save()
-        return
 
+def get_webhook_data(delivery):
     related_object_specific_webhook_data = {}
 
     if delivery.bot:
@@ -51,25 +69,71 @@ def deliver_webhook(self, delivery_id):
         related_object_specific_webhook_data["calendar_deduplication_key"] = delivery.calendar.deduplication_key
         related_object_specific_webhook_data["calendar_metadata"] = delivery.calendar.metadata
 
-    # Prepare the webhook payload
-    webhook_data = {
+    return {
         "idempotency_key": str(delivery.idempotency_key),
         **related_object_specific_webhook_data,
         "trigger": WebhookTriggerTypes.trigger_type_to_api_code(delivery.webhook_trigger_type),
         "data": delivery.payload,
     }
 
-    # Sign the payload
-    active_secret = subscription.project.webhook_secrets.filter().order_by("-created_at").first()
-    signature = sign_payload(webhook_data, active_secret.get_secret())
+
+def mark_deliveries_failed_for_inactive_subscription(deliveries):
+    subscription = deliveries[0].webhook_subscription
+    for delivery in deliveries:
+        delivery.status = WebhookDeliveryAttemptStatus.FAILURE
+        error_response = {
+            "status_code": None,  # No HTTP status since request failed
+            "error_type": "InactiveSubscription",
+            "error_message": "Webhook subscription is no longer active",
+            "request_url": subscription.url,
+        }
+        delivery.add_to_response_body_list(error_response)
+    save_deliveries(deliveries)
+
+
+def save_deliveries(deliveries):
+    if len(deliveries) == 1:
+        deliveries[0].save()
+        return
+
+    # bulk_update skips auto_now, so set updated_at ourselves
+    now = timezone.now()
+    for delivery in deliveries:
+        delivery.updated_at = now
+    WebhookDeliveryAttempt.objects.bulk_update(
+        deliveries,
+        ["status", "attempt_count", "last_attempt_at", "succeeded_at", "response_body_list", "updated_at"],
+    )
+
+
+def attempt_deliveries(deliveries):
+    """
+    Send the deliveries, which must all belong to the same subscription, in a single request. Batched deliveries are sent
+    as an array of webhook events, anything else must be sent on its own. Returns True if the request succeeded.
+    """
+    subscription = deliveries[0].webhook_subscription
+    is_batched = delivery_is_batched(deliveries[0])
+    if not is_batched and len(deliveries) > 1:
+        raise ValueError("Only batched deliveries can be sent in a single request")
 
     # Increment attempt counter
-    delivery.attempt_count += 1
-    delivery.last_attempt_at = timezone.now()
+    now = timezone.now()
+    for delivery in deliveries:
+        delivery.attempt_count += 1
+        delivery.last_attempt_at = now
+
+    # Prepare the webhook payload
+    if is_batched:
+        webhook_data = [get_webhook_data(delivery) for delivery in deliveries]
+    else:
+        webhook_data = get_webhook_data(deliveries[0])
 
     # Send the webhook
     try:
-        response = requests.post(
+        # Sign the payload
+        signature = sign_payload(webhook_data, get_webhook_secret(subscription.project_id))
+
+        response = get_webhook_session().post(
             subscription.url,
             json=webhook_data,
             headers={
@@ -80,40 +144,130 @@ def deliver_webhook(self, delivery_id):
             timeout=10,  # 10-second timeout
         )
 
-        # Update the delivery attempt with the response
-        delivery.response_status_code = response.status_code
-
         # Limit response body storage to prevent DB issues with large responses
         response_body = response.text[:10000]
-        delivery.add_to_response_body_list(response_body)
 
         # Check if the delivery was successful (2xx status code)
-        if 200 <= response.status_code < 300:
-            delivery.status = WebhookDeliveryAttemptStatus.SUCCESS
-            delivery.succeeded_at = timezone.now()
-            delivery.save()
-            return
+        succeeded = 200 <= response.status_code < 300
+        for delivery in deliveries:
+            delivery.response_status_code = response.status_code
+            delivery.add_to_response_body_list(response_body)
+            if succeeded:
+                delivery.status = WebhookDeliveryAttemptStatus.SUCCESS
+                delivery.succeeded_at = timezone.now()
+            else:
+                delivery.status = WebhookDeliveryAttemptStatus.FAILURE
 
-        # If we got here, the delivery failed with a non-2xx status code
-        delivery.status = WebhookDeliveryAttemptStatus.FAILURE
+    except (requests.RequestException, ValueError) as e:
+        # Handle network errors, timeouts, a missing secret, etc.
+        succeeded = False
+        for delivery in deliveries:
+            delivery.status = WebhookDeliveryAttemptStatus.FAILURE
+            error_response = {
+                "status_code": None,  # No HTTP status since request failed
+                "error_type": type(e).__name__,
+                "error_message": str(e),
+                "request_url": subscription.url,
+            }
+            delivery.add_to_response_body_list(error_response)
 
-    except requests.RequestException as e:
-        # Handle network errors, timeouts, etc.
-        delivery.status = WebhookDeliveryAttemptStatus.FAILURE
-        error_response = {
-            "status_code": None,  # No HTTP status since request failed
-            "error_type": type(e).__name__,
-            "error_message": str(e),
-            "request_url": subscription.url,
-        }
-        delivery.add_to_response_body_list(error_response)
+    save_deliveries(deliveries)
+    return succeeded
+
+
+@shared_task(
+    bind=True,
+    retry_backoff=True,  # Enable exponential backoff
+    max_retries=3,
+    autoretry_for=(Exception,),
+)
+def deliver_webhook(self, delivery_id):
+    """
+    Deliver a webhook to its destination.
+    """
+    try:
+        delivery = WebhookDeliveryAttempt.objects.get(id=delivery_id)
+    except WebhookDeliveryAttempt.DoesNotExist:
+        logger.error(f"Webhook delivery attempt {delivery_id} not found")
+        raise  # Re-raises the original exception with preserved traceback
+
+    subscription = delivery.webhook_subscription
+
+    # If the subscription is no longer active, mark as failed and return
+    if not subscription.is_active:
+        mark_deliveries_failed_for_inactive_subscription([delivery])
+        return
+
+    if attempt_deliveries([delivery]):
+        return
+
+    # Check if this was the last retry attempt
+    if delivery.attempt_count >= self.max_retries:
+        logger.error(f"Webhook delivery failed after {delivery.attempt_count} attempts. " + f"Webhook ID: {delivery.id}, URL: {subscription.url}, " + f"Event: {delivery.webhook_trigger_type}, Status: {delivery.status}")
+    else:
+        logger.info(f"Retrying webhook delivery {delivery.id} (attempt {delivery.attempt_count}/{self.max_retries})")
+        raise Exception("Retry due to failure")
+
+
+@shared_task(
+    bind=True,
+    retry_backoff=True,  # Enable exponential backoff
+    max_retries=3,
+    autoretry_for=(Exception,),
+)
+def deliver_webhooks(self, delivery_ids):
+    """
+    Deliver several webhooks that go to the same host, reusing the worker's connection to it.
+    Deliveries for subscriptions with batch_deliveries enabled are combined into as few requests as possible.
+    Failed deliveries are retried together with exponential backoff, without resending the ones that succeeded.
+    """
+    deliveries = list(WebhookDeliveryAttempt.objects.filter(id__in=delivery_ids).select_related("webhook_subscription", "bot", "calendar").order_by("id"))
+    if len(deliveries) != len(delivery_ids):
+        logger.error(f"{len(delivery_ids) - len(deliveries)} of {len(delivery_ids)} webhook delivery attempts not found")
+
+    # Split the deliveries into the requests we will send, preserving the order they were triggered in
+    requests_to_send = []
+    open_batches = {}
+    for delivery in deliveries:
+        if not delivery_is_batched(delivery):
+            requests_to_send.append([delivery])
+            continue
+        batch = open_batches.get(delivery.webhook_subscription_id)
+        if batch is None or len(batch) >= settings.WEBHOOK_MAX_BATCH_SIZE:
+            batch = []
+            open_batches[delivery.webhook_subscription_id] = batch
+            requests_to_send.append(batch)
+        batch.append(delivery)
+
+    delivery_ids_to_retry = []
+    for request_deliveries in requests_to_send:
+        subscription = request_deliveries[0].webhook_subscription
 
-    delivery.save()
+        try:
+            # If the subscription is no longer active, mark as failed and move on
+            if not subscription.is_active:
+                mark_deliveries_failed_for_inactive_subscription(request_deliveries)
+                continue
 
-    if delivery.status == WebhookDeliveryAttemptStatus.FAILURE:
-        # Check if this was the last retry attempt
-        if delivery.attempt_count >= self.max_retries:
-            logger.error(f"Webhook delivery failed after {delivery.attempt_count} attempts. " + f"Webhook ID: {delivery.id}, URL: {subscription.url}, " + f"Event: {delivery.webhook_trigger_type}, Status: {delivery.status}")
-        else:
-            logger.info(f"Retrying webhook delivery {delivery.id} (attempt {delivery.attempt_count}/{self.max_retries})")
-            raise Exception("Retry due to failure")
+            if attempt_deliveries(request_deliveries):
+                continue
+        except Exception:
+            # Like a database error saving the result. Only this request is retried, so the others aren't resent
+            logger.exception(f"Failed to deliver webhooks {[delivery.id for delivery in request_deliveries]}")
+            delivery_ids_to_retry.extend(delivery.id for delivery in request_deliveries)
+            continue
+
+        for delivery in request_deliveries:
+            # Check if this was the last retry attempt
+            if delivery.attempt_count >= self.max_retries:
+                logger.error(f"Webhook delivery failed after {delivery.attempt_count} attempts. " + f"Webhook ID: {delivery.id}, URL: {subscription.url}, " + f"Event: {delivery.webhook_trigger_type}, Status: {delivery.status}")
+            else:
+                delivery_ids_to_retry.append(delivery.id)
+
+    if delivery_ids_to_retry:
+        # The attempt counts may not have been saved when delivering raised, so the task's own retry count also limits the retries
+        if self.request.retries >= self.max_retries:
+            logger.error(f"Webhook deliveries {delivery_ids_to_retry} failed after {self.request.retries + 1} attempts")
+            return
+        logger.info(f"Retrying {len(delivery_ids_to_retry)} webhook deliveries (attempt {self.request.retries + 1}/{self.max_retries})")
+        raise self.retry(args=[delivery_ids_to_retry], countdown=2 ** (self.request.retries + 1))
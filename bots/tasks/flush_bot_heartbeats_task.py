@@ -0,0 +1,17 @@
+import logging
+
+from celery import shared_task
+
+from bots.bot_heartbeats import flush_bot_heartbeats
+from bots.bots_api_utils import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, soft_time_limit=300)
+def flush_bot_heartbeats_to_db(self):
+    """
+    Write the bot heartbeats in Redis to the database.
+    """
+    updated_count = flush_bot_heartbeats(get_redis_client())
+    logger.info(f"Flushed heartbeats for {updated_count} bots")
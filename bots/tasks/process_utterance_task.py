@@ -5,14 +5,34 @@ import time
 
 import requests
 from celery import shared_task
+from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+from bots.bots_api_utils import get_redis_client, send_sync_command
 from bots.models import Credentials, RecordingManager, TranscriptionFailureReasons, TranscriptionProviders, Utterance, WebhookTriggerTypes
-from bots.utils import pcm_to_mp3
+from bots.pending_utterances import UTTERANCES_TERMINATED_COMMAND, remove_pending_utterance
+from bots.utils import AudioFormats, encode_pcm
+from bots.utterance_transcription_queue import add_utterances_to_transcription_queue
 from bots.webhook_payloads import utterance_webhook_payload
 from bots.webhook_utils import trigger_webhook
 
+# The in-process audio formats each provider accepts for uploaded audio. Deepgram is sent the raw PCM.
+# FLAC is the cheapest to encode, Ogg Opus is the most compact. MP3 is the fallback if neither can be encoded.
+TRANSCRIPTION_PROVIDER_AUDIO_FORMATS = {
+    TranscriptionProviders.GLADIA: [AudioFormats.FLAC, AudioFormats.OGG_OPUS],
+    TranscriptionProviders.OPENAI: [AudioFormats.FLAC, AudioFormats.OGG_OPUS],
+    TranscriptionProviders.ASSEMBLY_AI: [AudioFormats.FLAC, AudioFormats.OGG_OPUS],
+    TranscriptionProviders.SARVAM: [AudioFormats.FLAC],
+    TranscriptionProviders.ELEVENLABS: [AudioFormats.FLAC, AudioFormats.OGG_OPUS],
+}
+
+
+def utterance_audio_formats(transcription_provider):
+    """The formats to try encoding utterance audio in for the provider, starting with the configured format if the provider accepts it."""
+    audio_formats = sorted(TRANSCRIPTION_PROVIDER_AUDIO_FORMATS[transcription_provider], key=lambda audio_format: audio_format != settings.UTTERANCE_AUDIO_UPLOAD_FORMAT)
+    return audio_formats + [AudioFormats.MP3]
+
 
 def is_retryable_failure(failure_data):
     return failure_data.get("reason") in [
@@ -73,29 +93,80 @@ def process_utterance(self, utterance_id):
                 utterance.save()
                 raise Exception(f"Retryable failure when transcribing utterance {utterance_id}: {failure_data}")
             else:
-                # Keep the audio blob around if it fails
-                utterance.failure_data = failure_data
-                utterance.save()
-                logger.info(f"Transcription failed for utterance {utterance_id}, failure data: {failure_data}")
+                save_utterance_transcription_failure(utterance, failure_data)
                 return
 
-        utterance.audio_blob = b""  # set the audio blob binary field to empty byte string
-        utterance.transcription = transcription
-        utterance.save()
+        save_utterance_transcription(utterance, transcription)
 
-        logger.info(f"Transcription complete for utterance {utterance_id}")
 
-        # Don't send webhook for empty transcript
-        if utterance.transcription.get("transcript"):
-            trigger_webhook(
-                webhook_trigger_type=WebhookTriggerTypes.TRANSCRIPT_UPDATE,
-                bot=recording.bot,
-                payload=utterance_webhook_payload(utterance),
-            )
+def enqueue_utterance_transcription(utterance):
+    """Queues the utterance for the transcription worker (run_transcription_worker) if it is enabled, and for a process_utterance task if not."""
+    if settings.UTTERANCE_TRANSCRIPTION_WORKER_ENABLED:
+        try:
+            add_utterances_to_transcription_queue(get_redis_client(), [utterance.id])
+            return
+        except Exception as e:
+            logger.warning(f"Failed to add utterance {utterance.id} to the transcription queue, transcribing it in a process_utterance task instead: {e}")
+
+    process_utterance.delay(utterance.id)
+
+
+def save_utterance_transcription(utterance, transcription):
+    utterance.delete_audio_blob()  # the audio is no longer needed once it has been transcribed
+    utterance.transcription = transcription
+    utterance.save()
+
+    logger.info(f"Transcription complete for utterance {utterance.id}")
+
+    # Don't send webhook for empty transcript
+    if utterance.transcription.get("transcript"):
+        trigger_webhook(
+            webhook_trigger_type=WebhookTriggerTypes.TRANSCRIPT_UPDATE,
+            bot=utterance.recording.bot,
+            payload=utterance_webhook_payload(utterance),
+        )
+
+    on_utterance_terminated(utterance)
+
+
+def save_utterance_transcription_failure(utterance, failure_data):
+    # Keep the audio blob around if it fails
+    utterance.failure_data = failure_data
+    utterance.save()
+    logger.info(f"Transcription failed for utterance {utterance.id}, failure data: {failure_data}")
+
+    on_utterance_terminated(utterance)
 
+
+def on_utterance_terminated(utterance):
+    """
+    Counts the utterance out of its recording's pending utterances. The database is only checked for utterances left to
+    transcribe once the counter reaches zero, instead of after every utterance.
+    """
+    try:
+        pending_utterance_count = remove_pending_utterance(get_redis_client(), utterance.recording_id)
+    except Exception as e:
+        logger.warning(f"Failed to update the pending utterance count for recording {utterance.recording_id}, checking the database instead: {e}")
+        pending_utterance_count = 0
+
+    if pending_utterance_count > 0:
+        return
+
+    # The recording may have ended since the utterance was loaded
+    utterance.recording.refresh_from_db(fields=["state"])
+    set_recording_transcription_complete_if_done(utterance.recording)
+
+    # Wakes up the bot if it is waiting for its utterances to finish before ending post-processing
+    try:
+        send_sync_command(utterance.recording.bot, UTTERANCES_TERMINATED_COMMAND)
+    except Exception as e:
+        logger.warning(f"Failed to notify bot {utterance.recording.bot.object_id} that its utterances are terminated: {e}")
+
+
+def set_recording_transcription_complete_if_done(recording):
     # If the recording is in a terminal state and there are no more utterances to transcribe, set the recording's transcription state to complete
-    if RecordingManager.is_terminal_state(utterance.recording.state) and Utterance.objects.filter(recording=utterance.recording, transcription__isnull=True).count() == 0:
-        RecordingManager.set_recording_transcription_complete(utterance.recording)
+    if RecordingManager.is_terminal_state(recording.state) and not Utterance.objects.filter(recording=recording, transcription__isnull=True).exists():
+        RecordingManager.set_recording_transcription_complete(recording)
 
 
 def get_transcription_via_gladia(utterance):
@@ -110,11 +181,11 @@ def get_transcription_via_gladia(utterance):
 
     upload_url = "https://api.gladia.io/v2/upload"
 
-    payload_mp3 = pcm_to_mp3(utterance.audio_blob.tobytes(), sample_rate=utterance.sample_rate)
+    audio = encode_pcm(utterance.get_audio_blob(), sample_rate=utterance.sample_rate, audio_formats=utterance_audio_formats(TranscriptionProviders.GLADIA))
     headers = {
         "x-gladia-key": gladia_credentials["api_key"],
     }
-    files = {"audio": ("file.mp3", payload_mp3, "audio/mpeg")}
+    files = {"audio": (f"file.{audio.file_extension}", audio.data, audio.content_type)}
     upload_response = requests.request("POST", upload_url, headers=headers, files=files)
 
     if upload_response.status_code == 401:
@@ -127,13 +198,7 @@ def get_transcription_via_gladia(utterance):
     audio_url = upload_response_json["audio_url"]
 
     transcribe_url = "https://api.gladia.io/v2/pre-recorded"
-    transcribe_request_body = {"audio_url": audio_url}
-    if recording.bot.gladia_enable_code_switching():
-        transcribe_request_body["enable_code_switching"] = True
-        transcribe_request_body["code_switching_config"] = {
-            "languages": recording.bot.gladia_code_switching_languages(),
-        }
-    transcribe_response = requests.request("POST", transcribe_url, headers=headers, json=transcribe_request_body)
+    transcribe_response = requests.request("POST", transcribe_url, headers=headers, json=gladia_transcribe_request_body(recording.bot, audio_url))
 
     if transcribe_response.status_code != 200 and transcribe_response.status_code != 201:
         return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "step": "transcribe_request", "status_code": transcribe_response.status_code}
@@ -159,7 +224,6 @@ def get_transcription_via_gladia(utterance):
 
         if status == "done":
             # Transcription is complete
-            transcription = result_data.get("result", {}).get("transcription", "")
             logger.info("Gladia transcription completed successfully, now deleting audio file from Gladia")
             # Delete the audio file from Gladia
             delete_response = requests.request("DELETE", result_url, headers=headers)
@@ -168,18 +232,7 @@ def get_transcription_via_gladia(utterance):
             else:
                 logger.info("Gladia delete successful")
 
-            transcription["transcript"] = transcription["full_transcript"]
-            del transcription["full_transcript"]
-
-            # Extract all words from all utterances into a flat list
-            all_words = []
-            for utterance in transcription["utterances"]:
-                if "words" in utterance:
-                    all_words.extend(utterance["words"])
-            transcription["words"] = all_words
-            del transcription["utterances"]
-
-            return transcription, None
+            return format_gladia_transcription(result_data), None
 
         elif status == "error":
             error_code = result_data.get("error_code")
@@ -199,6 +252,32 @@ def get_transcription_via_gladia(utterance):
     return None, {"reason": TranscriptionFailureReasons.TIMED_OUT, "step": "transcribe_result_poll"}
 
 
+def gladia_transcribe_request_body(bot, audio_url):
+    transcribe_request_body = {"audio_url": audio_url}
+    if bot.gladia_enable_code_switching():
+        transcribe_request_body["enable_code_switching"] = True
+        transcribe_request_body["code_switching_config"] = {
+            "languages": bot.gladia_code_switching_languages(),
+        }
+    return transcribe_request_body
+
+
+def format_gladia_transcription(result_data):
+    transcription = result_data.get("result", {}).get("transcription", "")
+    transcription["transcript"] = transcription["full_transcript"]
+    del transcription["full_transcript"]
+
+    # Extract all words from all utterances into a flat list
+    all_words = []
+    for utterance in transcription["utterances"]:
+        if "words" in utterance:
+            all_words.extend(utterance["words"])
+    transcription["words"] = all_words
+    del transcription["utterances"]
+
+    return transcription
+
+
 def get_transcription_via_deepgram(utterance):
     from deepgram import (
         DeepgramApiError,
@@ -209,7 +288,7 @@ def get_transcription_via_deepgram(utterance):
 
     recording = utterance.recording
     payload: FileSource = {
-        "buffer": utterance.audio_blob.tobytes(),
+        "buffer": utterance.get_audio_blob(),
     }
 
     deepgram_model = recording.bot.deepgram_model()
@@ -269,8 +348,8 @@ def get_transcription_via_openai(utterance):
         logger.info(f"OpenAI transcription skipped for utterance {utterance.id} because it's less than 80ms in duration")
         return {"transcript": ""}, None
 
-    # Convert PCM audio to MP3
-    payload_mp3 = pcm_to_mp3(utterance.audio_blob.tobytes(), sample_rate=utterance.sample_rate)
+    # Encode the PCM audio in a format OpenAI accepts
+    audio = encode_pcm(utterance.get_audio_blob(), sample_rate=utterance.sample_rate, audio_formats=utterance_audio_formats(TranscriptionProviders.OPENAI))
 
     # Prepare the request for OpenAI's transcription API
     base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
@@ -278,11 +357,9 @@ def get_transcription_via_openai(utterance):
     headers = {
         "Authorization": f"Bearer {openai_credentials['api_key']}",
     }
-    files = {"file": ("file.mp3", payload_mp3, "audio/mpeg"), "model": (None, recording.bot.openai_transcription_model())}
-    if recording.bot.openai_transcription_prompt():
-        files["prompt"] = (None, recording.bot.openai_transcription_prompt())
-    if recording.bot.openai_transcription_language():
-        files["language"] = (None, recording.bot.openai_transcription_language())
+    files = {"file": (f"file.{audio.file_extension}", audio.data, audio.content_type)}
+    for name, value in openai_transcription_form_data(recording.bot).items():
+        files[name] = (None, value)
     response = requests.post(url, headers=headers, files=files)
 
     if response.status_code == 401:
@@ -301,6 +378,15 @@ def get_transcription_via_openai(utterance):
     return transcription, None
 
 
+def openai_transcription_form_data(bot):
+    data = {"model": bot.openai_transcription_model()}
+    if bot.openai_transcription_prompt():
+        data["prompt"] = bot.openai_transcription_prompt()
+    if bot.openai_transcription_language():
+        data["language"] = bot.openai_transcription_language()
+    return data
+
+
 def get_transcription_via_assemblyai(utterance):
     recording = utterance.recording
     assemblyai_credentials_record = recording.bot.project.credentials.filter(credential_type=Credentials.CredentialTypes.ASSEMBLY_AI).first()
@@ -318,9 +404,9 @@ def get_transcription_via_assemblyai(utterance):
     headers = {"authorization": api_key}
     base_url = "https://api.assemblyai.com/v2"
 
-    payload_mp3 = pcm_to_mp3(utterance.audio_blob.tobytes(), sample_rate=utterance.sample_rate)
+    audio = encode_pcm(utterance.get_audio_blob(), sample_rate=utterance.sample_rate, audio_formats=utterance_audio_formats(TranscriptionProviders.ASSEMBLY_AI))
 
-    upload_response = requests.post(f"{base_url}/upload", headers=headers, data=payload_mp3)
+    upload_response = requests.post(f"{base_url}/upload", headers=headers, data=audio.data)
 
     if upload_response.status_code == 401:
         return None, {"reason": TranscriptionFailureReasons.CREDENTIALS_INVALID}
@@ -330,26 +416,8 @@ def get_transcription_via_assemblyai(utterance):
 
     upload_url = upload_response.json()["upload_url"]
 
-    data = {
-        "audio_url": upload_url,
-        "speech_model": "universal",
-    }
-
-    if recording.bot.assembly_ai_language_detection():
-        data["language_detection"] = True
-    elif recording.bot.assembly_ai_language_code():
-        data["language_code"] = recording.bot.assembly_ai_language_code()
-
-    # Add keyterms_prompt and speech_model if set
-    keyterms_prompt = recording.bot.assemblyai_keyterms_prompt()
-    if keyterms_prompt:
-        data["keyterms_prompt"] = keyterms_prompt
-    speech_model = recording.bot.assemblyai_speech_model()
-    if speech_model:
-        data["speech_model"] = speech_model
-
     url = f"{base_url}/transcript"
-    response = requests.post(url, json=data, headers=headers)
+    response = requests.post(url, json=assemblyai_transcript_request_body(recording.bot, upload_url), headers=headers)
 
     if response.status_code != 200:
         return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "status_code": response.status_code, "text": response.text}
@@ -382,32 +450,10 @@ def get_transcription_via_assemblyai(utterance):
             else:
                 logger.info("AssemblyAI delete successful")
 
-            transcript_text = transcription_result.get("text", "")
-            words = transcription_result.get("words", [])
-
-            formatted_words = []
-            if words:
-                for word in words:
-                    formatted_words.append(
-                        {
-                            "word": word["text"],
-                            "start": word["start"] / 1000.0,
-                            "end": word["end"] / 1000.0,
-                            "confidence": word["confidence"],
-                        }
-                    )
-
-            transcription = {"transcript": transcript_text, "words": formatted_words}
-            return transcription, None
+            return format_assemblyai_transcription(transcription_result), None
 
         elif transcription_result["status"] == "error":
-            error = transcription_result.get("error")
-
-            if error and "language_detection cannot be performed on files with no spoken audio" in error:
-                logger.info(f"AssemblyAI transcription skipped for utterance {utterance.id} because it did not have any spoken audio and we tried to detect language")
-                return {"transcript": "", "words": []}, None
-
-            return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "step": "transcribe_result_poll", "error": error}
+            return assemblyai_transcription_error_result(utterance, transcription_result)
 
         else:  # queued, processing
             logger.info(f"AssemblyAI transcription status: {transcription_result['status']}, waiting...")
@@ -418,6 +464,57 @@ def get_transcription_via_assemblyai(utterance):
     return None, {"reason": TranscriptionFailureReasons.TIMED_OUT, "step": "transcribe_result_poll"}
 
 
+def assemblyai_transcript_request_body(bot, upload_url):
+    data = {
+        "audio_url": upload_url,
+        "speech_model": "universal",
+    }
+
+    if bot.assembly_ai_language_detection():
+        data["language_detection"] = True
+    elif bot.assembly_ai_language_code():
+        data["language_code"] = bot.assembly_ai_language_code()
+
+    # Add keyterms_prompt and speech_model if set
+    keyterms_prompt = bot.assemblyai_keyterms_prompt()
+    if keyterms_prompt:
+        data["keyterms_prompt"] = keyterms_prompt
+    speech_model = bot.assemblyai_speech_model()
+    if speech_model:
+        data["speech_model"] = speech_model
+
+    return data
+
+
+def format_assemblyai_transcription(transcription_result):
+    transcript_text = transcription_result.get("text", "")
+    words = transcription_result.get("words", [])
+
+    formatted_words = []
+    if words:
+        for word in words:
+            formatted_words.append(
+                {
+                    "word": word["text"],
+                    "start": word["start"] / 1000.0,
+                    "end": word["end"] / 1000.0,
+                    "confidence": word["confidence"],
+                }
+            )
+
+    return {"transcript": transcript_text, "words": formatted_words}
+
+
+def assemblyai_transcription_error_result(utterance, transcription_result):
+    error = transcription_result.get("error")
+
+    if error and "language_detection cannot be performed on files with no spoken audio" in error:
+        logger.info(f"AssemblyAI transcription skipped for utterance {utterance.id} because it did not have any spoken audio and we tried to detect language")
+        return {"transcript": "", "words": []}, None
+
+    return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "step": "transcribe_result_poll", "error": error}
+
+
 def get_transcription_via_sarvam(utterance):
     recording = utterance.recording
     sarvam_credentials_record = recording.bot.project.credentials.filter(credential_type=Credentials.CredentialTypes.SARVAM).first()
@@ -443,16 +540,11 @@ def get_transcription_via_sarvam(utterance):
         return {"transcript": ""}, None
 
     # Sarvam says 16kHz sample rate works best
-    payload_mp3 = pcm_to_mp3(utterance.audio_blob.tobytes(), sample_rate=utterance.sample_rate, output_sample_rate=16000)
+    audio = encode_pcm(utterance.get_audio_blob(), sample_rate=utterance.sample_rate, audio_formats=utterance_audio_formats(TranscriptionProviders.SARVAM), output_sample_rate=16000)
 
-    files = {"file": ("audio.mp3", payload_mp3, "audio/mpeg")}
+    files = {"file": (f"audio.{audio.file_extension}", audio.data, audio.content_type)}
 
-    # Add optional parameters if configured
-    data = {}
-    if recording.bot.sarvam_language_code():
-        data["language_code"] = recording.bot.sarvam_language_code()
-    if recording.bot.sarvam_model():
-        data["model"] = recording.bot.sarvam_model()
+    data = sarvam_form_data(recording.bot)
 
     try:
         response = requests.post(base_url, headers=headers, files=files, data=data if data else None)
@@ -489,6 +581,16 @@ def get_transcription_via_sarvam(utterance):
         return None, {"reason": TranscriptionFailureReasons.INTERNAL_ERROR, "error": str(e)}
 
 
+def sarvam_form_data(bot):
+    # Add optional parameters if configured
+    data = {}
+    if bot.sarvam_language_code():
+        data["language_code"] = bot.sarvam_language_code()
+    if bot.sarvam_model():
+        data["model"] = bot.sarvam_model()
+    return data
+
+
 def get_transcription_via_elevenlabs(utterance):
     recording = utterance.recording
     elevenlabs_credentials_record = recording.bot.project.credentials.filter(credential_type=Credentials.CredentialTypes.ELEVENLABS).first()
@@ -503,8 +605,8 @@ def get_transcription_via_elevenlabs(utterance):
     if not api_key:
         return None, {"reason": TranscriptionFailureReasons.CREDENTIALS_NOT_FOUND, "error": "api_key not in credentials"}
 
-    # Convert PCM audio to MP3 for ElevenLabs
-    payload_mp3 = pcm_to_mp3(utterance.audio_blob.tobytes(), sample_rate=utterance.sample_rate)
+    # Encode the PCM audio in a format ElevenLabs accepts
+    audio = encode_pcm(utterance.get_audio_blob(), sample_rate=utterance.sample_rate, audio_formats=utterance_audio_formats(TranscriptionProviders.ELEVENLABS))
 
     # Prepare the request for ElevenLabs speech-to-text API
     url = "https://api.elevenlabs.io/v1/speech-to-text"
@@ -513,17 +615,9 @@ def get_transcription_via_elevenlabs(utterance):
     }
 
     # Prepare multipart form data
-    files = {"file": ("audio.mp3", payload_mp3, "audio/mpeg")}
+    files = {"file": (f"audio.{audio.file_extension}", audio.data, audio.content_type)}
 
-    # Add model_id if configured
-    data = {}
-    if recording.bot.elevenlabs_model_id():
-        data["model_id"] = recording.bot.elevenlabs_model_id()
-
-    if recording.bot.elevenlabs_language_code():
-        data["language_code"] = recording.bot.elevenlabs_language_code()
-
-    data["tag_audio_events"] = recording.bot.elevenlabs_tag_audio_events()
+    data = elevenlabs_form_data(recording.bot)
 
     try:
         response = requests.post(url, headers=headers, files=files, data=data if data else None)
@@ -541,18 +635,7 @@ def get_transcription_via_elevenlabs(utterance):
         result = response.json()
         logger.info("ElevenLabs transcription completed successfully")
 
-        if result.get("language_probability", 0.0) < 0.5:
-            logger.info(f"ElevenLabs transcription skipped for utterance {utterance.id} because the language probability was less than 0.5")
-            return {"transcript": "", "words": []}, None
-
-        # Extract transcript and words from the response
-        transcript_text = result.get("text", "")
-        words = list(map(lambda word: {"word": word.get("text"), "start": word.get("start"), "end": word.get("end")}, result.get("words", [])))
-
-        # Format the response to match our expected schema
-        transcription = {"transcript": transcript_text, "words": words}
-
-        return transcription, None
+        return format_elevenlabs_transcription(utterance, result), None
 
     except requests.exceptions.RequestException as e:
         logger.error(f"ElevenLabs transcription request failed: {str(e)}")
@@ -563,3 +646,29 @@ def get_transcription_via_elevenlabs(utterance):
     except Exception as e:
         logger.error(f"ElevenLabs transcription unexpected error: {str(e)}")
         return None, {"reason": TranscriptionFailureReasons.INTERNAL_ERROR, "error": str(e)}
+
+
+def elevenlabs_form_data(bot):
+    # Add model_id if configured
+    data = {}
+    if bot.elevenlabs_model_id():
+        data["model_id"] = bot.elevenlabs_model_id()
+
+    if bot.elevenlabs_language_code():
+        data["language_code"] = bot.elevenlabs_language_code()
+
+    data["tag_audio_events"] = bot.elevenlabs_tag_audio_events()
+    return data
+
+
+def format_elevenlabs_transcription(utterance, result):
+    if result.get("language_probability", 0.0) < 0.5:
+        logger.info(f"ElevenLabs transcription skipped for utterance {utterance.id} because the language probability was less than 0.5")
+        return {"transcript": "", "words": []}
+
+    # Extract transcript and words from the response
+    transcript_text = result.get("text", "")
+    words = list(map(lambda word: {"word": word.get("text"), "start": word.get("start"), "end": word.get("end")}, result.get("words", [])))
+
+    # Format the response to match our expected schema
+    return {"transcript": transcript_text, "words": words}
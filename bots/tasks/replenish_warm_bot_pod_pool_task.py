@@ -0,0 +1,47 @@
+import logging
+import uuid
+
+from celery import shared_task
+
+from bots.bot_pod_creator import BotPodCreator
+from bots.bot_pod_creator.warm_bot_pod_pool import add_starting_warm_bot_pod, remove_starting_warm_bot_pod, warm_bot_pod_pool_size, warm_bot_pods_to_create
+from bots.bots_api_utils import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+REPLENISH_LOCK_KEY = "warm_bot_pod_pool_replenish_lock"
+
+
+@shared_task(bind=True, soft_time_limit=600)
+def replenish_warm_bot_pod_pool(self):
+    """
+    Create warm bot pods until the idle and starting warm pods add up to the pool size.
+    """
+    pool_size = warm_bot_pod_pool_size()
+    if not pool_size:
+        return
+
+    redis_client = get_redis_client()
+    # Launches trigger this task concurrently, only one of them needs to create the missing pods.
+    # The lock expires with the task's time limit, in case the worker dies before releasing it.
+    if not redis_client.set(REPLENISH_LOCK_KEY, "locked", nx=True, ex=600):
+        logger.info("Warm bot pod pool is already being replenished")
+        return
+
+    try:
+        bot_pod_creator = BotPodCreator()
+        app_version = bot_pod_creator.app_version
+        num_pods_to_create = warm_bot_pods_to_create(redis_client, app_version, pool_size)
+        logger.info(f"Creating {num_pods_to_create} warm bot pods for pool of size {pool_size}")
+
+        for _ in range(num_pods_to_create):
+            pod_name = f"bot-pod-warm-{uuid.uuid4().hex[:12]}"
+            # Count the pod as starting before creating it, so it can't register as idle before it is counted
+            add_starting_warm_bot_pod(redis_client, app_version, pod_name)
+            create_pod_result = bot_pod_creator.create_warm_bot_pod(pod_name)
+            if not create_pod_result.get("created"):
+                logger.error(f"Failed to create warm bot pod {pod_name}: {create_pod_result}")
+                remove_starting_warm_bot_pod(redis_client, app_version, pod_name)
+                break
+    finally:
+        redis_client.delete(REPLENISH_LOCK_KEY)
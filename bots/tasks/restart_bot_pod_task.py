@@ -2,12 +2,16 @@ import logging
 import time
 
 from celery import shared_task
-from kubernetes import client, config
+from kubernetes import client
 
 from bots.models import Bot, BotEventTypes
 
 logger = logging.getLogger(__name__)
+from bots.bot_heartbeats import clear_bot_heartbeat
 from bots.bot_pod_creator import BotPodCreator
+from bots.bot_pod_creator.kubernetes_client import delete_pod_and_wait, get_core_v1_api
+from bots.bot_pod_creator.warm_bot_pod_pool import bot_pod_name, forget_bot_pod_name
+from bots.bots_api_utils import get_redis_client
 
 
 @shared_task(bind=True, soft_time_limit=3600)
@@ -26,47 +30,17 @@ def restart_bot_pod(self, bot_id):
         logger.info(f"Bot {bot_id} is not in JOINING state, so not restarting pod")
         return
 
-    # Initialize kubernetes client
+    # Delete the pod if it already exists, it's a warm pod if the bot was launched in one
+    redis_client = get_redis_client()
+    pod_name = bot_pod_name(redis_client, bot)
     try:
-        config.load_incluster_config()
-    except config.ConfigException:
-        config.load_kube_config()
-    v1 = client.CoreV1Api()
-    namespace = "attendee"
-
-    # Check if pod already exists with this name
-    pod_name = bot.k8s_pod_name()
-    try:
-        # Directly read the specific pod by name instead of listing all pods
-        v1.read_namespaced_pod(name=pod_name, namespace=namespace)
-
-        # Delete the pod if it exists (we'll only get here if the pod exists)
-        logger.info(f"Found existing pod {pod_name}, deleting it before creating a new one")
-        v1.delete_namespaced_pod(name=pod_name, namespace=namespace, grace_period_seconds=60)
-
-        # Sleep until the pod is no longer found
-        num_retries = 20
-        for i in range(num_retries):
-            try:
-                v1.read_namespaced_pod(name=pod_name, namespace=namespace)
-            except client.ApiException as e:
-                if e.status == 404:
-                    logger.info(f"Pod {pod_name} deleted successfully")
-                    break
-                else:
-                    logger.error(f"Error checking for existing pod: {str(e)}")
-            if i == num_retries - 1:
-                logger.error(f"Pod {pod_name} did not delete after {num_retries} retries")
-                raise Exception(f"Pod {pod_name} did not delete after {num_retries} retries")
-            time.sleep(5)
-
+        pod_deleted = delete_pod_and_wait(get_core_v1_api(), pod_name)
     except client.ApiException as e:
-        if e.status == 404:
-            # Pod doesn't exist - this is fine, just continue
-            logger.info(f"Pod {pod_name} not found, no need to delete")
-        else:
-            # Some other API error occurred
-            logger.error(f"Error checking for existing pod: {str(e)}")
+        # Some other API error occurred
+        logger.error(f"Error checking for existing pod: {str(e)}")
+        pod_deleted = True
+    if not pod_deleted:
+        raise Exception(f"Pod {pod_name} was not deleted")
 
     last_bot_event.requested_bot_action_taken_at = None
     if "pod_recreations" not in last_bot_event.metadata:
@@ -77,6 +51,11 @@ def restart_bot_pod(self, bot_id):
     bot.first_heartbeat_timestamp = None
     bot.last_heartbeat_timestamp = None
     bot.save()
+    # Otherwise the old pod's last heartbeat could be flushed to the new pod's bot
+    clear_bot_heartbeat(redis_client, bot.id)
+
+    # The new pod is not a warm pod, so it has the usual name
+    forget_bot_pod_name(redis_client, bot.id)
 
     bot_pod_creator = BotPodCreator()
     bot_pod_create_result = bot_pod_creator.create_bot_pod(bot_id=bot.id, bot_name=bot.k8s_pod_name(), bot_cpu_request=bot.cpu_request())
@@ -1,6 +1,7 @@
 import copy
 import logging
 import re
+import time
 from datetime import datetime, timedelta
 from datetime import timezone as python_timezone
 from typing import Dict, List, Optional
@@ -12,7 +13,8 @@ from celery import shared_task
 from django.db import transaction
 from django.utils import timezone
 
-from bots.bots_api_utils import delete_bot, patch_bot
+from bots.bots_api_utils import delete_bot, get_redis_client, patch_bot
+from bots.calendar_sync_planner import extend_calendar_sync_slot, release_calendar_sync_slot
 from bots.calendars_api_utils import remove_bots_from_calendar
 from bots.models import Bot, BotStates, Calendar, CalendarEvent, CalendarPlatform, CalendarStates, WebhookTriggerTypes
 from bots.utils import meeting_type_from_url
@@ -43,6 +45,14 @@ def _exception_is_404(e: Exception) -> bool:
     return False
 
 
+def _exception_is_410(e: Exception) -> bool:
+    """Check if an exception is a 410, which the calendar APIs return for an expired sync cursor."""
+    if isinstance(e, requests.HTTPError) and hasattr(e, "response") and e.response is not None:
+        return e.response.status_code == 410
+
+    return False
+
+
 def sync_bot_with_calendar_event(bot: Bot, calendar_event: CalendarEvent):
     """Sync a bot with a calendar event."""
     # If the calendar event is deleted, delete the bot
@@ -103,13 +113,37 @@ def sync_calendar(self, calendar_id):
     """Celery task to sync calendar events with a remote calendar."""
     logger.info(f"Syncing calendar {calendar_id}")
     calendar = Calendar.objects.get(id=calendar_id)
-    if calendar.platform == CalendarPlatform.GOOGLE:
-        sync_handler = GoogleCalendarSyncHandler(calendar_id)
-    elif calendar.platform == CalendarPlatform.MICROSOFT:
-        sync_handler = MicrosoftCalendarSyncHandler(calendar_id)
-    else:
-        raise ValueError(f"Unsupported calendar platform: {calendar.platform}")
-    return sync_handler.sync_events()
+    if self.request.retries > 0:
+        # Retries keep the concurrency slot the scheduler took for the first attempt, so they count against the caps too
+        try:
+            extend_calendar_sync_slot(get_redis_client(), calendar.id, calendar.platform, calendar.project.organization_id, time.time())
+        except Exception as e:
+            logger.warning(f"Failed to extend calendar sync slot for calendar {calendar_id}: {e}")
+
+    try:
+        if calendar.platform == CalendarPlatform.GOOGLE:
+            sync_handler = GoogleCalendarSyncHandler(calendar_id)
+        elif calendar.platform == CalendarPlatform.MICROSOFT:
+            sync_handler = MicrosoftCalendarSyncHandler(calendar_id)
+        else:
+            raise ValueError(f"Unsupported calendar platform: {calendar.platform}")
+        result = sync_handler.sync_events()
+    except Exception:
+        # The slot is only freed after the last attempt, a sync that Celery is going to retry still holds it
+        if self.request.retries >= self.max_retries:
+            _release_calendar_sync_slot(calendar)
+        raise
+
+    _release_calendar_sync_slot(calendar)
+    return result
+
+
+def _release_calendar_sync_slot(calendar: Calendar):
+    """Free the concurrency slot the scheduler took for syncing the calendar, so the next calendar can be synced."""
+    try:
+        release_calendar_sync_slot(get_redis_client(), calendar.id, calendar.platform, calendar.project.organization_id)
+    except Exception as e:
+        logger.warning(f"Failed to release calendar sync slot for calendar {calendar.id}: {e}")
 
 
 class CalendarAPIError(Exception):
@@ -127,10 +161,20 @@ class CalendarAPIAuthenticationError(CalendarAPIError):
 class CalendarSyncHandler:
     """Handler for syncing calendar events with a remote calendar."""
 
+    # The time window slides forward, but the changes fetched with a sync cursor only cover the window it was created for, so do a full sync at least this often
+    SYNC_CURSOR_MAX_AGE = timedelta(days=1)
+    # Refresh the access token when it has less than this long left
+    ACCESS_TOKEN_EXPIRY_MARGIN_SECONDS = 300
+    CALENDAR_EVENT_UPSERT_FIELDS = ["meeting_url", "name", "start_time", "end_time", "attendees", "raw", "is_deleted", "ical_uid", "updated_at"]
+
     def __init__(self, calendar_id: int):
         self.calendar = Calendar.objects.get(id=calendar_id)
         self.time_window_start: Optional[datetime] = None
         self.time_window_end: Optional[datetime] = None
+        # Set by _list_events and _list_changed_events to the cursor for the next sync
+        self.next_sync_cursor: Optional[str] = None
+        # Reused for all the requests in a sync, so they share connections
+        self.session = requests.Session()
 
     def _get_local_events_in_window(self) -> Dict[str, CalendarEvent]:
         """Get all local calendar events within the time window."""
@@ -139,38 +183,86 @@ class CalendarSyncHandler:
         # Return dict keyed by platform_uuid for easy lookup
         return {event.platform_uuid: event for event in local_events}
 
-    def _upsert_calendar_event(self, remote_event: dict) -> tuple[CalendarEvent, bool, bool]:
+    def _get_cached_access_token(self, credentials: dict) -> Optional[str]:
+        """Return the access token from the last refresh, if it isn't about to expire."""
+        access_token = credentials.get("access_token")
+        if access_token and credentials.get("access_token_expires_at", 0) > time.time() + self.ACCESS_TOKEN_EXPIRY_MARGIN_SECONDS:
+            return access_token
+        return None
+
+    def _cache_access_token(self, credentials: dict, token_data: dict):
+        """Store the access token with the credentials, so later syncs can reuse it until it expires."""
+        credentials["access_token"] = token_data["access_token"]
+        credentials["access_token_expires_at"] = int(time.time()) + int(token_data.get("expires_in", 3600))
+        self.calendar.set_credentials(credentials)
+
+    def _clear_cached_access_token(self):
+        """Drop the cached access token, so the next sync refreshes it."""
+        credentials = self.calendar.get_credentials()
+        if credentials and "access_token" in credentials:
+            credentials.pop("access_token")
+            credentials.pop("access_token_expires_at", None)
+            self.calendar.set_credentials(credentials)
+
+    def _get_valid_sync_cursor(self) -> Optional[str]:
+        """Return the sync cursor from the last sync, unless it's too old to cover the current time window."""
+        if not self.calendar.sync_cursor or not self.calendar.sync_cursor_created_at:
+            return None
+        if self.calendar.sync_cursor_created_at < timezone.now() - self.SYNC_CURSOR_MAX_AGE:
+            return None
+        return self.calendar.sync_cursor
+
+    def _is_removed_remote_event(self, remote_event: dict) -> bool:
+        """Whether the remote event is a deletion notice from an incremental sync, which only has the event id."""
+        return False
+
+    def _upsert_calendar_events(self, remote_events: List[dict], skip_new_events_outside_window: bool = False) -> tuple[int, int]:
         """
-        Upsert a calendar event from remote calendar data.
+        Upsert calendar events from remote calendar data in bulk.
 
         Returns:
-            tuple: (CalendarEvent instance, was_created, was_updated)
+            tuple: (created_count, updated_count)
         """
-        event_data = self._remote_event_to_calendar_event_data(remote_event)
-        platform_uuid = event_data["platform_uuid"]
-
-        try:
-            # Try to get existing event
-            local_event = CalendarEvent.objects.get(calendar=self.calendar, platform_uuid=platform_uuid)
+        # Keyed by platform_uuid, since a bulk upsert can't change the same row twice
+        events_data = {}
+        for remote_event in remote_events:
+            event_data = self._remote_event_to_calendar_event_data(remote_event)
+            events_data[event_data["platform_uuid"]] = event_data
+
+        local_events = {event.platform_uuid: event for event in CalendarEvent.objects.filter(calendar=self.calendar, platform_uuid__in=list(events_data.keys()))}
+
+        events_to_upsert = []
+        updated_local_events = []
+        for platform_uuid, event_data in events_data.items():
+            local_event = local_events.get(platform_uuid)
+
+            if local_event is None:
+                # Changes fetched with a sync cursor aren't limited to the time window
+                if skip_new_events_outside_window and (event_data["end_time"] < self.time_window_start or event_data["start_time"] >= self.time_window_end):
+                    continue
+                events_to_upsert.append(CalendarEvent(calendar=self.calendar, object_id=CalendarEvent.generate_object_id(), **event_data))
+                logger.info(f"Creating event {platform_uuid}")
+                continue
 
             # Check if raw data has changed or meeting url has changed due to changed extraction logic
             if local_event.raw == event_data["raw"] and local_event.meeting_url == event_data["meeting_url"]:
-                return local_event, False, False
+                continue
 
-            # Update the existing event
             for field, value in event_data.items():
                 setattr(local_event, field, value)
-            local_event.save()
+            updated_local_events.append(local_event)
+            # Upserted as a new instance, since bulk_create can't insert objects that already have a primary key
+            events_to_upsert.append(CalendarEvent(calendar=self.calendar, object_id=local_event.object_id, **event_data))
+            logger.info(f"Updating event {platform_uuid}")
 
-            # Sync the bots for the calendar event
-            sync_bots_for_calendar_event(local_event)
+        # Upserting on the unique constraint means an event created by a concurrent sync is updated instead of failing the sync
+        CalendarEvent.objects.bulk_create(events_to_upsert, update_conflicts=True, unique_fields=["calendar", "platform_uuid"], update_fields=self.CALENDAR_EVENT_UPSERT_FIELDS, batch_size=500)
 
-            return local_event, False, True
+        # Sync the bots for the updated calendar events
+        for local_event in updated_local_events:
+            sync_bots_for_calendar_event(local_event)
 
-        except CalendarEvent.DoesNotExist:
-            # Create new event
-            local_event = CalendarEvent.objects.create(calendar=self.calendar, **event_data)
-            return local_event, True, False
+        return len(events_to_upsert) - len(updated_local_events), len(updated_local_events)
 
     def _mark_calendar_event_as_deleted(self, local_event: CalendarEvent):
         """Mark an event as deleted in the local database."""
@@ -180,6 +272,24 @@ class CalendarSyncHandler:
         # Sync the bots for the calendar event
         sync_bots_for_calendar_event(local_event)
 
+    def _list_remote_events(self, access_token: str) -> tuple[List[dict], bool]:
+        """
+        List the events that changed since the last sync if there is a usable sync cursor, otherwise all the events in the time window.
+
+        Returns:
+            tuple: (remote events, whether only the changed events were listed)
+        """
+        sync_cursor = self._get_valid_sync_cursor()
+        if sync_cursor:
+            try:
+                return self._list_changed_events(access_token, sync_cursor), True
+            except requests.HTTPError as e:
+                if not _exception_is_410(e):
+                    raise
+                logger.info(f"Sync cursor for calendar {self.calendar.object_id} has expired, doing a full sync")
+
+        return self._list_events(access_token), False
+
     def sync_events(self) -> dict:
         """
         Main sync method that coordinates the entire sync process.
@@ -202,47 +312,46 @@ class CalendarSyncHandler:
 
             # Step 1: Pull from Remote Calendar
 
-            # Step 1a: List all events from Remote Calendar within time window
-            remote_events = self._list_events(access_token)
+            # Step 1a: List the events that changed since the last sync, or all events from Remote Calendar within time window
+            remote_events, is_incremental = self._list_remote_events(access_token)
             remote_event_ids = {event["id"] for event in remote_events}
+            removed_event_ids = {event["id"] for event in remote_events if self._is_removed_remote_event(event)}
+            remote_events = [event for event in remote_events if event["id"] not in removed_event_ids]
 
             # Start transaction
             with transaction.atomic():
-                # Step 1b: Find local events not in the remote fetch and get them individually
-                local_events = self._get_local_events_in_window()
-                local_events_missing_from_remote = set(local_events.keys()) - remote_event_ids
-
                 checked_individually_count = 0
                 deleted_count = 0
-                for missing_event_id in local_events_missing_from_remote:
-                    try:
-                        individual_remote_event = self._get_event_by_id(missing_event_id, access_token)
-                        checked_individually_count += 1
-
-                        if individual_remote_event:
-                            remote_events.append(individual_remote_event)
-                        else:
-                            # Event was deleted from Remote Calendar, mark as deleted
-                            self._mark_calendar_event_as_deleted(local_events[missing_event_id])
-                            logger.info(f"Marked event {missing_event_id} as deleted")
-                            deleted_count += 1
-                    except Exception as e:
-                        logger.error(f"Failed to check individual event {missing_event_id}: {e}")
-
-                # Step 2: Diff against local DB - upsert all Remote events
-                created_count = 0
-                updated_count = 0
 
-                for remote_event in remote_events:
-                    remote_event_id = remote_event["id"]
-                    local_event, was_created, was_updated = self._upsert_calendar_event(remote_event)
+                # Step 1b: Mark the events that were removed from Remote Calendar as deleted
+                for local_event in CalendarEvent.objects.filter(calendar=self.calendar, platform_uuid__in=removed_event_ids, is_deleted=False):
+                    self._mark_calendar_event_as_deleted(local_event)
+                    logger.info(f"Marked event {local_event.platform_uuid} as deleted")
+                    deleted_count += 1
+
+                # Step 1c: On a full sync, find local events not in the remote fetch and get them individually
+                local_events = {}
+                if not is_incremental:
+                    local_events = self._get_local_events_in_window()
+                    local_events_missing_from_remote = set(local_events.keys()) - remote_event_ids
+
+                    for missing_event_id in local_events_missing_from_remote:
+                        try:
+                            individual_remote_event = self._get_event_by_id(missing_event_id, access_token)
+                            checked_individually_count += 1
+
+                            if individual_remote_event:
+                                remote_events.append(individual_remote_event)
+                            else:
+                                # Event was deleted from Remote Calendar, mark as deleted
+                                self._mark_calendar_event_as_deleted(local_events[missing_event_id])
+                                logger.info(f"Marked event {missing_event_id} as deleted")
+                                deleted_count += 1
+                        except Exception as e:
+                            logger.error(f"Failed to check individual event {missing_event_id}: {e}")
 
-                    if was_created:
-                        created_count += 1
-                        logger.info(f"Created event {remote_event_id}")
-                    elif was_updated:
-                        updated_count += 1
-                        logger.info(f"Updated event {remote_event_id}")
+                # Step 2: Diff against local DB - upsert all Remote events
+                created_count, updated_count = self._upsert_calendar_events(remote_events, skip_new_events_outside_window=is_incremental)
 
                 # Update calendar sync success timestamp and window
                 self.calendar.last_attempted_sync_at = timezone.now()
@@ -252,10 +361,15 @@ class CalendarSyncHandler:
                 self.calendar.last_successful_sync_started_at = sync_started_at
                 self.calendar.state = CalendarStates.CONNECTED
                 self.calendar.connection_failure_data = None
+                # A cursor from an incremental sync covers the same time window as the one from the full sync it continues
+                if not is_incremental:
+                    self.calendar.sync_cursor_created_at = sync_started_at
+                self.calendar.sync_cursor = self.next_sync_cursor
                 self.calendar.save()
 
                 sync_results = {
                     "success": True,
+                    "incremental": is_incremental,
                     "created_count": created_count,
                     "updated_count": updated_count,
                     "deleted_count": deleted_count,
@@ -302,6 +416,9 @@ class CalendarSyncHandler:
             self.calendar.save()
             raise
 
+        finally:
+            self.session.close()
+
 
 class GoogleCalendarSyncHandler(CalendarSyncHandler):
     """Handler for syncing calendar events with Google Calendar API."""
@@ -316,11 +433,15 @@ class GoogleCalendarSyncHandler(CalendarSyncHandler):
         return
 
     def _get_access_token(self) -> str:
-        """Get a fresh access token using the refresh token."""
+        """Get an access token, refreshing it with the refresh token if the cached one has expired."""
         credentials = self.calendar.get_credentials()
         if not credentials:
             raise CalendarAPIAuthenticationError("No credentials found for calendar")
 
+        cached_access_token = self._get_cached_access_token(credentials)
+        if cached_access_token:
+            return cached_access_token
+
         refresh_token = credentials.get("refresh_token")
         client_secret = credentials.get("client_secret")
 
@@ -343,6 +464,7 @@ class GoogleCalendarSyncHandler(CalendarSyncHandler):
             if "access_token" not in token_data:
                 raise CalendarAPIError(f"No access_token in response. Response body: {response.json()}")
 
+            self._cache_access_token(credentials, token_data)
             return token_data["access_token"]
 
         except requests.RequestException as e:
@@ -357,27 +479,37 @@ class GoogleCalendarSyncHandler(CalendarSyncHandler):
 
         try:
             # Send the request
-            with requests.Session() as s:
-                resp = s.send(req, timeout=25)
+            resp = self.session.send(req, timeout=25)
             resp.raise_for_status()
             return resp.json()
         except requests.RequestException as e:
             self._raise_if_error_is_authentication_error(e)
+            if e.response is not None and e.response.status_code == 401:
+                # The cached access token was revoked, get a new one on the next attempt
+                self._clear_cached_access_token()
             logger.exception(f"Failed to make Google Calendar request. Response body: {e.response.json()}")
             raise e
 
     def _list_events(self, access_token: str) -> List[dict]:
         """List all events from Google Calendar within the time window."""
-        calendar_id = self.calendar.platform_uuid or "primary"
-
         # Format times for Google Calendar API (RFC3339)
         time_min = self.time_window_start.isoformat()
         time_max = self.time_window_end.isoformat()
 
+        return self._list_event_pages(access_token, {"timeMin": time_min, "timeMax": time_max})
+
+    def _list_changed_events(self, access_token: str, sync_token: str) -> List[dict]:
+        """List the events that changed since the sync token was issued. Google responds with a 410 if the sync token has expired."""
+        # The time window can't be combined with a sync token, it's implied by the request the token came from
+        return self._list_event_pages(access_token, {"syncToken": sync_token})
+
+    def _list_event_pages(self, access_token: str, window_or_sync_params: dict) -> List[dict]:
+        """List events from all the pages of a Google Calendar events request, and keep the sync token from the last page for the next sync."""
+        calendar_id = self.calendar.platform_uuid or "primary"
+
         base_url = f"https://www.googleapis.com/calendar/v3/calendars/{calendar_id}/events"
         base_params = {
-            "timeMin": time_min,
-            "timeMax": time_max,
+            **window_or_sync_params,
             "singleEvents": "true",  # Expand recurring events
             "showDeleted": "true",
             "maxResults": 2500,  # Google's max
@@ -385,6 +517,7 @@ class GoogleCalendarSyncHandler(CalendarSyncHandler):
 
         all_events = []
         next_page_token = None
+        seen_page_tokens = set()
 
         while True:
             params = dict(base_params)  # copy base params
@@ -399,7 +532,12 @@ class GoogleCalendarSyncHandler(CalendarSyncHandler):
 
             next_page_token = response_data.get("nextPageToken")
             if not next_page_token:
+                self.next_sync_cursor = response_data.get("nextSyncToken")
                 break
+            # A page token that comes back again would have us fetch the same pages forever
+            if next_page_token in seen_page_tokens:
+                raise CalendarAPIError(f"Google Calendar returned page token {next_page_token} more than once")
+            seen_page_tokens.add(next_page_token)
 
         logger.info(f"Fetched {len(all_events)} events from Google Calendar")
         return all_events
@@ -419,6 +557,10 @@ class GoogleCalendarSyncHandler(CalendarSyncHandler):
                 return None
             raise
 
+    def _is_removed_remote_event(self, google_event: dict) -> bool:
+        """Deleted events can come back with only their id and status, rather than as a full cancelled event."""
+        return google_event.get("status") == "cancelled" and "start" not in google_event
+
     def _parse_event_datetime(self, event_datetime: dict, default_tz: str = "UTC", normalize_to_utc: bool = False) -> datetime:
         """Parse Google Calendar event datetime dict (start/end)."""
         if not event_datetime:
@@ -492,7 +634,8 @@ class MicrosoftCalendarSyncHandler(CalendarSyncHandler):
     Handler for syncing calendar events with Microsoft Graph Calendar API.
 
     Notes:
-    - We use /me/calendarView to get expanded instances within a time window.
+    - We use /me/calendarView/delta to get expanded instances within a time window,
+      and follow the deltaLink it returns on later syncs to get only the changes.
     - We set Prefer: outlook.timezone="UTC" so all dateTimes are returned in UTC.
     - Microsoft rotates the refresh_token on each refresh. We update the stored
       credentials with the new refresh_token when present.
@@ -515,7 +658,7 @@ class MicrosoftCalendarSyncHandler(CalendarSyncHandler):
     # ---------------------------
     def _get_access_token(self) -> str:
         """
-        Exchange the stored refresh token for a new access token.
+        Return the cached access token, or exchange the stored refresh token for a new one.
         Microsoft returns a new refresh_token on each successful refresh.
         Persist it so we don't lose the chain.
         """
@@ -523,6 +666,10 @@ class MicrosoftCalendarSyncHandler(CalendarSyncHandler):
         if not credentials:
             raise CalendarAPIAuthenticationError("No credentials found for calendar")
 
+        cached_access_token = self._get_cached_access_token(credentials)
+        if cached_access_token:
+            return cached_access_token
+
         refresh_token = credentials.get("refresh_token")
         client_secret = credentials.get("client_secret")
         if not refresh_token or not client_secret:
@@ -548,9 +695,10 @@ class MicrosoftCalendarSyncHandler(CalendarSyncHandler):
             new_refresh = token_data.get("refresh_token")
             if new_refresh and new_refresh != refresh_token:
                 credentials["refresh_token"] = new_refresh
-                self.calendar.set_credentials(credentials)
                 logger.info("Stored rotated Microsoft refresh_token for calendar %s", self.calendar.object_id)
 
+            # Saves the rotated refresh token too
+            self._cache_access_token(credentials, token_data)
             return access_token
 
         except requests.RequestException as e:
@@ -581,12 +729,14 @@ class MicrosoftCalendarSyncHandler(CalendarSyncHandler):
 
         try:
             # Send the request
-            with requests.Session() as s:
-                resp = s.send(req, timeout=25)
+            resp = self.session.send(req, timeout=25)
             resp.raise_for_status()
             return resp.json()
         except requests.RequestException as e:
             self._raise_if_error_is_authentication_error(e)
+            if e.response is not None and e.response.status_code == 401:
+                # The cached access token was revoked, get a new one on the next attempt
+                self._clear_cached_access_token()
             logger.exception(f"Failed to make Microsoft Graph request. Response body: {e.response.json()}")
             raise e
 
@@ -611,36 +761,50 @@ class MicrosoftCalendarSyncHandler(CalendarSyncHandler):
 
     def _list_events(self, access_token: str) -> List[dict]:
         """
-        Use /me/calendarView to enumerate events (including expanded recurrences)
+        Use /me/calendarView/delta to enumerate events (including expanded recurrences)
         within the time window, with paging via @odata.nextLink.
         """
         start = self._format_dt_for_graph(self.time_window_start)
         end = self._format_dt_for_graph(self.time_window_end)
 
-        base_url = f"{self._calendar_base_url()}/calendarView"
+        base_url = f"{self._calendar_base_url()}/calendarView/delta"
         params = {
             "startDateTime": start,
             "endDateTime": end,
-            # Order helps with pagination sanity; Graph supports this on calendarView.
-            "$orderby": "start/dateTime",
-            # Keep payload lean but include what we need. We try to get the joinUrl via $expand.
-            "$select": self.CALENDAR_EVENT_SELECT_FIELDS,
-            # You can tune page size with $top (Graph may cap it). We let Graph decide for reliability.
-            # "$top": "200",
+            # Delta queries don't support $select or $orderby, so we get the full events in Graph's order.
         }
 
+        return self._list_delta_pages(base_url, access_token, params)
+
+    def _list_changed_events(self, access_token: str, delta_link: str) -> List[dict]:
+        """
+        Follow the deltaLink from the last sync to get the events that changed since then.
+        Graph responds with a 410 if the deltaLink has expired.
+        """
+        # delta_link already includes the time window and delta token
+        return self._list_delta_pages(delta_link, access_token)
+
+    def _list_delta_pages(self, url: str, access_token: str, params: dict | None = None) -> List[dict]:
+        """List events from all the pages of a delta query, and keep the @odata.deltaLink from the last page for the next sync."""
         events: list[dict] = []
-        data = self._make_graph_request(base_url, access_token, params)
+        data = self._make_graph_request(url, access_token, params)
 
         events.extend(data.get("value", []))
         next_link = data.get("@odata.nextLink")
+        seen_next_links = set()
 
         while next_link:
+            # A nextLink that comes back again would have us fetch the same pages forever
+            if next_link in seen_next_links:
+                raise CalendarAPIError(f"Microsoft Graph returned nextLink {next_link} more than once")
+            seen_next_links.add(next_link)
             # next_link already includes all parameters and skip tokens
             data = self._make_graph_request(next_link, access_token)
             events.extend(data.get("value", []))
             next_link = data.get("@odata.nextLink")
 
+        self.next_sync_cursor = data.get("@odata.deltaLink")
+
         logger.info("Fetched %d events from Microsoft Graph", len(events))
         return events
 
@@ -663,6 +827,10 @@ class MicrosoftCalendarSyncHandler(CalendarSyncHandler):
     # ---------------------------
     # Mapping helpers
     # ---------------------------
+    def _is_removed_remote_event(self, ms_event: dict) -> bool:
+        """Delta queries return deleted events as just their id and an @removed annotation."""
+        return "@removed" in ms_event
+
     def _parse_ms_datetime(self, dt_str: str, tz_name: str | None) -> datetime:
         """
         Parse Microsoft Graph dateTime strings.
@@ -0,0 +1,87 @@
+from django.core.cache import cache
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.request import Request
+
+from accounts.models import Organization
+from bots import api_key_cache
+from bots.authentication import ApiKeyAuthentication
+from bots.models import ApiKey, Project
+
+
+class ApiKeyAuthenticationCacheTest(TransactionTestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Test Org")
+        self.project = Project.objects.create(name="Test Project", organization=self.organization)
+        self.api_key, self.api_key_plain = ApiKey.create(project=self.project, name="Test API Key")
+        api_key_cache._api_key_cache.clear()
+        cache.clear()
+
+    def _authenticate(self):
+        request = Request(RequestFactory().get("/api/v1/bots", HTTP_AUTHORIZATION=f"Token {self.api_key_plain}"))
+        return ApiKeyAuthentication().authenticate(request)[1]
+
+    def test_key_is_looked_up_once(self):
+        with self.assertNumQueries(1):
+            self._authenticate()
+
+        with self.assertNumQueries(0):
+            authenticated_api_key = self._authenticate()
+
+        self.assertEqual(authenticated_api_key.id, self.api_key.id)
+        self.assertEqual(authenticated_api_key.project.id, self.project.id)
+
+    def test_cached_key_is_a_new_instance_every_time(self):
+        self._authenticate()
+
+        self.assertIsNot(self._authenticate(), self._authenticate())
+
+    def test_disabled_key_is_removed_from_cache(self):
+        self._authenticate()
+
+        self.api_key.disabled_at = timezone.now()
+        self.api_key.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self._authenticate()
+
+    def test_deleted_key_is_removed_from_cache(self):
+        self._authenticate()
+
+        self.api_key.delete()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self._authenticate()
+
+    @override_settings(API_KEY_CACHE_TTL_SECONDS=0)
+    def test_cache_can_be_disabled(self):
+        self._authenticate()
+
+        with self.assertNumQueries(1):
+            self._authenticate()
+
+    @override_settings(API_KEY_CACHE_MAX_SIZE=1)
+    def test_least_recently_used_key_is_evicted(self):
+        self._authenticate()
+        other_api_key, other_api_key_plain = ApiKey.create(project=self.project, name="Other API Key")
+        ApiKeyAuthentication().authenticate(Request(RequestFactory().get("/", HTTP_AUTHORIZATION=f"Token {other_api_key_plain}")))
+
+        with self.assertNumQueries(1):
+            self._authenticate()
+
+    @override_settings(API_KEY_DJANGO_CACHE_ENABLED=True)
+    def test_key_is_shared_through_django_cache(self):
+        self._authenticate()
+        # Simulate another process, which only has the Django cache
+        api_key_cache._api_key_cache.clear()
+
+        with self.assertNumQueries(0):
+            authenticated_api_key = self._authenticate()
+        self.assertEqual(authenticated_api_key.id, self.api_key.id)
+
+        self.api_key.delete()
+        api_key_cache._api_key_cache.clear()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self._authenticate()
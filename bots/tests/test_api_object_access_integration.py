@@ -186,9 +186,9 @@ class ApiObjectAccessIntegrationTest(TransactionTestCase):
         # API key A can access bot A's transcript
         response = self._make_authenticated_request("GET", f"/api/v1/bots/{self.bot_a.object_id}/transcript", self.api_key_a_plain)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        transcript_data = response.json()
-        self.assertEqual(len(transcript_data), 1)
-        self.assertEqual(transcript_data[0]["transcription"]["transcript"], "Hello from bot A")
+        transcript_data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(transcript_data["segments"]), 1)
+        self.assertEqual(transcript_data["segments"][0]["text"], "Hello from bot A")
 
         # API key A cannot access bot B's transcript
         response = self._make_authenticated_request("GET", f"/api/v1/bots/{self.bot_b.object_id}/transcript", self.api_key_a_plain)
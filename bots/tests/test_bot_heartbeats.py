@@ -0,0 +1,80 @@
+from unittest.mock import patch
+
+import fakeredis
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import Organization
+from bots.bot_heartbeats import BOT_HEARTBEATS_KEY, flush_bot_heartbeats, record_bot_heartbeat
+from bots.management.commands.clean_up_bots_with_heartbeat_timeout_or_that_never_launched import Command
+from bots.models import Bot, BotEventManager, BotEventTypes, BotStates, Project
+
+
+class BotHeartbeatsTest(TestCase):
+    def setUp(self):
+        self.redis_client = fakeredis.FakeRedis()
+        self.organization = Organization.objects.create(name="Test Organization")
+        self.project = Project.objects.create(name="Test Project", organization=self.organization)
+        self.now = int(timezone.now().timestamp())
+
+    def _create_bot(self, state, last_heartbeat_timestamp):
+        return Bot.objects.create(project=self.project, name="Test Bot", meeting_url="https://example.zoom.us/j/123456789", state=state, first_heartbeat_timestamp=self.now - 3600, last_heartbeat_timestamp=last_heartbeat_timestamp)
+
+    def test_flush_writes_newer_heartbeats_to_db(self):
+        running_bot = self._create_bot(BotStates.JOINED_RECORDING, self.now - 120)
+        already_flushed_bot = self._create_bot(BotStates.JOINED_RECORDING, self.now)
+        finished_bot = self._create_bot(BotStates.ENDED, self.now - 120)
+        record_bot_heartbeat(self.redis_client, running_bot.id, self.now)
+        record_bot_heartbeat(self.redis_client, already_flushed_bot.id, self.now - 60)
+        record_bot_heartbeat(self.redis_client, finished_bot.id, self.now)
+        record_bot_heartbeat(self.redis_client, 987654321, self.now)
+
+        # One query to load the bots and one to update them
+        with self.assertNumQueries(2):
+            self.assertEqual(flush_bot_heartbeats(self.redis_client), 1)
+
+        running_bot.refresh_from_db()
+        already_flushed_bot.refresh_from_db()
+        finished_bot.refresh_from_db()
+        self.assertEqual(running_bot.last_heartbeat_timestamp, self.now)
+        self.assertEqual(already_flushed_bot.last_heartbeat_timestamp, self.now)
+        self.assertEqual(finished_bot.last_heartbeat_timestamp, self.now - 120)
+        # Running bots stay in Redis, finished and deleted bots are removed
+        self.assertEqual(set(self.redis_client.hkeys(BOT_HEARTBEATS_KEY)), {str(running_bot.id).encode(), str(already_flushed_bot.id).encode()})
+
+    def test_flush_does_not_change_version(self):
+        bot = self._create_bot(BotStates.JOINED_RECORDING, self.now - 120)
+        version = bot.version
+        record_bot_heartbeat(self.redis_client, bot.id, self.now)
+
+        flush_bot_heartbeats(self.redis_client)
+
+        bot.refresh_from_db()
+        self.assertEqual(bot.version, version)
+
+    @override_settings(REDIS_BOT_HEARTBEATS_ENABLED=True)
+    def test_unflushed_heartbeat_is_used_when_bot_leaves_meeting(self):
+        bot = self._create_bot(BotStates.JOINED_RECORDING, self.now - 600)
+        record_bot_heartbeat(self.redis_client, bot.id, self.now)
+
+        with patch("bots.bot_heartbeats.get_redis_client", return_value=self.redis_client):
+            event = BotEventManager.create_event(bot=bot, event_type=BotEventTypes.FATAL_ERROR)
+
+        bot.refresh_from_db()
+        self.assertEqual(bot.last_heartbeat_timestamp, self.now)
+        self.assertEqual(event.metadata["bot_duration_seconds"], 3600)
+
+    @override_settings(REDIS_BOT_HEARTBEATS_ENABLED=True)
+    def test_heartbeat_timeout_cleanup_checks_redis(self):
+        bot_with_recent_redis_heartbeat = self._create_bot(BotStates.JOINED_RECORDING, self.now - 1200)
+        timed_out_bot = self._create_bot(BotStates.JOINED_RECORDING, self.now - 1200)
+        record_bot_heartbeat(self.redis_client, bot_with_recent_redis_heartbeat.id, self.now)
+        record_bot_heartbeat(self.redis_client, timed_out_bot.id, self.now - 900)
+
+        with patch("bots.management.commands.clean_up_bots_with_heartbeat_timeout_or_that_never_launched.get_redis_client", return_value=self.redis_client):
+            Command().terminate_bots_with_heartbeat_timeout()
+
+        bot_with_recent_redis_heartbeat.refresh_from_db()
+        timed_out_bot.refresh_from_db()
+        self.assertEqual(bot_with_recent_redis_heartbeat.state, BotStates.JOINED_RECORDING)
+        self.assertEqual(timed_out_bot.state, BotStates.FATAL_ERROR)
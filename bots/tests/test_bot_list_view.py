@@ -0,0 +1,68 @@
+import json
+
+from django.db import connection
+from django.test import Client, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+
+from accounts.models import Organization
+from bots.models import ApiKey, Bot, BotEvent, BotEventTypes, BotStates, Project, Recording, RecordingStates, RecordingTranscriptionStates, RecordingTypes, TranscriptionTypes
+
+
+class BotListViewTest(TransactionTestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Test Org", centicredits=10000)
+        self.project = Project.objects.create(name="Test Project", organization=self.organization)
+        self.api_key, self.api_key_plain = ApiKey.create(project=self.project, name="Test API Key")
+        self.client = Client()
+
+    def _create_bots(self, count):
+        for i in range(count):
+            bot = Bot.objects.create(project=self.project, name=f"Bot {i}", meeting_url=f"https://zoom.us/j/{i}", state=BotStates.JOINING)
+            Recording.objects.create(
+                bot=bot,
+                recording_type=RecordingTypes.AUDIO_AND_VIDEO,
+                transcription_type=TranscriptionTypes.NON_REALTIME,
+                is_default_recording=True,
+                state=RecordingStates.IN_PROGRESS,
+                transcription_state=RecordingTranscriptionStates.IN_PROGRESS,
+            )
+            BotEvent.objects.create(bot=bot, event_type=BotEventTypes.JOIN_REQUESTED, old_state=BotStates.READY, new_state=BotStates.JOINING)
+            BotEvent.objects.create(bot=bot, event_type=BotEventTypes.BOT_JOINED_MEETING, old_state=BotStates.JOINING, new_state=BotStates.JOINED_NOT_RECORDING)
+
+    def _list_bots(self):
+        response = self.client.get("/api/v1/bots", HTTP_AUTHORIZATION=f"Token {self.api_key_plain}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(response.content)["results"]
+
+    def test_query_count_does_not_depend_on_number_of_bots(self):
+        self._create_bots(1)
+        # Authenticate once beforehand so that both requests find the API key in the cache
+        self._list_bots()
+        with CaptureQueriesContext(connection) as single_bot_queries:
+            self.assertEqual(len(self._list_bots()), 1)
+
+        # Fill up a whole page
+        self._create_bots(24)
+        with self.assertNumQueries(len(single_bot_queries)):
+            bots = self._list_bots()
+        self.assertEqual(len(bots), 25)
+
+    def test_list_includes_events_and_default_recording_states(self):
+        self._create_bots(2)
+        # A recording that isn't the default recording should not affect the states
+        Recording.objects.create(
+            bot=Bot.objects.first(),
+            recording_type=RecordingTypes.AUDIO_ONLY,
+            transcription_type=TranscriptionTypes.NON_REALTIME,
+            is_default_recording=False,
+            state=RecordingStates.COMPLETE,
+            transcription_state=RecordingTranscriptionStates.COMPLETE,
+        )
+
+        bots = self._list_bots()
+
+        for bot in bots:
+            self.assertEqual([event["type"] for event in bot["events"]], ["join_requested", "joined_meeting"])
+            self.assertEqual(bot["recording_state"], "in_progress")
+            self.assertEqual(bot["transcription_state"], "in_progress")
@@ -279,6 +279,26 @@ class TestBotWebsocketClient(unittest.TestCase):
         expected_calls = [call(json.dumps(msg)) for msg in test_messages]
         mock_websocket.send.assert_has_calls(expected_calls)
 
+    def test_send_loop_sends_bytes_as_binary_frames(self):
+        """Test that bytes messages are sent as they are, without JSON encoding."""
+        mock_websocket = Mock()
+        self.client.websocket = mock_websocket
+        self.client.connection_state = BotWebsocketClient.CONNECTED
+
+        test_messages = [b"\x01\x01binary audio", {"type": "test", "data": "hello"}]
+        for msg in test_messages:
+            self.client.send_queue.put(msg)
+
+        def side_effect(*args):
+            if self.client.send_queue.empty():
+                self.client.connection_state = BotWebsocketClient.STOPPED
+
+        mock_websocket.send.side_effect = side_effect
+
+        self.client.send_loop()
+
+        mock_websocket.send.assert_has_calls([call(b"\x01\x01binary audio"), call(json.dumps(test_messages[1]))])
+
     def test_send_loop_handles_send_error(self):
         """Test that send loop handles websocket send errors."""
         mock_websocket = Mock()
@@ -1,12 +1,13 @@
 from datetime import timedelta
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from django.core.exceptions import ValidationError
 from django.test import TestCase
 from django.utils import timezone
 
 from accounts.models import Organization
-from bots.bots_api_utils import BotCreationSource, create_bot, create_webhook_subscription, validate_bot_concurrency_limit, validate_meeting_url_and_credentials
+from bots import bots_api_utils
+from bots.bots_api_utils import BotCreationSource, create_bot, create_webhook_subscription, send_sync_command, send_sync_commands, validate_bot_concurrency_limit, validate_meeting_url_and_credentials
 from bots.calendars_api_utils import create_calendar
 from bots.models import Bot, BotEventManager, BotEventTypes, BotStates, CalendarEvent, CalendarPlatform, Credentials, Project, TranscriptionProviders, WebhookSubscription, WebhookTriggerTypes
 
@@ -715,3 +716,43 @@ class TestConcurrentBotLimit(TestCase):
         self.assertIsNotNone(bot)
         self.assertIsNone(error)
         mock_limit.assert_called()
+
+
+class TestSendSyncCommand(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name="Test Organization")
+        self.project = Project.objects.create(name="Test Project", organization=organization)
+        self.bots = [Bot.objects.create(project=self.project, name=f"Bot {i}", meeting_url="https://zoom.us/j/123") for i in range(3)]
+
+        bots_api_utils._redis_client = None
+        bots_api_utils._redis_client_pid = None
+        self.addCleanup(setattr, bots_api_utils, "_redis_client", None)
+
+    @patch.dict("os.environ", {"REDIS_URL": "redis://localhost:6379/5"})
+    def test_redis_client_is_reused_until_fork(self):
+        client = bots_api_utils.get_redis_client()
+        self.assertIs(bots_api_utils.get_redis_client(), client)
+
+        # A forked worker gets its own connection pool
+        with patch("bots.bots_api_utils.os.getpid", return_value=-1):
+            forked_client = bots_api_utils.get_redis_client()
+        self.assertIsNot(forked_client, client)
+        self.assertIsNot(forked_client.connection_pool, client.connection_pool)
+
+    @patch("bots.bots_api_utils.get_redis_client")
+    def test_send_sync_command(self, mock_get_redis_client):
+        send_sync_command(self.bots[0], "sync_media_requests")
+
+        mock_get_redis_client.return_value.publish.assert_called_once_with(f"bot_{self.bots[0].id}", '{"command": "sync_media_requests"}')
+
+    @patch("bots.bots_api_utils.get_redis_client")
+    def test_send_sync_commands_uses_one_pipeline(self, mock_get_redis_client):
+        mock_pipeline = MagicMock()
+        mock_get_redis_client.return_value.pipeline.return_value = mock_pipeline
+
+        send_sync_commands(self.bots, "pause_recording")
+
+        mock_get_redis_client.return_value.pipeline.assert_called_once_with(transaction=False)
+        self.assertEqual([call.args for call in mock_pipeline.publish.call_args_list], [(f"bot_{bot.id}", '{"command": "pause_recording"}') for bot in self.bots])
+        mock_pipeline.execute.assert_called_once()
+        mock_get_redis_client.return_value.publish.assert_not_called()
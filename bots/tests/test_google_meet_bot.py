@@ -92,7 +92,7 @@ class TestGoogleMeetBot(TransactionTestCase):
     @patch("bots.google_meet_bot_adapter.google_meet_ui_methods.GoogleMeetUIMethods.wait_for_host_if_needed", return_value=None)
     @patch("deepgram.DeepgramClient")
     @patch("time.time")
-    @patch("bots.tasks.deliver_webhook_task.deliver_webhook")
+    @patch("bots.tasks.deliver_webhook_task.deliver_webhooks")
     def test_bot_can_join_meeting_and_record_audio_with_deepgram_transcription(
         self,
         mock_deliver_webhook,
@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+from django.test import TestCase
+
+from bots.utils import I420Scaler, I420ScalerCache, half_ceil, half_floor
+
+
+def make_i420_frame(width, height, y_value, uv_value):
+    return bytes([y_value]) * (width * height) + bytes([uv_value]) * (2 * half_ceil(width) * half_ceil(height))
+
+
+def make_random_i420_frame(width, height, seed, half=half_ceil):
+    return np.random.default_rng(seed).integers(0, 256, width * height + 2 * half(width) * half(height), dtype=np.uint8).tobytes()
+
+
+def reference_scale_i420(frame, frame_size, new_size, half=half_ceil):
+    """The per-frame implementation I420Scaler replaced, allocating every plane and the black background for each frame. With half=half_floor it is the one the Zoom adapter used."""
+    orig_width, orig_height = frame_size
+    new_width, new_height = new_size
+    uv_plane_size = half(orig_width) * half(orig_height)
+    frame = np.frombuffer(frame, dtype=np.uint8)
+    y = frame[: orig_width * orig_height].reshape(orig_height, orig_width)
+    u = frame[orig_width * orig_height : orig_width * orig_height + uv_plane_size].reshape(half(orig_height), half(orig_width))
+    v = frame[orig_width * orig_height + uv_plane_size : orig_width * orig_height + 2 * uv_plane_size].reshape(half(orig_height), half(orig_width))
+
+    input_aspect = orig_width / orig_height
+    output_aspect = new_width / new_height
+    if abs(input_aspect - output_aspect) < 1e-6:
+        scaled_y = cv2.resize(y, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+        scaled_u = cv2.resize(u, (half(new_width), half(new_height)), interpolation=cv2.INTER_LINEAR)
+        scaled_v = cv2.resize(v, (half(new_width), half(new_height)), interpolation=cv2.INTER_LINEAR)
+        return np.concatenate([scaled_y.flatten(), scaled_u.flatten(), scaled_v.flatten()]).astype(np.uint8).tobytes()
+
+    if input_aspect > output_aspect:
+        scaled_width = new_width
+        scaled_height = int(round(new_width / input_aspect))
+    else:
+        scaled_height = new_height
+        scaled_width = int(round(new_height * input_aspect))
+
+    scaled_y = cv2.resize(y, (scaled_width, scaled_height), interpolation=cv2.INTER_LINEAR)
+    scaled_u = cv2.resize(u, (half(scaled_width), half(scaled_height)), interpolation=cv2.INTER_LINEAR)
+    scaled_v = cv2.resize(v, (half(scaled_width), half(scaled_height)), interpolation=cv2.INTER_LINEAR)
+
+    final_y = np.zeros((new_height, new_width), dtype=np.uint8)
+    final_u = np.full((half(new_height), half(new_width)), 128, dtype=np.uint8)
+    final_v = np.full((half(new_height), half(new_width)), 128, dtype=np.uint8)
+
+    offset_y = (new_height - scaled_height) // 2
+    offset_x = (new_width - scaled_width) // 2
+    final_y[offset_y : offset_y + scaled_height, offset_x : offset_x + scaled_width] = scaled_y
+    final_u[offset_y // 2 : offset_y // 2 + half(scaled_height), offset_x // 2 : offset_x // 2 + half(scaled_width)] = scaled_u
+    final_v[offset_y // 2 : offset_y // 2 + half(scaled_height), offset_x // 2 : offset_x // 2 + half(scaled_width)] = scaled_v
+    return np.concatenate([final_y.flatten(), final_u.flatten(), final_v.flatten()]).astype(np.uint8).tobytes()
+
+
+class I420ScalerTest(TestCase):
+    def test_frame_with_the_same_aspect_ratio_fills_the_output(self):
+        scaled = I420Scaler((640, 360), (1280, 720)).scale(make_i420_frame(640, 360, 200, 60))
+
+        self.assertEqual(scaled, make_i420_frame(1280, 720, 200, 60))
+
+    def test_narrower_frame_is_pillarboxed_on_black(self):
+        scaled = np.frombuffer(I420Scaler((640, 480), (1280, 720)).scale(make_i420_frame(640, 480, 200, 60)), dtype=np.uint8)
+
+        y = scaled[: 1280 * 720].reshape(720, 1280)
+        u = scaled[1280 * 720 : 1280 * 720 + 640 * 360].reshape(360, 640)
+        # The 4:3 frame is scaled to 960x720 and centered, leaving 160 black columns on each side
+        self.assertTrue((y[:, :160] == 0).all())
+        self.assertTrue((y[:, 160:1120] == 200).all())
+        self.assertTrue((y[:, 1120:] == 0).all())
+        self.assertTrue((u[:, :80] == 128).all())
+        self.assertTrue((u[:, 80:560] == 60).all())
+        self.assertTrue((u[:, 560:] == 128).all())
+
+    def test_scaler_can_be_reused_for_frames_of_any_content(self):
+        for frame_size, new_size in [((640, 480), (1280, 720)), ((1280, 720), (1920, 1080)), ((720, 1280), (1280, 720)), ((321, 181), (641, 359))]:
+            with self.subTest(frame_size=frame_size, new_size=new_size):
+                scaler = I420Scaler(frame_size, new_size)
+                first_frame = make_random_i420_frame(*frame_size, seed=1)
+                second_frame = make_random_i420_frame(*frame_size, seed=2)
+
+                first = scaler.scale(first_frame)
+                second = scaler.scale(second_frame)
+
+                # Each frame only overwrites the scaled area of the canvas, and the earlier result isn't affected by later frames
+                self.assertEqual(first, reference_scale_i420(first_frame, frame_size, new_size))
+                self.assertEqual(second, reference_scale_i420(second_frame, frame_size, new_size))
+
+    def test_floor_chroma_matches_the_zoom_adapters_scaling(self):
+        for frame_size in [(640, 360), (640, 480), (321, 181)]:
+            with self.subTest(frame_size=frame_size):
+                frame = make_random_i420_frame(*frame_size, seed=3, half=half_floor)
+
+                scaled = I420Scaler(frame_size, (1280, 720), ceil_chroma=False).scale(frame)
+
+                self.assertEqual(scaled, reference_scale_i420(frame, frame_size, (1280, 720), half=half_floor))
+
+    def test_odd_dimensions_use_rounded_up_chroma_planes(self):
+        scaled = I420Scaler((321, 181), (641, 359)).scale(make_i420_frame(321, 181, 200, 60))
+
+        self.assertEqual(len(scaled), 641 * 359 + 2 * half_ceil(641) * half_ceil(359))
+
+
+class I420ScalerCacheTest(TestCase):
+    def test_scalers_are_reused_and_the_least_recently_used_one_is_evicted(self):
+        cache = I420ScalerCache(max_size=2)
+
+        scaler_360p = cache.get((640, 360), (1280, 720))
+        scaler_480p = cache.get((640, 480), (1280, 720))
+        self.assertIs(cache.get((640, 360), (1280, 720)), scaler_360p)
+
+        cache.get((1920, 1080), (1280, 720))
+
+        self.assertIs(cache.get((640, 360), (1280, 720)), scaler_360p)
+        self.assertIsNot(cache.get((640, 480), (1280, 720)), scaler_480p)
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+
+from bots.bot_controller.audio_output_manager import AudioOutputManager
+from bots.media_blob_pcm_cache import MediaBlobPCMCache, media_blob_pcm_cache_key
+
+
+class MediaBlobPCMCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.media_blob = SimpleNamespace(checksum="abc123", blob=b"mp3 data", content_type="audio/mp3")
+        self.pcm = bytes(range(256)) * 1000
+
+    @patch("bots.media_blob_pcm_cache.mp3_to_pcm")
+    def test_media_blob_is_only_decoded_the_first_time(self, mock_mp3_to_pcm):
+        mock_mp3_to_pcm.return_value = self.pcm
+        cache = MediaBlobPCMCache(directory=self.directory)
+
+        first_path = cache.get_pcm_path(self.media_blob, sample_rate=44100)
+        second_path = cache.get_pcm_path(self.media_blob, sample_rate=44100)
+
+        self.assertEqual(first_path, second_path)
+        with open(first_path, "rb") as f:
+            self.assertEqual(f.read(), self.pcm)
+        mock_mp3_to_pcm.assert_called_once_with(b"mp3 data", sample_rate=44100)
+
+        # Each sample rate is cached separately
+        cache.get_pcm_path(self.media_blob, sample_rate=16000)
+        self.assertEqual(mock_mp3_to_pcm.call_count, 2)
+
+    @patch("bots.media_blob_pcm_cache.mp3_to_pcm")
+    def test_pcm_decoded_by_another_bot_is_downloaded_from_s3(self, mock_mp3_to_pcm):
+        mock_mp3_to_pcm.return_value = self.pcm
+        s3_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, s3_directory)
+        s3_storage = FileSystemStorage(location=s3_directory)
+
+        MediaBlobPCMCache(directory=os.path.join(self.directory, "first_bot"), s3_storage=s3_storage).get_pcm_path(self.media_blob, sample_rate=44100)
+        path = MediaBlobPCMCache(directory=os.path.join(self.directory, "second_bot"), s3_storage=s3_storage).get_pcm_path(self.media_blob, sample_rate=44100)
+
+        self.assertTrue(s3_storage.exists(media_blob_pcm_cache_key(self.media_blob, 44100)))
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), self.pcm)
+        mock_mp3_to_pcm.assert_called_once()
+
+    @patch("bots.media_blob_pcm_cache.mp3_to_pcm")
+    def test_least_recently_used_files_are_evicted(self, mock_mp3_to_pcm):
+        mock_mp3_to_pcm.return_value = self.pcm
+        cache = MediaBlobPCMCache(directory=self.directory, max_size_bytes=2 * len(self.pcm))
+        media_blobs = [SimpleNamespace(checksum=f"blob{index}", blob=b"mp3 data", content_type="audio/mp3") for index in range(3)]
+
+        paths = []
+        for index, media_blob in enumerate(media_blobs):
+            paths.append(cache.get_pcm_path(media_blob, sample_rate=44100))
+            # Make the access order unambiguous regardless of the filesystem's timestamp resolution
+            os.utime(paths[-1], (index, index))
+
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertTrue(os.path.exists(paths[1]))
+        self.assertTrue(os.path.exists(paths[2]))
+
+
+class AudioOutputManagerMediaBlobTest(TestCase):
+    @patch("bots.media_blob_pcm_cache.mp3_to_pcm")
+    def test_media_blob_is_played_from_the_cache_in_chunks(self, mock_mp3_to_pcm):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        pcm = b"\x01\x02" * int(AudioOutputManager.SAMPLE_RATE * 2.5)
+        mock_mp3_to_pcm.return_value = pcm
+        play_raw_audio_callback = MagicMock()
+
+        with self.settings(MEDIA_BLOB_PCM_CACHE_DIR=directory):
+            audio_output_manager = AudioOutputManager(currently_playing_audio_media_request_finished_callback=MagicMock(), play_raw_audio_callback=play_raw_audio_callback, sleep_time_between_chunks_seconds=0)
+        audio_media_request = SimpleNamespace(media_blob=SimpleNamespace(checksum="abc123", blob=b"mp3 data", content_type="audio/mp3", duration_ms=2500))
+
+        for _ in range(2):
+            audio_output_manager.start_playing_audio_media_request(audio_media_request)
+            audio_output_manager.audio_thread.join()
+
+        chunks = [call.kwargs["bytes"] for call in play_raw_audio_callback.call_args_list]
+        # Each play sends one second chunks, and the clip was only decoded for the first play
+        self.assertEqual([len(chunk) for chunk in chunks], [88200, 88200, 44100] * 2)
+        self.assertEqual(b"".join(chunks[:3]), pcm)
+        mock_mp3_to_pcm.assert_called_once()
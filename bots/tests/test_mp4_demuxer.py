@@ -0,0 +1,127 @@
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import gi
+
+gi.require_version("Gst", "1.0")
+from django.test import TestCase
+from gi.repository import Gst
+
+from bots.zoom_bot_adapter.mp4_demuxer import MP4Demuxer
+
+
+def create_mp4_fixture(location, faststart):
+    """Encodes 3 seconds of test video and audio into an MP4, with the moov atom at the start or at the end of the file."""
+    Gst.init(None)
+    pipeline = Gst.parse_launch(f"videotestsrc num-buffers=90 ! video/x-raw,width=320,height=240,framerate=30/1 ! x264enc tune=zerolatency ! h264parse ! mp4mux name=mux faststart={'true' if faststart else 'false'} ! filesink location={location} audiotestsrc num-buffers=140 samplesperbuffer=1024 ! audio/x-raw,rate=48000,channels=1 ! audioconvert ! voaacenc ! aacparse ! mux.")
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(30 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    pipeline.set_state(Gst.State.NULL)
+    if message is None or message.type != Gst.MessageType.EOS:
+        raise Exception("Failed to create the MP4 fixture")
+
+
+class SlowRangeHandler(BaseHTTPRequestHandler):
+    """Serves the fixtures with support for range requests, a chunk at a time, slowly enough that a full download takes a while."""
+
+    protocol_version = "HTTP/1.1"
+    chunk_size = 16 * 1024
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = os.path.join(self.server.fixtures_dir, os.path.basename(self.path))
+        with open(path, "rb") as f:
+            data = f.read()
+
+        start, end = 0, len(data) - 1
+        range_match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if range_match:
+            start = int(range_match.group(1))
+            end = int(range_match.group(2)) if range_match.group(2) else end
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+
+        try:
+            for offset in range(start, end + 1, self.chunk_size):
+                self.wfile.write(data[offset : min(offset + self.chunk_size, end + 1)])
+                time.sleep(self.server.seconds_per_chunk)
+            if end == len(data) - 1:
+                self.server.last_byte_sent_at = time.time()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class MP4DemuxerTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fixtures_dir = tempfile.mkdtemp()
+        create_mp4_fixture(os.path.join(cls.fixtures_dir, "faststart.mp4"), faststart=True)
+        create_mp4_fixture(os.path.join(cls.fixtures_dir, "moov_at_end.mp4"), faststart=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.fixtures_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), SlowRangeHandler)
+        self.server.fixtures_dir = self.fixtures_dir
+        self.server.seconds_per_chunk = 0.05
+        self.server.last_byte_sent_at = None
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def _play(self, filename):
+        video_samples = []
+        audio_samples = []
+
+        def on_video_sample(pts, data):
+            video_samples.append((time.time(), pts, len(data)))
+
+        def on_audio_sample(pts, data):
+            audio_samples.append((time.time(), pts, len(data)))
+
+        demuxer = MP4Demuxer(
+            url=f"http://127.0.0.1:{self.server.server_port}/{filename}",
+            output_video_dimensions=(640, 360),
+            on_video_sample=on_video_sample,
+            on_audio_sample=on_audio_sample,
+        )
+        demuxer.start()
+        deadline = time.time() + 60
+        while demuxer.is_playing() and time.time() < deadline:
+            time.sleep(0.1)
+        demuxer.stop()
+        return video_samples, audio_samples
+
+    def test_playback_starts_before_the_download_finishes(self):
+        video_samples, audio_samples = self._play("faststart.mp4")
+
+        self.assertGreater(len(video_samples), 0)
+        self.assertGreater(len(audio_samples), 0)
+        self.assertTrue(all(size == 640 * 360 * 3 // 2 for _, _, size in video_samples))
+        # The first frames were played while the rest of the file was still being sent
+        self.assertIsNotNone(self.server.last_byte_sent_at)
+        self.assertLess(video_samples[0][0], self.server.last_byte_sent_at)
+
+    def test_mp4_with_moov_atom_at_the_end_is_played(self):
+        video_samples, audio_samples = self._play("moov_at_end.mp4")
+
+        self.assertGreater(len(video_samples), 0)
+        self.assertGreater(len(audio_samples), 0)
+        self.assertGreater(video_samples[-1][1], 2)
@@ -0,0 +1,126 @@
+import datetime
+import logging
+import time
+
+import numpy as np
+from django.test import TestCase
+
+from bots.bot_controller.per_participant_non_streaming_audio_input_manager import PerParticipantNonStreamingAudioInputManager, calculate_normalized_rms, calculate_normalized_rms_per_chunk
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+CHUNK_DURATION_MS = 10
+SAMPLES_PER_CHUNK = SAMPLE_RATE * CHUNK_DURATION_MS // 1000
+
+
+def synthetic_speech_chunks(seconds, seed):
+    """
+    Returns 10ms chunks of alternating voiced segments and pauses. Voiced segments are a harmonic series around
+    a pitch that drifts, modulated at a syllable-like rate. Pauses are low level noise.
+    """
+    rng = np.random.default_rng(seed)
+    samples = []
+    remaining_samples = seconds * SAMPLE_RATE
+    is_voiced = True
+    while remaining_samples > 0:
+        segment_samples = min(remaining_samples, int(rng.uniform(0.3, 1.5) * SAMPLE_RATE))
+        t = np.arange(segment_samples) / SAMPLE_RATE
+        noise = rng.normal(0, 30, segment_samples)
+        if is_voiced:
+            pitch = rng.uniform(100, 220) * (1 + 0.05 * np.sin(2 * np.pi * 0.5 * t))
+            phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+            harmonics = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 8))
+            syllable_envelope = 0.5 * (1 - np.cos(2 * np.pi * rng.uniform(3, 6) * t))
+            segment = 6000 * harmonics * syllable_envelope + noise
+        else:
+            segment = noise
+        samples.append(segment)
+        remaining_samples -= segment_samples
+        is_voiced = not is_voiced
+
+    pcm = np.clip(np.concatenate(samples), -32768, 32767).astype(np.int16)
+    pcm = pcm[: len(pcm) - len(pcm) % SAMPLES_PER_CHUNK]
+    return [chunk.tobytes() for chunk in pcm.reshape(-1, SAMPLES_PER_CHUNK)]
+
+
+class TestPerParticipantNonStreamingAudioInputManager(TestCase):
+    def _create_manager(self, saved_utterances):
+        return PerParticipantNonStreamingAudioInputManager(
+            save_utterance_callback=saved_utterances.append,
+            get_participant_callback=lambda speaker_id: {"participant_uuid": speaker_id},
+            sample_rate=SAMPLE_RATE,
+            utterance_size_limit=19 * 1024 * 1024,
+            silence_duration_limit=1,
+        )
+
+    def _feed_ticks(self, manager, chunks_per_speaker, start_time, process_tick):
+        # Chunks arrive interleaved between speakers, and the queue is drained every 100ms like on the GLib main loop
+        chunk_count = len(next(iter(chunks_per_speaker.values())))
+        chunks_per_tick = 100 // CHUNK_DURATION_MS
+        for tick_start in range(0, chunk_count, chunks_per_tick):
+            for chunk_index in range(tick_start, min(tick_start + chunks_per_tick, chunk_count)):
+                for speaker_id, chunks in chunks_per_speaker.items():
+                    manager.add_chunk(speaker_id, start_time + datetime.timedelta(milliseconds=CHUNK_DURATION_MS * chunk_index), chunks[chunk_index])
+            process_tick(manager)
+        manager.flush_utterances()
+
+    def _process_tick_one_chunk_at_a_time(self, manager):
+        # How process_chunks worked before silence detection was batched
+        while not manager.queue.empty():
+            speaker_id, chunk_time, chunk_bytes = manager.queue.get()
+            manager.process_chunk(speaker_id, chunk_time, chunk_bytes)
+
+        for speaker_id in list(manager.first_nonsilent_audio_time.keys()):
+            manager.process_chunk(speaker_id, datetime.datetime.utcnow(), None)
+
+    def test_rms_per_chunk_matches_rms_of_each_chunk(self):
+        chunks = synthetic_speech_chunks(seconds=2, seed=1) + [np.full(SAMPLES_PER_CHUNK * 2, 32767, dtype=np.int16).tobytes()]
+
+        np.testing.assert_allclose(calculate_normalized_rms_per_chunk(chunks), [calculate_normalized_rms(chunk_bytes) for chunk_bytes in chunks])
+
+    def test_silence_detected_in_chunks_matches_silence_detected(self):
+        chunks = synthetic_speech_chunks(seconds=5, seed=2) + [b""]
+
+        # VAD keeps state between frames, so each version gets its own manager
+        expected_manager = self._create_manager([])
+        expected_chunks_are_silent = [expected_manager.silence_detected(chunk_bytes) if chunk_bytes else True for chunk_bytes in chunks]
+        self.assertEqual(self._create_manager([]).silence_detected_in_chunks(chunks), expected_chunks_are_silent)
+        # The synthetic speech should exercise both outcomes
+        self.assertIn(True, expected_chunks_are_silent)
+        self.assertIn(False, expected_chunks_are_silent)
+
+    def test_batched_processing_produces_same_utterances(self):
+        chunks_per_speaker = {f"speaker_{i}": synthetic_speech_chunks(seconds=10, seed=10 + i) for i in range(3)}
+        # The chunks are timestamped in the future, so that the wall clock time process_chunks checks for silence never flushes an utterance
+        start_time = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+
+        expected_utterances = []
+        self._feed_ticks(self._create_manager(expected_utterances), chunks_per_speaker, start_time, self._process_tick_one_chunk_at_a_time)
+        utterances = []
+        self._feed_ticks(self._create_manager(utterances), chunks_per_speaker, start_time, lambda manager: manager.process_chunks())
+
+        self.assertGreater(len(expected_utterances), 0)
+        # Speakers are independent, so only the order of the utterances between speakers may differ
+        self.assertEqual(sorted(utterances, key=lambda utterance: (utterance["participant_uuid"], utterance["timestamp_ms"])), sorted(expected_utterances, key=lambda utterance: (utterance["participant_uuid"], utterance["timestamp_ms"])))
+
+    def test_silence_detection_microbenchmark(self):
+        """Compares silence detection one chunk at a time with the batched version, for a tick's worth of chunks from many speakers"""
+        speaker_count = 20
+        chunks = [chunk_bytes for i in range(speaker_count) for chunk_bytes in synthetic_speech_chunks(seconds=1, seed=100 + i)]
+        iterations = 20
+
+        manager = self._create_manager([])
+        start = time.perf_counter()
+        for _ in range(iterations):
+            per_chunk_result = [manager.silence_detected(chunk_bytes) for chunk_bytes in chunks]
+        per_chunk_seconds = (time.perf_counter() - start) / iterations
+
+        manager = self._create_manager([])
+        start = time.perf_counter()
+        for _ in range(iterations):
+            batched_result = manager.silence_detected_in_chunks(chunks)
+        batched_seconds = (time.perf_counter() - start) / iterations
+
+        self.assertEqual(batched_result, per_chunk_result)
+        logger.info(f"Silence detection for {len(chunks)} chunks from {speaker_count} speakers: {per_chunk_seconds * 1000:.2f}ms one chunk at a time, {batched_seconds * 1000:.2f}ms batched")
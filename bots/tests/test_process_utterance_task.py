@@ -1,7 +1,11 @@
+import io
 import uuid
 from unittest import mock
 
-from django.test import TransactionTestCase
+import fakeredis
+import numpy as np
+import soundfile
+from django.test import TestCase, TransactionTestCase, override_settings
 
 from bots.models import (
     Bot,
@@ -13,9 +17,12 @@ from bots.models import (
     RecordingStates,
     RecordingTranscriptionStates,
     TranscriptionFailureReasons,
+    TranscriptionProviders,
     Utterance,
 )
-from bots.tasks.process_utterance_task import get_transcription_via_assemblyai, get_transcription_via_deepgram, get_transcription_via_elevenlabs, get_transcription_via_gladia, get_transcription_via_openai, get_transcription_via_sarvam, process_utterance
+from bots.pending_utterances import UTTERANCES_TERMINATED_COMMAND, add_pending_utterance
+from bots.tasks.process_utterance_task import get_transcription_via_assemblyai, get_transcription_via_deepgram, get_transcription_via_elevenlabs, get_transcription_via_gladia, get_transcription_via_openai, get_transcription_via_sarvam, process_utterance, utterance_audio_formats
+from bots.utils import AudioFormats, EncodedAudio, encode_pcm, resample_pcm
 
 
 class ProcessUtteranceTaskTest(TransactionTestCase):
@@ -98,6 +105,32 @@ class ProcessUtteranceTaskTest(TransactionTestCase):
         self.assertEqual(self.utterance.transcription_attempt_count, 1)
         self.assertIsNone(self.utterance.failure_data)
 
+    # ------------------------------------------------------------------
+
+    @mock.patch("bots.tasks.process_utterance_task.RecordingManager.set_recording_transcription_complete")
+    @mock.patch("bots.tasks.process_utterance_task.get_transcription")
+    def test_recording_is_only_checked_once_the_last_pending_utterance_terminates(self, mock_get_transcription, mock_set_complete):
+        """The completion check and the bot notification wait for the pending utterance counter to reach zero."""
+        redis_client = fakeredis.FakeRedis()
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f"bot_{self.bot.id}")
+        failed_utterance = Utterance.objects.create(recording=self.recording, participant=self.participant, audio_blob=b"rawpcmbytes", timestamp_ms=1000, duration_ms=500, sample_rate=16_000)
+        add_pending_utterance(redis_client, self.recording.id)
+        add_pending_utterance(redis_client, self.recording.id)
+
+        with mock.patch("bots.tasks.process_utterance_task.get_redis_client", return_value=redis_client), mock.patch("bots.bots_api_utils.get_redis_client", return_value=redis_client):
+            mock_get_transcription.return_value = ({"transcript": "hello world"}, None)
+            self._run_task()
+            mock_set_complete.assert_not_called()
+            self.assertIsNone(pubsub.get_message())
+
+            mock_get_transcription.return_value = (None, {"reason": TranscriptionFailureReasons.CREDENTIALS_INVALID})
+            process_utterance.apply(args=[failed_utterance.id])
+
+        # The failed utterance keeps the recording's transcription from completing, but the bot is told nothing is pending
+        mock_set_complete.assert_not_called()
+        self.assertEqual(json.loads(pubsub.get_message()["data"]), {"command": UTTERANCES_TERMINATED_COMMAND})
+
 
 class BotModelRedactionSettingsTest(TransactionTestCase):
     """Unit tests for Bot model deepgram_redaction_settings method."""
@@ -688,7 +721,7 @@ class GladiaProviderTest(TransactionTestCase):
         """Upload → transcribe → poll → delete succeeds and returns formatted transcript."""
         with (
             self._patch_creds(),
-            mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3"),
+            mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg")),
             mock.patch("bots.tasks.process_utterance_task.requests.request") as m_request,
             mock.patch("bots.tasks.process_utterance_task.requests.get") as m_get,
         ):
@@ -741,7 +774,7 @@ class GladiaProviderTest(TransactionTestCase):
         """Gladia 401 on upload → CREDENTIALS_INVALID."""
         with (
             self._patch_creds(),
-            mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3"),
+            mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg")),
             mock.patch("bots.tasks.process_utterance_task.requests.request") as m_request,
         ):
             resp401 = mock.Mock(status_code=401)
@@ -804,7 +837,7 @@ class OpenAIProviderTest(TransactionTestCase):
 
     # ────────────────────────────────────────────────────────────────────────────────
     @mock.patch("bots.tasks.process_utterance_task.requests.post")
-    @mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3")
+    @mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
     def test_success_path(self, mock_pcm, mock_post):
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = {"text": "hello!"}
@@ -813,12 +846,12 @@ class OpenAIProviderTest(TransactionTestCase):
 
         self.assertIsNone(failure)
         self.assertEqual(tx, {"transcript": "hello!"})
-        mock_pcm.assert_called_once_with(b"pcm", sample_rate=16_000)
+        mock_pcm.assert_called_once_with(b"pcm", sample_rate=16_000, audio_formats=[AudioFormats.FLAC, AudioFormats.OGG_OPUS, AudioFormats.MP3])
         mock_post.assert_called_once()  # ensure request made
 
     # ────────────────────────────────────────────────────────────────────────────────
     @mock.patch("bots.tasks.process_utterance_task.requests.post")
-    @mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3")
+    @mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
     def test_invalid_credentials(self, mock_pcm, mock_post):
         mock_post.return_value.status_code = 401
         with mock.patch.object(self.creds.__class__, "get_credentials", return_value={"api_key": "bad"}):
@@ -832,7 +865,7 @@ class OpenAIProviderTest(TransactionTestCase):
 
     # ────────────────────────────────────────────────────────────────────────────────
     @mock.patch("bots.tasks.process_utterance_task.requests.post")
-    @mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3")
+    @mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
     def test_request_failure(self, mock_pcm, mock_post):
         mock_post.return_value.status_code = 500
         mock_post.return_value.text = "boom"
@@ -860,7 +893,7 @@ class OpenAIProviderTest(TransactionTestCase):
 
     # ────────────────────────────────────────────────────────────────────────────────
     @mock.patch("bots.tasks.process_utterance_task.requests.post")
-    @mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3")
+    @mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
     @mock.patch.dict("os.environ", {"OPENAI_BASE_URL": "https://custom.openai.com/v1"})
     def test_custom_base_url_from_env(self, mock_pcm, mock_post):
         mock_post.return_value.status_code = 200
@@ -877,7 +910,7 @@ class OpenAIProviderTest(TransactionTestCase):
 
     # ────────────────────────────────────────────────────────────────────────────────
     @mock.patch("bots.tasks.process_utterance_task.requests.post")
-    @mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3")
+    @mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
     @mock.patch.dict("os.environ", {"OPENAI_MODEL_NAME": "custom-model"})
     def test_custom_model_name_from_env(self, mock_pcm, mock_post):
         mock_post.return_value.status_code = 200
@@ -895,7 +928,7 @@ class OpenAIProviderTest(TransactionTestCase):
 
     # ────────────────────────────────────────────────────────────────────────────────
     @mock.patch("bots.tasks.process_utterance_task.requests.post")
-    @mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3")
+    @mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
     @mock.patch.dict("os.environ", {"OPENAI_BASE_URL": "https://custom-ai-endpoint.example.com/v1", "OPENAI_MODEL_NAME": "gpt-4-turbo-transcribe"})
     def test_both_env_vars_together(self, mock_pcm, mock_post):
         mock_post.return_value.status_code = 200
@@ -1021,7 +1054,7 @@ class AssemblyAIProviderTest(TransactionTestCase):
         """Upload → transcribe → poll succeeds and returns formatted transcript."""
         with (
             self._patch_creds(),
-            mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3"),
+            mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg")),
             mock.patch("bots.tasks.process_utterance_task.requests.post") as m_post,
             mock.patch("bots.tasks.process_utterance_task.requests.get") as m_get,
             mock.patch("bots.tasks.process_utterance_task.requests.delete") as m_delete,
@@ -1071,7 +1104,7 @@ class AssemblyAIProviderTest(TransactionTestCase):
         """AssemblyAI 401 on upload → CREDENTIALS_INVALID."""
         with (
             self._patch_creds(),
-            mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3"),
+            mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg")),
             mock.patch("bots.tasks.process_utterance_task.requests.post") as m_post,
         ):
             resp401 = mock.Mock(status_code=401)
@@ -1094,7 +1127,7 @@ class AssemblyAIProviderTest(TransactionTestCase):
         """A non-200 response when creating the transcript job is handled."""
         with (
             self._patch_creds(),
-            mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3"),
+            mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg")),
             mock.patch("bots.tasks.process_utterance_task.requests.post") as m_post,
         ):
             upload_response = mock.Mock(status_code=200)
@@ -1114,7 +1147,7 @@ class AssemblyAIProviderTest(TransactionTestCase):
         """An 'error' status during polling is handled."""
         with (
             self._patch_creds(),
-            mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3"),
+            mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg")),
             mock.patch("bots.tasks.process_utterance_task.requests.post") as m_post,
             mock.patch("bots.tasks.process_utterance_task.requests.get") as m_get,
         ):
@@ -1139,7 +1172,7 @@ class AssemblyAIProviderTest(TransactionTestCase):
         """Polling that never completes results in a TIMED_OUT failure."""
         with (
             self._patch_creds(),
-            mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3"),
+            mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg")),
             mock.patch("bots.tasks.process_utterance_task.requests.post") as m_post,
             mock.patch("bots.tasks.process_utterance_task.requests.get") as m_get,
             mock.patch("bots.tasks.process_utterance_task.time.sleep"),  # speed up test
@@ -1174,7 +1207,7 @@ class AssemblyAIProviderTest(TransactionTestCase):
         self.bot.save()
         with (
             self._patch_creds(),
-            mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3"),
+            mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg")),
             mock.patch("bots.tasks.process_utterance_task.requests.post") as m_post,
             mock.patch("bots.tasks.process_utterance_task.requests.get") as m_get,
             mock.patch("bots.tasks.process_utterance_task.requests.delete") as m_delete,
@@ -1263,7 +1296,7 @@ class SarvamProviderTest(TransactionTestCase):
         """Successful transcription returns formatted transcript."""
         with (
             self._patch_creds(),
-            mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3"),
+            mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg")),
             mock.patch("bots.tasks.process_utterance_task.requests.post") as m_post,
         ):
             success_response = mock.Mock(status_code=200)
@@ -1280,7 +1313,7 @@ class SarvamProviderTest(TransactionTestCase):
         """Sarvam 403 on request → CREDENTIALS_INVALID."""
         with (
             self._patch_creds(),
-            mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3"),
+            mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg")),
             mock.patch("bots.tasks.process_utterance_task.requests.post") as m_post,
         ):
             resp403 = mock.Mock(status_code=403)
@@ -1295,7 +1328,7 @@ class SarvamProviderTest(TransactionTestCase):
         """Sarvam 429 on request → RATE_LIMIT_EXCEEDED."""
         with (
             self._patch_creds(),
-            mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3"),
+            mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg")),
             mock.patch("bots.tasks.process_utterance_task.requests.post") as m_post,
         ):
             resp429 = mock.Mock(status_code=429)
@@ -1351,7 +1384,7 @@ class ElevenLabsProviderTest(TransactionTestCase):
     # ------------------------------------------------------------------ SUCCESS PATH
 
     @mock.patch("bots.tasks.process_utterance_task.requests.post")
-    @mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3")
+    @mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
     def test_success_path(self, mock_pcm, mock_post):
         """ElevenLabs transcription succeeds and returns formatted transcript with words."""
         with self._patch_creds():
@@ -1374,7 +1407,7 @@ class ElevenLabsProviderTest(TransactionTestCase):
             self.assertEqual(transcript["words"][1]["end"], 1.0)
 
             # Verify API call was made correctly
-            mock_pcm.assert_called_once_with(b"pcm-bytes", sample_rate=16_000)
+            mock_pcm.assert_called_once_with(b"pcm-bytes", sample_rate=16_000, audio_formats=[AudioFormats.FLAC, AudioFormats.OGG_OPUS, AudioFormats.MP3])
             mock_post.assert_called_once()
             call_args = mock_post.call_args
             # First argument is the URL
@@ -1383,7 +1416,7 @@ class ElevenLabsProviderTest(TransactionTestCase):
             self.assertEqual(call_args[1]["headers"]["xi-api-key"], "fake‑key")
 
     @mock.patch("bots.tasks.process_utterance_task.requests.post")
-    @mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3")
+    @mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
     def test_success_path_with_bot_settings(self, mock_pcm, mock_post):
         """ElevenLabs transcription succeeds with bot-specific settings applied."""
         # Configure bot with ElevenLabs settings
@@ -1420,7 +1453,7 @@ class ElevenLabsProviderTest(TransactionTestCase):
         self.assertEqual(failure["reason"], TranscriptionFailureReasons.CREDENTIALS_NOT_FOUND)
 
     @mock.patch("bots.tasks.process_utterance_task.requests.post")
-    @mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3")
+    @mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
     def test_invalid_credentials_401(self, mock_pcm, mock_post):
         """ElevenLabs returns 401 → CREDENTIALS_INVALID."""
         with self._patch_creds():
@@ -1433,7 +1466,7 @@ class ElevenLabsProviderTest(TransactionTestCase):
             self.assertEqual(failure["reason"], TranscriptionFailureReasons.CREDENTIALS_INVALID)
 
     @mock.patch("bots.tasks.process_utterance_task.requests.post")
-    @mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3")
+    @mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
     def test_request_failure_500(self, mock_pcm, mock_post):
         """ElevenLabs returns 500 → TRANSCRIPTION_REQUEST_FAILED."""
         with self._patch_creds():
@@ -1449,7 +1482,7 @@ class ElevenLabsProviderTest(TransactionTestCase):
             self.assertEqual(failure["response_text"], "Internal Server Error")
 
     @mock.patch("bots.tasks.process_utterance_task.requests.post")
-    @mock.patch("bots.tasks.process_utterance_task.pcm_to_mp3", return_value=b"mp3")
+    @mock.patch("bots.tasks.process_utterance_task.encode_pcm", return_value=EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
     def test_request_exception(self, mock_pcm, mock_post):
         """Network request exception → TRANSCRIPTION_REQUEST_FAILED."""
         with self._patch_creds():
@@ -1460,3 +1493,56 @@ class ElevenLabsProviderTest(TransactionTestCase):
             self.assertIsNone(transcript)
             self.assertEqual(failure["reason"], TranscriptionFailureReasons.INTERNAL_ERROR)
             self.assertIn("Network error", failure["error"])
+
+
+class EncodePcmTest(TestCase):
+    """Tests for encoding utterance audio before it's uploaded to a transcription provider"""
+
+    def setUp(self):
+        # One second of a 440Hz tone at 32kHz, like the audio from a meeting
+        self.sample_rate = 32000
+        self.pcm = (np.sin(2 * np.pi * 440 * np.arange(self.sample_rate) / self.sample_rate) * 8000).astype(np.int16).tobytes()
+
+    @override_settings(UTTERANCE_AUDIO_UPLOAD_FORMAT="ogg_opus")
+    def test_encodes_ogg_opus_at_a_sample_rate_opus_supports(self):
+        self.assertEqual(utterance_audio_formats(TranscriptionProviders.OPENAI), [AudioFormats.OGG_OPUS, AudioFormats.FLAC, AudioFormats.MP3])
+        audio = encode_pcm(self.pcm, sample_rate=self.sample_rate, audio_formats=utterance_audio_formats(TranscriptionProviders.OPENAI))
+
+        self.assertEqual((audio.file_extension, audio.content_type), ("ogg", "audio/ogg"))
+        # Much smaller than the PCM
+        self.assertLess(len(audio.data), len(self.pcm) / 5)
+        decoded, decoded_sample_rate = soundfile.read(io.BytesIO(audio.data), dtype="int16")
+        # Opus can't encode at 32kHz, so it's raised to 48kHz
+        self.assertEqual(decoded_sample_rate, 48000)
+        self.assertAlmostEqual(len(decoded) / decoded_sample_rate, 1.0, places=1)
+
+    def test_encodes_lossless_flac_at_the_output_sample_rate(self):
+        audio = encode_pcm(self.pcm, sample_rate=self.sample_rate, audio_formats=utterance_audio_formats(TranscriptionProviders.SARVAM), output_sample_rate=16000)
+
+        self.assertEqual((audio.file_extension, audio.content_type), ("flac", "audio/flac"))
+        decoded, decoded_sample_rate = soundfile.read(io.BytesIO(audio.data), dtype="int16")
+        self.assertEqual(decoded_sample_rate, 16000)
+        self.assertEqual(len(decoded), 16000)
+
+    def test_downsampling_filters_out_frequencies_that_would_alias(self):
+        # A 12kHz tone is above the 8kHz Nyquist frequency of 16kHz audio, without a low-pass filter it would come back as a loud 4kHz tone
+        high_tone_pcm = (np.sin(2 * np.pi * 12000 * np.arange(self.sample_rate) / self.sample_rate) * 8000).astype(np.int16).tobytes()
+
+        resampled = resample_pcm(high_tone_pcm, sample_rate=self.sample_rate, output_sample_rate=16000)
+
+        self.assertEqual(len(resampled), 16000)
+        self.assertLess(np.sqrt(np.mean(resampled.astype(np.float64) ** 2)), 100)
+        # Speech frequencies are kept
+        resampled = resample_pcm(self.pcm, sample_rate=self.sample_rate, output_sample_rate=16000)
+        self.assertAlmostEqual(np.sqrt(np.mean(resampled.astype(np.float64) ** 2)), 8000 / np.sqrt(2), delta=100)
+
+    @mock.patch("bots.utils.pcm_to_mp3", return_value=b"mp3")
+    def test_falls_back_to_mp3(self, mock_pcm_to_mp3):
+        with mock.patch("bots.utils.soundfile", None):
+            audio = encode_pcm(self.pcm, sample_rate=self.sample_rate, audio_formats=[AudioFormats.OGG_OPUS, AudioFormats.MP3])
+        self.assertEqual(audio, EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
+
+        # Audio that can't be encoded in process also falls back to MP3
+        audio = encode_pcm(b"odd", sample_rate=self.sample_rate, audio_formats=[AudioFormats.FLAC, AudioFormats.MP3])
+        self.assertEqual(audio, EncodedAudio(b"mp3", "mp3", "audio/mpeg"))
+        self.assertEqual(mock_pcm_to_mp3.call_count, 2)
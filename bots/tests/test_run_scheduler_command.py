@@ -1,12 +1,15 @@
 import signal
 from unittest.mock import patch
 
-from django.test import TestCase
+import fakeredis
+from django.test import TestCase, override_settings
 from django.utils import timezone as django_timezone
 
 from accounts.models import Organization
+from bots.calendar_sync_planner import CALENDAR_SYNC_INTERVAL, calendar_sync_offset_seconds, last_calendar_sync_slot, release_calendar_sync_slot
 from bots.management.commands.run_scheduler import Command
-from bots.models import Bot, BotStates, Calendar, CalendarPlatform, CalendarStates, Project
+from bots.models import Bot, BotStates, Calendar, CalendarEvent, CalendarPlatform, CalendarStates, Project
+from bots.scheduled_bot_queue import SCHEDULED_BOTS_KEY, add_scheduled_bots, next_launch_time, pop_due_bot_ids
 
 
 class RunSchedulerCommandTestCase(TestCase):
@@ -82,7 +85,7 @@ class RunSchedulerCommandTestCase(TestCase):
 
         command = Command()
 
-        with patch("bots.tasks.sync_calendar_task.enqueue_sync_calendar_task") as mock_enqueue:
+        with patch("bots.tasks.sync_calendar_task.enqueue_sync_calendar_task") as mock_enqueue, patch("bots.management.commands.run_scheduler.get_redis_client", return_value=fakeredis.FakeRedis()):
             with patch("django.utils.timezone.now", return_value=self.now):
                 command._run_periodic_calendar_syncs()
 
@@ -90,18 +93,21 @@ class RunSchedulerCommandTestCase(TestCase):
             mock_enqueue.assert_not_called()
 
     def test_run_periodic_calendar_syncs_handles_boundary_conditions(self):
-        """Test calendar sync with calendars exactly at the 30 min boundary"""
-        # Calendar synced exactly 30 minutes ago (should be included)
-        exactly_30_minutes_ago = self.now - django_timezone.timedelta(minutes=30)
-        calendar_boundary = Calendar.objects.create(project=self.project, platform=CalendarPlatform.GOOGLE, state=CalendarStates.CONNECTED, sync_task_enqueued_at=exactly_30_minutes_ago, client_id="test_client_id_boundary")
-
-        # Calendar synced just under 30 minutes ago (should be excluded)
-        just_under_30_minutes_ago = self.now - django_timezone.timedelta(minutes=29)
-        calendar_just_under = Calendar.objects.create(project=self.project, platform=CalendarPlatform.MICROSOFT, state=CalendarStates.CONNECTED, sync_task_enqueued_at=just_under_30_minutes_ago, client_id="test_client_id_under")
+        """Test calendar sync with calendars at the boundary of their sync slot"""
+        # Calendar synced just before its last sync slot (should be included)
+        calendar_boundary = Calendar.objects.create(project=self.project, platform=CalendarPlatform.GOOGLE, state=CalendarStates.CONNECTED, client_id="test_client_id_boundary")
+        calendar_boundary.sync_task_enqueued_at = last_calendar_sync_slot(calendar_boundary.id, self.now) - django_timezone.timedelta(seconds=1)
+        calendar_boundary.save()
+
+        # Calendar synced at its last sync slot (should be excluded)
+        calendar_just_under = Calendar.objects.create(project=self.project, platform=CalendarPlatform.MICROSOFT, state=CalendarStates.CONNECTED, client_id="test_client_id_under")
+        just_under_30_minutes_ago = last_calendar_sync_slot(calendar_just_under.id, self.now)
+        calendar_just_under.sync_task_enqueued_at = just_under_30_minutes_ago
+        calendar_just_under.save()
 
         command = Command()
 
-        with patch("bots.tasks.sync_calendar_task.sync_calendar.delay") as mock_delay:
+        with patch("bots.tasks.sync_calendar_task.sync_calendar.delay") as mock_delay, patch("bots.management.commands.run_scheduler.get_redis_client", return_value=fakeredis.FakeRedis()):
             with patch("django.utils.timezone.now", return_value=self.now):
                 command._run_periodic_calendar_syncs()
 
@@ -124,7 +130,7 @@ class RunSchedulerCommandTestCase(TestCase):
 
         command = Command()
 
-        with patch("bots.tasks.sync_calendar_task.sync_calendar.delay") as mock_delay:
+        with patch("bots.tasks.sync_calendar_task.sync_calendar.delay") as mock_delay, patch("bots.management.commands.run_scheduler.get_redis_client", return_value=fakeredis.FakeRedis()):
             with patch("django.utils.timezone.now", return_value=self.now):
                 command._run_periodic_calendar_syncs()
 
@@ -136,6 +142,45 @@ class RunSchedulerCommandTestCase(TestCase):
         self.assertEqual(calendar_with_requested_sync.sync_task_enqueued_at, self.now)
         self.assertEqual(calendar_with_requested_sync.sync_task_requested_at, None)
 
+    @override_settings(CALENDAR_SYNC_MAX_CONCURRENCY_PER_PLATFORM=10, CALENDAR_SYNC_MAX_CONCURRENCY_PER_ORGANIZATION=1)
+    def test_run_periodic_calendar_syncs_caps_concurrency_and_prioritizes_calendars_with_upcoming_bots(self):
+        """Test that only one calendar per organization is synced at once, and that calendars with bots joining soon go first"""
+        calendar_without_bots = Calendar.objects.create(project=self.project, platform=CalendarPlatform.GOOGLE, state=CalendarStates.CONNECTED, client_id="test_client_id_without_bots")
+        calendar_with_bots = Calendar.objects.create(project=self.project, platform=CalendarPlatform.GOOGLE, state=CalendarStates.CONNECTED, client_id="test_client_id_with_bots")
+        calendar_event = CalendarEvent.objects.create(calendar=calendar_with_bots, platform_uuid="event_1", start_time=self.join_at_too_early, end_time=self.join_at_too_early + django_timezone.timedelta(hours=1), raw={})
+        Bot.objects.create(project=self.project, name="Calendar Bot", meeting_url="https://example.zoom.us/j/123456789", state=BotStates.SCHEDULED, join_at=self.join_at_too_early, calendar_event=calendar_event)
+
+        other_organization = Organization.objects.create(name="Other Organization")
+        other_project = Project.objects.create(name="Other Project", organization=other_organization)
+        other_organization_calendar = Calendar.objects.create(project=other_project, platform=CalendarPlatform.GOOGLE, state=CalendarStates.CONNECTED, client_id="test_client_id_other_organization")
+
+        redis_client = fakeredis.FakeRedis()
+        command = Command()
+
+        with patch("bots.tasks.sync_calendar_task.sync_calendar.delay") as mock_delay, patch("bots.management.commands.run_scheduler.get_redis_client", return_value=redis_client):
+            with patch("django.utils.timezone.now", return_value=self.now):
+                command._run_periodic_calendar_syncs()
+
+            self.assertEqual(sorted(call.args[0] for call in mock_delay.call_args_list), sorted([calendar_with_bots.id, other_organization_calendar.id]))
+
+            # The deferred calendar is synced once the sync for its organization has finished
+            mock_delay.reset_mock()
+            release_calendar_sync_slot(redis_client, calendar_with_bots.id, CalendarPlatform.GOOGLE, self.organization.id)
+            with patch("django.utils.timezone.now", return_value=self.now):
+                command._run_periodic_calendar_syncs()
+
+            mock_delay.assert_called_once_with(calendar_without_bots.id)
+
+    def test_calendar_sync_slots_are_spread_across_the_interval(self):
+        """Test that each calendar is synced once per interval, at an offset that depends only on its id"""
+        offsets = {calendar_sync_offset_seconds(calendar_id) for calendar_id in range(1, 101)}
+        self.assertGreater(len(offsets), 90)
+        self.assertTrue(all(0 <= offset < CALENDAR_SYNC_INTERVAL.total_seconds() for offset in offsets))
+
+        last_slot = last_calendar_sync_slot(1, self.now)
+        self.assertEqual(last_calendar_sync_slot(1, last_slot + CALENDAR_SYNC_INTERVAL - django_timezone.timedelta(seconds=1)), last_slot)
+        self.assertEqual(last_calendar_sync_slot(1, last_slot + CALENDAR_SYNC_INTERVAL), last_slot + CALENDAR_SYNC_INTERVAL)
+
     def test_run_autopay_tasks_enqueues_eligible_organizations(self):
         """Test that _run_autopay_tasks finds and enqueues autopay tasks for eligible organizations"""
         # Create organization eligible for autopay
@@ -208,3 +253,66 @@ class RunSchedulerCommandTestCase(TestCase):
 
             # Verify only the organization with old charge task had an autopay task enqueued
             mock_delay.assert_called_once_with(old_charge_org.id)
+
+
+class ScheduledBotQueueTestCase(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Test Organization", centicredits=10000)
+        self.project = Project.objects.create(name="Test Project", organization=self.organization)
+        self.redis_client = fakeredis.FakeRedis()
+        self.now = django_timezone.now().replace(microsecond=0)
+
+    def _create_scheduled_bot(self, join_at, state=BotStates.SCHEDULED):
+        return Bot.objects.create(project=self.project, name="Scheduled Bot", meeting_url="https://example.zoom.us/j/123456789", state=state, join_at=join_at)
+
+    def test_bots_are_queued_by_launch_time(self):
+        later_bot = self._create_scheduled_bot(self.now + django_timezone.timedelta(minutes=20))
+        sooner_bot = self._create_scheduled_bot(self.now + django_timezone.timedelta(minutes=10))
+
+        add_scheduled_bots(self.redis_client, [later_bot, sooner_bot])
+
+        # Bots are launched 5 minutes before they join
+        self.assertEqual(next_launch_time(self.redis_client), (self.now + django_timezone.timedelta(minutes=5)).timestamp())
+        self.assertEqual(pop_due_bot_ids(self.redis_client, (self.now + django_timezone.timedelta(minutes=5)).timestamp()), [sooner_bot.id])
+        self.assertEqual(pop_due_bot_ids(self.redis_client, (self.now + django_timezone.timedelta(minutes=5)).timestamp()), [])
+        self.assertEqual(self.redis_client.zcard(SCHEDULED_BOTS_KEY), 1)
+
+    def test_rescheduling_a_bot_moves_it(self):
+        bot = self._create_scheduled_bot(self.now + django_timezone.timedelta(minutes=10))
+        add_scheduled_bots(self.redis_client, [bot])
+
+        bot.join_at = self.now + django_timezone.timedelta(hours=1)
+        add_scheduled_bots(self.redis_client, [bot])
+
+        self.assertEqual(self.redis_client.zcard(SCHEDULED_BOTS_KEY), 1)
+        self.assertEqual(next_launch_time(self.redis_client), (self.now + django_timezone.timedelta(minutes=55)).timestamp())
+
+    def test_next_launch_time_of_empty_queue(self):
+        self.assertIsNone(next_launch_time(self.redis_client))
+
+    def test_launch_due_scheduled_bots_launches_due_bots_in_one_batch(self):
+        due_bots = [self._create_scheduled_bot(self.now + django_timezone.timedelta(minutes=3)) for _ in range(3)]
+        # Still in the queue, but was launched by the polling scheduler in the meantime
+        already_launched_bot = self._create_scheduled_bot(self.now + django_timezone.timedelta(minutes=3), state=BotStates.JOINING)
+        not_due_bot = self._create_scheduled_bot(self.now + django_timezone.timedelta(minutes=30))
+        add_scheduled_bots(self.redis_client, due_bots + [already_launched_bot, not_due_bot])
+
+        with patch("bots.management.commands.run_scheduler.group") as mock_group:
+            with patch("django.utils.timezone.now", return_value=self.now):
+                Command()._launch_due_scheduled_bots(self.redis_client)
+
+        mock_group.assert_called_once()
+        launched_signatures = list(mock_group.call_args.args[0])
+        self.assertEqual(sorted(signature.args for signature in launched_signatures), sorted((bot.id, bot.join_at.isoformat()) for bot in due_bots))
+        mock_group.return_value.apply_async.assert_called_once()
+        # Only the bot that isn't due yet stays queued
+        self.assertEqual(self.redis_client.zrange(SCHEDULED_BOTS_KEY, 0, -1), [str(not_due_bot.id).encode()])
+
+    def test_enqueue_upcoming_scheduled_bots_adds_bots_missing_from_queue(self):
+        upcoming_bot = self._create_scheduled_bot(self.now + django_timezone.timedelta(minutes=6))
+        self._create_scheduled_bot(self.now + django_timezone.timedelta(hours=2))
+
+        with patch("django.utils.timezone.now", return_value=self.now):
+            Command()._enqueue_upcoming_scheduled_bots(self.redis_client, interval=60)
+
+        self.assertEqual(self.redis_client.zrange(SCHEDULED_BOTS_KEY, 0, -1), [str(upcoming_bot.id).encode()])
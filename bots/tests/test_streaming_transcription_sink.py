@@ -0,0 +1,173 @@
+import asyncio
+import datetime
+from unittest.mock import MagicMock, patch
+
+from django.test import TransactionTestCase, override_settings
+
+from bots.bot_controller import BotController
+from bots.bot_controller.per_participant_streaming_audio_input_manager import PerParticipantStreamingAudioInputManager
+from bots.bot_controller.streaming_transcription_sink import StreamingTranscriptionSink
+from bots.models import (
+    Bot,
+    Credentials,
+    Organization,
+    Participant,
+    Project,
+    Recording,
+    RecordingStates,
+    RecordingTranscriptionStates,
+    RecordingTypes,
+    TranscriptionProviders,
+    TranscriptionTypes,
+    Utterance,
+)
+from bots.transcription_providers.fake import FakeRealtimeASRClient
+
+SAMPLE_RATE = 16000
+# 10ms of 16-bit mono audio
+CHUNK_BYTES = b"\x01\x00" * (SAMPLE_RATE // 100)
+
+
+class FakeRealtimeASRClientTest(TransactionTestCase):
+    def test_sync_interface_emits_final_result_per_segment(self):
+        results = []
+        client = FakeRealtimeASRClient(transcripts=["first segment", "second segment"], sample_rate=SAMPLE_RATE, on_final_transcript_callback=results.append)
+
+        # 2.5 seconds of audio
+        for _ in range(250):
+            client.send(CHUNK_BYTES)
+
+        self.assertEqual([result["transcript"] for result in results], ["first segment", "second segment"])
+        self.assertEqual([(result["start_ms"], result["duration_ms"]) for result in results], [(0, 1000), (1000, 1000)])
+        self.assertEqual(results[0]["words"][1]["word"], "segment")
+        self.assertEqual(results[0]["words"][1]["start"], 0.5)
+        # Word times are relative to the start of their result, not of the stream
+        self.assertEqual((results[1]["words"][0]["start"], results[1]["words"][1]["end"]), (0.0, 1.0))
+
+        # Finishing flushes the last partial segment
+        client.finish()
+        self.assertEqual(len(results), 3)
+        self.assertEqual((results[2]["start_ms"], results[2]["duration_ms"]), (2000, 500))
+
+    def test_async_interface_calls_final_callbacks(self):
+        finals = []
+
+        async def on_final(text, start_ms, end_ms):
+            finals.append((text, start_ms, end_ms))
+
+        async def run():
+            client = FakeRealtimeASRClient(transcripts=["hello"], sample_rate=SAMPLE_RATE, segment_duration_ms=500)
+            client.on_final(on_final)
+            await client.connect()
+            for _ in range(120):
+                await client.send_audio(CHUNK_BYTES)
+            await client.close()
+
+        asyncio.run(run())
+
+        self.assertEqual(finals, [("hello", 0, 500), ("hello", 500, 1000), ("hello", 1000, 1200)])
+
+
+class StreamingTranscriptionSinkTest(TransactionTestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Test Org")
+        self.project = Project.objects.create(name="Test Project", organization=self.organization)
+        self.bot = Bot.objects.create(
+            project=self.project,
+            name="Test Bot",
+            meeting_url="https://meet.google.com/abc-defg-hij",
+            settings={"transcription_settings": {"deepgram": {"callback": "https://example.com/callback"}}},
+        )
+        self.recording = Recording.objects.create(
+            bot=self.bot,
+            recording_type=RecordingTypes.AUDIO_AND_VIDEO,
+            transcription_type=TranscriptionTypes.REALTIME,
+            transcription_provider=TranscriptionProviders.ASSEMBLY_AI,
+            is_default_recording=True,
+            state=RecordingStates.IN_PROGRESS,
+        )
+        self.assemblyai_credentials = Credentials.objects.create(project=self.project, credential_type=Credentials.CredentialTypes.ASSEMBLY_AI)
+        self.assemblyai_credentials.set_credentials({"api_key": "test_api_key"})
+
+        self.participants = {
+            "speaker_1": {
+                "participant_uuid": "speaker_1",
+                "participant_full_name": "Speaker One",
+                "participant_user_uuid": None,
+                "participant_is_the_bot": False,
+            },
+        }
+
+    def _message(self, timestamp_ms, transcript):
+        return {
+            **self.participants["speaker_1"],
+            "transcription": {"transcript": transcript, "words": []},
+            "timestamp_ms": timestamp_ms,
+            "duration_ms": 1000,
+            "sample_rate": SAMPLE_RATE,
+        }
+
+    def test_sink_flushes_everything_in_batches(self):
+        save_utterances_callback = MagicMock()
+        sink = StreamingTranscriptionSink(save_utterances_callback=save_utterances_callback, max_batch_size=2)
+
+        for i in range(5):
+            sink.add_transcription(self._message(i * 1000, f"utterance {i}"))
+        sink.flush()
+
+        self.assertEqual([len(call.args[0]) for call in save_utterances_callback.call_args_list], [2, 2, 1])
+
+        # Nothing left to flush
+        sink.flush()
+        self.assertEqual(save_utterances_callback.call_count, 3)
+
+    @override_settings(ASR_PROVIDER="fake")
+    def test_streaming_manager_sends_final_results_to_sink(self):
+        save_utterances_callback = MagicMock()
+        sink = StreamingTranscriptionSink(save_utterances_callback=save_utterances_callback)
+        manager = PerParticipantStreamingAudioInputManager(
+            save_utterance_callback=sink.add_transcription,
+            get_participant_callback=lambda speaker_id: self.participants.get(speaker_id),
+            sample_rate=SAMPLE_RATE,
+            transcription_provider=TranscriptionProviders.ASSEMBLY_AI,
+            bot=self.bot,
+        )
+
+        start_time = datetime.datetime(2025, 1, 1, 12, 0, 0)
+        with patch.object(manager, "silence_detected", return_value=False):
+            for i in range(150):
+                manager.add_chunk("speaker_1", start_time + datetime.timedelta(milliseconds=10 * i), CHUNK_BYTES)
+        manager.flush_utterances()
+        sink.flush()
+
+        save_utterances_callback.assert_called_once()
+        messages = save_utterances_callback.call_args.args[0]
+        start_time_ms = int(start_time.timestamp() * 1000)
+        self.assertEqual([message["timestamp_ms"] for message in messages], [start_time_ms, start_time_ms + 1000])
+        self.assertEqual([message["duration_ms"] for message in messages], [1000, 500])
+        self.assertEqual(messages[0]["participant_uuid"], "speaker_1")
+        self.assertEqual(messages[0]["transcription"]["transcript"], "hello world")
+        self.assertEqual(manager.streaming_transcribers, {})
+
+    @patch("bots.bot_controller.bot_controller.trigger_webhooks")
+    def test_controller_bulk_inserts_transcribed_utterances(self, mock_trigger_webhooks):
+        controller = BotController(self.bot.id)
+
+        controller.save_streaming_transcription_utterances([self._message(1000, "hello there"), self._message(2000, "how are you")])
+
+        utterances = list(Utterance.objects.filter(recording=self.recording).order_by("timestamp_ms"))
+        self.assertEqual(len(utterances), 2)
+        self.assertEqual([utterance.transcription["transcript"] for utterance in utterances], ["hello there", "how are you"])
+        self.assertEqual([utterance.timestamp_ms for utterance in utterances], [1000, 2000])
+        for utterance in utterances:
+            self.assertEqual(bytes(utterance.audio_blob), b"")
+            self.assertEqual(utterance.source, Utterance.Sources.PER_PARTICIPANT_AUDIO)
+        self.assertEqual(Participant.objects.filter(bot=self.bot).count(), 1)
+
+        self.recording.refresh_from_db()
+        self.assertEqual(self.recording.transcription_state, RecordingTranscriptionStates.IN_PROGRESS)
+        mock_trigger_webhooks.assert_called_once()
+        self.assertEqual(len(mock_trigger_webhooks.call_args.kwargs["payloads"]), 2)
+
+        # No utterances are left waiting for process_utterance
+        self.assertFalse(self.recording.utterances.filter(transcription__isnull=True).exists())
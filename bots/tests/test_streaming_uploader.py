@@ -0,0 +1,192 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import MagicMock, patch
+
+from django.test import TransactionTestCase
+
+from bots.bot_controller import BotController
+from bots.bot_controller.gstreamer_pipeline import GstreamerPipeline
+from bots.bot_controller.streaming_uploader import StreamingUploader
+from bots.models import Bot, Organization, Project, Recording, RecordingStates, RecordingTypes, TranscriptionProviders, TranscriptionTypes
+
+
+class FakeS3Client:
+    """In-memory stand-in for the parts of the boto3 S3 client that StreamingUploader uses"""
+
+    def __init__(self, fail_part_numbers=()):
+        self.objects = {}
+        self.multipart_uploads = {}
+        self.aborted_upload_ids = []
+        self.fail_part_numbers = set(fail_part_numbers)
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = f"upload-{len(self.multipart_uploads) + 1}"
+        self.multipart_uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, PartNumber, UploadId, Body):
+        if PartNumber in self.fail_part_numbers:
+            raise Exception("Simulated S3 error")
+        self.multipart_uploads[UploadId][PartNumber] = Body
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.multipart_uploads.pop(UploadId)
+        self.objects[(Bucket, Key)] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.multipart_uploads.pop(UploadId, None)
+        self.aborted_upload_ids.append(UploadId)
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, "rb") as f:
+            self.objects[(Bucket, Key)] = f.read()
+
+
+class StreamingUploaderTest(TransactionTestCase):
+    def _spool_path(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return os.path.join(directory, "recording.mp4")
+
+    def _create_uploader(self, s3_client, chunk_size=10, spool_path=None):
+        with patch("bots.bot_controller.streaming_uploader.boto3.client", return_value=s3_client):
+            uploader = StreamingUploader(bucket="recordings", key="recording.mp4", chunk_size=chunk_size, spool_path=spool_path)
+        uploader.start_upload()
+        return uploader
+
+    def test_data_is_uploaded_in_parts_and_completed(self):
+        s3_client = FakeS3Client()
+        uploader = self._create_uploader(s3_client)
+
+        data = bytes(range(256)) * 3
+        for i in range(0, len(data), 7):
+            uploader.upload_part(data[i : i + 7])
+        uploader.complete_upload()
+
+        self.assertEqual(s3_client.objects[("recordings", "recording.mp4")], data)
+        self.assertEqual(len(uploader.parts), 77)
+        self.assertEqual(s3_client.multipart_uploads, {})
+
+    def test_data_from_views_released_after_each_call_is_uploaded(self):
+        s3_client = FakeS3Client()
+        uploader = self._create_uploader(s3_client)
+
+        # GstreamerPipeline passes views of mapped buffers that are unmapped once upload_part returns
+        data = bytes(range(256))
+        sample = bytearray(7)
+        for i in range(0, len(data), 7):
+            chunk = data[i : i + 7]
+            # Reuse the same memory for every sample, so any data the uploader kept a reference to would get overwritten
+            sample[: len(chunk)] = chunk
+            with memoryview(sample)[: len(chunk)] as view:
+                uploader.upload_part(view)
+        uploader.complete_upload()
+
+        self.assertEqual(s3_client.objects[("recordings", "recording.mp4")], data)
+        self.assertEqual(uploader.bytes_received, len(data))
+
+    def test_small_recording_is_uploaded_with_a_regular_put(self):
+        s3_client = FakeS3Client()
+        uploader = self._create_uploader(s3_client, chunk_size=1024)
+
+        uploader.upload_part(b"tiny")
+        uploader.complete_upload()
+
+        self.assertEqual(s3_client.objects[("recordings", "recording.mp4")], b"tiny")
+        self.assertEqual(s3_client.aborted_upload_ids, ["upload-1"])
+
+    @patch("bots.bot_controller.streaming_uploader.time.sleep")
+    def test_failed_part_aborts_the_upload(self, mock_sleep):
+        s3_client = FakeS3Client(fail_part_numbers=[2])
+        uploader = self._create_uploader(s3_client)
+
+        uploader.upload_part(b"x" * 35)
+        with self.assertRaises(Exception):
+            uploader.complete_upload()
+
+        self.assertEqual(uploader.failed_part_numbers, [2])
+        self.assertEqual(s3_client.aborted_upload_ids, ["upload-1"])
+        self.assertEqual(s3_client.objects, {})
+        # Each part gets retried before giving up on it
+        self.assertEqual(mock_sleep.call_count, StreamingUploader.MAX_PART_UPLOAD_ATTEMPTS - 1)
+
+    @patch("bots.bot_controller.streaming_uploader.time.sleep")
+    def test_failed_part_is_uploaded_again_from_the_spool_file(self, mock_sleep):
+        s3_client = FakeS3Client(fail_part_numbers=[2])
+        spool_path = self._spool_path()
+        uploader = self._create_uploader(s3_client, spool_path=spool_path)
+
+        data = bytes(range(35))
+        uploader.upload_part(data)
+        uploader.upload_queue.join()
+        # S3 recovers before the meeting ends
+        s3_client.fail_part_numbers.clear()
+        uploader.complete_upload()
+
+        self.assertEqual(s3_client.objects[("recordings", "recording.mp4")], data)
+        self.assertEqual(uploader.failed_part_numbers, [])
+        self.assertEqual(s3_client.aborted_upload_ids, [])
+        self.assertFalse(os.path.exists(spool_path))
+
+    @patch("bots.bot_controller.streaming_uploader.time.sleep")
+    def test_recording_is_uploaded_from_the_spool_file_when_a_part_keeps_failing(self, mock_sleep):
+        s3_client = FakeS3Client(fail_part_numbers=[2])
+        spool_path = self._spool_path()
+        uploader = self._create_uploader(s3_client, spool_path=spool_path)
+
+        data = bytes(range(35))
+        for i in range(0, len(data), 7):
+            uploader.upload_part(data[i : i + 7])
+        uploader.complete_upload()
+
+        # The multipart upload is abandoned, but the recording isn't lost
+        self.assertEqual(s3_client.aborted_upload_ids, ["upload-1"])
+        self.assertEqual(s3_client.objects[("recordings", "recording.mp4")], data)
+        self.assertFalse(os.path.exists(spool_path))
+
+
+class BotControllerStreamingUploadTest(TransactionTestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Test Org")
+        self.project = Project.objects.create(name="Test Project", organization=self.organization)
+        self.bot = Bot.objects.create(project=self.project, name="Test Bot", meeting_url="https://zoom.us/j/123?pwd=abc")
+        Recording.objects.create(
+            bot=self.bot,
+            recording_type=RecordingTypes.AUDIO_AND_VIDEO,
+            transcription_type=TranscriptionTypes.NON_REALTIME,
+            transcription_provider=TranscriptionProviders.DEEPGRAM,
+            is_default_recording=True,
+            state=RecordingStates.NOT_STARTED,
+        )
+
+    @patch.dict(os.environ, {"STREAM_RECORDING_UPLOADS": "true"})
+    def test_zoom_recording_is_streamed_through_appsink(self):
+        controller = BotController(self.bot.id)
+
+        self.assertTrue(controller.should_stream_recording_upload())
+        self.assertEqual(controller.get_gstreamer_sink_type(), GstreamerPipeline.SINK_TYPE_APPSINK)
+        self.assertEqual(controller.get_gstreamer_output_format(), GstreamerPipeline.OUTPUT_FORMAT_MP4)
+
+        controller.rtmp_client = None
+        controller.recording_streaming_uploader = MagicMock()
+        controller.on_new_sample_from_gstreamer_pipeline(b"fragment")
+        controller.recording_streaming_uploader.upload_part.assert_called_once_with(b"fragment")
+
+    def test_recording_is_written_to_file_by_default(self):
+        controller = BotController(self.bot.id)
+
+        self.assertFalse(controller.should_stream_recording_upload())
+        self.assertEqual(controller.get_gstreamer_sink_type(), GstreamerPipeline.SINK_TYPE_FILE)
+
+    @patch.dict(os.environ, {"STREAM_RECORDING_UPLOADS": "true"})
+    def test_recording_is_not_streamed_for_browser_based_bots(self):
+        self.bot.meeting_url = "https://meet.google.com/abc-defg-hij"
+        self.bot.save()
+        controller = BotController(self.bot.id)
+
+        self.assertFalse(controller.should_stream_recording_upload())
@@ -19,6 +19,7 @@ from bots.models import (
 )
 from bots.tasks.sync_calendar_task import (
     CalendarAPIAuthenticationError,
+    CalendarAPIError,
     CalendarSyncHandler,
     GoogleCalendarSyncHandler,
     MicrosoftCalendarSyncHandler,
@@ -308,6 +309,35 @@ class TestSyncCalendar(TestCase):
 
         self.assertIn("Unsupported calendar platform", str(cm.exception))
 
+    @patch("bots.tasks.sync_calendar_task.extend_calendar_sync_slot")
+    @patch("bots.tasks.sync_calendar_task.release_calendar_sync_slot")
+    @patch("bots.tasks.sync_calendar_task.GoogleCalendarSyncHandler")
+    def test_sync_calendar_keeps_slot_until_retries_are_done(self, mock_handler_class, mock_release_slot, mock_extend_slot):
+        """Test the concurrency slot is held while Celery retries the sync, and released once it succeeds."""
+        calendar = Calendar.objects.create(project=self.project, platform=CalendarPlatform.GOOGLE, client_id="test_client_id")
+        mock_handler_class.return_value.sync_events.side_effect = [requests.HTTPError("429 Too Many Requests"), {"success": True}]
+
+        result = sync_calendar.apply(args=[calendar.id])
+
+        self.assertEqual(result.get(), {"success": True})
+        self.assertEqual(mock_handler_class.return_value.sync_events.call_count, 2)
+        mock_extend_slot.assert_called_once()
+        mock_release_slot.assert_called_once()
+
+    @patch("bots.tasks.sync_calendar_task.release_calendar_sync_slot")
+    @patch("bots.tasks.sync_calendar_task.GoogleCalendarSyncHandler")
+    def test_sync_calendar_releases_slot_after_last_retry(self, mock_handler_class, mock_release_slot):
+        """Test the concurrency slot is released when the last attempt fails."""
+        calendar = Calendar.objects.create(project=self.project, platform=CalendarPlatform.GOOGLE, client_id="test_client_id")
+        mock_handler_class.return_value.sync_events.side_effect = requests.HTTPError("429 Too Many Requests")
+
+        with patch("bots.tasks.sync_calendar_task.extend_calendar_sync_slot"):
+            result = sync_calendar.apply(args=[calendar.id], retries=sync_calendar.max_retries)
+
+        self.assertIsInstance(result.result, requests.HTTPError)
+        mock_handler_class.return_value.sync_events.assert_called_once()
+        mock_release_slot.assert_called_once()
+
 
 class TestCalendarSyncHandler(TestCase):
     """Test the CalendarSyncHandler base class."""
@@ -354,41 +384,46 @@ class TestCalendarSyncHandler(TestCase):
         self.assertTrue(event.is_deleted)
 
     @patch("bots.tasks.sync_calendar_task.sync_bots_for_calendar_event")
-    def test_upsert_calendar_event_create_new(self, mock_sync_bots):
-        """Test _upsert_calendar_event creates new event."""
+    def test_upsert_calendar_events_create_new(self, mock_sync_bots):
+        """Test _upsert_calendar_events creates new event."""
         handler = CalendarSyncHandler(self.calendar.id)
         handler._remote_event_to_calendar_event_data = Mock(return_value={"platform_uuid": "new_event_123", "meeting_url": "https://zoom.us/j/123456789", "start_time": timezone.now(), "end_time": timezone.now() + timedelta(hours=1), "raw": {"test": "data"}})
 
         remote_event = {"id": "new_event_123", "test": "data"}
 
-        local_event, was_created, was_updated = handler._upsert_calendar_event(remote_event)
+        created_count, updated_count = handler._upsert_calendar_events([remote_event])
 
-        self.assertTrue(was_created)
-        self.assertFalse(was_updated)
-        self.assertEqual(local_event.platform_uuid, "new_event_123")
+        self.assertEqual(created_count, 1)
+        self.assertEqual(updated_count, 0)
+        local_event = CalendarEvent.objects.get(calendar=self.calendar, platform_uuid="new_event_123")
+        self.assertTrue(local_event.object_id.startswith(CalendarEvent.OBJECT_ID_PREFIX))
         mock_sync_bots.assert_not_called()
 
     @patch("bots.tasks.sync_calendar_task.sync_bots_for_calendar_event")
-    def test_upsert_calendar_event_update_existing(self, mock_sync_bots):
-        """Test _upsert_calendar_event updates existing event."""
+    def test_upsert_calendar_events_update_existing(self, mock_sync_bots):
+        """Test _upsert_calendar_events updates existing event."""
         handler = CalendarSyncHandler(self.calendar.id)
-        CalendarEvent.objects.create(calendar=self.calendar, platform_uuid="existing_event_123", meeting_url="https://zoom.us/j/111", start_time=timezone.now(), end_time=timezone.now() + timedelta(hours=1), raw={"old": "data"})
+        existing_event = CalendarEvent.objects.create(calendar=self.calendar, platform_uuid="existing_event_123", meeting_url="https://zoom.us/j/111", start_time=timezone.now(), end_time=timezone.now() + timedelta(hours=1), raw={"old": "data"})
 
         handler._remote_event_to_calendar_event_data = Mock(return_value={"platform_uuid": "existing_event_123", "meeting_url": "https://zoom.us/j/222", "start_time": timezone.now() + timedelta(minutes=30), "end_time": timezone.now() + timedelta(hours=1, minutes=30), "raw": {"new": "data"}})
 
         remote_event = {"id": "existing_event_123", "test": "data"}
 
-        local_event, was_created, was_updated = handler._upsert_calendar_event(remote_event)
+        created_count, updated_count = handler._upsert_calendar_events([remote_event])
 
-        self.assertFalse(was_created)
-        self.assertTrue(was_updated)
+        self.assertEqual(created_count, 0)
+        self.assertEqual(updated_count, 1)
+        local_event = CalendarEvent.objects.get(calendar=self.calendar, platform_uuid="existing_event_123")
+        self.assertEqual(local_event.id, existing_event.id)
+        self.assertEqual(local_event.object_id, existing_event.object_id)
         self.assertEqual(local_event.meeting_url, "https://zoom.us/j/222")
         self.assertEqual(local_event.raw, {"new": "data"})
-        mock_sync_bots.assert_called_once_with(local_event)
+        mock_sync_bots.assert_called_once()
+        self.assertEqual(mock_sync_bots.call_args.args[0].id, existing_event.id)
 
     @patch("bots.tasks.sync_calendar_task.sync_bots_for_calendar_event")
-    def test_upsert_calendar_event_no_change(self, mock_sync_bots):
-        """Test _upsert_calendar_event when no changes are needed."""
+    def test_upsert_calendar_events_no_change(self, mock_sync_bots):
+        """Test _upsert_calendar_events when no changes are needed."""
         handler = CalendarSyncHandler(self.calendar.id)
         existing_event = CalendarEvent.objects.create(calendar=self.calendar, platform_uuid="existing_event_123", meeting_url="https://zoom.us/j/111", start_time=timezone.now(), end_time=timezone.now() + timedelta(hours=1), raw={"same": "data"})
 
@@ -396,13 +431,30 @@ class TestCalendarSyncHandler(TestCase):
 
         remote_event = {"id": "existing_event_123", "test": "data"}
 
-        local_event, was_created, was_updated = handler._upsert_calendar_event(remote_event)
+        created_count, updated_count = handler._upsert_calendar_events([remote_event])
 
-        self.assertFalse(was_created)
-        self.assertFalse(was_updated)
-        self.assertEqual(local_event, existing_event)
+        self.assertEqual(created_count, 0)
+        self.assertEqual(updated_count, 0)
+        existing_event_updated_at = existing_event.updated_at
+        existing_event.refresh_from_db()
+        self.assertEqual(existing_event.updated_at, existing_event_updated_at)
         mock_sync_bots.assert_not_called()
 
+    @patch("bots.tasks.sync_calendar_task.sync_bots_for_calendar_event")
+    def test_upsert_calendar_events_skips_new_events_outside_window(self, mock_sync_bots):
+        """Test _upsert_calendar_events doesn't create events outside the time window when asked to."""
+        handler = CalendarSyncHandler(self.calendar.id)
+        now = timezone.now()
+        handler.time_window_start = now - timedelta(days=1)
+        handler.time_window_end = now + timedelta(days=28)
+        handler._remote_event_to_calendar_event_data = Mock(side_effect=[{"platform_uuid": "far_future_event", "meeting_url": None, "start_time": now + timedelta(days=60), "end_time": now + timedelta(days=60, hours=1), "raw": {"event": "far"}}, {"platform_uuid": "soon_event", "meeting_url": None, "start_time": now + timedelta(days=1), "end_time": now + timedelta(days=1, hours=1), "raw": {"event": "soon"}}])
+
+        created_count, updated_count = handler._upsert_calendar_events([{"id": "far_future_event"}, {"id": "soon_event"}], skip_new_events_outside_window=True)
+
+        self.assertEqual(created_count, 1)
+        self.assertEqual(updated_count, 0)
+        self.assertEqual(list(CalendarEvent.objects.filter(calendar=self.calendar).values_list("platform_uuid", flat=True)), ["soon_event"])
+
 
 class TestCalendarSyncHandlerSyncEvents(TransactionTestCase):
     """Test the sync_events method with full integration."""
@@ -580,8 +632,7 @@ class TestGoogleCalendarSyncHandler(TestCase):
         with self.assertRaises(CalendarAPIAuthenticationError):
             handler._get_access_token()
 
-    @patch("requests.Session")
-    def test_list_events_success(self, mock_session_class):
+    def test_list_events_success(self):
         """Test successful event listing."""
         handler = GoogleCalendarSyncHandler(self.calendar.id)
         handler.time_window_start = timezone.now() - timedelta(days=1)
@@ -592,7 +643,7 @@ class TestGoogleCalendarSyncHandler(TestCase):
         mock_response.json.return_value = {"items": [{"id": "event_1", "summary": "Event 1"}, {"id": "event_2", "summary": "Event 2"}]}
         mock_response.raise_for_status.return_value = None
         mock_session.send.return_value = mock_response
-        mock_session_class.return_value.__enter__.return_value = mock_session
+        handler.session = mock_session
 
         result = handler._list_events("mock_token")
 
@@ -600,8 +651,25 @@ class TestGoogleCalendarSyncHandler(TestCase):
         self.assertEqual(result[0]["id"], "event_1")
         self.assertEqual(result[1]["id"], "event_2")
 
-    @patch("requests.Session")
-    def test_get_event_by_id_success(self, mock_session_class):
+    def test_list_events_stops_when_a_page_token_repeats(self):
+        """Test a response that keeps returning the same page token doesn't make the listing loop forever."""
+        handler = GoogleCalendarSyncHandler(self.calendar.id)
+        handler.time_window_start = timezone.now() - timedelta(days=1)
+        handler.time_window_end = timezone.now() + timedelta(days=1)
+
+        mock_session = Mock()
+        mock_response = Mock()
+        mock_response.json.return_value = {"items": [{"id": "event_1"}], "nextPageToken": "page_2"}
+        mock_response.raise_for_status.return_value = None
+        mock_session.send.return_value = mock_response
+        handler.session = mock_session
+
+        with self.assertRaises(CalendarAPIError):
+            handler._list_events("mock_token")
+
+        self.assertEqual(mock_session.send.call_count, 2)
+
+    def test_get_event_by_id_success(self):
         """Test successful individual event retrieval."""
         handler = GoogleCalendarSyncHandler(self.calendar.id)
 
@@ -610,14 +678,13 @@ class TestGoogleCalendarSyncHandler(TestCase):
         mock_response.json.return_value = {"id": "event_123", "summary": "Individual Event"}
         mock_response.raise_for_status.return_value = None
         mock_session.send.return_value = mock_response
-        mock_session_class.return_value.__enter__.return_value = mock_session
+        handler.session = mock_session
 
         result = handler._get_event_by_id("event_123", "mock_token")
 
         self.assertEqual(result["id"], "event_123")
 
-    @patch("requests.Session")
-    def test_get_event_by_id_not_found(self, mock_session_class):
+    def test_get_event_by_id_not_found(self):
         """Test individual event retrieval when event not found."""
         handler = GoogleCalendarSyncHandler(self.calendar.id)
 
@@ -632,12 +699,128 @@ class TestGoogleCalendarSyncHandler(TestCase):
 
         mock_session = Mock()
         mock_session.send.side_effect = http_error
-        mock_session_class.return_value.__enter__.return_value = mock_session
+        handler.session = mock_session
 
         result = handler._get_event_by_id("nonexistent_event", "mock_token")
 
         self.assertIsNone(result)
 
+    @patch("requests.post")
+    def test_get_access_token_reuses_cached_token(self, mock_post):
+        """Test the access token is only refreshed once it's about to expire."""
+        mock_response = Mock()
+        mock_response.json.return_value = {"access_token": "new_access_token", "expires_in": 3599}
+        mock_response.raise_for_status.return_value = None
+        mock_post.return_value = mock_response
+
+        self.assertEqual(GoogleCalendarSyncHandler(self.calendar.id)._get_access_token(), "new_access_token")
+        self.assertEqual(GoogleCalendarSyncHandler(self.calendar.id)._get_access_token(), "new_access_token")
+        mock_post.assert_called_once()
+
+        # Refreshed again when the cached token expires
+        self.calendar.refresh_from_db()
+        credentials = self.calendar.get_credentials()
+        credentials["access_token_expires_at"] = int(timezone.now().timestamp()) + 60
+        self.calendar.set_credentials(credentials)
+        GoogleCalendarSyncHandler(self.calendar.id)._get_access_token()
+        self.assertEqual(mock_post.call_count, 2)
+
+    def _gcal_response(self, data):
+        response = Mock()
+        response.json.return_value = data
+        response.raise_for_status.return_value = None
+        return response
+
+    def _gcal_event(self, event_id, summary, start_time):
+        return {"id": event_id, "status": "confirmed", "summary": summary, "start": {"dateTime": start_time.isoformat()}, "end": {"dateTime": (start_time + timedelta(hours=1)).isoformat()}}
+
+    @patch("bots.tasks.sync_calendar_task.trigger_webhook")
+    @patch("requests.Session")
+    def test_sync_events_uses_sync_token(self, mock_session_class, mock_trigger_webhook):
+        """Test a full sync stores the sync token and the next sync only fetches the changes."""
+        start_time = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        mock_session = Mock()
+        mock_session_class.return_value = mock_session
+        mock_session.send.side_effect = [
+            self._gcal_response({"items": [self._gcal_event("event_1", "Event 1", start_time)], "nextPageToken": "page_2"}),
+            self._gcal_response({"items": [self._gcal_event("event_2", "Event 2", start_time)], "nextSyncToken": "sync_token_1"}),
+        ]
+
+        handler = GoogleCalendarSyncHandler(self.calendar.id)
+        handler._get_access_token = Mock(return_value="mock_token")
+        result = handler.sync_events()
+
+        self.assertFalse(result["incremental"])
+        self.assertEqual(result["created_count"], 2)
+        self.calendar.refresh_from_db()
+        self.assertEqual(self.calendar.sync_cursor, "sync_token_1")
+        self.assertIsNotNone(self.calendar.sync_cursor_created_at)
+
+        mock_session.send.side_effect = [
+            self._gcal_response({"items": [self._gcal_event("event_1", "Event 1 renamed", start_time), {"id": "event_2", "status": "cancelled"}, {"id": "unknown_event", "status": "cancelled"}], "nextSyncToken": "sync_token_2"}),
+        ]
+
+        handler = GoogleCalendarSyncHandler(self.calendar.id)
+        handler._get_access_token = Mock(return_value="mock_token")
+        result = handler.sync_events()
+
+        self.assertTrue(result["incremental"])
+        self.assertEqual(result["created_count"], 0)
+        self.assertEqual(result["updated_count"], 1)
+        self.assertEqual(result["deleted_count"], 1)
+        self.assertIn("syncToken=sync_token_1", mock_session.send.call_args.args[0].url)
+        self.assertNotIn("timeMin", mock_session.send.call_args.args[0].url)
+        self.assertEqual(CalendarEvent.objects.get(calendar=self.calendar, platform_uuid="event_1").name, "Event 1 renamed")
+        self.assertTrue(CalendarEvent.objects.get(calendar=self.calendar, platform_uuid="event_2").is_deleted)
+        self.assertFalse(CalendarEvent.objects.filter(calendar=self.calendar, platform_uuid="unknown_event").exists())
+        self.calendar.refresh_from_db()
+        self.assertEqual(self.calendar.sync_cursor, "sync_token_2")
+
+    @patch("bots.tasks.sync_calendar_task.trigger_webhook")
+    @patch("requests.Session")
+    def test_sync_events_does_full_sync_when_sync_token_expired(self, mock_session_class, mock_trigger_webhook):
+        """Test an expired sync token is replaced by doing a full sync."""
+        self.calendar.sync_cursor = "expired_sync_token"
+        self.calendar.sync_cursor_created_at = timezone.now()
+        self.calendar.save()
+
+        gone_response = requests.Response()
+        gone_response.status_code = 410
+        gone_response._content = b'{"error": {"code": 410, "message": "Sync token is no longer valid, a full sync is required."}}'
+        mock_session = Mock()
+        mock_session_class.return_value = mock_session
+        mock_session.send.side_effect = [requests.HTTPError(response=gone_response), self._gcal_response({"items": [], "nextSyncToken": "new_sync_token"})]
+
+        handler = GoogleCalendarSyncHandler(self.calendar.id)
+        handler._get_access_token = Mock(return_value="mock_token")
+        result = handler.sync_events()
+
+        self.assertFalse(result["incremental"])
+        self.assertIn("timeMin", mock_session.send.call_args.args[0].url)
+        self.calendar.refresh_from_db()
+        self.assertEqual(self.calendar.sync_cursor, "new_sync_token")
+
+    @patch("bots.tasks.sync_calendar_task.trigger_webhook")
+    @patch("requests.Session")
+    def test_sync_events_does_full_sync_when_sync_token_is_old(self, mock_session_class, mock_trigger_webhook):
+        """Test the sync token isn't used once the time window has moved on since it was created."""
+        self.calendar.sync_cursor = "old_sync_token"
+        self.calendar.sync_cursor_created_at = timezone.now() - timedelta(days=2)
+        self.calendar.save()
+
+        mock_session = Mock()
+        mock_session_class.return_value = mock_session
+        mock_session.send.return_value = self._gcal_response({"items": [], "nextSyncToken": "new_sync_token"})
+
+        handler = GoogleCalendarSyncHandler(self.calendar.id)
+        handler._get_access_token = Mock(return_value="mock_token")
+        result = handler.sync_events()
+
+        self.assertFalse(result["incremental"])
+        self.assertNotIn("syncToken", mock_session.send.call_args.args[0].url)
+        self.calendar.refresh_from_db()
+        self.assertEqual(self.calendar.sync_cursor, "new_sync_token")
+
 
 class TestMicrosoftCalendarSyncHandler(TestCase):
     """Test the MicrosoftCalendarSyncHandler class."""
@@ -761,8 +944,7 @@ class TestMicrosoftCalendarSyncHandler(TestCase):
         self.assertEqual(updated_credentials["refresh_token"], "new_refresh_token")
         self.assertNotEqual(updated_credentials["refresh_token"], original_credentials["refresh_token"])
 
-    @patch("requests.Session")
-    def test_list_events_with_pagination(self, mock_session_class):
+    def test_list_events_with_pagination(self):
         """Test listing events with pagination support."""
         handler = MicrosoftCalendarSyncHandler(self.calendar.id)
         handler.time_window_start = timezone.now() - timedelta(days=1)
@@ -783,7 +965,7 @@ class TestMicrosoftCalendarSyncHandler(TestCase):
         second_response.raise_for_status.return_value = None
 
         mock_session.send.side_effect = [first_response, second_response]
-        mock_session_class.return_value.__enter__.return_value = mock_session
+        handler.session = mock_session
 
         result = handler._list_events("mock_token")
 
@@ -791,3 +973,62 @@ class TestMicrosoftCalendarSyncHandler(TestCase):
         self.assertEqual(result[0]["id"], "event_1")
         self.assertEqual(result[2]["id"], "event_3")
         self.assertEqual(mock_session.send.call_count, 2)
+
+    def test_list_events_stops_when_a_next_link_repeats(self):
+        """Test a response that keeps returning the same nextLink doesn't make the listing loop forever."""
+        handler = MicrosoftCalendarSyncHandler(self.calendar.id)
+        handler.time_window_start = timezone.now() - timedelta(days=1)
+        handler.time_window_end = timezone.now() + timedelta(days=1)
+
+        mock_session = Mock()
+        mock_response = Mock()
+        mock_response.json.return_value = {"value": [{"id": "event_1"}], "@odata.nextLink": "https://graph.microsoft.com/v1.0/me/calendarView/delta?$skiptoken=page_2"}
+        mock_response.raise_for_status.return_value = None
+        mock_session.send.return_value = mock_response
+        handler.session = mock_session
+
+        with self.assertRaises(CalendarAPIError):
+            handler._list_events("mock_token")
+
+        self.assertEqual(mock_session.send.call_count, 2)
+
+    @patch("bots.tasks.sync_calendar_task.trigger_webhook")
+    @patch("requests.Session")
+    def test_sync_events_follows_delta_link(self, mock_session_class, mock_trigger_webhook):
+        """Test a full sync stores the deltaLink and the next sync follows it to fetch only the changes."""
+        start_time = (timezone.now() + timedelta(days=1)).astimezone(python_timezone.utc).replace(tzinfo=None, microsecond=0)
+        ms_event = {"id": "ms_event_1", "subject": "Event 1", "start": {"dateTime": start_time.isoformat(), "timeZone": "UTC"}, "end": {"dateTime": (start_time + timedelta(hours=1)).isoformat(), "timeZone": "UTC"}, "isCancelled": False}
+        delta_link = "https://graph.microsoft.com/v1.0/me/calendarView/delta?$deltatoken=token_1"
+
+        first_response = Mock()
+        first_response.json.return_value = {"value": [ms_event], "@odata.deltaLink": delta_link}
+        first_response.raise_for_status.return_value = None
+        mock_session = Mock()
+        mock_session.send.return_value = first_response
+        mock_session_class.return_value = mock_session
+
+        handler = MicrosoftCalendarSyncHandler(self.calendar.id)
+        handler._get_access_token = Mock(return_value="mock_token")
+        result = handler.sync_events()
+
+        self.assertFalse(result["incremental"])
+        self.assertEqual(result["created_count"], 1)
+        self.assertIn("/calendarView/delta?startDateTime=", mock_session.send.call_args.args[0].url)
+        self.calendar.refresh_from_db()
+        self.assertEqual(self.calendar.sync_cursor, delta_link)
+
+        second_response = Mock()
+        second_response.json.return_value = {"value": [{"id": "ms_event_1", "@removed": {"reason": "deleted"}}], "@odata.deltaLink": "https://graph.microsoft.com/v1.0/me/calendarView/delta?$deltatoken=token_2"}
+        second_response.raise_for_status.return_value = None
+        mock_session.send.return_value = second_response
+
+        handler = MicrosoftCalendarSyncHandler(self.calendar.id)
+        handler._get_access_token = Mock(return_value="mock_token")
+        result = handler.sync_events()
+
+        self.assertTrue(result["incremental"])
+        self.assertEqual(result["deleted_count"], 1)
+        self.assertEqual(mock_session.send.call_args.args[0].url, delta_link)
+        self.assertTrue(CalendarEvent.objects.get(calendar=self.calendar, platform_uuid="ms_event_1").is_deleted)
+        self.calendar.refresh_from_db()
+        self.assertEqual(self.calendar.sync_cursor, "https://graph.microsoft.com/v1.0/me/calendarView/delta?$deltatoken=token_2")
@@ -0,0 +1,97 @@
+import json
+import shutil
+import tempfile
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, override_settings
+
+from bots.bot_controller import text_to_speech
+from bots.bot_controller.audio_output_manager import AudioOutputManager
+from bots.bot_controller.text_to_speech import GoogleTextToSpeechProvider, get_text_to_speech_media_blob, get_text_to_speech_provider
+from bots.models import Bot, Credentials, MediaBlob, Organization, Project
+
+VOICE_SETTINGS = {"google": {"voice_language_code": "en-US", "voice_name": "en-US-Standard-A"}}
+
+
+@override_settings(TEXT_TO_SPEECH_PROVIDER="fake")
+class TextToSpeechCacheTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Test Org")
+        self.project = Project.objects.create(name="Test Project", organization=self.organization)
+        self.bot = Bot.objects.create(project=self.project, meeting_url="https://zoom.us/j/123")
+        self.provider = get_text_to_speech_provider()
+        self.provider.requests = []
+        patcher = patch.dict(text_to_speech._text_to_speech_media_blobs, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_speech_is_only_synthesized_once_per_project(self):
+        first_media_blob = get_text_to_speech_media_blob(bot=self.bot, text="Hello everyone", settings=VOICE_SETTINGS, sample_rate=44100)
+        with self.assertNumQueries(0):
+            second_media_blob = get_text_to_speech_media_blob(bot=self.bot, text="Hello everyone", settings=VOICE_SETTINGS, sample_rate=44100)
+
+        self.assertIs(first_media_blob, second_media_blob)
+        self.assertEqual(len(self.provider.requests), 1)
+        self.assertEqual(first_media_blob.content_type, "audio/L16;rate=44100")
+        self.assertEqual(first_media_blob.duration_ms, 700)
+        # The content type is one of the MediaBlob's choices, so the admin and forms accept the row
+        first_media_blob.full_clean()
+
+        # Another bot in the project, which doesn't have it in memory, gets it from the database
+        other_bot = Bot.objects.create(project=self.project, meeting_url="https://zoom.us/j/456")
+        with patch.dict(text_to_speech._text_to_speech_media_blobs, clear=True):
+            media_blob_from_database = get_text_to_speech_media_blob(bot=other_bot, text="Hello everyone", settings=VOICE_SETTINGS, sample_rate=44100)
+        self.assertEqual(media_blob_from_database.id, first_media_blob.id)
+        self.assertEqual(len(self.provider.requests), 1)
+        self.assertEqual(MediaBlob.objects.filter(project=self.project).count(), 1)
+
+    def test_speech_is_synthesized_again_for_different_inputs(self):
+        get_text_to_speech_media_blob(bot=self.bot, text="Hello everyone", settings=VOICE_SETTINGS, sample_rate=44100)
+        get_text_to_speech_media_blob(bot=self.bot, text="Goodbye everyone", settings=VOICE_SETTINGS, sample_rate=44100)
+        get_text_to_speech_media_blob(bot=self.bot, text="Hello everyone", settings={"google": {"voice_language_code": "en-GB", "voice_name": "en-GB-Standard-A"}}, sample_rate=44100)
+        get_text_to_speech_media_blob(bot=self.bot, text="Hello everyone", settings=VOICE_SETTINGS, sample_rate=16000)
+
+        self.assertEqual(len(self.provider.requests), 4)
+        self.assertEqual(MediaBlob.objects.filter(project=self.project).count(), 4)
+
+    def test_speech_is_played_without_being_synthesized_again(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        play_raw_audio_callback = MagicMock()
+        with self.settings(MEDIA_BLOB_PCM_CACHE_DIR=directory):
+            audio_output_manager = AudioOutputManager(currently_playing_audio_media_request_finished_callback=MagicMock(), play_raw_audio_callback=play_raw_audio_callback, sleep_time_between_chunks_seconds=0)
+        audio_media_request = MagicMock(media_blob=None, text_to_speak="Hello everyone", text_to_speech_settings=VOICE_SETTINGS, bot=self.bot)
+
+        for _ in range(2):
+            audio_output_manager.start_playing_audio_media_request(audio_media_request)
+            audio_output_manager.audio_thread.join()
+
+        self.assertEqual(len(self.provider.requests), 1)
+        self.assertEqual(audio_output_manager.currently_playing_audio_media_request_duration_ms, 700)
+        played = b"".join(call.kwargs["bytes"] for call in play_raw_audio_callback.call_args_list)
+        self.assertEqual(played, b"\x00\x00" * (44100 * 14 // 20) * 2)
+
+
+class GoogleTextToSpeechProviderTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Test Org")
+        self.project = Project.objects.create(name="Test Project", organization=self.organization)
+        self.bot = Bot.objects.create(project=self.project, meeting_url="https://zoom.us/j/123")
+        self.credentials = Credentials.objects.create(project=self.project, credential_type=Credentials.CredentialTypes.GOOGLE_TTS)
+        self.credentials.set_credentials({"service_account_json": json.dumps({"type": "service_account"})})
+
+    @patch("google.cloud.texttospeech.TextToSpeechClient")
+    def test_client_is_reused_until_the_credentials_change(self, MockTextToSpeechClient):
+        mock_client = MockTextToSpeechClient.from_service_account_info.return_value
+        mock_client.synthesize_speech.return_value.audio_content = b"\x00" * 44 + b"\x01\x02" * 10
+        provider = GoogleTextToSpeechProvider()
+
+        self.assertEqual(provider.synthesize(self.bot, "Hello", VOICE_SETTINGS, 16000), b"\x01\x02" * 10)
+        provider.synthesize(self.bot, "Goodbye", VOICE_SETTINGS, 16000)
+        self.assertEqual(MockTextToSpeechClient.from_service_account_info.call_count, 1)
+        self.assertEqual(mock_client.synthesize_speech.call_count, 2)
+
+        self.credentials.set_credentials({"service_account_json": json.dumps({"type": "service_account", "private_key_id": "new"})})
+        provider.synthesize(self.bot, "Hello", VOICE_SETTINGS, 16000)
+        self.assertEqual(MockTextToSpeechClient.from_service_account_info.call_count, 2)
+        self.assertEqual(list(provider.clients), [(self.credentials.id, Credentials.objects.get(id=self.credentials.id).updated_at)])
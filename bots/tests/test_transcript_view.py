@@ -0,0 +1,81 @@
+import json
+from unittest.mock import patch
+
+from django.test import Client, TransactionTestCase
+from rest_framework import status
+
+from accounts.models import Organization
+from bots.bots_api_views import TranscriptView
+from bots.models import ApiKey, Bot, BotStates, Participant, Project, Recording, RecordingStates, RecordingTypes, TranscriptionTypes, Utterance
+
+
+class TranscriptViewTest(TransactionTestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Test Org", centicredits=10000)
+        self.project = Project.objects.create(name="Test Project", organization=self.organization)
+        self.api_key, self.api_key_plain = ApiKey.create(project=self.project, name="Test API Key")
+        self.bot = Bot.objects.create(project=self.project, name="Test Bot", meeting_url="https://zoom.us/j/123", state=BotStates.JOINED_RECORDING)
+        self.recording = Recording.objects.create(bot=self.bot, recording_type=RecordingTypes.AUDIO_AND_VIDEO, transcription_type=TranscriptionTypes.NON_REALTIME, is_default_recording=True, state=RecordingStates.IN_PROGRESS)
+        self.participant = Participant.objects.create(bot=self.bot, uuid="participant_uuid", full_name="Participant")
+
+        # (timestamp_ms, duration_ms, transcription), created out of order to check the ordering
+        for timestamp_ms, duration_ms, transcription in [
+            (30000, 5000, {"transcript": "third"}),
+            (1000, 2000, {"transcript": "first"}),
+            (10000, 4000, {"transcript": 'second "quoted"'}),
+            (20000, 1000, {"transcript": ""}),
+            (40000, 1000, None),
+        ]:
+            Utterance.objects.create(recording=self.recording, participant=self.participant, audio_blob=b"", timestamp_ms=timestamp_ms, duration_ms=duration_ms, transcription=transcription)
+
+        self.client = Client()
+
+    def _get_transcript(self, query_string=""):
+        response = self.client.get(f"/api/v1/bots/{self.bot.object_id}/transcript{query_string}", HTTP_AUTHORIZATION=f"Token {self.api_key_plain}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(b"".join(response.streaming_content) if response.streaming else response.content)
+
+    def test_segments_are_ordered_and_skip_empty_transcriptions(self):
+        transcript = self._get_transcript()
+
+        self.assertEqual([segment["text"] for segment in transcript["segments"]], ["first", 'second "quoted"', "third"])
+        self.assertEqual(transcript["segments"][0], {"start_ms": 1000, "end_ms": 3000, "text": "first", "is_final": True, "speaker_name": "Participant", "speaker_uuid": "participant_uuid"})
+        self.assertEqual(transcript["last_timestamp_ms"], 35000)
+
+    def test_long_transcript_is_streamed_in_chunks(self):
+        # Starts at the same time as "first", so the chunks have to be continued by id as well as by time
+        Utterance.objects.create(recording=self.recording, participant=self.participant, audio_blob=b"", timestamp_ms=1000, duration_ms=500, transcription={"transcript": "also first"})
+
+        with patch.object(TranscriptView, "STREAMING_CHUNK_SIZE", 2):
+            response = self.client.get(f"/api/v1/bots/{self.bot.object_id}/transcript", HTTP_AUTHORIZATION=f"Token {self.api_key_plain}")
+            self.assertTrue(response.streaming)
+            transcript = json.loads(b"".join(response.streaming_content))
+
+        self.assertEqual([segment["text"] for segment in transcript["segments"]], ["first", "also first", 'second "quoted"', "third"])
+        self.assertEqual(transcript["last_timestamp_ms"], 35000)
+
+    def test_since_ms_filters_on_end_time(self):
+        transcript = self._get_transcript("?since_ms=13000")
+
+        self.assertEqual([segment["text"] for segment in transcript["segments"]], ['second "quoted"', "third"])
+
+    def test_window_s_is_relative_to_latest_end_time(self):
+        transcript = self._get_transcript("?window_s=21")
+
+        self.assertEqual([segment["text"] for segment in transcript["segments"]], ["third"])
+        self.assertEqual(transcript["last_timestamp_ms"], 35000)
+
+    def test_plain_format(self):
+        transcript = self._get_transcript("?format=plain&since_ms=3000")
+
+        self.assertEqual(transcript, {"text": 'second "quoted" third', "last_timestamp_ms": 35000})
+
+    def test_no_matching_segments(self):
+        transcript = self._get_transcript("?since_ms=50000&window_s=10")
+
+        self.assertEqual(transcript, {"segments": [], "last_timestamp_ms": 0})
+
+    def test_invalid_since_ms(self):
+        response = self.client.get(f"/api/v1/bots/{self.bot.object_id}/transcript?since_ms=abc", HTTP_AUTHORIZATION=f"Token {self.api_key_plain}")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
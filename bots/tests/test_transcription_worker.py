@@ -0,0 +1,208 @@
+import asyncio
+import json
+import signal
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import fakeredis
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from bots.management.commands.run_transcription_worker import Command as RunTranscriptionWorkerCommand
+from bots.models import Bot, Credentials, Organization, Participant, Project, Recording, RecordingStates, RecordingTranscriptionStates, TranscriptionProviders, Utterance
+from bots.transcription_worker import TranscriptionClientPool, TranscriptionWorker
+from bots.utterance_transcription_queue import UTTERANCE_TRANSCRIPTION_LEASE_KEY, UTTERANCE_TRANSCRIPTION_PENDING_KEY, UTTERANCE_TRANSCRIPTION_QUEUE_KEY, acquire_utterance_transcription_leases, add_utterances_to_transcription_queue
+
+
+class FakeAssemblyAIHandler(BaseHTTPRequestHandler):
+    """Answers like the AssemblyAI API: each transcript is still processing on its first poll and completed on its second."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status_code, body):
+        data = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        self.server.connections.add(self.client_address)
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        self._read_body()
+        with self.server.lock:
+            if self.path == "/v2/upload":
+                if self.server.upload_failures_remaining > 0:
+                    self.server.upload_failures_remaining -= 1
+                    return self._respond(500, {"error": "try again"})
+                self.server.uploads += 1
+                return self._respond(200, {"upload_url": f"https://cdn.example.com/{self.server.uploads}"})
+            self.server.transcripts += 1
+            transcript_id = str(self.server.transcripts)
+            self.server.polls_remaining[transcript_id] = 1
+        self._respond(200, {"id": transcript_id})
+
+    def do_GET(self):
+        self._read_body()
+        transcript_id = self.path.rsplit("/", 1)[-1]
+        with self.server.lock:
+            if self.server.polls_remaining[transcript_id] > 0:
+                self.server.polls_remaining[transcript_id] -= 1
+                return self._respond(200, {"status": "processing"})
+        self._respond(200, {"status": "completed", "text": "hello", "words": [{"text": "hello", "start": 0, "end": 500, "confidence": 0.9}]})
+
+    def do_DELETE(self):
+        self._read_body()
+        with self.server.lock:
+            self.server.deleted += 1
+        self._respond(200, {})
+
+
+class TranscriptionWorkerTest(TransactionTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeAssemblyAIHandler)
+        self.server.lock = threading.Lock()
+        self.server.connections = set()
+        self.server.polls_remaining = {}
+        self.server.upload_failures_remaining = 0
+        self.server.uploads = 0
+        self.server.transcripts = 0
+        self.server.deleted = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.redis_client = fakeredis.FakeRedis()
+        for target in ["bots.tasks.process_utterance_task.get_redis_client", "bots.bots_api_utils.get_redis_client"]:
+            patcher = mock.patch(target, return_value=self.redis_client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.organization = Organization.objects.create(name="Test Org")
+        self.project = Project.objects.create(name="Test Project", organization=self.organization)
+        self.bot = Bot.objects.create(project=self.project, meeting_url="https://zoom.us/j/123")
+        self.recording = Recording.objects.create(
+            bot=self.bot,
+            recording_type=1,
+            transcription_type=1,
+            state=RecordingStates.COMPLETE,
+            transcription_state=RecordingTranscriptionStates.IN_PROGRESS,
+            transcription_provider=TranscriptionProviders.ASSEMBLY_AI,
+        )
+        self.participant = Participant.objects.create(bot=self.bot, uuid="participant-1")
+        Credentials.objects.create(project=self.project, credential_type=Credentials.CredentialTypes.ASSEMBLY_AI).set_credentials({"api_key": "test-key"})
+
+        # Half a second of a tone at 16kHz
+        self.pcm = (np.sin(np.arange(8000) / 5) * 8000).astype(np.int16).tobytes()
+
+    def _create_utterances(self, count):
+        return [Utterance.objects.create(recording=self.recording, participant=self.participant, audio_blob=self.pcm, timestamp_ms=index * 1000, duration_ms=500, sample_rate=16000) for index in range(count)]
+
+    def _make_worker(self, max_connections_per_client=100):
+        client_pool = TranscriptionClientPool(base_urls={TranscriptionProviders.ASSEMBLY_AI: f"http://127.0.0.1:{self.server.server_port}/v2"}, max_connections_per_client=max_connections_per_client)
+        return TranscriptionWorker(redis_client=self.redis_client, client_pool=client_pool)
+
+    def _transcribe_queue(self, worker):
+        async def transcribe_queue():
+            while await worker.transcribe_next_batch(timeout_seconds=0.1):
+                pass
+            await worker.wait_for_in_flight()
+            await worker.client_pool.aclose()
+            await sync_to_async(connections.close_all)()
+
+        asyncio.run(transcribe_queue())
+
+    @mock.patch("bots.transcription_worker.POLL_INITIAL_DELAY_SECONDS", 0.01)
+    def test_transcribes_utterances_concurrently_over_pooled_connections(self):
+        utterances = self._create_utterances(20)
+        add_utterances_to_transcription_queue(self.redis_client, [utterance.id for utterance in utterances])
+
+        with mock.patch.object(Credentials, "get_credentials", autospec=True, side_effect=Credentials.get_credentials) as mock_get_credentials:
+            self._transcribe_queue(self._make_worker(max_connections_per_client=4))
+
+        for utterance in utterances:
+            utterance.refresh_from_db()
+            self.assertEqual(utterance.transcription, {"transcript": "hello", "words": [{"word": "hello", "start": 0.0, "end": 0.5, "confidence": 0.9}]})
+            self.assertIsNone(utterance.audio_blob_size)
+            self.assertEqual(bytes(utterance.audio_blob), b"")
+        self.recording.refresh_from_db()
+        self.assertEqual(self.recording.transcription_state, RecordingTranscriptionStates.COMPLETE)
+        self.assertEqual(self.server.deleted, 20)
+        # The 100 requests share the connections of one client, and the credentials were decrypted once for the whole batch
+        self.assertLessEqual(len(self.server.connections), 4)
+        self.assertEqual(mock_get_credentials.call_count, 1)
+        # The leases are released once the utterances are done, and the worker is no longer responsible for them
+        self.assertEqual(self.redis_client.keys("utterance_transcription_lease:*"), [])
+        self.assertEqual(self.redis_client.keys("utterance_transcription_queued:*"), [])
+        self.assertEqual(self.redis_client.smembers(UTTERANCE_TRANSCRIPTION_PENDING_KEY), set())
+
+    @mock.patch("bots.transcription_worker.POLL_INITIAL_DELAY_SECONDS", 0.01)
+    @mock.patch("bots.transcription_worker.retry_delay_seconds", return_value=0)
+    def test_retries_failed_uploads(self, mock_retry_delay_seconds):
+        self.server.upload_failures_remaining = 2
+        (utterance,) = self._create_utterances(1)
+        add_utterances_to_transcription_queue(self.redis_client, [utterance.id])
+
+        self._transcribe_queue(self._make_worker())
+
+        utterance.refresh_from_db()
+        self.assertEqual(utterance.transcription["transcript"], "hello")
+        self.assertIsNone(utterance.failure_data)
+        self.assertEqual(utterance.transcription_attempt_count, 3)
+        self.assertEqual(mock_retry_delay_seconds.call_count, 2)
+
+    def test_skips_utterances_another_worker_is_transcribing(self):
+        (utterance,) = self._create_utterances(1)
+        acquire_utterance_transcription_leases(self.redis_client, [utterance.id])
+        add_utterances_to_transcription_queue(self.redis_client, [utterance.id])
+
+        self._transcribe_queue(self._make_worker())
+
+        utterance.refresh_from_db()
+        self.assertIsNone(utterance.transcription)
+        self.assertEqual(self.server.uploads, 0)
+        self.assertTrue(self.redis_client.exists(UTTERANCE_TRANSCRIPTION_LEASE_KEY.format(utterance_id=utterance.id)))
+
+    def test_requeues_stale_utterances_that_no_worker_has(self):
+        stale_utterance, leased_stale_utterance, celery_stale_utterance, new_utterance = self._create_utterances(4)
+        Utterance.objects.filter(id__in=[stale_utterance.id, leased_stale_utterance.id, celery_stale_utterance.id]).update(created_at=timezone.now() - timedelta(minutes=30))
+        add_utterances_to_transcription_queue(self.redis_client, [stale_utterance.id, leased_stale_utterance.id, new_utterance.id])
+        # The worker died after popping them
+        self.redis_client.delete(UTTERANCE_TRANSCRIPTION_QUEUE_KEY, *self.redis_client.keys("utterance_transcription_queued:*"))
+        acquire_utterance_transcription_leases(self.redis_client, [leased_stale_utterance.id])
+
+        async def requeue_stale_utterances():
+            worker = self._make_worker()
+            await worker.requeue_stale_utterances()
+            # Sweeping again while the utterance is still in the queue doesn't add it twice
+            await worker.requeue_stale_utterances()
+            await sync_to_async(connections.close_all)()
+
+        asyncio.run(requeue_stale_utterances())
+
+        # The utterance that a process_utterance task is transcribing is left to the task
+        self.assertEqual(self.redis_client.lrange(UTTERANCE_TRANSCRIPTION_QUEUE_KEY, 0, -1), [str(stale_utterance.id).encode()])
+
+    @override_settings(UTTERANCE_TRANSCRIPTION_WORKER_ENABLED=False)
+    def test_command_idles_until_stopped_when_the_worker_is_disabled(self):
+        command = RunTranscriptionWorkerCommand()
+        # Stop the command on its first idle sleep, the way SIGTERM would
+        with (
+            mock.patch("bots.management.commands.run_transcription_worker.signal.signal"),
+            mock.patch("bots.management.commands.run_transcription_worker.time.sleep", side_effect=lambda seconds: command._graceful_exit(signal.SIGTERM, None)) as mock_sleep,
+            mock.patch("bots.management.commands.run_transcription_worker.TranscriptionWorker") as MockTranscriptionWorker,
+        ):
+            command.handle()
+
+        mock_sleep.assert_called_once()
+        MockTranscriptionWorker.assert_not_called()
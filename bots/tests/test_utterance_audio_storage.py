@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from bots.models import (
+    Bot,
+    BotStates,
+    Organization,
+    Participant,
+    Project,
+    Recording,
+    RecordingStates,
+    RecordingTranscriptionStates,
+    Utterance,
+)
+from bots.tasks.process_utterance_task import process_utterance
+from bots.utterance_audio_storage import get_utterance_audio_storage
+
+
+class UtteranceAudioStorageTest(TransactionTestCase):
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir, ignore_errors=True)
+        settings_override = override_settings(UTTERANCE_AUDIO_STORAGE_BACKEND="filesystem", UTTERANCE_AUDIO_SPOOL_DIR=self.spool_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.organization = Organization.objects.create(name="Test Org")
+        self.project = Project.objects.create(name="Proj", organization=self.organization)
+        self.bot = Bot.objects.create(project=self.project, meeting_url="https://zoom.us/j/xyz")
+        self.recording = Recording.objects.create(
+            bot=self.bot,
+            recording_type=1,
+            transcription_type=1,
+            state=RecordingStates.COMPLETE,
+            transcription_state=RecordingTranscriptionStates.IN_PROGRESS,
+            transcription_provider=1,
+        )
+        self.participant = Participant.objects.create(bot=self.bot, uuid=str(uuid.uuid4()))
+
+    def _create_utterance(self, audio, **kwargs):
+        utterance = Utterance(recording=self.recording, participant=self.participant, timestamp_ms=0, duration_ms=500, sample_rate=16_000, **kwargs)
+        utterance.set_audio_blob(audio)
+        utterance.save()
+        return utterance
+
+    def _spool_path(self, key):
+        return os.path.join(self.spool_dir, key)
+
+    def test_audio_is_written_to_spool_instead_of_database(self):
+        utterance = self._create_utterance(b"rawpcmbytes")
+        utterance.refresh_from_db()
+
+        self.assertEqual(bytes(utterance.audio_blob), b"")
+        self.assertTrue(utterance.audio_blob_key.startswith(f"{self.recording.object_id}/"))
+        self.assertEqual(utterance.audio_blob_size, len(b"rawpcmbytes"))
+        self.assertTrue(os.path.exists(self._spool_path(utterance.audio_blob_key)))
+        self.assertEqual(utterance.get_audio_blob(), b"rawpcmbytes")
+
+    @override_settings(UTTERANCE_AUDIO_STORAGE_BACKEND="database")
+    def test_database_backend_keeps_audio_in_database(self):
+        utterance = self._create_utterance(b"rawpcmbytes")
+        utterance.refresh_from_db()
+
+        self.assertIsNone(utterance.audio_blob_key)
+        self.assertEqual(bytes(utterance.audio_blob), b"rawpcmbytes")
+        self.assertEqual(utterance.get_audio_blob(), b"rawpcmbytes")
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    @mock.patch("bots.tasks.process_utterance_task.RecordingManager.set_recording_transcription_complete")
+    @mock.patch("bots.tasks.process_utterance_task.get_transcription")
+    def test_process_utterance_deletes_spooled_audio_after_transcription(self, mock_get_transcription, mock_set_complete):
+        utterance = self._create_utterance(b"rawpcmbytes")
+        spool_path = self._spool_path(utterance.audio_blob_key)
+        mock_get_transcription.return_value = ({"transcript": "hello world"}, None)
+
+        process_utterance.apply(args=[utterance.id])
+        utterance.refresh_from_db()
+
+        self.assertEqual(utterance.transcription["transcript"], "hello world")
+        self.assertIsNone(utterance.audio_blob_key)
+        self.assertFalse(os.path.exists(spool_path))
+
+    def test_migrate_command_moves_legacy_audio_into_storage(self):
+        legacy_utterance = Utterance.objects.create(recording=self.recording, participant=self.participant, audio_blob=b"legacy audio", timestamp_ms=0, duration_ms=500)
+        transcribed_utterance = Utterance.objects.create(recording=self.recording, participant=self.participant, audio_blob=b"", timestamp_ms=1000, duration_ms=500, transcription={"transcript": "hi"})
+
+        call_command("migrate_utterance_audio_to_storage", batch_size=1)
+
+        legacy_utterance.refresh_from_db()
+        self.assertEqual(bytes(legacy_utterance.audio_blob), b"")
+        self.assertIsNotNone(legacy_utterance.audio_blob_key)
+        self.assertEqual(legacy_utterance.get_audio_blob(), b"legacy audio")
+
+        transcribed_utterance.refresh_from_db()
+        self.assertIsNone(transcribed_utterance.audio_blob_key)
+
+    def test_clean_up_command_deletes_audio_that_is_no_longer_needed(self):
+        pending_utterance = self._create_utterance(b"pending")
+        transcribed_utterance = self._create_utterance(b"transcribed", transcription={"transcript": "hi"})
+        recently_failed_utterance = self._create_utterance(b"failed recently", failure_data={"reason": "x"})
+        old_failed_utterance = self._create_utterance(b"failed long ago", failure_data={"reason": "x"})
+        Utterance.objects.filter(id=old_failed_utterance.id).update(updated_at=timezone.now() - timedelta(hours=73))
+
+        storage = FileSystemStorage(location=self.spool_dir)
+        orphan_key = storage.save(f"{self.recording.object_id}/orphan.pcm", ContentFile(b"orphan"))
+        old_mtime = time.time() - 73 * 3600
+        os.utime(self._spool_path(orphan_key), (old_mtime, old_mtime))
+        recent_orphan_key = storage.save(f"{self.recording.object_id}/recent_orphan.pcm", ContentFile(b"orphan"))
+
+        call_command("clean_up_utterance_audio", retention_hours=72)
+
+        for utterance in [pending_utterance, transcribed_utterance, recently_failed_utterance, old_failed_utterance]:
+            utterance.refresh_from_db()
+        self.assertEqual(pending_utterance.get_audio_blob(), b"pending")
+        self.assertEqual(recently_failed_utterance.get_audio_blob(), b"failed recently")
+        self.assertIsNone(transcribed_utterance.audio_blob_key)
+        self.assertIsNone(old_failed_utterance.audio_blob_key)
+        self.assertIsNone(old_failed_utterance.audio_blob_size)
+        self.assertEqual(recently_failed_utterance.audio_blob_size, len(b"failed recently"))
+        self.assertFalse(os.path.exists(self._spool_path(orphan_key)))
+        self.assertTrue(os.path.exists(self._spool_path(recent_orphan_key)))
+
+    def test_delete_data_deletes_spooled_audio(self):
+        utterance = self._create_utterance(b"rawpcmbytes")
+        spool_path = self._spool_path(utterance.audio_blob_key)
+        self.bot.state = BotStates.ENDED
+        self.bot.save()
+
+        self.bot.delete_data()
+
+        self.assertFalse(Utterance.objects.filter(id=utterance.id).exists())
+        self.assertFalse(os.path.exists(spool_path))
+
+    def test_unknown_backend_raises(self):
+        with override_settings(UTTERANCE_AUDIO_STORAGE_BACKEND="floppy"):
+            with self.assertRaises(ValueError):
+                get_utterance_audio_storage()
@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import fakeredis
+from django.test import TestCase
+
+from accounts.models import Organization
+from bots.bot_pod_creator.warm_bot_pod_pool import (
+    IDLE_HEARTBEAT_SECONDS,
+    IDLE_WARM_BOT_PODS_KEY,
+    bot_pod_name,
+    claim_warm_bot_pod,
+    wait_for_bot_id,
+    warm_bot_pods_to_create,
+)
+from bots.launch_bot_utils import launch_bot
+from bots.models import Bot, Project
+from bots.tasks.replenish_warm_bot_pod_pool_task import replenish_warm_bot_pod_pool
+
+APP_VERSION = "abc123-1700000000"
+
+
+class FakeBotPodCreator:
+    """Stands in for BotPodCreator, which talks to the Kubernetes API"""
+
+    def __init__(self):
+        self.app_version = APP_VERSION
+        self.created_bot_pods = []
+        self.created_warm_bot_pods = []
+
+    def create_bot_pod(self, bot_id, bot_name=None, bot_cpu_request=None):
+        self.created_bot_pods.append(bot_name)
+        return {"name": bot_name, "status": "Pending", "created": True}
+
+    def create_warm_bot_pod(self, pod_name):
+        self.created_warm_bot_pods.append(pod_name)
+        return {"name": pod_name, "status": "Pending", "created": True}
+
+
+class WarmBotPodPoolTest(TestCase):
+    def setUp(self):
+        self.redis_client = fakeredis.FakeRedis()
+        self.organization = Organization.objects.create(name="Test Organization")
+        self.project = Project.objects.create(name="Test Project", organization=self.organization)
+        self.bot = Bot.objects.create(project=self.project, name="Test Bot", meeting_url="https://example.zoom.us/j/123456789")
+
+    def _add_idle_pod(self, pod_name, last_heartbeat=None):
+        self.redis_client.zadd(IDLE_WARM_BOT_PODS_KEY.format(app_version=APP_VERSION), {pod_name: last_heartbeat or time.time()})
+
+    def _start_waiting_pod(self, pod_name):
+        """Runs a warm pod's wait for a bot in a thread, and returns once the pod is idle. The bot id it gets ends up in the returned dict."""
+        result = {}
+        pod_thread = threading.Thread(target=lambda: result.update(bot_id=wait_for_bot_id(self.redis_client, APP_VERSION, pod_name)))
+        pod_thread.start()
+        self.addCleanup(pod_thread.join, 5)
+        deadline = time.monotonic() + 5
+        while self.redis_client.zscore(IDLE_WARM_BOT_PODS_KEY.format(app_version=APP_VERSION), pod_name) is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return pod_thread, result
+
+    def test_waiting_pod_receives_claimed_bot(self):
+        result = {}
+        pod_thread = threading.Thread(target=lambda: result.update(bot_id=wait_for_bot_id(self.redis_client, APP_VERSION, "bot-pod-warm-1")))
+        pod_thread.start()
+
+        pod_name = None
+        deadline = time.monotonic() + 5
+        while pod_name is None and time.monotonic() < deadline:
+            pod_name = claim_warm_bot_pod(self.redis_client, APP_VERSION, self.bot.id)
+            time.sleep(0.01)
+        pod_thread.join(timeout=5)
+
+        self.assertEqual(pod_name, "bot-pod-warm-1")
+        self.assertEqual(result["bot_id"], self.bot.id)
+        self.assertEqual(bot_pod_name(self.redis_client, self.bot), "bot-pod-warm-1")
+        # The pod is no longer idle, so it can't be claimed twice
+        self.assertIsNone(claim_warm_bot_pod(self.redis_client, APP_VERSION, self.bot.id + 1))
+
+    def test_claim_skips_pods_without_recent_heartbeat(self):
+        self._add_idle_pod("bot-pod-warm-stale", last_heartbeat=time.time() - 10 * IDLE_HEARTBEAT_SECONDS)
+
+        self.assertIsNone(claim_warm_bot_pod(self.redis_client, APP_VERSION, self.bot.id))
+        self.assertEqual(bot_pod_name(self.redis_client, self.bot), self.bot.k8s_pod_name())
+
+    def test_claim_only_uses_pods_from_same_release(self):
+        pod_thread, result = self._start_waiting_pod("bot-pod-warm-1")
+
+        self.assertIsNone(claim_warm_bot_pod(self.redis_client, "def456-1700000001", self.bot.id))
+        self.assertEqual(claim_warm_bot_pod(self.redis_client, APP_VERSION, self.bot.id), "bot-pod-warm-1")
+        pod_thread.join(timeout=5)
+        self.assertEqual(result["bot_id"], self.bot.id)
+
+    @patch("bots.bot_pod_creator.warm_bot_pod_pool.CLAIM_ACK_TIMEOUT_SECONDS", 1)
+    def test_claim_takes_the_bot_back_when_the_pod_does_not_take_it(self):
+        # The pod died after its last heartbeat, so nothing is waiting for the bot id
+        self._add_idle_pod("bot-pod-warm-dead")
+
+        self.assertIsNone(claim_warm_bot_pod(self.redis_client, APP_VERSION, self.bot.id))
+        self.assertEqual(self.redis_client.llen("warm_bot_pod:bot-pod-warm-dead:bot_id"), 0)
+        self.assertEqual(bot_pod_name(self.redis_client, self.bot), self.bot.k8s_pod_name())
+
+    @patch.dict(os.environ, {"WARM_BOT_POD_MAX_IDLE_SECONDS": "0"})
+    def test_pod_leaves_pool_after_max_idle_time(self):
+        self.assertIsNone(wait_for_bot_id(self.redis_client, APP_VERSION, "bot-pod-warm-1"))
+        self.assertIsNone(claim_warm_bot_pod(self.redis_client, APP_VERSION, self.bot.id))
+
+    @patch.dict(os.environ, {"WARM_BOT_POD_POOL_SIZE": "3"})
+    @patch("bots.tasks.replenish_warm_bot_pod_pool_task.get_redis_client")
+    @patch("bots.tasks.replenish_warm_bot_pod_pool_task.BotPodCreator")
+    def test_replenish_creates_missing_pods(self, MockBotPodCreator, mock_get_redis_client):
+        bot_pod_creator = FakeBotPodCreator()
+        MockBotPodCreator.return_value = bot_pod_creator
+        mock_get_redis_client.return_value = self.redis_client
+        self._add_idle_pod("bot-pod-warm-idle")
+        self._add_idle_pod("bot-pod-warm-stale", last_heartbeat=time.time() - 10 * IDLE_HEARTBEAT_SECONDS)
+
+        replenish_warm_bot_pod_pool()
+
+        self.assertEqual(len(bot_pod_creator.created_warm_bot_pods), 2)
+        # The new pods count as starting, so running again doesn't create more
+        self.assertEqual(warm_bot_pods_to_create(self.redis_client, APP_VERSION, 3), 0)
+        replenish_warm_bot_pod_pool()
+        self.assertEqual(len(bot_pod_creator.created_warm_bot_pods), 2)
+
+    @patch.dict(os.environ, {"LAUNCH_BOT_METHOD": "kubernetes", "WARM_BOT_POD_POOL_SIZE": "2", "CUBER_RELEASE_VERSION": APP_VERSION})
+    @patch("bots.tasks.replenish_warm_bot_pod_pool_task.replenish_warm_bot_pod_pool.delay")
+    @patch("bots.bots_api_utils.get_redis_client")
+    @patch("bots.bot_pod_creator.BotPodCreator")
+    def test_launch_bot_claims_warm_pod(self, MockBotPodCreator, mock_get_redis_client, mock_replenish_delay):
+        bot_pod_creator = FakeBotPodCreator()
+        MockBotPodCreator.return_value = bot_pod_creator
+        mock_get_redis_client.return_value = self.redis_client
+        pod_thread, result = self._start_waiting_pod("bot-pod-warm-1")
+
+        launch_bot(self.bot)
+
+        pod_thread.join(timeout=5)
+        self.assertEqual(bot_pod_creator.created_bot_pods, [])
+        self.assertEqual(result["bot_id"], self.bot.id)
+        mock_replenish_delay.assert_called_once()
+
+        # With the pool empty, the bot gets a new pod
+        launch_bot(self.bot)
+
+        self.assertEqual(bot_pod_creator.created_bot_pods, [self.bot.k8s_pod_name()])
+        self.assertEqual(mock_replenish_delay.call_count, 2)
+
+    @patch.dict(os.environ, {"LAUNCH_BOT_METHOD": "kubernetes", "WARM_BOT_POD_POOL_SIZE": "2", "CUBER_RELEASE_VERSION": APP_VERSION})
+    @patch("bots.bot_pod_creator.warm_bot_pod_pool.CLAIM_ACK_TIMEOUT_SECONDS", 1)
+    @patch("bots.tasks.replenish_warm_bot_pod_pool_task.replenish_warm_bot_pod_pool.delay")
+    @patch("bots.bots_api_utils.get_redis_client")
+    @patch("bots.bot_pod_creator.BotPodCreator")
+    def test_launch_bot_creates_a_pod_when_the_claimed_warm_pod_does_not_take_the_bot(self, MockBotPodCreator, mock_get_redis_client, mock_replenish_delay):
+        bot_pod_creator = FakeBotPodCreator()
+        MockBotPodCreator.return_value = bot_pod_creator
+        mock_get_redis_client.return_value = self.redis_client
+        self._add_idle_pod("bot-pod-warm-dead")
+
+        launch_bot(self.bot)
+
+        self.assertEqual(bot_pod_creator.created_bot_pods, [self.bot.k8s_pod_name()])
@@ -0,0 +1,96 @@
+import os
+import signal
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase
+from kubernetes import client
+
+from bots.bot_pod_creator.kubernetes_client import delete_pod_and_wait
+from bots.management.commands.watch_bot_pods import Command
+
+
+def make_pod(name, phase, resource_version="1", deletion_timestamp=None):
+    return SimpleNamespace(metadata=SimpleNamespace(name=name, resource_version=resource_version, deletion_timestamp=deletion_timestamp), status=SimpleNamespace(phase=phase))
+
+
+def make_event(event_type, pod):
+    return {"type": event_type, "object": pod, "raw_object": {"metadata": {"resourceVersion": pod.metadata.resource_version}}}
+
+
+class WatchBotPodsCommandTest(TestCase):
+    def setUp(self):
+        self.v1 = MagicMock()
+
+    @patch.dict(os.environ, {"LAUNCH_BOT_METHOD": "celery"})
+    @patch("bots.management.commands.watch_bot_pods.signal.signal")
+    @patch("bots.management.commands.watch_bot_pods.get_core_v1_api")
+    def test_idles_until_stopped_when_bots_are_not_launched_in_kubernetes(self, mock_get_core_v1_api, mock_signal):
+        command = Command()
+        # Stop the command on its first idle sleep, the way SIGTERM would
+        with patch("bots.management.commands.watch_bot_pods.time.sleep", side_effect=lambda seconds: command._graceful_exit(signal.SIGTERM, None)) as mock_sleep:
+            command.handle()
+
+        mock_sleep.assert_called_once()
+        mock_get_core_v1_api.assert_not_called()
+
+    def test_deletes_pods_that_completed_before_the_watch(self):
+        self.v1.list_namespaced_pod.return_value = SimpleNamespace(
+            items=[make_pod("bot-pod-1-bot-abc", "Succeeded"), make_pod("bot-pod-2-bot-def", "Running"), make_pod("other-pod", "Succeeded")],
+            metadata=SimpleNamespace(resource_version="100"),
+        )
+
+        resource_version = Command()._delete_completed_pods(self.v1)
+
+        self.assertEqual(resource_version, "100")
+        self.v1.delete_namespaced_pod.assert_called_once_with(name="bot-pod-1-bot-abc", namespace="attendee", grace_period_seconds=60)
+
+    @patch("bots.management.commands.watch_bot_pods.watch.Watch")
+    def test_deletes_pods_when_they_complete(self, MockWatch):
+        MockWatch.return_value.stream.return_value = [
+            make_event("ADDED", make_pod("bot-pod-1-bot-abc", "Running", "101")),
+            make_event("MODIFIED", make_pod("bot-pod-1-bot-abc", "Succeeded", "102")),
+            # Modified again by the deletion
+            make_event("MODIFIED", make_pod("bot-pod-1-bot-abc", "Succeeded", "103", deletion_timestamp="2025-01-01T00:00:00Z")),
+            make_event("DELETED", make_pod("bot-pod-1-bot-abc", "Succeeded", "104")),
+            {"type": "BOOKMARK", "object": {}, "raw_object": {"metadata": {"resourceVersion": "110"}}},
+        ]
+
+        resource_version = Command()._watch_pods(self.v1, "100")
+
+        self.assertEqual(resource_version, "110")
+        self.assertEqual(MockWatch.return_value.stream.call_args.kwargs["resource_version"], "100")
+        self.assertTrue(MockWatch.return_value.stream.call_args.kwargs["allow_watch_bookmarks"])
+        self.v1.delete_namespaced_pod.assert_called_once_with(name="bot-pod-1-bot-abc", namespace="attendee", grace_period_seconds=60)
+
+
+class DeletePodAndWaitTest(TestCase):
+    def setUp(self):
+        self.v1 = MagicMock()
+
+    def test_missing_pod_counts_as_deleted(self):
+        self.v1.read_namespaced_pod.side_effect = client.ApiException(status=404)
+
+        self.assertTrue(delete_pod_and_wait(self.v1, "bot-pod-1-bot-abc"))
+        self.v1.delete_namespaced_pod.assert_not_called()
+
+    @patch("bots.bot_pod_creator.kubernetes_client.watch.Watch")
+    def test_waits_for_deleted_event(self, MockWatch):
+        self.v1.read_namespaced_pod.return_value = make_pod("bot-pod-1-bot-abc", "Running", "200")
+        MockWatch.return_value.stream.return_value = [
+            make_event("MODIFIED", make_pod("bot-pod-1-bot-abc", "Running", "201")),
+            make_event("DELETED", make_pod("bot-pod-1-bot-abc", "Running", "202")),
+        ]
+
+        self.assertTrue(delete_pod_and_wait(self.v1, "bot-pod-1-bot-abc"))
+        self.v1.delete_namespaced_pod.assert_called_once_with(name="bot-pod-1-bot-abc", namespace="attendee", grace_period_seconds=60)
+        # Watching from the version that was read, so a deletion before the watch started isn't missed
+        self.assertEqual(MockWatch.return_value.stream.call_args.kwargs["resource_version"], "200")
+        self.assertEqual(MockWatch.return_value.stream.call_args.kwargs["field_selector"], "metadata.name=bot-pod-1-bot-abc")
+
+    @patch("bots.bot_pod_creator.kubernetes_client.watch.Watch")
+    def test_returns_false_if_pod_is_not_deleted_before_timeout(self, MockWatch):
+        self.v1.read_namespaced_pod.return_value = make_pod("bot-pod-1-bot-abc", "Running", "200")
+        MockWatch.return_value.stream.return_value = [make_event("MODIFIED", make_pod("bot-pod-1-bot-abc", "Running", "201"))]
+
+        self.assertFalse(delete_pod_and_wait(self.v1, "bot-pod-1-bot-abc", timeout_seconds=1))
@@ -1,7 +1,11 @@
+import json
+import threading
 import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch
 
 from django.contrib.messages.storage.fallback import FallbackStorage
+from django.db import DatabaseError
 from django.http import Http404, HttpRequest
 from django.http.request import QueryDict
 from django.test import TransactionTestCase
@@ -19,8 +23,8 @@ from bots.models import (
     WebhookTriggerTypes,
 )
 from bots.projects_views import CreateWebhookView, DeleteWebhookView, ProjectWebhooksView
-from bots.tasks.deliver_webhook_task import deliver_webhook
-from bots.webhook_utils import sign_payload, verify_signature
+from bots.tasks.deliver_webhook_task import _webhook_secret_cache, deliver_webhook, save_deliveries
+from bots.webhook_utils import sign_payload, trigger_webhooks, verify_signature
 
 
 class WebhookSubscriptionTest(TransactionTestCase):
@@ -296,7 +300,7 @@ class WebhookDeliveryTest(TransactionTestCase):
         settings.CELERY_TASK_ALWAYS_EAGER = True
         settings.CELERY_TASK_EAGER_PROPAGATES = True
 
-    @patch("bots.tasks.deliver_webhook_task.requests.post")
+    @patch("bots.tasks.deliver_webhook_task.requests.Session.post")
     def test_webhook_delivery_success(self, mock_post):
         """Test successful webhook delivery"""
         mock_post.return_value.status_code = 200
@@ -324,7 +328,7 @@ class WebhookDeliveryTest(TransactionTestCase):
         self.assertEqual(len(attempt.response_body_list), 1)
         self.assertIsNotNone(attempt.succeeded_at)
 
-    @patch("bots.tasks.deliver_webhook_task.requests.post")
+    @patch("bots.tasks.deliver_webhook_task.requests.Session.post")
     def test_webhook_delivery_failure(self, mock_post):
         """Test webhook delivery failure and retry"""
         mock_post.return_value.status_code = 500
@@ -355,7 +359,7 @@ class WebhookDeliveryTest(TransactionTestCase):
         self.assertIsNone(attempt.succeeded_at)
         self.assertEqual(attempt.attempt_count, 3)
 
-    @patch("bots.tasks.deliver_webhook_task.requests.post")
+    @patch("bots.tasks.deliver_webhook_task.requests.Session.post")
     def test_webhook_delivery_inactive(self, mock_post):
         """Test webhook delivery does not deliver when the subscription is inactive"""
 
@@ -381,7 +385,7 @@ class WebhookDeliveryTest(TransactionTestCase):
         self.assertIsNone(attempt.succeeded_at)
         self.assertEqual(attempt.attempt_count, 0)
 
-    @patch("bots.tasks.deliver_webhook_task.requests.post")
+    @patch("bots.tasks.deliver_webhook_task.requests.Session.post")
     def test_bot_webhook_prioritization(self, mock_post):
         """Test that bot-level webhooks are prioritized over project-level webhooks"""
         from bots.webhook_utils import trigger_webhook
@@ -453,3 +457,149 @@ class WebhookDeliveryTest(TransactionTestCase):
         # Test that triggering a webhook for a transcript update does go through, since it uses the project-level webhook
         num_attempts = trigger_webhook(webhook_trigger_type=WebhookTriggerTypes.TRANSCRIPT_UPDATE, bot=self.bot, payload=test_payload)
         self.assertEqual(num_attempts, 1)
+
+
+class WebhookTestServerHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that the connection is kept alive between requests
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.received_requests.append({"path": self.path, "body": body, "signature": self.headers["X-Webhook-Signature"], "client_address": self.client_address})
+            status_code = server.status_codes.pop(0) if server.status_codes else 200
+        response_body = b"OK"
+        self.send_response(status_code)
+        self.send_header("Content-Length", str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WebhookDispatcherTest(TransactionTestCase):
+    """Delivers webhooks to a local HTTP server through trigger_webhooks"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), WebhookTestServerHandler)
+        self.server.lock = threading.Lock()
+        self.server.received_requests = []
+        self.server.status_codes = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+        self.organization = Organization.objects.create(name="Test Org")
+        self.project = Project.objects.create(name="Test Project", organization=self.organization)
+        self.webhook_secret = WebhookSecret.objects.create(project=self.project)
+        self.bot = Bot.objects.create(project=self.project, meeting_url="https://zoom.us/j/123", state=BotStates.JOINED_RECORDING)
+        _webhook_secret_cache.clear()
+
+        # Configure Celery to run tasks eagerly (synchronously)
+        from django.conf import settings
+
+        settings.CELERY_TASK_ALWAYS_EAGER = True
+        settings.CELERY_TASK_EAGER_PROPAGATES = True
+
+    def _create_subscription(self, path, batch_deliveries=False):
+        return WebhookSubscription.objects.create(
+            project=self.project,
+            bot=self.bot,
+            url=f"{self.base_url}{path}",
+            triggers=[WebhookTriggerTypes.TRANSCRIPT_UPDATE, WebhookTriggerTypes.BOT_STATE_CHANGE],
+            batch_deliveries=batch_deliveries,
+        )
+
+    def _requests_for_path(self, path):
+        return [request for request in self.server.received_requests if request["path"] == path]
+
+    def test_batched_subscription_receives_events_in_one_request(self):
+        self._create_subscription("/batched", batch_deliveries=True)
+        self._create_subscription("/single")
+        payloads = [{"transcription": {"transcript": f"utterance {i}"}} for i in range(5)]
+
+        with patch("bots.models.WebhookSecret.get_secret", autospec=True, side_effect=lambda webhook_secret: b"testsecret") as mock_get_secret:
+            num_attempts = trigger_webhooks(webhook_trigger_type=WebhookTriggerTypes.TRANSCRIPT_UPDATE, bot=self.bot, payloads=payloads)
+
+        self.assertEqual(num_attempts, 10)
+        self.assertEqual(WebhookDeliveryAttempt.objects.filter(status=WebhookDeliveryAttemptStatus.SUCCESS).count(), 10)
+
+        # The batched subscription gets one request with an array of all five events
+        batched_requests = self._requests_for_path("/batched")
+        self.assertEqual(len(batched_requests), 1)
+        self.assertEqual([event["data"] for event in batched_requests[0]["body"]], payloads)
+        self.assertEqual({event["trigger"] for event in batched_requests[0]["body"]}, {"transcript.update"})
+        self.assertTrue(verify_signature(batched_requests[0]["body"], batched_requests[0]["signature"], b"testsecret"))
+
+        # The other subscription gets one request per event
+        single_requests = self._requests_for_path("/single")
+        self.assertEqual(len(single_requests), 5)
+        self.assertEqual([request["body"]["data"] for request in single_requests], payloads)
+        self.assertTrue(verify_signature(single_requests[0]["body"], single_requests[0]["signature"], b"testsecret"))
+
+        # All six requests went to the same host, so they shared a single keep-alive connection
+        self.assertEqual(len({request["client_address"] for request in self.server.received_requests}), 1)
+
+        # The secret was only decrypted once
+        self.assertEqual(mock_get_secret.call_count, 1)
+
+    def test_batching_only_applies_to_high_volume_triggers(self):
+        self._create_subscription("/batched", batch_deliveries=True)
+
+        trigger_webhooks(webhook_trigger_type=WebhookTriggerTypes.BOT_STATE_CHANGE, bot=self.bot, payloads=[{"new_state": "joined"}, {"new_state": "ended"}])
+
+        batched_requests = self._requests_for_path("/batched")
+        self.assertEqual(len(batched_requests), 2)
+        self.assertEqual(batched_requests[0]["body"]["data"], {"new_state": "joined"})
+
+    def test_failed_batch_is_retried_without_resending_successful_deliveries(self):
+        self._create_subscription("/batched", batch_deliveries=True)
+        self._create_subscription("/single")
+        # The first request (the batch) fails, everything after succeeds
+        self.server.status_codes = [500]
+
+        trigger_webhooks(webhook_trigger_type=WebhookTriggerTypes.TRANSCRIPT_UPDATE, bot=self.bot, payloads=[{"n": 1}, {"n": 2}])
+
+        self.assertEqual(len(self._requests_for_path("/batched")), 2)
+        self.assertEqual(len(self._requests_for_path("/single")), 2)
+        for delivery in WebhookDeliveryAttempt.objects.filter(webhook_subscription__url__endswith="/batched"):
+            self.assertEqual(delivery.status, WebhookDeliveryAttemptStatus.SUCCESS)
+            self.assertEqual(delivery.attempt_count, 2)
+            self.assertEqual(len(delivery.response_body_list), 2)
+        for delivery in WebhookDeliveryAttempt.objects.filter(webhook_subscription__url__endswith="/single"):
+            self.assertEqual(delivery.status, WebhookDeliveryAttemptStatus.SUCCESS)
+            self.assertEqual(delivery.attempt_count, 1)
+
+    def test_request_that_raises_is_retried_without_resending_the_others(self):
+        self._create_subscription("/first")
+        self._create_subscription("/second")
+        raised = []
+
+        def save_deliveries_failing_once_for_second(deliveries):
+            if deliveries[0].webhook_subscription.url.endswith("/second") and not raised:
+                raised.append(True)
+                raise DatabaseError("connection lost")
+            save_deliveries(deliveries)
+
+        with patch("bots.tasks.deliver_webhook_task.save_deliveries", side_effect=save_deliveries_failing_once_for_second):
+            trigger_webhooks(webhook_trigger_type=WebhookTriggerTypes.BOT_STATE_CHANGE, bot=self.bot, payloads=[{"new_state": "joined"}])
+
+        self.assertEqual(len(self._requests_for_path("/first")), 1)
+        self.assertEqual(len(self._requests_for_path("/second")), 2)
+        self.assertEqual(WebhookDeliveryAttempt.objects.filter(status=WebhookDeliveryAttemptStatus.SUCCESS).count(), 2)
+
+    @patch("bots.tasks.deliver_webhook_task.deliver_webhooks.delay")
+    def test_attempts_are_bulk_created_and_grouped_by_host(self, mock_delay):
+        self._create_subscription("/first")
+        WebhookSubscription.objects.create(project=self.project, bot=self.bot, url="https://other-host.example.com/webhook", triggers=[WebhookTriggerTypes.TRANSCRIPT_UPDATE])
+
+        # Looking up the subscriptions takes two queries, then the attempts are inserted with one statement inside a transaction
+        with self.assertNumQueries(5):
+            num_attempts = trigger_webhooks(webhook_trigger_type=WebhookTriggerTypes.TRANSCRIPT_UPDATE, bot=self.bot, payloads=[{"n": i} for i in range(3)])
+
+        self.assertEqual(num_attempts, 6)
+        self.assertEqual(mock_delay.call_count, 2)
+        self.assertEqual(sorted(len(call.args[0]) for call in mock_delay.call_args_list), [3, 3])
@@ -0,0 +1,65 @@
+import json
+import struct
+from base64 import b64decode, b64encode
+from unittest.mock import MagicMock
+
+from django.test import TestCase
+
+from bots.bot_controller import BotController
+from bots.websocket_payloads import (
+    BINARY_AUDIO_HEADER,
+    BinaryAudioFormats,
+    BinaryAudioMessageTypes,
+    mixed_audio_websocket_binary_payload,
+    mixed_audio_websocket_payload,
+    parse_bot_output_audio_binary_message,
+)
+
+
+class TestWebsocketPayloads(TestCase):
+    def setUp(self):
+        self.chunk = struct.pack("<160h", *range(-80, 80))
+
+    def test_binary_payload_has_header_and_raw_pcm(self):
+        payload = mixed_audio_websocket_binary_payload(chunk=self.chunk, input_sample_rate=16000, output_sample_rate=16000, bot_object_id="bot_abcdefghijklmnop")
+
+        self.assertEqual(BINARY_AUDIO_HEADER.size, 48)
+        version, message_type, audio_format, reserved, sample_rate, timestamp_ms, bot_id = struct.unpack(">BBBBIQ32s", payload[:48])
+        self.assertEqual((version, message_type, audio_format, reserved, sample_rate), (1, BinaryAudioMessageTypes.MIXED_AUDIO_CHUNK, BinaryAudioFormats.PCM_S16LE_MONO, 0, 16000))
+        self.assertGreater(timestamp_ms, 0)
+        self.assertEqual(bot_id.rstrip(b"\x00"), b"bot_abcdefghijklmnop")
+        self.assertEqual(payload[48:], self.chunk)
+
+    def test_binary_payload_is_downsampled_like_json_payload(self):
+        binary_payload = mixed_audio_websocket_binary_payload(chunk=self.chunk, input_sample_rate=32000, output_sample_rate=16000, bot_object_id="bot_abcdefghijklmnop")
+        json_payload = mixed_audio_websocket_payload(chunk=self.chunk, input_sample_rate=32000, output_sample_rate=16000, bot_object_id="bot_abcdefghijklmnop")
+
+        self.assertEqual(binary_payload[BINARY_AUDIO_HEADER.size :], b64decode(json_payload["data"]["chunk"]))
+        # The binary payload is the audio plus the header, the JSON payload is a third larger than the audio just from base64
+        self.assertLess(len(binary_payload), len(json.dumps(json_payload)))
+
+    def test_parse_bot_output_audio_binary_message(self):
+        message = BINARY_AUDIO_HEADER.pack(1, BinaryAudioMessageTypes.BOT_OUTPUT_AUDIO_CHUNK, BinaryAudioFormats.PCM_S16LE_MONO, 0, 24000, 0, b"") + self.chunk
+
+        self.assertEqual(parse_bot_output_audio_binary_message(message), (self.chunk, 24000))
+
+    def test_parse_rejects_invalid_binary_messages(self):
+        invalid_messages = [
+            b"\x01\x02",
+            BINARY_AUDIO_HEADER.pack(2, BinaryAudioMessageTypes.BOT_OUTPUT_AUDIO_CHUNK, BinaryAudioFormats.PCM_S16LE_MONO, 0, 16000, 0, b"") + self.chunk,
+            BINARY_AUDIO_HEADER.pack(1, BinaryAudioMessageTypes.MIXED_AUDIO_CHUNK, BinaryAudioFormats.PCM_S16LE_MONO, 0, 16000, 0, b"") + self.chunk,
+            BINARY_AUDIO_HEADER.pack(1, BinaryAudioMessageTypes.BOT_OUTPUT_AUDIO_CHUNK, 9, 0, 16000, 0, b"") + self.chunk,
+        ]
+        for message in invalid_messages:
+            with self.assertRaises(ValueError):
+                parse_bot_output_audio_binary_message(message)
+
+    def test_bot_controller_accepts_binary_and_json_bot_output_audio(self):
+        controller = MagicMock()
+        binary_message = BINARY_AUDIO_HEADER.pack(1, BinaryAudioMessageTypes.BOT_OUTPUT_AUDIO_CHUNK, BinaryAudioFormats.PCM_S16LE_MONO, 0, 8000, 0, b"") + self.chunk
+        json_message = json.dumps({"trigger": "realtime_audio.bot_output", "data": {"chunk": b64encode(self.chunk).decode("ascii"), "sample_rate": 16000}})
+
+        BotController.on_message_from_websocket_audio(controller, binary_message)
+        BotController.on_message_from_websocket_audio(controller, json_message)
+
+        self.assertEqual([call.args for call in controller.realtime_audio_output_manager.add_chunk.call_args_list], [(self.chunk, 8000), (self.chunk, 16000)])
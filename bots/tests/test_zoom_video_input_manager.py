@@ -0,0 +1,56 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase
+
+from bots.zoom_bot_adapter.video_input_manager import VideoInputManager, VideoInputStream, get_black_i420_frame
+
+
+@patch("bots.zoom_bot_adapter.video_input_manager.GLib")
+@patch("bots.zoom_bot_adapter.video_input_manager.zoom")
+class VideoInputStreamBlackFrameTest(TestCase):
+    def _create_stream(self, mock_zoom, mock_glib, video_input_manager=None):
+        mock_zoom.RawData_Off = "off"
+        mock_zoom.RawData_On = "on"
+        mock_glib.timeout_add.side_effect = lambda interval, callback: len(mock_glib.timeout_add.mock_calls)
+        video_input_manager = video_input_manager or VideoInputManager(new_frame_callback=MagicMock(), wants_any_frames_callback=MagicMock(return_value=True), video_frame_size=(1280, 720))
+        return VideoInputStream(video_input_manager, user_id=1, stream_type=VideoInputManager.StreamType.VIDEO, share_source_id=None)
+
+    def test_timer_only_runs_while_the_user_is_not_sending_video(self, mock_zoom, mock_glib):
+        stream = self._create_stream(mock_zoom, mock_glib)
+        self.assertEqual(mock_glib.timeout_add.call_count, 1)
+        first_timer_id = stream.black_frame_timer_id
+
+        stream.on_raw_data_status_changed_callback(mock_zoom.RawData_On)
+        mock_glib.source_remove.assert_called_once_with(first_timer_id)
+        self.assertIsNone(stream.black_frame_timer_id)
+
+        stream.on_raw_data_status_changed_callback(mock_zoom.RawData_Off)
+        self.assertEqual(mock_glib.timeout_add.call_count, 2)
+        self.assertIsNotNone(stream.black_frame_timer_id)
+
+        stream.cleanup()
+        stream.on_raw_data_status_changed_callback(mock_zoom.RawData_Off)
+        # The timer isn't restarted for a stream that was cleaned up
+        self.assertEqual(mock_glib.timeout_add.call_count, 2)
+        self.assertIsNone(stream.black_frame_timer_id)
+
+    def test_streams_share_the_same_black_frame(self, mock_zoom, mock_glib):
+        video_input_manager = VideoInputManager(new_frame_callback=MagicMock(), wants_any_frames_callback=MagicMock(return_value=True), video_frame_size=(1280, 720))
+        streams = [self._create_stream(mock_zoom, mock_glib, video_input_manager) for _ in range(2)]
+
+        for stream in streams:
+            stream.last_frame_time = 0
+            self.assertTrue(stream.send_black_frame())
+
+        (first_frame, _), (second_frame, _) = [call.args for call in video_input_manager.new_frame_callback.call_args_list]
+        self.assertIs(first_frame, second_frame)
+        self.assertIs(first_frame, get_black_i420_frame((1280, 720)))
+        self.assertEqual(len(first_frame), 1280 * 720 * 3 // 2)
+
+    def test_timer_stops_itself_once_the_user_sends_video(self, mock_zoom, mock_glib):
+        stream = self._create_stream(mock_zoom, mock_glib)
+        stream.raw_data_status = mock_zoom.RawData_On
+
+        self.assertFalse(stream.send_black_frame())
+        self.assertIsNone(stream.black_frame_timer_id)
+        stream.video_input_manager.new_frame_callback.assert_not_called()
@@ -3,7 +3,7 @@ import base64
 import json
 import logging
 import time
-from typing import Optional, Dict, Any
+from typing import Any, Callable, Dict, Optional
 
 import websockets
 from django.conf import settings
@@ -24,7 +24,8 @@ class AssemblyAIStreamingTranscriber:
         sample_rate: int = 16000,
         metadata: Optional[list] = None,
         callback: Optional[str] = None,
-        redaction_settings: Optional[Dict[str, Any]] = None
+        redaction_settings: Optional[Dict[str, Any]] = None,
+        on_final_transcript_callback: Optional[Callable[[dict], None]] = None
     ):
         self.api_key = assemblyai_api_key or settings.ASSEMBLYAI_API_KEY
         self.url = settings.ASSEMBLYAI_REALTIME_URL
@@ -35,6 +36,7 @@ class AssemblyAIStreamingTranscriber:
         self.metadata = metadata
         self.callback = callback
         self.redaction_settings = redaction_settings
+        self.on_final_transcript_callback = on_final_transcript_callback
         
         self.ws = None
         self.last_send_time = time.time()
@@ -124,6 +126,8 @@ class AssemblyAIStreamingTranscriber:
                         })()
                         self.on_message_callback(self, result)
                         logger.info(f"AssemblyAI transcription: {text}")
+                    if text and self.on_final_transcript_callback:
+                        self.on_final_transcript_callback(self._final_transcript_from_message(data))
                         
                 elif data.get("message_type") == "PartialTranscript":
                     if self.interim_results:
@@ -157,6 +161,27 @@ class AssemblyAIStreamingTranscriber:
                     self.on_error_callback(self, str(e))
                 break
     
+    def _final_transcript_from_message(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a FinalTranscript message into the format we store on utterances."""
+        start_ms = data.get("audio_start", 0)
+        end_ms = data.get("audio_end", start_ms)
+        # The words' times are relative to the start of the stream, make them relative to the start of the utterance
+        words = [
+            {
+                "word": word["text"],
+                "start": (word["start"] - start_ms) / 1000.0,
+                "end": (word["end"] - start_ms) / 1000.0,
+                "confidence": word.get("confidence"),
+            }
+            for word in data.get("words", [])
+        ]
+        return {
+            "transcript": data.get("text", ""),
+            "words": words,
+            "start_ms": start_ms,
+            "duration_ms": end_ms - start_ms,
+        }
+    
     def start(self, options=None):
         """Start the transcription session (synchronous wrapper for compatibility)."""
         # Since original Deepgram uses synchronous start, we create event loop if needed
@@ -1,3 +1,4 @@
+import json
 import logging
 import time
 
@@ -12,11 +13,12 @@ logger = logging.getLogger(__name__)
 
 
 class DeepgramStreamingTranscriber:
-    def __init__(self, *, deepgram_api_key, interim_results, language, model, sample_rate, metadata, callback, redaction_settings=None):
+    def __init__(self, *, deepgram_api_key, interim_results, language, model, sample_rate, metadata, callback, redaction_settings=None, on_final_transcript_callback=None):
         # Configure the DeepgramClientOptions to enable KeepAlive for maintaining the WebSocket connection (only if necessary to your scenario)
         config = DeepgramClientOptions(options={"keepalive": "true"})
 
         self.last_send_time = time.time()
+        self.on_final_transcript_callback = on_final_transcript_callback
 
         # Create a websocket connection using the DEEPGRAM_API_KEY from environment variables
         self.deepgram = DeepgramClient(deepgram_api_key, config)
@@ -24,12 +26,28 @@ class DeepgramStreamingTranscriber:
         # Use the listen.live class to create the websocket connection
         self.dg_connection = self.deepgram.listen.websocket.v("1")
 
+        transcriber = self
+
         def on_message(self, result, **kwargs):
             sentence = result.channel.alternatives[0].transcript
             if len(sentence) == 0:
                 return
             logger.info(f"Transcription: {sentence}")
 
+            if result.is_final and transcriber.on_final_transcript_callback:
+                alternative = json.loads(result.channel.alternatives[0].to_json())
+                # The words' times are relative to the start of the stream, make them relative to the start of the result like the other providers' words
+                for word in alternative.get("words", []):
+                    word["start"] -= result.start
+                    word["end"] -= result.start
+                transcriber.on_final_transcript_callback(
+                    {
+                        **alternative,
+                        "start_ms": int(result.start * 1000),
+                        "duration_ms": int(result.duration * 1000),
+                    }
+                )
+
         self.dg_connection.on(LiveTranscriptionEvents.Transcript, on_message)
 
         def on_error(self, error, **kwargs):
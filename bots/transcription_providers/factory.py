@@ -15,7 +15,8 @@ def create_provider(
     sample_rate=16000,
     metadata=None,
     callback=None,
-    redaction_settings=None
+    redaction_settings=None,
+    on_final_transcript_callback=None
 ):
     """
     Factory function to create the appropriate transcription provider.
@@ -35,7 +36,8 @@ def create_provider(
             sample_rate=sample_rate,
             metadata=metadata,
             callback=callback,
-            redaction_settings=redaction_settings
+            redaction_settings=redaction_settings,
+            on_final_transcript_callback=on_final_transcript_callback
         )
     
     elif provider == "deepgram":
@@ -50,7 +52,8 @@ def create_provider(
                 sample_rate=sample_rate,
                 metadata=metadata,
                 callback=callback,
-                redaction_settings=redaction_settings
+                redaction_settings=redaction_settings,
+                on_final_transcript_callback=on_final_transcript_callback
             )
         except ImportError:
             logger.error("Deepgram provider not available, falling back to AssemblyAI")
@@ -63,9 +66,18 @@ def create_provider(
                 sample_rate=sample_rate,
                 metadata=metadata,
                 callback=callback,
-                redaction_settings=redaction_settings
+                redaction_settings=redaction_settings,
+                on_final_transcript_callback=on_final_transcript_callback
             )
     
+    elif provider == "fake":
+        from .fake import FakeRealtimeASRClient
+        logger.info("Using fake transcription provider")
+        return FakeRealtimeASRClient(
+            sample_rate=sample_rate,
+            on_final_transcript_callback=on_final_transcript_callback
+        )
+    
     else:
         # Default to AssemblyAI if unknown provider
         logger.warning(f"Unknown ASR provider '{provider}', defaulting to AssemblyAI")
@@ -78,7 +90,8 @@ def create_provider(
             sample_rate=sample_rate,
             metadata=metadata,
             callback=callback,
-            redaction_settings=redaction_settings
+            redaction_settings=redaction_settings,
+            on_final_transcript_callback=on_final_transcript_callback
         )
 
 
@@ -0,0 +1,3 @@
+from .fake_realtime_asr_client import FakeRealtimeASRClient
+
+__all__ = ["FakeRealtimeASRClient"]
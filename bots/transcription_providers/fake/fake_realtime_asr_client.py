@@ -0,0 +1,136 @@
+import logging
+import time
+from typing import Callable, List, Optional
+
+from ..base import FinalCallback, PartialCallback, RealtimeASRClient
+
+logger = logging.getLogger(__name__)
+
+
+class FakeRealtimeASRClient(RealtimeASRClient):
+    """Offline stand-in for a realtime ASR provider.
+
+    Every `segment_duration_ms` of audio that it receives produces one final result, using the
+    scripted transcripts in order. It implements the async RealtimeASRClient interface as well as the
+    synchronous send/finish interface that the streaming transcribers expose.
+    """
+
+    def __init__(
+        self,
+        *,
+        transcripts: Optional[List[str]] = None,
+        sample_rate: int = 16000,
+        segment_duration_ms: int = 1000,
+        on_final_transcript_callback: Optional[Callable[[dict], None]] = None,
+        **kwargs,
+    ):
+        self.transcripts = list(transcripts) if transcripts else ["hello world"]
+        self.sample_rate = sample_rate
+        self.segment_duration_ms = segment_duration_ms
+        self.on_final_transcript_callback = on_final_transcript_callback
+
+        self.last_send_time = time.time()
+        self.finished = False
+
+        self._partial_callbacks: List[PartialCallback] = []
+        self._final_callbacks: List[FinalCallback] = []
+        self._bytes_received = 0
+        self._segment_start_ms = 0
+        self._segment_bytes = 0
+        self._transcript_index = 0
+
+    def _bytes_to_ms(self, num_bytes: int) -> int:
+        # 16-bit mono PCM
+        return int(num_bytes / (self.sample_rate * 2) * 1000)
+
+    def _next_result(self, end_ms: int) -> dict:
+        transcript = self.transcripts[self._transcript_index % len(self.transcripts)]
+        self._transcript_index += 1
+
+        start_ms = self._segment_start_ms
+        words = transcript.split()
+        word_duration_ms = (end_ms - start_ms) / max(len(words), 1)
+        result = {
+            "transcript": transcript,
+            "words": [
+                {
+                    "word": word,
+                    # Relative to the start of the result, like the words of the other providers
+                    "start": i * word_duration_ms / 1000.0,
+                    "end": (i + 1) * word_duration_ms / 1000.0,
+                    "confidence": 1.0,
+                }
+                for i, word in enumerate(words)
+            ],
+            "start_ms": start_ms,
+            "duration_ms": end_ms - start_ms,
+        }
+
+        self._segment_start_ms = end_ms
+        return result
+
+    def _consume(self, pcm16: bytes) -> List[dict]:
+        results = []
+        segment_size_bytes = int(self.sample_rate * 2 * self.segment_duration_ms / 1000)
+        self._bytes_received += len(pcm16)
+        self._segment_bytes += len(pcm16)
+        while self._segment_bytes >= segment_size_bytes:
+            self._segment_bytes -= segment_size_bytes
+            results.append(self._next_result(self._segment_start_ms + self.segment_duration_ms))
+        return results
+
+    def _drain(self) -> List[dict]:
+        if self._segment_bytes == 0:
+            return []
+        self._segment_bytes = 0
+        return [self._next_result(self._bytes_to_ms(self._bytes_received))]
+
+    def _emit(self, results: List[dict]) -> None:
+        if not self.on_final_transcript_callback:
+            return
+        for result in results:
+            self.on_final_transcript_callback(result)
+
+    # Synchronous interface used by PerParticipantStreamingAudioInputManager
+
+    def send(self, data: bytes) -> None:
+        if self.finished:
+            logger.warning("Cannot send audio - fake transcriber already finished")
+            return
+        self._emit(self._consume(data))
+        self.last_send_time = time.time()
+
+    def finish(self) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        self._emit(self._drain())
+
+    # RealtimeASRClient interface
+
+    async def connect(self) -> None:
+        self.finished = False
+
+    async def send_audio(self, pcm16: bytes) -> None:
+        for result in self._consume(pcm16):
+            await self._dispatch_final(result)
+        self.last_send_time = time.time()
+
+    async def close(self) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        for result in self._drain():
+            await self._dispatch_final(result)
+
+    def on_partial(self, callback: PartialCallback) -> None:
+        self._partial_callbacks.append(callback)
+
+    def on_final(self, callback: FinalCallback) -> None:
+        self._final_callbacks.append(callback)
+
+    async def _dispatch_final(self, result: dict) -> None:
+        self._emit([result])
+        end_ms = result["start_ms"] + result["duration_ms"]
+        for callback in self._final_callbacks:
+            await callback(result["transcript"], result["start_ms"], end_ms)
@@ -0,0 +1,522 @@
+import asyncio
+import logging
+import os
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.utils import timezone
+
+from bots.models import Credentials, RecordingTranscriptionStates, TranscriptionFailureReasons, TranscriptionProviders, Utterance
+from bots.tasks.process_utterance_task import (
+    assemblyai_transcript_request_body,
+    assemblyai_transcription_error_result,
+    elevenlabs_form_data,
+    format_assemblyai_transcription,
+    format_elevenlabs_transcription,
+    format_gladia_transcription,
+    gladia_transcribe_request_body,
+    is_retryable_failure,
+    openai_transcription_form_data,
+    sarvam_form_data,
+    save_utterance_transcription,
+    save_utterance_transcription_failure,
+    utterance_audio_formats,
+)
+from bots.utils import encode_pcm
+from bots.utterance_transcription_queue import (
+    acquire_utterance_transcription_leases,
+    add_utterances_to_transcription_queue,
+    finish_utterance_transcriptions,
+    pending_utterance_ids,
+    pop_utterances_from_transcription_queue,
+    release_utterance_transcription_lease,
+    unleased_utterance_ids,
+)
+
+logger = logging.getLogger(__name__)
+
+# Results that aren't ready after this long time out, like in the process_utterance task
+TRANSCRIPTION_RESULT_TIMEOUT_SECONDS = 120
+# The wait between polls for a result doubles from the initial delay up to the max delay
+POLL_INITIAL_DELAY_SECONDS = 1
+POLL_MAX_DELAY_SECONDS = 10
+# Same number of attempts as the process_utterance task
+MAX_TRANSCRIPTION_ATTEMPTS = 5
+RETRY_MAX_DELAY_SECONDS = 60
+# Utterances that have waited this long without being transcribed are added to the queue again, in case a worker died while it had them
+STALE_UTTERANCE_AGE = timedelta(minutes=10)
+
+TRANSCRIPTION_PROVIDER_CREDENTIAL_TYPES = {
+    TranscriptionProviders.DEEPGRAM: Credentials.CredentialTypes.DEEPGRAM,
+    TranscriptionProviders.GLADIA: Credentials.CredentialTypes.GLADIA,
+    TranscriptionProviders.OPENAI: Credentials.CredentialTypes.OPENAI,
+    TranscriptionProviders.ASSEMBLY_AI: Credentials.CredentialTypes.ASSEMBLY_AI,
+    TranscriptionProviders.SARVAM: Credentials.CredentialTypes.SARVAM,
+    TranscriptionProviders.ELEVENLABS: Credentials.CredentialTypes.ELEVENLABS,
+}
+
+
+def default_transcription_provider_base_urls():
+    return {
+        TranscriptionProviders.DEEPGRAM: "https://api.deepgram.com/v1",
+        TranscriptionProviders.GLADIA: "https://api.gladia.io/v2",
+        TranscriptionProviders.OPENAI: os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+        TranscriptionProviders.ASSEMBLY_AI: "https://api.assemblyai.com/v2",
+        TranscriptionProviders.SARVAM: "https://api.sarvam.ai",
+        TranscriptionProviders.ELEVENLABS: "https://api.elevenlabs.io/v1",
+    }
+
+
+@dataclass(frozen=True)
+class TranscriptionJob:
+    utterance: Utterance
+    transcription_provider: int
+    credentials_id: int | None
+    credentials: dict | None
+    # The encoded audio for providers that are sent a file, and the raw PCM for Deepgram
+    audio: object
+
+
+class TranscriptionClientPool:
+    """
+    Keeps an HTTP client for each provider and credential, so the requests made with the same credentials reuse their
+    connections, and one account's slow requests can't use up the connections of the others.
+    """
+
+    def __init__(self, base_urls=None, max_connections_per_client=100, transport=None):
+        self.base_urls = {**default_transcription_provider_base_urls(), **(base_urls or {})}
+        self.max_connections_per_client = max_connections_per_client
+        self.transport = transport
+        self.clients = {}
+
+    def get_client(self, transcription_provider, credentials_id):
+        key = (transcription_provider, credentials_id)
+        client = self.clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=self.base_urls[transcription_provider],
+                http2=True,
+                limits=httpx.Limits(max_connections=self.max_connections_per_client, max_keepalive_connections=self.max_connections_per_client),
+                timeout=httpx.Timeout(60, connect=10),
+                transport=self.transport,
+            )
+            self.clients[key] = client
+        return client
+
+    async def aclose(self):
+        clients = list(self.clients.values())
+        self.clients = {}
+        await asyncio.gather(*[client.aclose() for client in clients], return_exceptions=True)
+
+
+class CredentialsCache:
+    """Decrypted credentials by the id of their record. They are decrypted again only when the record has been updated."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get_credentials(self, credentials_record):
+        entry = self.entries.get(credentials_record.id)
+        if entry is None or entry[0] != credentials_record.updated_at:
+            entry = (credentials_record.updated_at, credentials_record.get_credentials())
+            self.entries[credentials_record.id] = entry
+        return entry[1]
+
+
+def encode_utterance_audio(utterance, transcription_provider):
+    if transcription_provider == TranscriptionProviders.DEEPGRAM:
+        return utterance.get_audio_blob()
+    # Sarvam says 16kHz sample rate works best
+    output_sample_rate = 16000 if transcription_provider == TranscriptionProviders.SARVAM else None
+    return encode_pcm(utterance.get_audio_blob(), sample_rate=utterance.sample_rate, audio_formats=utterance_audio_formats(transcription_provider), output_sample_rate=output_sample_rate)
+
+
+def load_transcription_jobs(utterance_ids, credentials_cache):
+    """
+    Loads the utterances that still need to be transcribed, with their credentials and audio. Takes the same few queries for a whole batch.
+    Returns the jobs, and the ids of the utterances that don't need to be transcribed anymore because they were transcribed, failed or deleted.
+    """
+    close_old_connections()
+
+    utterances = list(Utterance.objects.filter(id__in=utterance_ids, transcription__isnull=True, failure_data__isnull=True).select_related("recording__bot__project"))
+    finished_utterance_ids = set(utterance_ids) - {utterance.id for utterance in utterances}
+    credentials_records = Credentials.objects.filter(
+        project_id__in={utterance.recording.bot.project_id for utterance in utterances},
+        credential_type__in=TRANSCRIPTION_PROVIDER_CREDENTIAL_TYPES.values(),
+    )
+    credentials_records_by_project_and_type = {(record.project_id, record.credential_type): record for record in credentials_records}
+
+    jobs = []
+    for utterance in utterances:
+        transcription_provider = utterance.recording.transcription_provider
+        credentials_record = credentials_records_by_project_and_type.get((utterance.recording.bot.project_id, TRANSCRIPTION_PROVIDER_CREDENTIAL_TYPES.get(transcription_provider)))
+        try:
+            credentials = credentials_cache.get_credentials(credentials_record) if credentials_record else None
+            audio = encode_utterance_audio(utterance, transcription_provider) if transcription_provider in TRANSCRIPTION_PROVIDER_CREDENTIAL_TYPES else None
+        except Exception:
+            # Skipped, so its lease is released and the sweep for stale utterances picks it up again later
+            logger.exception(f"Failed to load utterance {utterance.id} for transcription")
+            continue
+        jobs.append(TranscriptionJob(utterance=utterance, transcription_provider=transcription_provider, credentials_id=credentials_record.id if credentials_record else None, credentials=credentials, audio=audio))
+    return jobs, finished_utterance_ids
+
+
+def find_stale_utterance_ids(now):
+    """Returns the ids of the utterances that have been waiting to be transcribed for longer than they should have."""
+    close_old_connections()
+    return list(
+        Utterance.objects.filter(
+            recording__transcription_state=RecordingTranscriptionStates.IN_PROGRESS,
+            audio_format=Utterance.AudioFormat.PCM,
+            transcription__isnull=True,
+            failure_data__isnull=True,
+            created_at__lt=now - STALE_UTTERANCE_AGE,
+        ).values_list("id", flat=True)
+    )
+
+
+def save_transcription_attempt_count(utterance):
+    close_old_connections()
+    Utterance.objects.filter(id=utterance.id).update(transcription_attempt_count=utterance.transcription_attempt_count)
+
+
+def save_transcription(utterance, transcription):
+    close_old_connections()
+    save_utterance_transcription(utterance, transcription)
+
+
+def save_transcription_failure(utterance, failure_data):
+    close_old_connections()
+    save_utterance_transcription_failure(utterance, failure_data)
+
+
+def poll_delays():
+    """Yields how long to wait before each poll for a transcription result, until the result times out."""
+    delay = POLL_INITIAL_DELAY_SECONDS
+    waited = 0
+    while waited < TRANSCRIPTION_RESULT_TIMEOUT_SECONDS:
+        yield delay
+        waited += delay
+        delay = min(delay * 2, POLL_MAX_DELAY_SECONDS)
+
+
+def retry_delay_seconds(attempt_count):
+    """Exponential backoff with full jitter, so utterances that failed together aren't retried together."""
+    return random.uniform(0, min(2**attempt_count, RETRY_MAX_DELAY_SECONDS))
+
+
+async def transcribe_via_deepgram(client, job):
+    bot = job.utterance.recording.bot
+    params = {
+        "model": bot.deepgram_model(),
+        "smart_format": True,
+        "language": bot.deepgram_language(),
+        "detect_language": bot.deepgram_detect_language(),
+        "keyterm": bot.deepgram_keyterms(),
+        "keywords": bot.deepgram_keywords(),
+        "encoding": "linear16",  # for 16-bit PCM
+        "sample_rate": job.utterance.sample_rate,
+        "redact": bot.deepgram_redaction_settings(),
+    }
+    headers = {"Authorization": f"Token {job.credentials['api_key']}", "Content-Type": "application/octet-stream"}
+    response = await client.post("/listen", params={name: value for name, value in params.items() if value is not None}, headers=headers, content=job.audio)
+
+    if response.status_code != 200:
+        try:
+            error_json = response.json()
+        except ValueError:
+            error_json = {"body": response.text}
+        if response.status_code == 401 or error_json.get("err_code") == "INVALID_AUTH":
+            return None, {"reason": TranscriptionFailureReasons.CREDENTIALS_INVALID}
+        return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "error_code": error_json.get("err_code"), "error_json": error_json}
+
+    alternatives = response.json()["results"]["channels"][0]["alternatives"]
+    if len(alternatives) == 0:
+        return {"transcript": "", "words": []}, None
+    return alternatives[0], None
+
+
+async def transcribe_via_gladia(client, job):
+    headers = {"x-gladia-key": job.credentials["api_key"]}
+    files = {"audio": (f"file.{job.audio.file_extension}", job.audio.data, job.audio.content_type)}
+    upload_response = await client.post("/upload", headers=headers, files=files)
+
+    if upload_response.status_code == 401:
+        return None, {"reason": TranscriptionFailureReasons.CREDENTIALS_INVALID}
+
+    if upload_response.status_code != 200 and upload_response.status_code != 201:
+        return None, {"reason": TranscriptionFailureReasons.AUDIO_UPLOAD_FAILED, "status_code": upload_response.status_code}
+
+    transcribe_response = await client.post("/pre-recorded", headers=headers, json=gladia_transcribe_request_body(job.utterance.recording.bot, upload_response.json()["audio_url"]))
+
+    if transcribe_response.status_code != 200 and transcribe_response.status_code != 201:
+        return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "step": "transcribe_request", "status_code": transcribe_response.status_code}
+
+    result_url = transcribe_response.json()["result_url"]
+
+    for delay in poll_delays():
+        await asyncio.sleep(delay)
+        result_response = await client.get(result_url, headers=headers)
+
+        if result_response.status_code != 200:
+            logger.error(f"Gladia result fetch failed with status code {result_response.status_code}")
+            continue
+
+        result_data = result_response.json()
+        status = result_data.get("status")
+
+        if status == "done":
+            delete_response = await client.delete(result_url, headers=headers)
+            if delete_response.status_code != 200 and delete_response.status_code != 202:
+                logger.error(f"Gladia delete failed with status code {delete_response.status_code}")
+            return format_gladia_transcription(result_data), None
+
+        elif status == "error":
+            return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "step": "transcribe_result_poll", "error_code": result_data.get("error_code")}
+
+        elif status not in ["queued", "processing"]:
+            return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "step": "transcribe_result_poll", "status": status}
+
+    return None, {"reason": TranscriptionFailureReasons.TIMED_OUT, "step": "transcribe_result_poll"}
+
+
+async def transcribe_via_openai(client, job):
+    # Audio clips this short almost certainly don't have any speech, and the OpenAI API fails on them with a corrupted file error
+    if job.utterance.duration_ms < 80:
+        return {"transcript": ""}, None
+
+    headers = {"Authorization": f"Bearer {job.credentials['api_key']}"}
+    files = {"file": (f"file.{job.audio.file_extension}", job.audio.data, job.audio.content_type)}
+    response = await client.post("/audio/transcriptions", headers=headers, files=files, data=openai_transcription_form_data(job.utterance.recording.bot))
+
+    if response.status_code == 401:
+        return None, {"reason": TranscriptionFailureReasons.CREDENTIALS_INVALID}
+
+    if response.status_code != 200:
+        logger.error(f"OpenAI transcription failed with status code {response.status_code}: {response.text}")
+        return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "status_code": response.status_code, "response_text": response.text}
+
+    return {"transcript": response.json().get("text", "")}, None
+
+
+async def transcribe_via_assemblyai(client, job):
+    headers = {"authorization": job.credentials["api_key"]}
+    upload_response = await client.post("/upload", headers=headers, content=job.audio.data)
+
+    if upload_response.status_code == 401:
+        return None, {"reason": TranscriptionFailureReasons.CREDENTIALS_INVALID}
+
+    if upload_response.status_code != 200:
+        return None, {"reason": TranscriptionFailureReasons.AUDIO_UPLOAD_FAILED, "status_code": upload_response.status_code, "text": upload_response.text}
+
+    response = await client.post("/transcript", headers=headers, json=assemblyai_transcript_request_body(job.utterance.recording.bot, upload_response.json()["upload_url"]))
+
+    if response.status_code != 200:
+        return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "status_code": response.status_code, "text": response.text}
+
+    polling_endpoint = f"/transcript/{response.json()['id']}"
+
+    for delay in poll_delays():
+        await asyncio.sleep(delay)
+        polling_response = await client.get(polling_endpoint, headers=headers)
+
+        if polling_response.status_code != 200:
+            logger.error(f"AssemblyAI result fetch failed with status code {polling_response.status_code}")
+            continue
+
+        transcription_result = polling_response.json()
+
+        if transcription_result["status"] == "completed":
+            delete_response = await client.delete(polling_endpoint, headers=headers)
+            if delete_response.status_code != 200:
+                logger.error(f"AssemblyAI delete failed with status code {delete_response.status_code}: {delete_response.text}")
+            return format_assemblyai_transcription(transcription_result), None
+
+        elif transcription_result["status"] == "error":
+            return assemblyai_transcription_error_result(job.utterance, transcription_result)
+
+    return None, {"reason": TranscriptionFailureReasons.TIMED_OUT, "step": "transcribe_result_poll"}
+
+
+async def transcribe_via_sarvam(client, job):
+    # Audio clips this short almost certainly don't have any speech, and the Sarvam API fails on them
+    if job.utterance.duration_ms < 50:
+        return {"transcript": ""}, None
+
+    headers = {"api-subscription-key": job.credentials["api_key"]}
+    files = {"file": (f"audio.{job.audio.file_extension}", job.audio.data, job.audio.content_type)}
+    response = await client.post("/speech-to-text", headers=headers, files=files, data=sarvam_form_data(job.utterance.recording.bot))
+
+    if response.status_code == 403:
+        return None, {"reason": TranscriptionFailureReasons.CREDENTIALS_INVALID}
+
+    if response.status_code == 429:
+        return None, {"reason": TranscriptionFailureReasons.RATE_LIMIT_EXCEEDED, "status_code": response.status_code}
+
+    if response.status_code != 200:
+        logger.error(f"Sarvam transcription failed with status code {response.status_code}: {response.text}")
+        return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "status_code": response.status_code, "response_text": response.text}
+
+    return {"transcript": response.json().get("transcript", "")}, None
+
+
+async def transcribe_via_elevenlabs(client, job):
+    headers = {"xi-api-key": job.credentials["api_key"]}
+    files = {"file": (f"audio.{job.audio.file_extension}", job.audio.data, job.audio.content_type)}
+    data = {name: value for name, value in elevenlabs_form_data(job.utterance.recording.bot).items() if value is not None}
+    response = await client.post("/speech-to-text", headers=headers, files=files, data=data)
+
+    if response.status_code == 401:
+        return None, {"reason": TranscriptionFailureReasons.CREDENTIALS_INVALID}
+
+    if response.status_code == 429:
+        return None, {"reason": TranscriptionFailureReasons.RATE_LIMIT_EXCEEDED, "status_code": response.status_code}
+
+    if response.status_code != 200:
+        logger.error(f"ElevenLabs transcription failed with status code {response.status_code}: {response.text}")
+        return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "status_code": response.status_code, "response_text": response.text}
+
+    return format_elevenlabs_transcription(job.utterance, response.json()), None
+
+
+TRANSCRIBERS = {
+    TranscriptionProviders.DEEPGRAM: transcribe_via_deepgram,
+    TranscriptionProviders.GLADIA: transcribe_via_gladia,
+    TranscriptionProviders.OPENAI: transcribe_via_openai,
+    TranscriptionProviders.ASSEMBLY_AI: transcribe_via_assemblyai,
+    TranscriptionProviders.SARVAM: transcribe_via_sarvam,
+    TranscriptionProviders.ELEVENLABS: transcribe_via_elevenlabs,
+}
+
+
+async def transcribe(client_pool, job):
+    """The async counterpart of get_transcription. Returns the transcription and failure data the same way."""
+    try:
+        transcriber = TRANSCRIBERS.get(job.transcription_provider)
+        if transcriber is None:
+            raise Exception(f"Unknown transcription provider: {job.transcription_provider}")
+        if not job.credentials:
+            return None, {"reason": TranscriptionFailureReasons.CREDENTIALS_NOT_FOUND}
+        if not job.credentials.get("api_key"):
+            return None, {"reason": TranscriptionFailureReasons.CREDENTIALS_NOT_FOUND, "error": "api_key not in credentials"}
+
+        return await transcriber(client_pool.get_client(job.transcription_provider, job.credentials_id), job)
+    except httpx.HTTPError as e:
+        return None, {"reason": TranscriptionFailureReasons.TRANSCRIPTION_REQUEST_FAILED, "error": str(e)}
+    except Exception as e:
+        return None, {"reason": TranscriptionFailureReasons.INTERNAL_ERROR, "error": str(e)}
+
+
+class TranscriptionWorker:
+    """
+    Transcribes the utterances in the utterance transcription queue. Utterances are pulled from the queue in batches and
+    transcribed concurrently on one event loop, so waiting on a provider doesn't take up a process or a thread.
+    """
+
+    def __init__(self, redis_client, client_pool, batch_size=50, max_in_flight=500):
+        self.redis_client = redis_client
+        self.client_pool = client_pool
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.credentials_cache = CredentialsCache()
+        self.in_flight = set()
+
+    async def run(self, keep_running, stale_sweep_interval_seconds=60):
+        next_stale_sweep = 0
+        try:
+            while keep_running():
+                try:
+                    if asyncio.get_running_loop().time() >= next_stale_sweep:
+                        await self.requeue_stale_utterances()
+                        next_stale_sweep = asyncio.get_running_loop().time() + stale_sweep_interval_seconds
+                    await self.transcribe_next_batch()
+                except Exception:
+                    logger.exception("Transcription worker failed to start a batch")
+                    await asyncio.sleep(5)
+        finally:
+            # Let the utterances that were started finish, their leases would keep them from being picked up again for a while
+            await self.wait_for_in_flight()
+            await self.client_pool.aclose()
+
+    async def transcribe_next_batch(self, timeout_seconds=1):
+        """Pulls a batch of utterances from the queue and starts transcribing them. Returns the number started."""
+        if len(self.in_flight) >= self.max_in_flight:
+            await asyncio.wait(self.in_flight, return_when=asyncio.FIRST_COMPLETED)
+            return 0
+
+        count = min(self.batch_size, self.max_in_flight - len(self.in_flight))
+        utterance_ids = await asyncio.to_thread(pop_utterances_from_transcription_queue, self.redis_client, count, timeout_seconds)
+        if not utterance_ids:
+            return 0
+
+        leased_utterance_ids = await asyncio.to_thread(acquire_utterance_transcription_leases, self.redis_client, utterance_ids)
+        if not leased_utterance_ids:
+            return 0
+
+        # The database work runs with thread_sensitive=False, so it is spread over the threads of the event loop's executor instead of
+        # waiting on a single thread for all the utterances in flight. The threads keep their connections, which is why each call closes old ones first.
+        jobs, finished_utterance_ids = await sync_to_async(load_transcription_jobs, thread_sensitive=False)(leased_utterance_ids, self.credentials_cache)
+        await asyncio.to_thread(finish_utterance_transcriptions, self.redis_client, finished_utterance_ids)
+        # Utterances that were finished or failed to load don't need their lease
+        loaded_utterance_ids = {job.utterance.id for job in jobs}
+        for utterance_id in leased_utterance_ids:
+            if utterance_id not in loaded_utterance_ids:
+                await asyncio.to_thread(release_utterance_transcription_lease, self.redis_client, utterance_id)
+
+        for job in jobs:
+            task = asyncio.create_task(self.process_job(job))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+        return len(jobs)
+
+    async def wait_for_in_flight(self):
+        if self.in_flight:
+            await asyncio.gather(*self.in_flight, return_exceptions=True)
+
+    async def process_job(self, job):
+        """Transcribes the utterance like the process_utterance task, retrying with backoff in place of Celery."""
+        utterance = job.utterance
+        try:
+            while True:
+                utterance.transcription_attempt_count += 1
+                transcription, failure_data = await transcribe(self.client_pool, job)
+
+                if not failure_data:
+                    await sync_to_async(save_transcription, thread_sensitive=False)(utterance, transcription)
+                    await asyncio.to_thread(finish_utterance_transcriptions, self.redis_client, [utterance.id])
+                    return
+
+                if utterance.transcription_attempt_count < MAX_TRANSCRIPTION_ATTEMPTS and is_retryable_failure(failure_data):
+                    logger.info(f"Retryable failure when transcribing utterance {utterance.id}: {failure_data}")
+                    await sync_to_async(save_transcription_attempt_count, thread_sensitive=False)(utterance)
+                    await asyncio.sleep(retry_delay_seconds(utterance.transcription_attempt_count))
+                    continue
+
+                await sync_to_async(save_transcription_failure, thread_sensitive=False)(utterance, failure_data)
+                await asyncio.to_thread(finish_utterance_transcriptions, self.redis_client, [utterance.id])
+                return
+        except Exception:
+            logger.exception(f"Failed to transcribe utterance {utterance.id}")
+        finally:
+            try:
+                await asyncio.to_thread(release_utterance_transcription_lease, self.redis_client, utterance.id)
+            except Exception as e:
+                logger.warning(f"Failed to release the transcription lease for utterance {utterance.id}: {e}")
+
+    async def requeue_stale_utterances(self):
+        """
+        Adds the utterances the worker is responsible for that should have been transcribed by now back to the queue,
+        unless a worker is still on them or they are still in the queue.
+        """
+        stale_utterance_ids = await sync_to_async(find_stale_utterance_ids, thread_sensitive=False)(timezone.now())
+        if not stale_utterance_ids:
+            return
+        stale_utterance_ids = await asyncio.to_thread(pending_utterance_ids, self.redis_client, stale_utterance_ids)
+        stale_utterance_ids = await asyncio.to_thread(unleased_utterance_ids, self.redis_client, stale_utterance_ids)
+        requeued_utterance_ids = await asyncio.to_thread(add_utterances_to_transcription_queue, self.redis_client, stale_utterance_ids)
+        if requeued_utterance_ids:
+            logger.info(f"Added {len(requeued_utterance_ids)} stale utterances back to the transcription queue")
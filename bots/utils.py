@@ -1,4 +1,6 @@
 import io
+import logging
+from typing import NamedTuple
 
 import cv2
 import numpy as np
@@ -10,6 +12,18 @@ from .models import (
     TranscriptionProviders,
 )
 
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+logger = logging.getLogger(__name__)
+
 
 def pcm_to_mp3(
     pcm_data: bytes,
@@ -58,6 +72,107 @@ def pcm_to_mp3(
     return mp3_data
 
 
+class AudioFormats:
+    OGG_OPUS = "ogg_opus"
+    FLAC = "flac"
+    MP3 = "mp3"
+
+
+class EncodedAudio(NamedTuple):
+    data: bytes
+    file_extension: str
+    content_type: str
+
+
+# Opus can only encode audio at these sample rates
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def resample_pcm(pcm_data: bytes, sample_rate: int, output_sample_rate: int) -> np.ndarray:
+    """
+    Resample mono 16-bit PCM audio data with soxr. Its low-pass filter removes the frequencies above the new Nyquist
+    frequency when downsampling, so they don't alias into the speech.
+
+    Returns:
+        np.ndarray: The resampled samples as int16
+    """
+    samples = np.frombuffer(pcm_data, dtype=np.int16)
+    if output_sample_rate == sample_rate or len(samples) == 0:
+        return samples
+
+    if soxr is None:
+        raise RuntimeError("soxr is not installed, so the audio can't be resampled in process")
+    return soxr.resample(samples, sample_rate, output_sample_rate)
+
+
+def _encode_with_soundfile(samples: np.ndarray, sample_rate: int, format: str, subtype: str) -> bytes:
+    buffer = io.BytesIO()
+    soundfile.write(buffer, samples, sample_rate, format=format, subtype=subtype)
+    return buffer.getvalue()
+
+
+def pcm_to_flac(pcm_data: bytes, sample_rate: int = 32000, output_sample_rate: int = None) -> bytes:
+    """
+    Convert mono 16-bit PCM audio data to FLAC format, in process with libsndfile.
+
+    Args:
+        pcm_data (bytes): Raw PCM audio data
+        sample_rate (int): Input sample rate in Hz (default: 32000)
+        output_sample_rate (int): Output sample rate in Hz (default: None, uses input sample_rate)
+
+    Returns:
+        bytes: FLAC encoded audio data
+    """
+    output_sample_rate = output_sample_rate or sample_rate
+    return _encode_with_soundfile(resample_pcm(pcm_data, sample_rate, output_sample_rate), output_sample_rate, "FLAC", "PCM_16")
+
+
+def pcm_to_ogg_opus(pcm_data: bytes, sample_rate: int = 32000, output_sample_rate: int = None) -> bytes:
+    """
+    Convert mono 16-bit PCM audio data to Opus in an Ogg container, in process with libsndfile.
+
+    Args:
+        pcm_data (bytes): Raw PCM audio data
+        sample_rate (int): Input sample rate in Hz (default: 32000)
+        output_sample_rate (int): Output sample rate in Hz (default: None, uses input sample_rate). Rates Opus doesn't
+            support are raised to the next one it does, so none of the audio is lost.
+
+    Returns:
+        bytes: Ogg Opus encoded audio data
+    """
+    output_sample_rate = output_sample_rate or sample_rate
+    opus_sample_rate = next((rate for rate in OPUS_SAMPLE_RATES if rate >= output_sample_rate), OPUS_SAMPLE_RATES[-1])
+    return _encode_with_soundfile(resample_pcm(pcm_data, sample_rate, opus_sample_rate), opus_sample_rate, "OGG", "OPUS")
+
+
+def encode_pcm(pcm_data: bytes, sample_rate: int, audio_formats: list[str], output_sample_rate: int = None) -> EncodedAudio:
+    """
+    Encode mono 16-bit PCM audio data in the first of the audio formats that can be encoded in process. Falls back to
+    MP3, which pydub encodes with an ffmpeg subprocess.
+
+    Args:
+        pcm_data (bytes): Raw PCM audio data
+        sample_rate (int): Input sample rate in Hz
+        audio_formats (list[str]): AudioFormats to try, in order of preference
+        output_sample_rate (int): Output sample rate in Hz (default: None, uses input sample_rate)
+
+    Returns:
+        EncodedAudio: The encoded audio data, with the file extension and content type of its format
+    """
+    for audio_format in audio_formats:
+        if audio_format == AudioFormats.MP3 or soundfile is None:
+            break
+        try:
+            if audio_format == AudioFormats.OGG_OPUS:
+                return EncodedAudio(pcm_to_ogg_opus(pcm_data, sample_rate=sample_rate, output_sample_rate=output_sample_rate), "ogg", "audio/ogg")
+            if audio_format == AudioFormats.FLAC:
+                return EncodedAudio(pcm_to_flac(pcm_data, sample_rate=sample_rate, output_sample_rate=output_sample_rate), "flac", "audio/flac")
+        except Exception as e:
+            logger.warning(f"Failed to encode audio as {audio_format}, trying the next format: {e}")
+
+    return EncodedAudio(pcm_to_mp3(pcm_data, sample_rate=sample_rate, output_sample_rate=output_sample_rate), "mp3", "audio/mpeg")
+
+
 def mp3_to_pcm(mp3_data: bytes, sample_rate: int = 32000, channels: int = 1, sample_width: int = 2) -> bytes:
     """
     Convert MP3 audio data to PCM format.
@@ -117,109 +232,137 @@ def half_ceil(x):
     return (x + 1) // 2
 
 
+def half_floor(x):
+    return x // 2
+
+
+class I420Scaler:
+    """
+    Scales I420 (YUV 4:2:0) frames of one size to another, preserving the aspect ratio and
+    letterboxing/pillarboxing the result on a black background when the aspect ratios differ.
+    Odd frame widths/heights are handled by using 'ceil' in the chroma planes, or 'floor' if ceil_chroma is False.
+
+    The letterbox geometry and the output canvas, with its black borders already filled in, are set up once.
+    Each frame is then resized straight into the canvas, so the only allocation per frame is the returned bytes.
+    A scaler is not thread safe, since every call writes to the same canvas.
+    """
+
+    def __init__(self, frame_size, new_size, ceil_chroma=True):
+        """
+        :param frame_size:  (orig_width, orig_height)
+        :param new_size:    (new_width, new_height)
+        :param ceil_chroma: Whether the chroma planes of frames with odd widths/heights are rounded up or down
+        """
+        self.frame_size = tuple(frame_size)
+        self.new_size = tuple(new_size)
+        half = half_ceil if ceil_chroma else half_floor
+
+        # 1) Unpack source / destination dimensions
+        orig_width, orig_height = self.frame_size
+        new_width, new_height = self.new_size
+
+        # 2) Compute source plane sizes with rounding for chroma
+        self.orig_chroma_shape = (half(orig_height), half(orig_width))
+        self.y_plane_size = orig_width * orig_height
+        self.uv_plane_size = self.orig_chroma_shape[0] * self.orig_chroma_shape[1]  # for each U or V
+
+        # 3) Fit the frame inside the new size, letterboxing or pillarboxing if the aspect ratios differ
+        input_aspect = orig_width / orig_height
+        output_aspect = new_width / new_height
+
+        if abs(input_aspect - output_aspect) < 1e-6:
+            # Same aspect ratio; the frame fills the whole output
+            scaled_width, scaled_height = new_width, new_height
+        elif input_aspect > output_aspect:
+            # The image is relatively wider => match width, shrink height
+            scaled_width = new_width
+            scaled_height = int(round(new_width / input_aspect))
+        else:
+            # The image is relatively taller => match height, shrink width
+            scaled_height = new_height
+            scaled_width = int(round(new_height * input_aspect))
+
+        # For U, V, use half-dimensions of the scaled result, rounded the same way.
+        self.scaled_y_size = (scaled_width, scaled_height)
+        self.scaled_uv_size = (half(scaled_width), half(scaled_height))
+
+        # 4) Create the output canvas in I420 layout. For "dark" black:
+        #    Y=0, U=128, V=128.
+        new_y_plane_size = new_width * new_height
+        new_uv_plane_size = half(new_width) * half(new_height)
+        self.canvas = np.full(new_y_plane_size + 2 * new_uv_plane_size, 128, dtype=np.uint8)
+        self.canvas[:new_y_plane_size] = 0
+        final_y = self.canvas[:new_y_plane_size].reshape(new_height, new_width)
+        final_u = self.canvas[new_y_plane_size : new_y_plane_size + new_uv_plane_size].reshape(half(new_height), half(new_width))
+        final_v = self.canvas[new_y_plane_size + new_uv_plane_size :].reshape(half(new_height), half(new_width))
+
+        # 5) Compute centering offsets for each plane (Y first), and keep views of the regions the scaled planes go in
+        offset_y = (new_height - scaled_height) // 2
+        offset_x = (new_width - scaled_width) // 2
+        self.y_destination = final_y[offset_y : offset_y + scaled_height, offset_x : offset_x + scaled_width]
+
+        # Offsets for U and V planes are half of the Y offsets (integer floor)
+        offset_y_uv = offset_y // 2
+        offset_x_uv = offset_x // 2
+        scaled_uv_width, scaled_uv_height = self.scaled_uv_size
+        self.u_destination = final_u[offset_y_uv : offset_y_uv + scaled_uv_height, offset_x_uv : offset_x_uv + scaled_uv_width]
+        self.v_destination = final_v[offset_y_uv : offset_y_uv + scaled_uv_height, offset_x_uv : offset_x_uv + scaled_uv_width]
+
+    def scale(self, frame):
+        """
+        :param frame: A bytes-like object containing the raw I420 frame data.
+        :return:      A bytes object with the scaled I420 frame.
+        """
+        frame = np.frombuffer(frame, dtype=np.uint8)
+        y = frame[: self.y_plane_size]
+        u = frame[self.y_plane_size : self.y_plane_size + self.uv_plane_size]
+        v = frame[self.y_plane_size + self.uv_plane_size : self.y_plane_size + 2 * self.uv_plane_size]
+        return self.scale_planes(y, u, v)
+
+    def scale_planes(self, y, u, v):
+        """
+        :param y, u, v: The Y, U and V planes of the frame, as flat uint8 arrays.
+        :return:        A bytes object with the scaled I420 frame.
+        """
+        orig_width, orig_height = self.frame_size
+        cv2.resize(y.reshape(orig_height, orig_width), self.scaled_y_size, dst=self.y_destination, interpolation=cv2.INTER_LINEAR)
+        cv2.resize(u.reshape(self.orig_chroma_shape), self.scaled_uv_size, dst=self.u_destination, interpolation=cv2.INTER_LINEAR)
+        cv2.resize(v.reshape(self.orig_chroma_shape), self.scaled_uv_size, dst=self.v_destination, interpolation=cv2.INTER_LINEAR)
+        # The canvas is reused for the next frame, so the caller gets a copy
+        return self.canvas.tobytes()
+
+
+class I420ScalerCache:
+    """Keeps the I420Scalers for the most recently used (frame size, new size) pairs, since the size of an incoming video stream rarely changes."""
+
+    def __init__(self, max_size=4, ceil_chroma=True):
+        self.max_size = max_size
+        self.ceil_chroma = ceil_chroma
+        self.scalers = {}
+
+    def get(self, frame_size, new_size):
+        key = (tuple(frame_size), tuple(new_size))
+        # Dicts keep insertion order, so re-inserting the scaler marks it as the most recently used
+        scaler = self.scalers.pop(key, None)
+        if scaler is None:
+            scaler = I420Scaler(frame_size, new_size, ceil_chroma=self.ceil_chroma)
+            if len(self.scalers) >= self.max_size:
+                del self.scalers[next(iter(self.scalers))]
+        self.scalers[key] = scaler
+        return scaler
+
+
 def scale_i420(frame, frame_size, new_size):
     """
-    Scales an I420 (YUV 4:2:0) frame from 'frame_size' to 'new_size',
-    handling odd frame widths/heights by using 'ceil' in the chroma planes.
+    Scales an I420 (YUV 4:2:0) frame from 'frame_size' to 'new_size'. See I420Scaler, which should be
+    used instead for scaling a stream of frames.
 
     :param frame:      A bytes object containing the raw I420 frame data.
     :param frame_size: (orig_width, orig_height)
     :param new_size:   (new_width, new_height)
     :return:           A bytes object with the scaled I420 frame.
     """
-
-    # 1) Unpack source / destination dimensions
-    orig_width, orig_height = frame_size
-    new_width, new_height = new_size
-
-    # 2) Compute source plane sizes with rounding up for chroma
-    orig_chroma_width = half_ceil(orig_width)
-    orig_chroma_height = half_ceil(orig_height)
-
-    y_plane_size = orig_width * orig_height
-    uv_plane_size = orig_chroma_width * orig_chroma_height  # for each U or V
-
-    # 3) Extract Y, U, V planes from the byte array
-    y = np.frombuffer(frame[0:y_plane_size], dtype=np.uint8)
-    u = np.frombuffer(frame[y_plane_size : y_plane_size + uv_plane_size], dtype=np.uint8)
-    v = np.frombuffer(
-        frame[y_plane_size + uv_plane_size : y_plane_size + 2 * uv_plane_size],
-        dtype=np.uint8,
-    )
-
-    # 4) Reshape planes
-    y = y.reshape(orig_height, orig_width)
-    u = u.reshape(orig_chroma_height, orig_chroma_width)
-    v = v.reshape(orig_chroma_height, orig_chroma_width)
-
-    # ---------------------------------------------------------
-    # Scale preserving aspect ratio or do letterbox/pillarbox
-    # ---------------------------------------------------------
-    input_aspect = orig_width / orig_height
-    output_aspect = new_width / new_height
-
-    if abs(input_aspect - output_aspect) < 1e-6:
-        # Same aspect ratio; do a straightforward resize
-        scaled_y = cv2.resize(y, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
-
-        # For U, V we should scale to half-dimensions (rounded up)
-        # of the new size. But OpenCV requires exact (int) dims, so:
-        target_u_width = half_ceil(new_width)
-        target_u_height = half_ceil(new_height)
-
-        scaled_u = cv2.resize(u, (target_u_width, target_u_height), interpolation=cv2.INTER_LINEAR)
-        scaled_v = cv2.resize(v, (target_u_width, target_u_height), interpolation=cv2.INTER_LINEAR)
-
-        # Flatten and return
-        return np.concatenate([scaled_y.flatten(), scaled_u.flatten(), scaled_v.flatten()]).astype(np.uint8).tobytes()
-
-    # Otherwise, the aspect ratios differ => letterbox or pillarbox
-    if input_aspect > output_aspect:
-        # The image is relatively wider => match width, shrink height
-        scaled_width = new_width
-        scaled_height = int(round(new_width / input_aspect))
-    else:
-        # The image is relatively taller => match height, shrink width
-        scaled_height = new_height
-        scaled_width = int(round(new_height * input_aspect))
-
-    # 5) Resize Y, U, and V to the scaled dimensions
-    scaled_y = cv2.resize(y, (scaled_width, scaled_height), interpolation=cv2.INTER_LINEAR)
-
-    # For U, V, use half-dimensions of the scaled result, rounding up.
-    scaled_u_width = half_ceil(scaled_width)
-    scaled_u_height = half_ceil(scaled_height)
-    scaled_u = cv2.resize(u, (scaled_u_width, scaled_u_height), interpolation=cv2.INTER_LINEAR)
-    scaled_v = cv2.resize(v, (scaled_u_width, scaled_u_height), interpolation=cv2.INTER_LINEAR)
-
-    # 6) Create the output buffers. For "dark" black:
-    #    Y=0, U=128, V=128.
-    final_y = np.zeros((new_height, new_width), dtype=np.uint8)
-    final_u = np.full((half_ceil(new_height), half_ceil(new_width)), 128, dtype=np.uint8)
-    final_v = np.full((half_ceil(new_height), half_ceil(new_width)), 128, dtype=np.uint8)
-
-    # 7) Compute centering offsets for each plane (Y first)
-    offset_y = (new_height - scaled_height) // 2
-    offset_x = (new_width - scaled_width) // 2
-
-    final_y[offset_y : offset_y + scaled_height, offset_x : offset_x + scaled_width] = scaled_y
-
-    # Offsets for U and V planes are half of the Y offsets (integer floor)
-    offset_y_uv = offset_y // 2
-    offset_x_uv = offset_x // 2
-
-    final_u[
-        offset_y_uv : offset_y_uv + scaled_u_height,
-        offset_x_uv : offset_x_uv + scaled_u_width,
-    ] = scaled_u
-    final_v[
-        offset_y_uv : offset_y_uv + scaled_u_height,
-        offset_x_uv : offset_x_uv + scaled_u_width,
-    ] = scaled_v
-
-    # 8) Flatten back to I420 layout and return bytes
-
-    return np.concatenate([final_y.flatten(), final_u.flatten(), final_v.flatten()]).astype(np.uint8).tobytes()
+    return I420Scaler(frame_size, new_size).scale(frame)
 
 
 def png_to_yuv420_frame(png_bytes: bytes) -> tuple:
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from storages.backends.s3boto3 import S3Boto3Storage
+
+
+class UtteranceAudioStorageBackends:
+    # Raw audio is kept in Utterance.audio_blob, this is the original behavior
+    DATABASE = "database"
+    # Raw audio is spooled to a local directory. The bot and the celery workers must share the directory.
+    FILESYSTEM = "filesystem"
+    # Raw audio is written to an S3 bucket
+    S3 = "s3"
+
+
+class UtteranceAudioS3Storage(S3Boto3Storage):
+    bucket_name = settings.AWS_UTTERANCE_AUDIO_STORAGE_BUCKET_NAME
+
+
+def get_utterance_audio_storage():
+    """Returns the storage that utterance audio is written to, or None if it is kept in the database."""
+    backend = settings.UTTERANCE_AUDIO_STORAGE_BACKEND
+    if backend == UtteranceAudioStorageBackends.S3:
+        return UtteranceAudioS3Storage()
+    if backend == UtteranceAudioStorageBackends.FILESYSTEM:
+        return FileSystemStorage(location=settings.UTTERANCE_AUDIO_SPOOL_DIR)
+    if backend == UtteranceAudioStorageBackends.DATABASE:
+        return None
+    raise ValueError(f"Unknown utterance audio storage backend: {backend}")
+
+
+def utterance_audio_key(recording, utterance_uuid):
+    return f"{recording.object_id}/{utterance_uuid}.pcm"
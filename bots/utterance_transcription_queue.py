@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+# Redis list of the ids of utterances waiting for the transcription worker (run_transcription_worker)
+UTTERANCE_TRANSCRIPTION_QUEUE_KEY = "utterance_transcription_queue"
+# Redis set of the ids of the utterances the transcription worker is responsible for, from when they are queued until they are transcribed or failed.
+# Utterances transcribed by process_utterance tasks are never in it, so the worker doesn't pick them up when they are slow.
+UTTERANCE_TRANSCRIPTION_PENDING_KEY = "utterance_transcription_pending"
+# Set while the utterance is in the queue, so adding it again doesn't make the queue grow
+UTTERANCE_TRANSCRIPTION_QUEUED_KEY = "utterance_transcription_queued:{utterance_id}"
+# Expires in case the worker died between popping the utterance and clearing it, the utterance can be added to the queue again after that
+UTTERANCE_TRANSCRIPTION_QUEUED = timedelta(hours=2)
+# Set while a worker is transcribing the utterance, so the same utterance isn't transcribed by two workers at once
+UTTERANCE_TRANSCRIPTION_LEASE_KEY = "utterance_transcription_lease:{utterance_id}"
+# Longer than transcribing an utterance can take with all its retries, the lease only outlives that if the worker died
+UTTERANCE_TRANSCRIPTION_LEASE = timedelta(minutes=30)
+
+
+def add_utterances_to_transcription_queue(redis_client, utterance_ids):
+    """Makes the transcription worker responsible for the utterances, and adds the ones that aren't in the queue yet to it. Returns the ids that were added."""
+    utterance_ids = list(utterance_ids)
+    if not utterance_ids:
+        return []
+    redis_client.sadd(UTTERANCE_TRANSCRIPTION_PENDING_KEY, *utterance_ids)
+
+    pipeline = redis_client.pipeline(transaction=False)
+    for utterance_id in utterance_ids:
+        pipeline.set(UTTERANCE_TRANSCRIPTION_QUEUED_KEY.format(utterance_id=utterance_id), 1, nx=True, ex=UTTERANCE_TRANSCRIPTION_QUEUED)
+    newly_queued = [utterance_id for utterance_id, was_set in zip(utterance_ids, pipeline.execute()) if was_set]
+    if newly_queued:
+        redis_client.rpush(UTTERANCE_TRANSCRIPTION_QUEUE_KEY, *newly_queued)
+    return newly_queued
+
+
+def pop_utterances_from_transcription_queue(redis_client, count, timeout_seconds):
+    """Removes up to count utterance ids from the queue and returns them. Waits up to timeout_seconds for the first one if the queue is empty."""
+    popped = redis_client.blpop([UTTERANCE_TRANSCRIPTION_QUEUE_KEY], timeout=timeout_seconds)
+    if popped is None:
+        return []
+    utterance_ids = [int(popped[1])]
+    if count > 1:
+        utterance_ids.extend(int(member) for member in redis_client.lpop(UTTERANCE_TRANSCRIPTION_QUEUE_KEY, count - 1) or [])
+    redis_client.delete(*[UTTERANCE_TRANSCRIPTION_QUEUED_KEY.format(utterance_id=utterance_id) for utterance_id in utterance_ids])
+    return utterance_ids
+
+
+def finish_utterance_transcriptions(redis_client, utterance_ids):
+    """The transcription worker is no longer responsible for the utterances, because they were transcribed, failed or deleted."""
+    utterance_ids = list(utterance_ids)
+    if utterance_ids:
+        redis_client.srem(UTTERANCE_TRANSCRIPTION_PENDING_KEY, *utterance_ids)
+
+
+def pending_utterance_ids(redis_client, utterance_ids):
+    """Returns the ids of the utterances that the transcription worker is responsible for."""
+    utterance_ids = list(utterance_ids)
+    pipeline = redis_client.pipeline(transaction=False)
+    for utterance_id in utterance_ids:
+        pipeline.sismember(UTTERANCE_TRANSCRIPTION_PENDING_KEY, utterance_id)
+    pending = pipeline.execute()
+    return [utterance_id for utterance_id, is_pending in zip(utterance_ids, pending) if is_pending]
+
+
+def acquire_utterance_transcription_leases(redis_client, utterance_ids):
+    """Takes the lease on each of the utterances that no worker is transcribing, and returns their ids."""
+    utterance_ids = list(utterance_ids)
+    pipeline = redis_client.pipeline(transaction=False)
+    for utterance_id in utterance_ids:
+        pipeline.set(UTTERANCE_TRANSCRIPTION_LEASE_KEY.format(utterance_id=utterance_id), 1, nx=True, ex=UTTERANCE_TRANSCRIPTION_LEASE)
+    acquired = pipeline.execute()
+    return [utterance_id for utterance_id, was_acquired in zip(utterance_ids, acquired) if was_acquired]
+
+
+def release_utterance_transcription_lease(redis_client, utterance_id):
+    redis_client.delete(UTTERANCE_TRANSCRIPTION_LEASE_KEY.format(utterance_id=utterance_id))
+
+
+def unleased_utterance_ids(redis_client, utterance_ids):
+    """Returns the ids of the utterances that no worker is transcribing."""
+    utterance_ids = list(utterance_ids)
+    pipeline = redis_client.pipeline(transaction=False)
+    for utterance_id in utterance_ids:
+        pipeline.exists(UTTERANCE_TRANSCRIPTION_LEASE_KEY.format(utterance_id=utterance_id))
+    leased = pipeline.execute()
+    return [utterance_id for utterance_id, is_leased in zip(utterance_ids, leased) if not is_leased]
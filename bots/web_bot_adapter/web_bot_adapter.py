@@ -16,7 +16,7 @@ from websockets.sync.server import serve
 from bots.automatic_leave_configuration import AutomaticLeaveConfiguration
 from bots.bot_adapter import BotAdapter
 from bots.models import ParticipantEventTypes, RecordingViews
-from bots.utils import half_ceil, scale_i420
+from bots.utils import I420ScalerCache, half_ceil
 
 from .debug_screen_recorder import DebugScreenRecorder
 from .ui_methods import UiCouldNotJoinMeetingWaitingForHostException, UiCouldNotJoinMeetingWaitingRoomTimeoutException, UiIncorrectPasswordException, UiLoginAttemptFailedException, UiLoginRequiredException, UiMeetingNotFoundException, UiRequestToJoinDeniedException, UiRetryableException, UiRetryableExpectedException
@@ -84,6 +84,7 @@ class WebBotAdapter(BotAdapter):
         self.participants_info = {}
         self.only_one_participant_in_meeting_at = None
         self.video_frame_ticker = 0
+        self.i420_scalers = I420ScalerCache()
 
         self.automatic_leave_configuration = automatic_leave_configuration
 
@@ -166,7 +167,7 @@ class WebBotAdapter(BotAdapter):
 
             # Check if len(video_data) does not agree with width and height
             if len(video_data) == expected_video_data_length:  # I420 format uses 1.5 bytes per pixel
-                scaled_i420_frame = scale_i420(video_data, (width, height), self.video_frame_size)
+                scaled_i420_frame = self.i420_scalers.get((width, height), self.video_frame_size).scale(video_data)
                 if self.wants_any_video_frames_callback() and self.send_frames:
                     self.add_video_frame_callback(scaled_i420_frame, timestamp * 1000)
 
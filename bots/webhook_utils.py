@@ -4,6 +4,7 @@ import hmac
 import json
 import logging
 import uuid
+from urllib.parse import urlsplit
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +14,18 @@ def trigger_webhook(webhook_trigger_type, bot=None, calendar=None, payload=None)
     Trigger a webhook for a given event.
     Prioritizes bot-level webhook subscriptions over project-level ones.
     """
+    if not payload:
+        raise ValueError("Payload must be provided")
+
+    return trigger_webhooks(webhook_trigger_type, bot=bot, calendar=calendar, payloads=[payload])
+
+
+def trigger_webhooks(webhook_trigger_type, bot=None, calendar=None, payloads=None):
+    """
+    Trigger webhooks for several events of the same type at once.
+    The delivery attempts are created in a single query and handed to one delivery task per destination host,
+    so the events can share a connection and be batched for subscriptions that opted into it.
+    """
     from bots.models import WebhookDeliveryAttempt
 
     if bot:
@@ -22,7 +35,7 @@ def trigger_webhook(webhook_trigger_type, bot=None, calendar=None, payload=None)
     else:
         raise ValueError("Either bot or calendar must be provided")
 
-    if not payload:
+    if not payloads or not all(payloads):
         raise ValueError("Payload must be provided")
 
     # If bot was provided and has any bot-level webhook subscriptions, use those exclusively
@@ -36,10 +49,8 @@ def trigger_webhook(webhook_trigger_type, bot=None, calendar=None, payload=None)
             is_active=True,
         )
 
-    delivery_attempts = []
-    for subscription in subscriptions:
-        # Create a webhook delivery attempt record
-        delivery_attempt = WebhookDeliveryAttempt.objects.create(
+    delivery_attempts = [
+        WebhookDeliveryAttempt(
             webhook_subscription=subscription,
             webhook_trigger_type=webhook_trigger_type,
             idempotency_key=uuid.uuid4(),
@@ -47,15 +58,33 @@ def trigger_webhook(webhook_trigger_type, bot=None, calendar=None, payload=None)
             calendar=calendar,
             payload=payload,
         )
-        delivery_attempts.append(delivery_attempt)
+        for subscription in subscriptions
+        for payload in payloads
+    ]
+    if not delivery_attempts:
+        return 0
 
-        from bots.tasks.deliver_webhook_task import deliver_webhook
-
-        deliver_webhook.delay(delivery_attempt.id)
+    WebhookDeliveryAttempt.objects.bulk_create(delivery_attempts)
+    enqueue_webhook_deliveries(delivery_attempts)
 
     return len(delivery_attempts)
 
 
+def enqueue_webhook_deliveries(delivery_attempts):
+    """
+    Queue delivery of the given attempts, with one task per destination host.
+    """
+    from bots.tasks.deliver_webhook_task import deliver_webhooks
+
+    delivery_ids_by_host = {}
+    for delivery_attempt in delivery_attempts:
+        host = urlsplit(delivery_attempt.webhook_subscription.url).netloc.lower()
+        delivery_ids_by_host.setdefault(host, []).append(delivery_attempt.id)
+
+    for delivery_ids in delivery_ids_by_host.values():
+        deliver_webhooks.delay(delivery_ids)
+
+
 def sign_payload(payload, secret):
     """
     Sign a webhook payload using HMAC-SHA256. Returns a base64-encoded HMAC-SHA256 signature
@@ -9,6 +9,7 @@ logger = logging.getLogger(__name__)
 
 import audioop
 import logging
+import struct
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +17,29 @@ SAMPLE_WIDTH = 2  # 16-bit PCM
 CHANNELS = 1  # mono
 
 
+class WebsocketAudioMessageFormats:
+    # Base64 encoded audio inside a JSON text frame, the original format
+    JSON = "json"
+    # A fixed size header followed by the raw PCM audio, in a binary frame
+    BINARY = "binary"
+
+
+# Header of binary audio frames. All integers are big-endian.
+#   version (uint8), message type (uint8), audio format (uint8), reserved (uint8),
+#   sample rate (uint32), timestamp in ms (uint64), bot id (32 bytes of ASCII, padded with null bytes)
+BINARY_AUDIO_HEADER = struct.Struct(">BBBBIQ32s")
+BINARY_AUDIO_VERSION = 1
+
+
+class BinaryAudioMessageTypes:
+    MIXED_AUDIO_CHUNK = 1
+    BOT_OUTPUT_AUDIO_CHUNK = 2
+
+
+class BinaryAudioFormats:
+    PCM_S16LE_MONO = 1
+
+
 def _downsample(chunk: bytes, src_rate: int, dst_rate: int) -> bytes:
     if src_rate == dst_rate:
         return chunk  # nothing to do
@@ -47,3 +71,39 @@ def mixed_audio_websocket_payload(chunk: bytes, input_sample_rate: int, output_s
             "sample_rate": output_sample_rate,
         },
     }
+
+
+def mixed_audio_websocket_binary_payload(chunk: bytes, input_sample_rate: int, output_sample_rate: int, bot_object_id: str) -> bytes:
+    """
+    Down-sample (if needed) and package for websocket as a binary frame, see BINARY_AUDIO_HEADER.
+    """
+    chunk_downsampled = _downsample(chunk, input_sample_rate, output_sample_rate)
+
+    header = BINARY_AUDIO_HEADER.pack(
+        BINARY_AUDIO_VERSION,
+        BinaryAudioMessageTypes.MIXED_AUDIO_CHUNK,
+        BinaryAudioFormats.PCM_S16LE_MONO,
+        0,
+        output_sample_rate,
+        int(time.time() * 1000),
+        bot_object_id.encode("ascii"),
+    )
+    return header + chunk_downsampled
+
+
+def parse_bot_output_audio_binary_message(message: bytes) -> tuple[bytes, int]:
+    """
+    Returns the PCM chunk and its sample rate from a binary bot output audio frame. The bot id and timestamp are not used.
+    """
+    if len(message) < BINARY_AUDIO_HEADER.size:
+        raise ValueError(f"Binary audio message is {len(message)} bytes, shorter than the {BINARY_AUDIO_HEADER.size} byte header")
+
+    version, message_type, audio_format, _, sample_rate, _, _ = BINARY_AUDIO_HEADER.unpack_from(message)
+    if version != BINARY_AUDIO_VERSION:
+        raise ValueError(f"Unsupported binary audio message version {version}")
+    if message_type != BinaryAudioMessageTypes.BOT_OUTPUT_AUDIO_CHUNK:
+        raise ValueError(f"Unsupported binary audio message type {message_type}")
+    if audio_format != BinaryAudioFormats.PCM_S16LE_MONO:
+        raise ValueError(f"Unsupported binary audio format {audio_format}")
+
+    return message[BINARY_AUDIO_HEADER.size :], sample_rate
@@ -1,8 +1,5 @@
 import logging
-import os
-import tempfile
 import threading
-import urllib.request
 
 import gi
 
@@ -20,14 +17,20 @@ class MP4Demuxer:
     """
     Stream-demux a remote MP4.
 
+    The MP4 is read over HTTP as it plays, so playback starts as soon as the moov atom has arrived
+    instead of after the whole file is downloaded. If the moov atom is at the end of the file, qtdemux
+    fetches it with a range request first.
+
     Parameters
     ----------
     url : str
         Full HTTP/HTTPS URL of the MP4.
     on_video_sample : Callable[[float, bytes], None]
-        Called with (pts_seconds, raw_rgba_frame).
+        Called with (pts_seconds, raw_i420_frame).
     on_audio_sample : Callable[[float, bytes], None]
         Called with (pts_seconds, raw_pcm_block).
+
+    The sample data is the mapped GStreamer buffer, so the callbacks must not hold on to it after they return.
     """
 
     def __init__(self, url, output_video_dimensions, on_video_sample, on_audio_sample):
@@ -40,34 +43,9 @@ class MP4Demuxer:
         self._loop = GObject.MainLoop()
         self._thread = None
         self._queue_elements = {}  # Store references to queue elements
-        self._temp_file_path = None
 
-        self._download_file()
         self._build_pipeline()
 
-    # ------------------------------------------------------------------ #
-    #  File download                                                     #
-    # ------------------------------------------------------------------ #
-    def _download_file(self) -> None:
-        """
-        Download the file from URL to a temporary file.
-        """
-        logger.info(f"Downloading MP4 from {self._url}...")
-
-        # Create a temporary file
-        temp_fd, self._temp_file_path = tempfile.mkstemp(suffix=".mp4")
-        os.close(temp_fd)  # Close the file descriptor, we'll use the path
-
-        try:
-            # Download the file
-            urllib.request.urlretrieve(self._url, self._temp_file_path)
-            logger.info(f"Downloaded MP4 to {self._temp_file_path}")
-        except Exception as e:
-            logger.error(f"Error downloading file: {e}")
-            if os.path.exists(self._temp_file_path):
-                os.unlink(self._temp_file_path)
-            raise
-
     # ------------------------------------------------------------------ #
     #  Public control API                                                #
     # ------------------------------------------------------------------ #
@@ -94,32 +72,17 @@ class MP4Demuxer:
         self._pipeline.send_event(Gst.Event.new_eos())  # graceful EOS
         self._pipeline.set_state(Gst.State.NULL)
         self._loop.quit()
-        if self._thread and self._thread.is_alive():
+        # stop() can be called from the bus handler, which runs on the loop's own thread
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
             self._thread.join()
         self._playing = False
 
-        # Clean up temporary file
-        self._cleanup_temp_file()
-
     def is_playing(self) -> bool:
         """
         Returns True while the pipeline is running.
         """
         return self._playing
 
-    def _cleanup_temp_file(self) -> None:
-        """
-        Remove the temporary file if it exists.
-        """
-        if self._temp_file_path and os.path.exists(self._temp_file_path):
-            try:
-                os.unlink(self._temp_file_path)
-                logger.info(f"Cleaned up temporary file: {self._temp_file_path}")
-            except Exception as e:
-                logger.error(f"Error cleaning up temporary file: {e}")
-            finally:
-                self._temp_file_path = None
-
     # ------------------------------------------------------------------ #
     #  Internal helpers                                                  #
     # ------------------------------------------------------------------ #
@@ -128,7 +91,7 @@ class MP4Demuxer:
         Create elements, link them, and attach callbacks.
         """
         launch = f"""
-            filesrc location={self._temp_file_path} ! qtdemux name=d
+            souphttpsrc name=source ! qtdemux name=d
 
                 d. ! queue name=video_queue                                 \
                         max-size-buffers=50 max-size-bytes=0 max-size-time=0 \
@@ -150,6 +113,8 @@ class MP4Demuxer:
                                 max-buffers=30 drop=false
         """
         self._pipeline = Gst.parse_launch(launch)
+        # Set the URL as a property, so characters like & and ; in it aren't parsed as part of the pipeline description
+        self._pipeline.get_by_name("source").set_property("location", self._url)
 
         # sink elements
         vsink = self._pipeline.get_by_name("vsink")
@@ -228,7 +193,8 @@ class MP4Demuxer:
         success, mapinfo = buf.map(Gst.MapFlags.READ)
         if success:
             try:
-                user_cb(pts, bytes(mapinfo.data))
+                # Hand over the mapped data as is, the callbacks pass it straight to the Zoom SDK
+                user_cb(pts, mapinfo.data)
             finally:
                 buf.unmap(mapinfo)
 
@@ -239,10 +205,7 @@ class MP4Demuxer:
         t = msg.type
         if t == Gst.MessageType.EOS or t == Gst.MessageType.ERROR:
             # Pipeline finished or hit error – shut down cleanly
+            if t == Gst.MessageType.ERROR:
+                err, debug = msg.parse_error()
+                logger.error(f"MP4Demuxer pipeline error for {self._url}: {err} {debug}")
             self.stop()
-
-    def __del__(self):
-        """
-        Destructor to ensure cleanup of temporary file.
-        """
-        self._cleanup_temp_file()
@@ -1,11 +1,12 @@
 import logging
 import time
 
-import cv2
 import numpy as np
 import zoom_meeting_sdk as zoom
 from gi.repository import GLib
 
+from bots.utils import I420ScalerCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,95 +30,16 @@ def create_black_i420_frame(video_frame_size):
     return yuv_frame.astype(np.uint8).tobytes()
 
 
-def scale_i420(frame, new_size):
-    new_width, new_height = new_size
-    """
-    Scales the given frame in I420 format to new_width x new_height while
-    preserving aspect ratio. If the aspect ratios do not match, letterboxes/pillarboxes
-    the scaled image on a black background.
-    
-    :param frame: Frame object with methods:
-        - GetStreamWidth()
-        - GetStreamHeight()
-        - GetYBuffer()
-        - GetUBuffer()
-        - GetVBuffer()
-    :param new_width: Desired width.
-    :param new_height: Desired height.
-    :return: Scaled (and possibly letter/pillarboxed) I420 frame bytes.
-    """
-    orig_width = frame.GetStreamWidth()
-    orig_height = frame.GetStreamHeight()
-
-    # 1) Convert buffers to NumPy arrays without extra copies if possible.
-    y = np.frombuffer(frame.GetYBuffer(), dtype=np.uint8, count=orig_width * orig_height)
-    u = np.frombuffer(frame.GetUBuffer(), dtype=np.uint8, count=(orig_width // 2) * (orig_height // 2))
-    v = np.frombuffer(frame.GetVBuffer(), dtype=np.uint8, count=(orig_width // 2) * (orig_height // 2))
-
-    # Reshape planes
-    y = y.reshape(orig_height, orig_width)
-    u = u.reshape(orig_height // 2, orig_width // 2)
-    v = v.reshape(orig_height // 2, orig_width // 2)
-
-    # 2) Determine scale preserving aspect ratio
-    input_aspect = orig_width / orig_height
-    output_aspect = new_width / new_height
-
-    if abs(input_aspect - output_aspect) < 1e-6:
-        # Aspect ratios match (or extremely close). Just do a simple stretch to (new_width, new_height).
-        scaled_y = cv2.resize(y, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
-        scaled_u = cv2.resize(u, (new_width // 2, new_height // 2), interpolation=cv2.INTER_LINEAR)
-        scaled_v = cv2.resize(v, (new_width // 2, new_height // 2), interpolation=cv2.INTER_LINEAR)
-
-        # Flatten and return
-        return np.concatenate([scaled_y.flatten(), scaled_u.flatten(), scaled_v.flatten()]).astype(np.uint8).tobytes()
-
-    # Otherwise, the aspect ratios differ => letterbox or pillarbox
-    # 3) Compute scaled dimensions that fit entirely within (new_width, new_height)
-    if input_aspect > output_aspect:
-        # The image is relatively wider => match width, shrink height
-        scaled_width = new_width
-        scaled_height = int(round(new_width / input_aspect))
-    else:
-        # The image is relatively taller => match height, shrink width
-        scaled_height = new_height
-        scaled_width = int(round(new_height * input_aspect))
-
-    # 4) Resize Y, U, and V to the scaled dimensions
-    scaled_y = cv2.resize(y, (scaled_width, scaled_height), interpolation=cv2.INTER_LINEAR)
-    scaled_u = cv2.resize(u, (scaled_width // 2, scaled_height // 2), interpolation=cv2.INTER_LINEAR)
-    scaled_v = cv2.resize(v, (scaled_width // 2, scaled_height // 2), interpolation=cv2.INTER_LINEAR)
-
-    # 5) Create the black background only if needed
-    # For I420, black is typically (Y=0, U=128, V=128) or (Y=16, U=128, V=128).
-    # We'll use Y=0, U=128, V=128 for "dark" black.
-    final_y = np.zeros((new_height, new_width), dtype=np.uint8)
-    final_u = np.full((new_height // 2, new_width // 2), 128, dtype=np.uint8)
-    final_v = np.full((new_height // 2, new_width // 2), 128, dtype=np.uint8)
-
-    # 6) Compute centering offsets for each plane
-    # For Y-plane
-    offset_y = (new_height - scaled_height) // 2
-    offset_x = (new_width - scaled_width) // 2
-
-    # Insert Y
-    final_y[offset_y : offset_y + scaled_height, offset_x : offset_x + scaled_width] = scaled_y
-
-    # For U, V planes (subsampled by 2 in each dimension)
-    offset_y_uv = offset_y // 2
-    offset_x_uv = offset_x // 2
-
-    final_u[
-        offset_y_uv : offset_y_uv + (scaled_height // 2),
-        offset_x_uv : offset_x_uv + (scaled_width // 2),
-    ] = scaled_u
-    final_v[
-        offset_y_uv : offset_y_uv + (scaled_height // 2),
-        offset_x_uv : offset_x_uv + (scaled_width // 2),
-    ] = scaled_v
-
-    # 7) Flatten back to I420 layout and return bytes
-    return np.concatenate([final_y.flatten(), final_u.flatten(), final_v.flatten()]).astype(np.uint8).tobytes()
+# Black frames are immutable bytes, so one per resolution is shared by every stream instead of building a new one each time
+_black_i420_frames = {}
+
+
+def get_black_i420_frame(video_frame_size):
+    video_frame_size = tuple(video_frame_size)
+    black_frame = _black_i420_frames.get(video_frame_size)
+    if black_frame is None:
+        black_frame = _black_i420_frames[video_frame_size] = create_black_i420_frame(video_frame_size)
+    return black_frame
 
 
 class VideoInputStream:
@@ -127,7 +49,10 @@ class VideoInputStream:
         self.stream_type = stream_type
         self.share_source_id = share_source_id
         self.renderer_destroyed = False
+        self.cleaned_up = False
         self.last_debug_frame_time = None
+        # The SDK's U and V buffers have always been read as (width // 2) x (height // 2), keep doing that for frames with odd sizes
+        self.i420_scalers = I420ScalerCache(ceil_chroma=False)
         self.renderer_delegate = zoom.ZoomSDKRendererDelegateCallbacks(
             onRawDataFrameReceivedCallback=self.on_raw_video_frame_received_callback,
             onRendererBeDestroyedCallback=self.on_renderer_destroyed_callback,
@@ -149,7 +74,8 @@ class VideoInputStream:
         self.raw_data_status = zoom.RawData_Off
 
         self.last_frame_time = time.time()
-        self.black_frame_timer_id = GLib.timeout_add(250, self.send_black_frame)
+        self.black_frame_timer_id = None
+        self.start_black_frame_timer()
 
         logger.info(f"In VideoInputStream.init self.renderer = {self.renderer}")
         logger.info(f"In VideoInputStream.init set_resolution_result for user {self.user_id} and share source id {self.share_source_id} is {set_resolution_result}")
@@ -159,26 +85,43 @@ class VideoInputStream:
         self.raw_data_status = status
         logger.info(f"In VideoInputStream.on_raw_data_status_changed_callback raw_data_status for user {self.user_id} is {self.raw_data_status}")
 
+        # Black frames are only sent while the user isn't sending video, so the timer doesn't need to run while they are
+        if self.raw_data_status == zoom.RawData_Off:
+            self.start_black_frame_timer()
+        else:
+            self.stop_black_frame_timer()
+
+    def start_black_frame_timer(self):
+        if self.black_frame_timer_id is not None or self.renderer_destroyed or self.cleaned_up:
+            return
+        self.black_frame_timer_id = GLib.timeout_add(250, self.send_black_frame)
+
+    def stop_black_frame_timer(self):
+        if self.black_frame_timer_id is None:
+            return
+        GLib.source_remove(self.black_frame_timer_id)
+        self.black_frame_timer_id = None
+
     def send_black_frame(self):
-        if self.renderer_destroyed:
+        if self.renderer_destroyed or self.raw_data_status != zoom.RawData_Off:
+            # Returning False removes the timer
+            self.black_frame_timer_id = None
             return False
 
         current_time = time.time()
-        if current_time - self.last_frame_time >= 0.25 and self.raw_data_status == zoom.RawData_Off:
-            # Create a black frame of the same dimensions
-            black_frame = create_black_i420_frame(self.video_input_manager.video_frame_size)
+        if current_time - self.last_frame_time >= 0.25:
+            black_frame = get_black_i420_frame(self.video_input_manager.video_frame_size)
             self.video_input_manager.new_frame_callback(black_frame, time.time_ns())
             logger.info(f"In VideoInputStream.send_black_frame for user {self.user_id} sent black frame")
 
-        return not self.renderer_destroyed  # Continue timer if not cleaned up
+        return True
 
     def cleanup(self):
         if self.renderer_destroyed:
             return
 
-        if self.black_frame_timer_id is not None:
-            GLib.source_remove(self.black_frame_timer_id)
-            self.black_frame_timer_id = None
+        self.cleaned_up = True
+        self.stop_black_frame_timer()
 
         logger.info(f"starting renderer unsubscription for user {self.user_id} and share source id {self.share_source_id}")
         self.renderer.unSubscribe()
@@ -209,7 +152,13 @@ class VideoInputStream:
             logger.debug(f"In VideoInputStream.on_raw_video_frame_received_callback for user {self.user_id} received frame")
             self.last_debug_frame_time = time.time()
 
-        scaled_i420_frame = scale_i420(data, self.video_input_manager.video_frame_size)
+        frame_size = (data.GetStreamWidth(), data.GetStreamHeight())
+        scaler = self.i420_scalers.get(frame_size, self.video_input_manager.video_frame_size)
+        # Read the planes straight out of the SDK's buffers
+        y = np.frombuffer(data.GetYBuffer(), dtype=np.uint8, count=scaler.y_plane_size)
+        u = np.frombuffer(data.GetUBuffer(), dtype=np.uint8, count=scaler.uv_plane_size)
+        v = np.frombuffer(data.GetVBuffer(), dtype=np.uint8, count=scaler.uv_plane_size)
+        scaled_i420_frame = scaler.scale_planes(y, u, v)
         self.video_input_manager.new_frame_callback(scaled_i420_frame, current_time_ns)
 
 
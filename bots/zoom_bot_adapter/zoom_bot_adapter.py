@@ -53,6 +53,17 @@ def create_black_yuv420_frame(width=640, height=360):
     return yuv_frame.tobytes()
 
 
+# The blank frame sent to the virtual camera only depends on its resolution, so it's built once per resolution
+_black_yuv420_frames = {}
+
+
+def get_black_yuv420_frame(width=640, height=360):
+    black_frame = _black_yuv420_frames.get((width, height))
+    if black_frame is None:
+        black_frame = _black_yuv420_frames[(width, height)] = create_black_yuv420_frame(width, height)
+    return black_frame
+
+
 def parse_join_url(join_url):
     # Parse the URL into components
     parsed = urlparse(join_url)
@@ -573,7 +584,7 @@ class ZoomBotAdapter(BotAdapter):
         # Then the callback will be triggered again and subsequent calls will succeed.
         # Not sure why this happens.
         if self.video_sender and not self.on_virtual_camera_start_send_callback_called and self.suggested_video_cap:
-            blank = create_black_yuv420_frame(self.suggested_video_cap.width, self.suggested_video_cap.height)
+            blank = get_black_yuv420_frame(self.suggested_video_cap.width, self.suggested_video_cap.height)
             initial_send_video_frame_response = self.video_sender.sendVideoFrame(blank, self.suggested_video_cap.width, self.suggested_video_cap.height, 0, zoom.FrameDataFormat_I420_FULL)
             logger.info(f"initial_send_video_frame_response = {initial_send_video_frame_response}")
         self.on_virtual_camera_start_send_callback_called = True